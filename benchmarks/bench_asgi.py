@@ -0,0 +1,216 @@
+import argparse
+import asyncio
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from benchmarks.harness import summarize, write_results, compare_results, print_table
+from benchmarks.bench_funnel import configure_environment, build_app
+
+STREAM_PATH = '/api/document-progress/stream'
+PROBE_PATH = '/api/document-progress'
+
+def seed_documents(app, count):
+    """Documents mid-analysis, one per stream client"""
+    from leasecheck.database import db
+    from leasecheck.models import Document
+
+    with app.app_context():
+        documents = [
+            Document(
+                original_filename=f"lease_{number}.pdf", stored_filename=f"bench_{number}.pdf",
+                file_path=f"bench_{number}.pdf", file_size=1024, status='processing', page_count=20,
+                pages_extracted=0, analysis_started_at=datetime.utcnow()
+            )
+            for number in range(count)
+        ]
+        db.session.add_all(documents)
+        db.session.commit()
+        return [document.id for document in documents]
+
+def reset_documents(app, ids):
+    from leasecheck.database import db
+    from leasecheck.models import Document
+
+    with app.app_context():
+        Document.query.filter(Document.id.in_(ids)).update(
+            {'status': 'processing', 'pages_extracted': 0}, synchronize_session=False
+        )
+        db.session.commit()
+
+def finish_documents_later(app, ids, delay):
+    """Mark every document analyzed after delay seconds, as the analysis workers would"""
+    from leasecheck.database import db
+    from leasecheck.models import Document
+
+    def finish():
+        time.sleep(delay)
+        with app.app_context():
+            Document.query.filter(Document.id.in_(ids)).update(
+                {'status': 'processed', 'pages_extracted': 20}, synchronize_session=False
+            )
+            db.session.commit()
+    thread = threading.Thread(target=finish, daemon=True)
+    thread.start()
+    return thread
+
+def admin_cookie(app):
+    """Session cookie of an admin, who may follow any document's progress"""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['admin_id'] = 1
+    return client.get_cookie('session').value
+
+def bench_wsgi(app, ids, threads, probes, delay):
+    """Streams and probe requests sharing one sync worker's thread pool, as under gthread"""
+    cookie = admin_cookie(app)
+    first_event, probe_samples, errors = [], [], 0
+    lock = threading.Lock()
+    start = time.perf_counter()
+
+    def stream(document_id):
+        client = app.test_client()
+        client.set_cookie('session', cookie)
+        response = client.get(f"{STREAM_PATH}?document_id={document_id}", buffered=False)
+        chunks = iter(response.response)
+        next(chunks)
+        with lock:
+            first_event.append(time.perf_counter() - start)
+        for _ in chunks:
+            pass
+        response.close()
+
+    def probe(document_id):
+        # Timed from when the client sent it, including the wait for a free thread
+        client = app.test_client()
+        client.set_cookie('session', cookie)
+        client.get(f"{PROBE_PATH}?document_id={document_id}")
+        with lock:
+            probe_samples.append(time.perf_counter() - start)
+
+    finisher = finish_documents_later(app, ids, delay)
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        futures = [pool.submit(stream, document_id) for document_id in ids]
+        futures += [pool.submit(probe, ids[number % len(ids)]) for number in range(probes)]
+        for future in futures:
+            try:
+                future.result()
+            except Exception:
+                errors += 1
+    elapsed = time.perf_counter() - start
+    finisher.join()
+    return first_event, probe_samples, elapsed, errors, threads
+
+def bench_asgi(app, ids, probes, delay):
+    """Streams on the event loop and probes through the WSGI bridge, in one worker"""
+    from leasecheck.asgi import AsgiApplication
+
+    application = AsgiApplication(app)
+    cookie = admin_cookie(app)
+    headers = [(b'cookie', f"session={cookie}".encode())]
+    first_event, probe_samples = [], []
+    peak_threads = threading.active_count()
+
+    def scope(path, document_id):
+        return {
+            'type': 'http', 'method': 'GET', 'path': path, 'root_path': '', 'scheme': 'http',
+            'query_string': f"document_id={document_id}".encode(), 'headers': headers,
+            'http_version': '1.1', 'server': ('localhost', 80), 'client': ('127.0.0.1', 0)
+        }
+
+    async def stream(document_id, start):
+        idle = asyncio.Event()
+        seen = []
+
+        async def receive():
+            await idle.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.body' and message.get('body') and not seen:
+                seen.append(True)
+                first_event.append(time.perf_counter() - start)
+        await application(scope(STREAM_PATH, document_id), receive, send)
+
+    async def probe(document_id, start):
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            pass
+        await application(scope(PROBE_PATH, document_id), receive, send)
+        probe_samples.append(time.perf_counter() - start)
+
+    async def run():
+        nonlocal peak_threads
+        start = time.perf_counter()
+        tasks = [asyncio.ensure_future(stream(document_id, start)) for document_id in ids]
+        tasks += [asyncio.ensure_future(probe(ids[number % len(ids)], start)) for number in range(probes)]
+        while not all(task.done() for task in tasks):
+            peak_threads = max(peak_threads, threading.active_count())
+            await asyncio.sleep(0.05)
+        errors = sum(1 for task in tasks if task.exception() is not None)
+        await application.progress.close()
+        return time.perf_counter() - start, errors
+
+    finisher = finish_documents_later(app, ids, delay)
+    elapsed, errors = asyncio.run(run())
+    finisher.join()
+    return first_event, probe_samples, elapsed, errors, peak_threads
+
+def scenario_results(name, result, streams):
+    first_event, probe_samples, elapsed, errors, threads = result
+    # A stream counts as served concurrently if its first event arrived within a second
+    served = sum(1 for seconds in first_event if seconds < 1.0)
+    return {
+        f"{name}_first_event": summarize(first_event, elapsed, errors, {
+            'streams': streams, 'served_within_1s': served, 'threads': threads
+        }),
+        f"{name}_probe": summarize(probe_samples, elapsed)
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare progress streams per worker under WSGI threads and ASGI')
+    parser.add_argument('--streams', type=int, default=200, help='Concurrent progress stream clients')
+    parser.add_argument('--threads', type=int, default=8, help='Threads of the sync worker being compared')
+    parser.add_argument('--probes', type=int, default=50, help='Plain JSON requests issued alongside the streams')
+    parser.add_argument('--analysis-seconds', type=float, default=3.0, help='Seconds until every review finishes')
+    parser.add_argument('--database-url', help='Database to use (defaults to a temporary SQLite file)')
+    parser.add_argument('--output', default='bench_results/asgi.json', help='JSON result file')
+    parser.add_argument('--compare', help='Baseline JSON file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10, help='Allowed p95 regression ratio')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_environment(args.database_url, workdir)
+        app = build_app()
+        app.config['PROGRESS_STREAM_INTERVAL'] = 0.5
+        ids = seed_documents(app, args.streams)
+
+        scenarios = {}
+        print(f"Running WSGI ({args.threads} threads, {args.streams} streams)...")
+        scenarios.update(scenario_results(
+            'wsgi', bench_wsgi(app, ids, args.threads, args.probes, args.analysis_seconds), args.streams
+        ))
+        reset_documents(app, ids)
+        print(f"Running ASGI ({args.streams} streams)...")
+        scenarios.update(scenario_results(
+            'asgi', bench_asgi(app, ids, args.probes, args.analysis_seconds), args.streams
+        ))
+
+    print_table(scenarios)
+    params = {
+        'streams': args.streams, 'threads': args.threads, 'probes': args.probes,
+        'analysis_seconds': args.analysis_seconds, 'database': args.database_url or 'sqlite'
+    }
+    result = write_results(args.output, 'asgi', scenarios, params)
+    if args.compare:
+        regressions = compare_results(args.compare, result, threshold=args.threshold)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,118 @@
+import argparse
+import heapq
+import random
+import sys
+
+from benchmarks.harness import (
+    run_scenario, summarize, measure_peak_memory, write_results,
+    compare_results, print_table, timed
+)
+
+# Metro areas the synthetic attorneys cluster around: (lat, lng, weight)
+METROS = (
+    (40.71, -74.01, 20), (34.05, -118.24, 14), (41.88, -87.63, 10), (29.76, -95.37, 8),
+    (33.45, -112.07, 6), (39.95, -75.17, 6), (37.77, -122.42, 8), (47.61, -122.33, 5),
+    (25.76, -80.19, 6), (42.36, -71.06, 6), (39.74, -104.99, 4), (44.98, -93.27, 3)
+)
+
+SPECIALTIES = (
+    'Real Estate Law', 'Landlord-Tenant Law', 'Property Law', 'Housing Law',
+    'Contract Law', 'Civil Litigation', 'Consumer Protection', 'Eviction Defense'
+)
+
+def synthetic_attorneys(count, seed=3):
+    """Index rows clustered around metros, with a rural share spread across the country"""
+    rng = random.Random(seed)
+    weights = [weight for _, _, weight in METROS]
+    rows = []
+    for attorney_id in range(1, count + 1):
+        if rng.random() < 0.15:
+            lat, lng = rng.uniform(26, 48), rng.uniform(-123, -70)
+        else:
+            metro_lat, metro_lng, _ = rng.choices(METROS, weights)[0]
+            lat, lng = rng.gauss(metro_lat, 0.3), rng.gauss(metro_lng, 0.3)
+        specialties = ';'.join(rng.sample(SPECIALTIES, rng.randint(1, 3)))
+        rows.append((attorney_id, lat, lng, specialties, None, None, None))
+    return rows
+
+def linear_nearest(rows, lat, lng, count, specialty=None):
+    """Baseline that measures the distance to every attorney"""
+    from leasecheck.attorneys import haversine_km
+
+    return heapq.nsmallest(count, (
+        (haversine_km(lat, lng, row_lat, row_lng), attorney_id)
+        for attorney_id, row_lat, row_lng, specialties, *_ in rows
+        if specialty is None or specialty in specialties
+    ))
+
+def query_points(count, seed=5):
+    """Search locations, mostly in metros like real users"""
+    rng = random.Random(seed)
+    points = []
+    for _ in range(count):
+        if rng.random() < 0.8:
+            metro_lat, metro_lng, _ = rng.choice(METROS)
+            points.append((rng.gauss(metro_lat, 0.2), rng.gauss(metro_lng, 0.2)))
+        else:
+            points.append((rng.uniform(26, 48), rng.uniform(-123, -70)))
+    return points
+
+def bench_queries(search, points, iterations):
+    """Time one nearest-k search per iteration, cycling through the query points"""
+    def make_worker():
+        queue = iter(points * (iterations // len(points) + 2))
+        return lambda: search(*next(queue))
+
+    samples, elapsed, errors = run_scenario(make_worker, iterations, warmup=5)
+    peak = measure_peak_memory(make_worker(), repeat=5)
+    return summarize(samples, elapsed, errors, {'peak_mem_kib': peak})
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the attorney spatial index')
+    parser.add_argument('--attorneys', type=int, default=100000, help='Synthetic directory size')
+    parser.add_argument('--k', type=int, default=12, help='Results per search')
+    parser.add_argument('--iterations', type=int, default=500, help='Searches per scenario')
+    parser.add_argument('--skip-linear', action='store_true', help='Skip the linear scan baseline')
+    parser.add_argument('--output', default='bench_results/attorneys.json', help='JSON result file')
+    parser.add_argument('--compare', help='Baseline JSON file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10, help='Allowed p95 regression ratio')
+    args = parser.parse_args(argv)
+
+    from leasecheck.attorneys import AttorneyIndex
+
+    rows = synthetic_attorneys(args.attorneys)
+    build_time, index = timed(lambda: AttorneyIndex(rows))
+    print(f"Indexed {index.size} attorneys in {build_time * 1000:.0f} ms")
+    points = query_points(200)
+
+    scenarios = {}
+    for specialty in (None, 'Eviction Defense'):
+        label = 'all' if specialty is None else 'specialty'
+        print(f"Running grid_{label}...")
+        scenarios[f"grid_{label}"] = bench_queries(
+            lambda lat, lng: index.nearest(lat, lng, args.k, specialty=specialty), points, args.iterations
+        )
+        print(f"Running grid_{label}_page5...")
+        scenarios[f"grid_{label}_page5"] = bench_queries(
+            lambda lat, lng: index.nearest(lat, lng, args.k * 5 + 1, specialty=specialty)[-args.k:],
+            points, args.iterations
+        )
+        if not args.skip_linear:
+            print(f"Running linear_{label}...")
+            scenarios[f"linear_{label}"] = bench_queries(
+                lambda lat, lng: linear_nearest(rows, lat, lng, args.k, specialty=specialty),
+                points, max(10, args.iterations // 50)
+            )
+    scenarios['grid_all']['build_ms'] = round(build_time * 1000, 1)
+
+    print_table(scenarios)
+    params = {'attorneys': args.attorneys, 'k': args.k, 'iterations': args.iterations}
+    result = write_results(args.output, 'attorneys', scenarios, params)
+
+    if args.compare:
+        regressions = compare_results(args.compare, result, threshold=args.threshold)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
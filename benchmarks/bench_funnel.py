@@ -0,0 +1,273 @@
+import argparse
+import io
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.harness import (
+    run_scenario, summarize, measure_peak_memory, write_results,
+    compare_results, print_table
+)
+
+# Funnel pages in the order a new visitor sees them
+FUNNEL_ROUTES = [
+    ('index', '/'),
+    ('onboarding', '/onboarding'),
+    ('select_plan', '/select-plan'),
+    ('checkout_basic', '/checkout?plan=basic'),
+    ('checkout_premium', '/checkout?plan=premium')
+]
+
+# Admin pages that search the seeded tables
+ADMIN_ROUTES = [
+    ('admin_search', '/admin/search?q=lease'),
+    ('admin_api_search', '/admin/api/search?q=clause&kind=ticket')
+]
+
+UPLOAD_SIZES_KIB = [100, 1024, 10 * 1024]
+
+SEED_BATCH_SIZE = 5000
+
+# Signed-in user whose uploads are timed, with terms accepted and analyses to spend
+BENCH_USER_EMAIL = 'bench-user@example.com'
+BENCH_GRANT = 1000000
+
+def configure_environment(database_url, workdir):
+    """Point the app at a disposable database and storage folders before it is imported"""
+    os.environ['DATABASE_URL'] = database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    # Everything the app would otherwise write under instance/ goes to the work directory
+    for name, folder in (
+        ('UPLOAD_FOLDER', 'uploads'), ('TEXT_CACHE_FOLDER', 'text_cache'), ('ARCHIVE_FOLDER', 'archive'),
+        ('REPORT_FOLDER', 'reports'), ('PROFILING_DIR', 'profiles')
+    ):
+        os.environ[name] = os.path.join(workdir, folder)
+    os.environ.setdefault('FLASK_SECRET_KEY', 'benchmark-secret')
+    # Scripted clients share one address and would be throttled within a few requests
+    os.environ['RATE_LIMIT_ENABLED'] = 'false'
+    # Uploads go through the quota check, the seeded grant keeps it from running out
+    os.environ['ENTITLEMENTS_ENFORCED'] = 'true'
+    # Failed requests are counted per scenario, keep tracebacks out of the timing loop
+    logging.disable(logging.ERROR)
+
+def build_app():
+    """Create the real application with CSRF disabled for scripted clients"""
+    from leasecheck.app import create_app
+    app = create_app()
+    app.config['WTF_CSRF_ENABLED'] = False
+    app.config['TESTING'] = False
+    return app
+
+def synthetic_pdf(size_kib):
+    """Build a minimal, structurally valid PDF padded to roughly size_kib"""
+    objects = [
+        b"1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj\n",
+        b"2 0 obj << /Type /Pages /Kids [3 0 R] /Count 1 >> endobj\n",
+        b"3 0 obj << /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] >> endobj\n"
+    ]
+    body = b"%PDF-1.4\n"
+    offsets = []
+    for obj in objects:
+        offsets.append(len(body))
+        body += obj
+    # The cross-reference table lets readers find the objects past the padding
+    xref = b"xref\n0 4\n0000000000 65535 f \n" + b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    trailer_size = len(xref) + 64
+    padding = max(0, size_kib * 1024 - len(body) - trailer_size)
+    # PDF comments are legal anywhere between objects
+    filler = (b"% lease clause padding text " * (padding // 28 + 1))[:padding]
+    body += filler + b"\n"
+    return body + xref + b"trailer << /Size 4 /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % len(body)
+
+def seed_bench_user(app):
+    """Create the benchmark user, accept the current terms and grant analyses, returning its id"""
+    from leasecheck.database import db
+    from leasecheck.models import AdminUser, Entitlement
+    from leasecheck.terms import record_acceptance
+    from leasecheck.entitlements import refresh_balance
+
+    with app.app_context():
+        user = AdminUser.query.filter_by(email=BENCH_USER_EMAIL).first()
+        if user is None:
+            user = AdminUser(email=BENCH_USER_EMAIL, password_hash='x')
+            db.session.add(user)
+            db.session.commit()
+        record_acceptance(BENCH_USER_EMAIL)
+        if not Entitlement.query.filter_by(stripe_payment_id='bench_grant').first():
+            db.session.add(Entitlement(
+                user_id=user.id, stripe_payment_id='bench_grant', plan_name='premium', granted=BENCH_GRANT
+            ))
+            db.session.commit()
+        refresh_balance(user.id)
+        return user.id
+
+def seed_database(app, rows):
+    """Bulk insert documents, support tickets and admin users"""
+    from sqlalchemy import insert, func
+    from leasecheck.database import db
+    from leasecheck.models import Document, SupportTicket, AdminUser
+
+    with app.app_context():
+        existing = db.session.query(func.count(Document.id)).scalar()
+        if existing >= rows:
+            print(f"Database already has {existing} documents, skipping seed")
+            return
+
+        print(f"Seeding {rows} documents...")
+        now = datetime.utcnow()
+        start = time.perf_counter()
+        for offset in range(existing, rows, SEED_BATCH_SIZE):
+            batch = [
+                {
+                    'original_filename': f"lease_{i}.pdf",
+                    'stored_filename': f"{i:08d}_lease.pdf",
+                    'file_path': f"{i:08d}_lease.pdf",
+                    'file_size': 1024 * (i % 5000 + 1),
+                    'upload_date': now - timedelta(minutes=i),
+                    'status': 'processed',
+                    'risk_level': ('low', 'medium', 'high')[i % 3]
+                }
+                for i in range(offset, min(offset + SEED_BATCH_SIZE, rows))
+            ]
+            db.session.execute(insert(Document), batch)
+            db.session.commit()
+
+        tickets = max(1, rows // 10)
+        for offset in range(0, tickets, SEED_BATCH_SIZE):
+            batch = [
+                {
+                    'document_id': i + 1,
+                    'user_email': f"user{i}@example.com",
+                    'issue_type': 'analysis',
+                    'description': f"Ticket {i} about clause review",
+                    'status': 'open'
+                }
+                for i in range(offset, min(offset + SEED_BATCH_SIZE, tickets))
+            ]
+            db.session.execute(insert(SupportTicket), batch)
+            db.session.commit()
+
+        if not AdminUser.query.first():
+            db.session.add(AdminUser(email='bench-admin@example.com', password_hash='x'))
+            db.session.commit()
+        print(f"Seeded in {time.perf_counter() - start:.1f}s")
+
+def _logged_in_client(app, key, value):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess[key] = value
+    return client
+
+def session_cookie(app, key, value):
+    """Session cookie holding one key, for clients that talk to a separately started server"""
+    return _logged_in_client(app, key, value).get_cookie('session').value
+
+def _is_not_ok(response):
+    # A redirect to login or the terms page is as much a failure as a 500
+    return response.status_code != 200
+
+def bench_get(app, url, iterations, concurrency, session_key=None, session_value=1):
+    """Benchmark a GET route, counting anything but a 200 as an error"""
+    def make_worker():
+        client = _logged_in_client(app, session_key, session_value) if session_key else app.test_client()
+        return lambda: client.get(url)
+
+    samples, elapsed, errors = run_scenario(
+        make_worker, iterations, concurrency, is_error=_is_not_ok
+    )
+    peak = measure_peak_memory(make_worker())
+    return summarize(samples, elapsed, errors, {'peak_mem_kib': peak})
+
+def _upload_failed(result):
+    """An upload counts only if it redirected to the analysis page with the success message"""
+    client, response = result
+    # Read after the timer stops, and taking the flashes keeps the session from growing
+    with client.session_transaction() as sess:
+        categories = [category for category, _ in sess.pop('_flashes', [])]
+    return (
+        response.status_code != 302
+        or not response.headers.get('Location', '').endswith('/lease-analysis')
+        or 'success' not in categories
+    )
+
+def bench_upload(app, user_id, size_kib, iterations, concurrency):
+    """Benchmark /lease-analysis/upload with a synthetic PDF"""
+    payload = synthetic_pdf(size_kib)
+
+    def make_worker():
+        client = _logged_in_client(app, 'user_id', user_id)
+
+        def upload():
+            data = {'file': (io.BytesIO(payload), f"lease_{size_kib}k.pdf")}
+            return client, client.post('/lease-analysis/upload', data=data, content_type='multipart/form-data')
+        return upload
+
+    samples, elapsed, errors = run_scenario(
+        make_worker, iterations, concurrency, is_error=_upload_failed
+    )
+    peak = measure_peak_memory(make_worker(), repeat=1)
+    throughput_mib = (len(samples) * len(payload) / (1024 * 1024)) / elapsed if elapsed else None
+    return summarize(samples, elapsed, errors, {
+        'peak_mem_kib': peak,
+        'upload_mib_per_s': round(throughput_mib, 2) if throughput_mib else None
+    })
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the LeaseCheck user funnel and admin search')
+    parser.add_argument('--database-url', help='Database to benchmark against (default: temporary SQLite file)')
+    parser.add_argument('--rows', type=int, default=10000, help='Seeded document rows for admin search (10k-1M)')
+    parser.add_argument('--iterations', type=int, default=200, help='Requests per funnel scenario')
+    parser.add_argument('--admin-iterations', type=int, default=20, help='Requests per admin scenario')
+    parser.add_argument('--concurrency', type=int, default=1, help='Concurrent client threads')
+    parser.add_argument('--skip-admin', action='store_true', help='Skip seeding and admin search')
+    parser.add_argument('--output', default='bench_results/funnel.json', help='JSON result file')
+    parser.add_argument('--compare', help='Baseline JSON file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10, help='Allowed p95 regression ratio')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='leasecheck-bench-')
+    configure_environment(args.database_url, workdir)
+    app = build_app()
+    user_id = seed_bench_user(app)
+
+    scenarios = {}
+    for name, url in FUNNEL_ROUTES:
+        print(f"Running {name}...")
+        # Checkout sends visitors to login, walk the funnel as the seeded user
+        scenarios[name] = bench_get(
+            app, url, args.iterations, args.concurrency, session_key='user_id', session_value=user_id
+        )
+
+    for size_kib in UPLOAD_SIZES_KIB:
+        name = f"upload_{size_kib}k"
+        print(f"Running {name}...")
+        iterations = max(5, args.iterations // max(1, size_kib // 100))
+        scenarios[name] = bench_upload(app, user_id, size_kib, iterations, args.concurrency)
+
+    if not args.skip_admin:
+        seed_database(app, args.rows)
+        for name, url in ADMIN_ROUTES:
+            print(f"Running {name} over {args.rows} rows...")
+            scenarios[f"{name}_{args.rows}"] = bench_get(
+                app, url, args.admin_iterations, args.concurrency, session_key='admin_id'
+            )
+
+    print_table(scenarios)
+    params = {
+        'rows': args.rows,
+        'iterations': args.iterations,
+        'admin_iterations': args.admin_iterations,
+        'concurrency': args.concurrency,
+        'database': app.config['SQLALCHEMY_DATABASE_URI'].split(':', 1)[0]
+    }
+    result = write_results(args.output, 'funnel', scenarios, params)
+
+    if args.compare:
+        regressions = compare_results(args.compare, result, threshold=args.threshold)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+import argparse
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+from benchmarks.harness import (
+    run_scenario, summarize, measure_peak_memory, write_results,
+    compare_results, print_table
+)
+from benchmarks.bench_funnel import configure_environment
+
+SEVERITIES = ('critical', 'warning', 'info')
+
+def synthetic_context(findings):
+    """Render input for a document with the given number of risk findings"""
+    from leasecheck.models import Document
+    from leasecheck.report_renderer import report_context
+
+    factors = [
+        {
+            'id': i,
+            'severity': SEVERITIES[i % len(SEVERITIES)],
+            'title': f"Clause {i}: automatic renewal",
+            'description': "The lease renews automatically unless notice is given 60 days in advance. " * 3,
+            'recommendation': "Ask the landlord to shorten the notice period to 30 days." if i % 2 else None
+        }
+        for i in range(1, findings + 1)
+    ]
+    document = Document(
+        id=1, original_filename='benchmark_lease.pdf', risk_level='high',
+        risk_factors=factors, annotations={'resolved': [2]}, last_reviewed=datetime.utcnow()
+    )
+    return report_context(document)
+
+def bench_inline(context, iterations, cached):
+    """Render in this process, with or without the per-process template/font cache"""
+    from leasecheck.report_renderer import render_report, _load_assets
+
+    def make_worker():
+        if cached:
+            return lambda: render_report(context)
+
+        def cold():
+            _load_assets.cache_clear()
+            return render_report(context)
+        return cold
+
+    samples, elapsed, errors = run_scenario(make_worker, iterations, warmup=1)
+    peak = measure_peak_memory(make_worker(), repeat=1)
+    return summarize(samples, elapsed, errors, {
+        'peak_mem_kib': peak,
+        'reports_per_s_per_core': round(len(samples) / elapsed, 2) if elapsed else None
+    })
+
+def bench_pool(context, iterations, processes):
+    """Render through the shared process pool with one submitting thread per process"""
+    from leasecheck.report_renderer import render_report, get_render_pool, shutdown_render_pool
+
+    shutdown_render_pool()
+    pool = get_render_pool(processes)
+
+    def make_worker():
+        return lambda: pool.submit(render_report, context).result()
+
+    samples, elapsed, errors = run_scenario(make_worker, iterations, concurrency=processes, warmup=1)
+    shutdown_render_pool()
+    throughput = len(samples) / elapsed if elapsed else None
+    return summarize(samples, elapsed, errors, {
+        'processes': processes,
+        'reports_per_s_per_core': round(throughput / processes, 2) if throughput else None
+    })
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark PDF risk report rendering')
+    parser.add_argument('--findings', type=int, default=25, help='Risk findings per report')
+    parser.add_argument('--iterations', type=int, default=50, help='Reports rendered per scenario')
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, os.cpu_count() or 1],
+                        help='Render pool sizes to measure')
+    parser.add_argument('--output', default='bench_results/reports.json', help='JSON result file')
+    parser.add_argument('--compare', help='Baseline JSON file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10, help='Allowed p95 regression ratio')
+    args = parser.parse_args(argv)
+
+    configure_environment(None, tempfile.mkdtemp(prefix='leasecheck-bench-'))
+    from leasecheck.report_renderer import _load_assets, RendererUnavailable
+    try:
+        _load_assets()
+    except RendererUnavailable as e:
+        print(str(e))
+        return 2
+
+    context = synthetic_context(args.findings)
+    scenarios = {}
+    print("Running inline_cold...")
+    scenarios['inline_cold'] = bench_inline(context, max(5, args.iterations // 5), cached=False)
+    print("Running inline_cached...")
+    scenarios['inline_cached'] = bench_inline(context, args.iterations, cached=True)
+    for processes in sorted(set(args.processes)):
+        name = f"pool_{processes}"
+        print(f"Running {name}...")
+        scenarios[name] = bench_pool(context, args.iterations, processes)
+
+    print_table(scenarios)
+    print(f"\n{'scenario':<40} {'reports/s/core':>15}")
+    for name, result in sorted(scenarios.items()):
+        print(f"{name:<40} {str(result['reports_per_s_per_core']):>15}")
+
+    params = {
+        'findings': args.findings,
+        'iterations': args.iterations,
+        'processes': sorted(set(args.processes))
+    }
+    result = write_results(args.output, 'reports', scenarios, params)
+
+    if args.compare:
+        regressions = compare_results(args.compare, result, threshold=args.threshold)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
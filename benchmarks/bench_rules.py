@@ -0,0 +1,144 @@
+import argparse
+import random
+import re
+import sys
+import time
+
+from benchmarks.harness import (
+    run_scenario, summarize, measure_peak_memory, write_results,
+    compare_results, print_table, timed
+)
+
+WORDS = (
+    'tenant landlord premises rent deposit lease term notice repair utilities parking pet '
+    'guest alteration insurance default remedy holdover renewal inspection keys smoke '
+    'noise trash garden appliance plumbing heating cooling window door lock signage'
+).split()
+
+FILLER = (
+    "The tenant shall pay rent on the first day of each month at the address designated by "
+    "the landlord. Utilities other than water and trash are the responsibility of the tenant. "
+    "The premises shall be used solely as a private residence. "
+)
+
+# Phrases from the shipped rules, sprinkled in so matches are found and reported
+TRIGGERS = (
+    "This lease shall renew automatically for successive terms. ",
+    "A late fee of 15 percent of the monthly rent applies. ",
+    "Landlord may enter the premises at any time. ",
+    "The security deposit is non-refundable deposit in part. ",
+)
+
+def synthetic_rules(count, seed=7):
+    """Shipped rules plus generated keyword and regex rules up to count"""
+    from leasecheck.rule_engine import load_rules
+
+    rng = random.Random(seed)
+    rules = load_rules()
+    for i in range(max(0, count - len(rules))):
+        rule = {
+            'id': f"synthetic-{i}",
+            'category': 'synthetic',
+            'severity': ('critical', 'warning', 'suggestion')[i % 3],
+            'title': f"Synthetic rule {i}",
+            'description': 'Generated for benchmarking',
+            'recommendation': None
+        }
+        phrase = ' '.join(rng.sample(WORDS, 3))
+        if i % 10 == 0:
+            rule['patterns'] = [rf"{re.escape(phrase)}\s+(?:of|for)\s+\d+\s+days"]
+        else:
+            rule['keywords'] = [phrase, f"{phrase} {rng.choice(WORDS)}"]
+        rules.append(rule)
+    return rules
+
+def synthetic_pages(count, chars_per_page, seed=11):
+    """Lease-like pages of filler text with a few triggering clauses"""
+    rng = random.Random(seed)
+    pages = []
+    for number in range(1, count + 1):
+        parts = []
+        while sum(len(p) for p in parts) < chars_per_page:
+            parts.append(FILLER if rng.random() < 0.8 else rng.choice(TRIGGERS))
+        pages.append((number, ''.join(parts)[:chars_per_page]))
+    return pages
+
+class NaiveRuleSet:
+    """Baseline that scans the text once per rule, for comparison"""
+
+    def __init__(self, rules):
+        self.compiled = []
+        for rule in rules:
+            patterns = [re.escape(k).replace(r'\ ', r'\s+') for k in rule.get('keywords', [])]
+            patterns += rule.get('patterns', [])
+            self.compiled.append(re.compile('|'.join(f"(?:{p})" for p in patterns), re.IGNORECASE))
+
+    def evaluate(self, pages):
+        hits = set()
+        for _, text in pages:
+            for index, regex in enumerate(self.compiled):
+                if index not in hits and regex.search(text):
+                    hits.add(index)
+        return hits
+
+def bench_engine(rule_set, pages, iterations):
+    """Scan the whole document per iteration and report pages per second"""
+    def make_worker():
+        return lambda: rule_set.evaluate(pages)
+
+    samples, elapsed, errors = run_scenario(make_worker, iterations, warmup=1)
+    peak = measure_peak_memory(make_worker(), repeat=1)
+    return summarize(samples, elapsed, errors, {
+        'peak_mem_kib': peak,
+        'pages_per_s': round(len(samples) * len(pages) / elapsed, 1) if elapsed else None
+    })
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the lease risk rule engine')
+    parser.add_argument('--rules', type=int, nargs='+', default=[100, 1000, 5000], help='Rule counts to measure')
+    parser.add_argument('--pages', type=int, default=20, help='Pages per synthetic lease')
+    parser.add_argument('--chars-per-page', type=int, default=3000, help='Characters per page')
+    parser.add_argument('--iterations', type=int, default=20, help='Documents scanned per scenario')
+    parser.add_argument('--skip-naive', action='store_true', help='Skip the once-per-rule baseline')
+    parser.add_argument('--output', default='bench_results/rules.json', help='JSON result file')
+    parser.add_argument('--compare', help='Baseline JSON file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10, help='Allowed p95 regression ratio')
+    args = parser.parse_args(argv)
+
+    from leasecheck.rule_engine import RuleSet
+
+    pages = synthetic_pages(args.pages, args.chars_per_page)
+    scenarios = {}
+    for count in sorted(set(args.rules)):
+        rules = synthetic_rules(count)
+        compile_time, rule_set = timed(lambda: RuleSet(rules))
+        print(f"Running compiled_{count} (compiled in {compile_time * 1000:.0f} ms)...")
+        result = bench_engine(rule_set, pages, args.iterations)
+        result['compile_ms'] = round(compile_time * 1000, 1)
+        result['findings'] = len(rule_set.evaluate(pages))
+        scenarios[f"compiled_{count}"] = result
+
+        if not args.skip_naive:
+            print(f"Running naive_{count}...")
+            scenarios[f"naive_{count}"] = bench_engine(NaiveRuleSet(rules), pages, max(1, args.iterations // 4))
+
+    print_table(scenarios)
+    print(f"\n{'scenario':<40} {'pages/s':>10}")
+    for name, result in sorted(scenarios.items()):
+        print(f"{name:<40} {str(result['pages_per_s']):>10}")
+
+    params = {
+        'rules': sorted(set(args.rules)),
+        'pages': args.pages,
+        'chars_per_page': args.chars_per_page,
+        'iterations': args.iterations
+    }
+    result = write_results(args.output, 'rules', scenarios, params)
+
+    if args.compare:
+        regressions = compare_results(args.compare, result, threshold=args.threshold)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
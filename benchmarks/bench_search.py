@@ -0,0 +1,160 @@
+import argparse
+import random
+import string
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.harness import (
+    run_scenario, summarize, measure_peak_memory, write_results,
+    compare_results, print_table
+)
+from benchmarks.bench_funnel import configure_environment, build_app
+
+SEED_BATCH_SIZE = 5000
+
+ISSUES = ('billing', 'analysis', 'upload', 'account', 'refund', 'report')
+
+WORDS = (
+    'lease landlord tenant deposit refund charged twice report missing clause renewal notice '
+    'payment failed upload error pdf pages slow analysis wrong risk level email never arrived '
+    'account password reset invoice receipt plan upgrade premium standard basic cancel subscription '
+    'maintenance repair entry termination penalty sublet pets parking utilities late fee'
+).split()
+
+QUERIES = {
+    'rare_word': 'sublet penalty',
+    'common_prefix': 'lea',
+    'email_prefix': 'user12345@exa',
+    'transaction_id': None,  # filled with a seeded payment id
+    'typo': 'recipt',
+    'ticket_filter': 'charged twice'
+}
+
+def seed_database(app, rows, seed=13):
+    """Bulk insert documents, support tickets and payments, indexed by the sync triggers"""
+    from sqlalchemy import insert, func
+    from leasecheck.database import db
+    from leasecheck.models import Document, SupportTicket, Payment
+
+    rng = random.Random(seed)
+    with app.app_context():
+        existing = db.session.query(func.count(Document.id)).scalar()
+        if existing:
+            print(f"Database already has {existing} documents, skipping seed")
+            return db.session.query(Payment.stripe_payment_id).first()[0]
+
+        now = datetime.utcnow()
+        split = {'documents': rows // 2, 'tickets': rows // 5, 'payments': rows - rows // 2 - rows // 5}
+        print(f"Seeding {rows} rows: {split}...")
+        start = time.perf_counter()
+        for offset in range(0, split['documents'], SEED_BATCH_SIZE):
+            db.session.execute(insert(Document), [
+                {
+                    'original_filename': f"{rng.choice(WORDS)}_{rng.choice(WORDS)}_{i}.pdf",
+                    'stored_filename': f"{i:08d}_lease.pdf",
+                    'file_path': f"{i:08d}_lease.pdf",
+                    'file_size': 1024,
+                    'upload_date': now - timedelta(minutes=i),
+                    'status': 'processed'
+                }
+                for i in range(offset, min(offset + SEED_BATCH_SIZE, split['documents']))
+            ])
+            db.session.commit()
+        for offset in range(0, split['tickets'], SEED_BATCH_SIZE):
+            db.session.execute(insert(SupportTicket), [
+                {
+                    'document_id': i % split['documents'] + 1,
+                    'user_email': f"user{i}@example.com",
+                    'issue_type': rng.choice(ISSUES),
+                    'description': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 30))),
+                    'status': 'open'
+                }
+                for i in range(offset, min(offset + SEED_BATCH_SIZE, split['tickets']))
+            ])
+            db.session.commit()
+        for offset in range(0, split['payments'], SEED_BATCH_SIZE):
+            db.session.execute(insert(Payment), [
+                {
+                    'stripe_payment_id': 'pi_' + ''.join(rng.choices(string.ascii_letters + string.digits, k=24)),
+                    'user_email': f"user{i}@example.com",
+                    'amount': 995,
+                    'status': 'succeeded',
+                    'plan_name': rng.choice(('basic', 'standard', 'premium')),
+                    'created_at': now - timedelta(minutes=i)
+                }
+                for i in range(offset, min(offset + SEED_BATCH_SIZE, split['payments']))
+            ])
+            db.session.commit()
+        print(f"Seeded and indexed in {time.perf_counter() - start:.1f}s")
+        return db.session.query(Payment.stripe_payment_id).first()[0]
+
+def bench_query(app, query, kind, page, iterations):
+    """Time one ranked search page per iteration"""
+    from leasecheck.search import search
+
+    def make_worker():
+        def run():
+            with app.app_context():
+                return search(query, kind=kind, page=page)
+        return run
+
+    samples, elapsed, errors = run_scenario(make_worker, iterations, warmup=2)
+    peak = measure_peak_memory(make_worker(), repeat=1)
+    with app.app_context():
+        hits = len(search(query, kind=kind, page=page)['results'])
+    return summarize(samples, elapsed, errors, {'peak_mem_kib': peak, 'hits': hits})
+
+def bench_like(app, query, iterations):
+    """Baseline LIKE '%x%' over ticket descriptions, a full scan when little matches"""
+    from leasecheck.models import SupportTicket
+
+    def make_worker():
+        def run():
+            with app.app_context():
+                return SupportTicket.query.filter(
+                    SupportTicket.description.like(f"%{query}%")
+                ).order_by(SupportTicket.id.desc()).limit(21).all()
+        return run
+
+    samples, elapsed, errors = run_scenario(make_worker, iterations, warmup=1)
+    return summarize(samples, elapsed, errors)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the admin full-text search')
+    parser.add_argument('--rows', type=int, default=1000000, help='Seeded documents, tickets and payments in total')
+    parser.add_argument('--database-url', help='Database to seed (defaults to a temporary SQLite file)')
+    parser.add_argument('--iterations', type=int, default=50, help='Searches per scenario')
+    parser.add_argument('--output', default='bench_results/search.json', help='JSON result file')
+    parser.add_argument('--compare', help='Baseline JSON file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10, help='Allowed p95 regression ratio')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_environment(args.database_url, workdir)
+        app = build_app()
+        payment_id = seed_database(app, args.rows)
+        queries = dict(QUERIES, transaction_id=payment_id[:10])
+
+        scenarios = {}
+        for name, query in queries.items():
+            kind = 'ticket' if name == 'ticket_filter' else None
+            print(f"Running {name} ({query!r})...")
+            scenarios[name] = bench_query(app, query, kind, 1, args.iterations)
+        print("Running common_prefix_page10...")
+        scenarios['common_prefix_page10'] = bench_query(app, queries['common_prefix'], None, 10, args.iterations)
+        print("Running like_baseline...")
+        scenarios['like_baseline'] = bench_like(app, 'penalty sublet pets', max(3, args.iterations // 10))
+
+    print_table(scenarios)
+    params = {'rows': args.rows, 'iterations': args.iterations, 'database': args.database_url or 'sqlite'}
+    result = write_results(args.output, 'search', scenarios, params)
+
+    if args.compare:
+        regressions = compare_results(args.compare, result, threshold=args.threshold)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,148 @@
+import argparse
+import http.client
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.harness import run_scenario, summarize, write_results, compare_results, print_table
+from benchmarks.bench_funnel import FUNNEL_ROUTES, configure_environment, build_app, seed_bench_user, session_cookie
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# How each entry point is launched, the port comes from PORT in both
+LAUNCHERS = {
+    'dev': [sys.executable, 'main.py'],
+    'gunicorn': [sys.executable, '-m', 'leasecheck.server']
+}
+
+def _children(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+def tree_memory_kib(pid):
+    """Proportional set size of a process and its descendants, so shared pages count once"""
+    total, pending = 0, [pid]
+    while pending:
+        current = pending.pop()
+        pending.extend(_children(current))
+        try:
+            with open(f"/proc/{current}/smaps_rollup") as f:
+                for line in f:
+                    if line.startswith('Pss:'):
+                        total += int(line.split()[1])
+                        break
+        except OSError:
+            return None
+    return total
+
+def wait_for_port(port, timeout):
+    """Seconds until the server accepts connections"""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.2):
+                return time.perf_counter() - start
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Server did not listen on port {port} within {timeout}s")
+
+def start_server(mode, port, environ):
+    env = dict(environ, PORT=str(port), PYTHONPATH=REPO_ROOT, SERVER_ACCESS_LOG='')
+    process = subprocess.Popen(
+        LAUNCHERS[mode], cwd=REPO_ROOT, env=env, start_new_session=True,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    startup = wait_for_port(port, timeout=60)
+    return process, startup
+
+def stop_server(process):
+    # The dev reloader and gunicorn both run child processes, stop the whole group
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=30)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        os.killpg(process.pid, signal.SIGKILL)
+
+def bench_route(port, path, iterations, concurrency, cookie):
+    """GET a route over kept-alive connections as the seeded user, reconnecting when the server closes one"""
+    def make_worker():
+        state = {'connection': None}
+
+        def run():
+            for _ in range(2):
+                if state['connection'] is None:
+                    state['connection'] = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                try:
+                    state['connection'].request('GET', path, headers={'Cookie': f"session={cookie}"})
+                    response = state['connection'].getresponse()
+                    response.read()
+                    if response.will_close:
+                        state['connection'].close()
+                        state['connection'] = None
+                    return response.status
+                except (http.client.HTTPException, OSError):
+                    state['connection'].close()
+                    state['connection'] = None
+            return 599
+        return run
+
+    samples, elapsed, errors = run_scenario(
+        make_worker, iterations, concurrency=concurrency, warmup=2, is_error=lambda status: status != 200
+    )
+    return summarize(samples, elapsed, errors)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare the dev server entry point with the production launcher')
+    parser.add_argument('--modes', default='dev,gunicorn', help='Entry points to run, comma separated')
+    parser.add_argument('--iterations', type=int, default=2000, help='Requests per route')
+    parser.add_argument('--concurrency', type=int, default=16, help='Concurrent keep-alive clients')
+    parser.add_argument('--port', type=int, default=5099, help='Port the servers listen on')
+    parser.add_argument('--database-url', help='Database to use (defaults to a temporary SQLite file)')
+    parser.add_argument('--output', default='bench_results/server.json', help='JSON result file')
+    parser.add_argument('--compare', help='Baseline JSON file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10, help='Allowed p95 regression ratio')
+    args = parser.parse_args(argv)
+
+    scenarios, footprint = {}, {}
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_environment(args.database_url, workdir)
+        # Sessions live in the shared database, so a cookie made here signs in to either server
+        app = build_app()
+        cookie = session_cookie(app, 'user_id', seed_bench_user(app))
+        for mode in args.modes.split(','):
+            print(f"Starting {mode} server...")
+            process, startup = start_server(mode, args.port, os.environ)
+            try:
+                for name, path in FUNNEL_ROUTES:
+                    scenarios[f"{mode}_{name}"] = bench_route(
+                        args.port, path, args.iterations, args.concurrency, cookie
+                    )
+                memory = tree_memory_kib(process.pid)
+            finally:
+                stop_server(process)
+            footprint[mode] = {'startup_s': round(startup, 2), 'pss_kib': memory}
+            for name, _ in FUNNEL_ROUTES:
+                scenarios[f"{mode}_{name}"].update(footprint[mode])
+
+    print_table(scenarios)
+    for mode, values in footprint.items():
+        print(f"{mode}: listening after {values['startup_s']}s, {values['pss_kib']} KiB PSS across its processes")
+    params = {
+        'modes': args.modes, 'iterations': args.iterations, 'concurrency': args.concurrency,
+        'cpus': os.cpu_count(), 'database': args.database_url or 'sqlite'
+    }
+    result = write_results(args.output, 'server', scenarios, params)
+    if args.compare:
+        regressions = compare_results(args.compare, result, threshold=args.threshold)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,157 @@
+import argparse
+import json
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.harness import (
+    run_scenario, summarize, write_results, compare_results, print_table, timed
+)
+from benchmarks.bench_funnel import configure_environment, build_app
+
+WEBHOOK_SECRET = 'whsec_benchmark'
+
+# A payment's lifecycle, each step a later event
+LIFECYCLE = (
+    'payment_intent.processing', 'payment_intent.succeeded', 'charge.refunded'
+)
+
+def synthetic_events(payments, seed=17):
+    """Signed-ready payloads for payments moving through their lifecycle, plus unrelated events"""
+    rng = random.Random(seed)
+    start = int(time.time()) - 3600
+    events = []
+    for number in range(payments):
+        intent_id = f"pi_bench{number:08d}"
+        for step, event_type in enumerate(LIFECYCLE[:rng.randint(1, len(LIFECYCLE))]):
+            if event_type == 'charge.refunded':
+                obj = {'id': f"ch_bench{number:08d}", 'payment_intent': intent_id, 'amount': 1999, 'refunded': True}
+            else:
+                obj = {
+                    'id': intent_id, 'amount': 1999, 'amount_received': 1999, 'currency': 'usd',
+                    'metadata': {'plan': rng.choice(('basic', 'standard', 'premium')), 'email': f"user{number}@example.com"}
+                }
+            obj['created'] = start
+            events.append({
+                'id': f"evt_bench{len(events):09d}", 'type': event_type,
+                'created': start + number + step * 60, 'data': {'object': obj}
+            })
+        if rng.random() < 0.2:
+            events.append({
+                'id': f"evt_bench{len(events):09d}", 'type': 'customer.updated',
+                'created': start + number, 'data': {'object': {'id': f"cus_{number}"}}
+            })
+    # Stripe does not guarantee delivery order
+    rng.shuffle(events)
+    return [json.dumps(event).encode() for event in events]
+
+def bench_ingest(app, payloads, concurrency, duplicate_ratio):
+    """Time signed webhook POSTs, replaying a share of them as Stripe redeliveries"""
+    from leasecheck.stripe_events import sign_payload
+
+    rng = random.Random(23)
+    deliveries = payloads + rng.sample(payloads, int(len(payloads) * duplicate_ratio))
+    rng.shuffle(deliveries)
+    queue = iter(deliveries)
+    lock = threading.Lock()
+
+    def make_worker():
+        client = app.test_client()
+
+        def run():
+            with lock:
+                body = next(queue)
+            return client.post('/webhooks/stripe', data=body, headers={
+                'Stripe-Signature': sign_payload(body, WEBHOOK_SECRET),
+                'Content-Type': 'application/json'
+            })
+        return run
+
+    samples, elapsed, errors = run_scenario(
+        make_worker, len(deliveries), concurrency=concurrency, warmup=0,
+        is_error=lambda response: response.status_code != 200
+    )
+    return summarize(samples, elapsed, errors, {'deliveries': len(deliveries)})
+
+def bench_drain(app, batch_size):
+    """Drain the inbox with one processor and report events applied per second"""
+    from leasecheck.stripe_events import StripeEventWorker
+
+    worker = StripeEventWorker(app, batch_size=batch_size)
+    batch_samples, applied = [], 0
+    start = time.perf_counter()
+    while True:
+        elapsed, processed = timed(worker.run_once)
+        if not processed:
+            break
+        batch_samples.append(elapsed)
+        applied += processed
+    total = time.perf_counter() - start
+    result = summarize(batch_samples, total, extra={'events': applied})
+    result['events_per_s'] = round(applied / total, 1) if total else 0
+    return result
+
+def check_payments(app):
+    """Every payment must end at its newest lifecycle step, whatever the delivery order"""
+    from leasecheck.models import Payment, StripeEvent
+
+    with app.app_context():
+        statuses = {payment.stripe_payment_id: payment.status for payment in Payment.query}
+        pending = StripeEvent.query.filter(StripeEvent.status.in_(('pending', 'processing'))).count()
+    return statuses, pending
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark Stripe webhook ingestion and processing')
+    parser.add_argument('--payments', type=int, default=5000, help='Payments whose lifecycle events are sent')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent webhook senders')
+    parser.add_argument('--duplicates', type=float, default=0.1, help='Share of events delivered twice')
+    parser.add_argument('--batch-size', type=int, default=200, help='Events applied per processor batch')
+    parser.add_argument('--database-url', help='Database to use (defaults to a temporary SQLite file)')
+    parser.add_argument('--output', default='bench_results/stripe_webhooks.json', help='JSON result file')
+    parser.add_argument('--compare', help='Baseline JSON file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10, help='Allowed p95 regression ratio')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_environment(args.database_url, workdir)
+        app = build_app()
+        app.config['STRIPE_WEBHOOK_SECRET'] = WEBHOOK_SECRET
+        payloads = synthetic_events(args.payments)
+
+        scenarios = {}
+        print(f"Running ingest ({len(payloads)} events)...")
+        scenarios['ingest'] = bench_ingest(app, payloads, args.concurrency, args.duplicates)
+        print("Running drain...")
+        scenarios['drain'] = bench_drain(app, args.batch_size)
+
+        statuses, pending = check_payments(app)
+        expected = {}
+        for payload in payloads:
+            event = json.loads(payload)
+            obj = event['data']['object']
+            intent_id = obj.get('payment_intent') or obj['id']
+            if intent_id.startswith('pi_') and event['created'] >= expected.get(intent_id, (0, None))[0]:
+                expected[intent_id] = (event['created'], event['type'])
+        final = {'payment_intent.processing': 'processing', 'payment_intent.succeeded': 'succeeded', 'charge.refunded': 'refunded'}
+        mismatched = sum(1 for intent_id, (_, event_type) in expected.items() if statuses.get(intent_id) != final[event_type])
+        scenarios['drain'].update({'payments': len(statuses), 'mismatched': mismatched, 'left_pending': pending})
+
+    print_table(scenarios)
+    params = {
+        'payments': args.payments, 'concurrency': args.concurrency, 'duplicates': args.duplicates,
+        'batch_size': args.batch_size, 'database': args.database_url or 'sqlite'
+    }
+    result = write_results(args.output, 'stripe_webhooks', scenarios, params)
+
+    if mismatched or pending:
+        print(f"{mismatched} payments ended in the wrong state, {pending} events left unprocessed")
+        return 1
+    if args.compare:
+        regressions = compare_results(args.compare, result, threshold=args.threshold)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
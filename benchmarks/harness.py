@@ -0,0 +1,154 @@
+# Shared helpers for the benchmark suite: every benchmark summarizes its
+# timings with the same percentile math and writes a JSON result file that
+# can be compared against a previous run with compare_results().
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+def percentile(sorted_samples, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_samples:
+        return None
+    rank = max(0, min(len(sorted_samples) - 1, int(round(pct / 100.0 * len(sorted_samples))) - 1))
+    return sorted_samples[rank]
+
+def summarize(samples, elapsed, errors=0, extra=None):
+    """Summarize latency samples (seconds) into a result dict (milliseconds)"""
+    ordered = sorted(samples)
+    summary = {
+        'requests': len(samples),
+        'errors': errors,
+        'p50_ms': _ms(percentile(ordered, 50)),
+        'p95_ms': _ms(percentile(ordered, 95)),
+        'p99_ms': _ms(percentile(ordered, 99)),
+        'max_ms': _ms(ordered[-1] if ordered else None),
+        'throughput_rps': round(len(samples) / elapsed, 2) if elapsed > 0 else None
+    }
+    if extra:
+        summary.update(extra)
+    return summary
+
+def _ms(value):
+    return round(value * 1000, 3) if value is not None else None
+
+def measure_peak_memory(func, repeat=3):
+    """Peak Python heap allocation (KiB) while calling func, measured apart from timing runs"""
+    tracemalloc.start()
+    try:
+        for _ in range(repeat):
+            func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return round(peak / 1024, 1)
+
+def max_rss_kib():
+    """Maximum resident set size of this process in KiB, if the platform reports it"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux reports kilobytes
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+def git_revision():
+    """Current git commit, so results can be matched to the code they measured"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            check=True, capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def write_results(path, name, scenarios, params):
+    """Write benchmark results as JSON with enough metadata to compare runs"""
+    payload = {
+        'benchmark': name,
+        'git_commit': git_revision(),
+        'timestamp': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'params': params,
+        'max_rss_kib': max_rss_kib(),
+        'scenarios': scenarios
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(payload, f, indent=2, sort_keys=True)
+    print(f"Results written to {path}")
+    return payload
+
+def compare_results(baseline_path, current, metric='p95_ms', threshold=0.10):
+    """Compare a result payload against a saved baseline, returning regressed scenarios"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    regressions = []
+    print(f"\n{'scenario':<40} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, result in sorted(current['scenarios'].items()):
+        before = baseline.get('scenarios', {}).get(name, {}).get(metric)
+        after = result.get(metric)
+        if before is None or after is None:
+            print(f"{name:<40} {'-':>12} {str(after):>12} {'new':>8}")
+            continue
+        change = (after - before) / before if before else 0.0
+        print(f"{name:<40} {before:>12} {after:>12} {change:>+8.1%}")
+        if change > threshold:
+            regressions.append(name)
+
+    if regressions:
+        print(f"\nRegressed beyond {threshold:.0%} on {metric}: {', '.join(regressions)}")
+    return regressions
+
+def print_table(scenarios):
+    """Print a compact human readable summary"""
+    print(f"\n{'scenario':<40} {'n':>6} {'err':>5} {'p50':>9} {'p95':>9} {'p99':>9} {'rps':>9} {'mem KiB':>9}")
+    for name, r in sorted(scenarios.items()):
+        print(
+            f"{name:<40} {r['requests']:>6} {r['errors']:>5} {str(r['p50_ms']):>9} {str(r['p95_ms']):>9} "
+            f"{str(r['p99_ms']):>9} {str(r['throughput_rps']):>9} {str(r.get('peak_mem_kib')):>9}"
+        )
+
+def timed(func):
+    """Call func and return (elapsed seconds, result)"""
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+def run_scenario(make_worker, iterations, concurrency=1, warmup=5, is_error=None):
+    """Run make_worker()'s operation on each thread, returning (samples, elapsed, errors)"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    def run(count):
+        op = make_worker()
+        for _ in range(warmup):
+            op()
+        samples, errors = [], 0
+        for _ in range(count):
+            start = time.perf_counter()
+            result = op()
+            samples.append(time.perf_counter() - start)
+            if is_error is not None and is_error(result):
+                errors += 1
+        return samples, errors
+
+    per_worker = max(1, iterations // concurrency)
+    start = time.perf_counter()
+    if concurrency == 1:
+        outcomes = [run(per_worker)]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(run, [per_worker] * concurrency))
+    elapsed = time.perf_counter() - start
+
+    samples = [s for worker_samples, _ in outcomes for s in worker_samples]
+    errors = sum(e for _, e in outcomes)
+    return samples, elapsed, errors
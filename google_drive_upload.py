@@ -1,14 +1,34 @@
 from google.oauth2.service_account import Credentials
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaFileUpload
+from googleapiclient.errors import HttpError
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import os
 import json
+import argparse
 import time
+import random
+import hashlib
+import posixpath
+import threading
 
 SCOPES = ['https://www.googleapis.com/auth/drive.file']
 UPLOAD_TIMEOUT = 600  # 10 minutes timeout for uploads
-MAX_RETRIES = 3
-RETRY_DELAY = 5  # seconds
+MAX_RETRIES = 5
+RETRY_DELAY = 1  # seconds, base delay for exponential backoff
+MAX_RETRY_DELAY = 64  # seconds
+MAX_WORKERS = 8
+CHUNK_SIZE = 5 * 1024 * 1024  # must be a multiple of 256 KB
+MANIFEST_PATH = '.drive_sync_manifest.json'
+MANIFEST_SAVE_INTERVAL = 10  # save the manifest after this many completed files
+BATCH_SIZE = 100  # Drive accepts up to 100 calls per batch request
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+REMOVE_MODE = 'trash'  # what to do with remote files removed locally: trash, delete or keep
+MAX_REMOVE_SHARE = 0.5  # refuse to remove more of the synced files than this without --force
+
+# HTTP statuses worth retrying, plus 403s caused by rate limiting
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded')
 
 def get_credentials():
     try:
@@ -80,49 +100,417 @@ def create_folder(service, folder_name="LeaseCheck_Files"):
         print(f"Error creating folder: {str(e)}")
         return None
 
-def upload_file(service, folder_id, file_path, maintain_structure=True, retry_count=0):
-    try:
-        if not os.path.exists(file_path):
-            print(f"File not found: {file_path}")
-            return False
-            
-        if maintain_structure:
-            rel_path = os.path.relpath(file_path, '.')
-            file_name = rel_path.replace('\\', '/')
-        else:
-            file_name = os.path.basename(file_path)
-            
-        print(f"Preparing to upload: {file_name}")
-        
-        file_metadata = {
-            'name': file_name,
-            'parents': [folder_id]
-        }
-        
-        media = MediaFileUpload(file_path, resumable=True)
-        
-        print(f"Starting upload for {file_name}")
-        try:
-            file = service.files().create(
-                body=file_metadata,
-                media_body=media,
-                fields='id'
-            ).execute()
-            
-            print(f'Successfully uploaded {file_name} (ID: {file.get("id")})')
-            return True
-            
-        except Exception as upload_error:
-            print(f"Upload error for {file_name}: {str(upload_error)}")
-            if retry_count < MAX_RETRIES:
-                print(f"Retrying upload ({retry_count + 1}/{MAX_RETRIES})...")
-                time.sleep(RETRY_DELAY)
-                return upload_file(service, folder_id, file_path, maintain_structure, retry_count + 1)
-            return False
+def file_hash(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
 
-    except Exception as e:
-        print(f"Error preparing upload for {file_path}: {str(e)}")
+class SyncManifest:
+    """Local record of path -> content hash -> Drive file id, plus unfinished uploads"""
+
+    def __init__(self, path=MANIFEST_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.data = {'folder_id': None, 'folders': {}, 'files': {}, 'pending': {}}
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.data.update(json.load(f))
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Ignoring unreadable manifest {path}: {str(e)}")
+
+    def bind_folder(self, folder_id):
+        # File ids only make sense inside the folder they were uploaded to
+        with self.lock:
+            if self.data['folder_id'] != folder_id:
+                self.data = {'folder_id': folder_id, 'folders': {}, 'files': {}, 'pending': {}}
+
+    @property
+    def root_id(self):
+        return self.data['folder_id']
+
+    def folders(self):
+        with self.lock:
+            return dict(self.data['folders'], **{'': self.data['folder_id']})
+
+    def set_folders(self, folders):
+        with self.lock:
+            self.data['folders'] = {path: folder_id for path, folder_id in folders.items() if path}
+
+    def forget_folder(self, rel_dir):
+        with self.lock:
+            self.data['folders'].pop(rel_dir, None)
+
+    def paths(self):
+        with self.lock:
+            return list(self.data['files'])
+
+    def get(self, rel_path):
+        with self.lock:
+            return self.data['files'].get(rel_path)
+
+    def record(self, rel_path, content_hash, file_id, stat, parent, name):
+        with self.lock:
+            self.data['files'][rel_path] = {
+                'hash': content_hash,
+                'file_id': file_id,
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'parent': parent,
+                'name': name
+            }
+            self.data['pending'].pop(rel_path, None)
+
+    def forget(self, rel_path):
+        with self.lock:
+            self.data['files'].pop(rel_path, None)
+            self.data['pending'].pop(rel_path, None)
+
+    def get_pending(self, rel_path):
+        with self.lock:
+            return self.data['pending'].get(rel_path)
+
+    def set_pending(self, rel_path, content_hash, resumable_uri):
+        with self.lock:
+            self.data['pending'][rel_path] = {'hash': content_hash, 'uri': resumable_uri}
+
+    def clear_pending(self, rel_path):
+        with self.lock:
+            self.data['pending'].pop(rel_path, None)
+
+    def save(self):
+        with self.lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.data, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+def is_retryable(error):
+    if isinstance(error, HttpError):
+        status = error.resp.status
+        if status in RETRYABLE_STATUSES:
+            return True
+        if status == 403:
+            content = error.content.decode('utf-8', 'replace') if isinstance(error.content, bytes) else str(error.content)
+            return any(reason in content for reason in RATE_LIMIT_REASONS)
         return False
+    # Dropped connections and timeouts from the transport layer
+    return isinstance(error, (OSError, TimeoutError))
+
+def with_backoff(operation, description):
+    """Run operation, retrying rate limits and transient errors with exponential backoff"""
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return operation()
+        except Exception as e:
+            if attempt == MAX_RETRIES or not is_retryable(e):
+                raise
+            delay = min(MAX_RETRY_DELAY, RETRY_DELAY * (2 ** attempt)) + random.uniform(0, 1)
+            print(f"{description} failed ({str(e)}), retrying in {delay:.1f}s ({attempt + 1}/{MAX_RETRIES})...")
+            time.sleep(delay)
+
+def remote_name(file_path):
+    return os.path.relpath(file_path, '.').replace('\\', '/')
+
+def execute_batch(service, requests):
+    """Run (key, request) pairs through the Drive batch API, retrying transient failures"""
+    results = {}
+    remaining = list(requests)
+    for attempt in range(MAX_RETRIES + 1):
+        retry = []
+        for start in range(0, len(remaining), BATCH_SIZE):
+            chunk = {str(index): item for index, item in enumerate(remaining[start:start + BATCH_SIZE])}
+
+            def callback(request_id, response, exception, chunk=chunk):
+                key, request = chunk[request_id]
+                if exception is None:
+                    results[key] = response
+                elif attempt < MAX_RETRIES and is_retryable(exception):
+                    retry.append((key, request))
+                else:
+                    results[key] = exception
+
+            batch = service.new_batch_http_request(callback=callback)
+            for request_id, (_, request) in chunk.items():
+                batch.add(request, request_id=request_id)
+            with_backoff(batch.execute, "Batch request")
+
+        if not retry:
+            break
+        delay = min(MAX_RETRY_DELAY, RETRY_DELAY * (2 ** attempt)) + random.uniform(0, 1)
+        print(f"{len(retry)} batched calls were rate limited, retrying in {delay:.1f}s...")
+        time.sleep(delay)
+        remaining = retry
+    return results
+
+def _raise_batch_errors(results, description):
+    errors = {key: value for key, value in results.items() if isinstance(value, Exception)}
+    if errors:
+        key, error = next(iter(errors.items()))
+        raise RuntimeError(f"{description} failed for {len(errors)} item(s), first: {key}: {str(error)}")
+
+def list_child_folders(service, parents):
+    """Every child folder of each {rel_dir: folder_id} parent, following nextPageToken"""
+    children = {parent: [] for parent in parents}
+    tokens = {parent: None for parent in parents}
+    while tokens:
+        # One batch per page, with a call only for the parents that have more pages
+        listings = execute_batch(service, [
+            (parent, service.files().list(
+                q=f"'{parents[parent]}' in parents and mimeType='{FOLDER_MIME_TYPE}' and trashed=false",
+                spaces='drive',
+                fields='nextPageToken, files(id, name)',
+                pageSize=1000,
+                pageToken=token
+            ))
+            for parent, token in tokens.items()
+        ])
+        _raise_batch_errors(listings, "Listing folders")
+        tokens = {}
+        for parent, response in listings.items():
+            children[parent].extend(response.get('files', []))
+            if response.get('nextPageToken'):
+                tokens[parent] = response['nextPageToken']
+    return children
+
+def ensure_folders(service, rel_dirs, manifest):
+    """Mirror local directories as Drive folders, returning {rel_dir: folder_id}"""
+    # One depth level at a time: one batch lists the existing child folders of
+    # every parent on the level and one batch creates the missing ones
+    folders = manifest.folders()
+    needed = set()
+    for rel_dir in rel_dirs:
+        while rel_dir and rel_dir not in needed:
+            needed.add(rel_dir)
+            rel_dir = posixpath.dirname(rel_dir)
+
+    by_depth = {}
+    for rel_dir in needed:
+        if rel_dir not in folders:
+            by_depth.setdefault(rel_dir.count('/'), []).append(rel_dir)
+
+    for depth in sorted(by_depth):
+        missing = sorted(by_depth[depth])
+        parents = sorted({posixpath.dirname(rel_dir) for rel_dir in missing})
+
+        # Folders may exist from an earlier run whose manifest was lost
+        listings = list_child_folders(service, {parent: folders[parent] for parent in parents})
+        for parent, children in listings.items():
+            for folder in children:
+                folders.setdefault(posixpath.join(parent, folder['name']), folder['id'])
+
+        to_create = [rel_dir for rel_dir in missing if rel_dir not in folders]
+        if to_create:
+            print(f"Creating {len(to_create)} folder(s) at depth {depth + 1}")
+            created = execute_batch(service, [
+                (rel_dir, service.files().create(
+                    body={
+                        'name': posixpath.basename(rel_dir),
+                        'mimeType': FOLDER_MIME_TYPE,
+                        'parents': [folders[posixpath.dirname(rel_dir)]]
+                    },
+                    fields='id'
+                ))
+                for rel_dir in to_create
+            ])
+            _raise_batch_errors(created, "Creating folders")
+            for rel_dir, response in created.items():
+                folders[rel_dir] = response['id']
+
+    manifest.set_folders(folders)
+    return folders
+
+def remove_deleted(service, manifest, local_paths, rel_dirs, mode=REMOVE_MODE, force=False):
+    """Trash or delete remote files and folders that no longer exist locally"""
+    if mode == 'keep':
+        return []
+    synced = manifest.paths()
+    stale_files = [path for path in synced if path not in local_paths]
+    # A wrong working directory or an unmounted folder looks like everything was deleted
+    if not force:
+        if not local_paths and (synced or len(manifest.folders()) > 1):
+            print("No local files found, not removing anything remotely. Run with --force to remove them")
+            return []
+        if len(stale_files) > len(synced) * MAX_REMOVE_SHARE:
+            print(
+                f"{len(stale_files)} of {len(synced)} synced files are gone locally, not removing them remotely. "
+                f"Run with --force to remove them"
+            )
+            return []
+
+    # Removing a folder removes its contents, so only the topmost stale folders are needed
+    live_dirs = set()
+    for rel_dir in rel_dirs:
+        while rel_dir:
+            live_dirs.add(rel_dir)
+            rel_dir = posixpath.dirname(rel_dir)
+    stale_dirs = [rel_dir for rel_dir in manifest.folders() if rel_dir and rel_dir not in live_dirs]
+    top_stale_dirs = [
+        rel_dir for rel_dir in stale_dirs
+        if posixpath.dirname(rel_dir) not in stale_dirs
+    ]
+
+    def removal(file_id):
+        if mode == 'delete':
+            return service.files().delete(fileId=file_id)
+        return service.files().update(fileId=file_id, body={'trashed': True}, fields='id')
+
+    folders = manifest.folders()
+    requests = [(('file', path), removal(manifest.get(path)['file_id'])) for path in stale_files]
+    requests += [(('folder', rel_dir), removal(folders[rel_dir])) for rel_dir in top_stale_dirs]
+    if not requests:
+        return []
+
+    print(f"Removing {len(requests)} remote item(s) deleted locally ({mode})")
+    removed = []
+    for (kind, path), result in execute_batch(service, requests).items():
+        not_found = isinstance(result, HttpError) and result.resp.status == 404
+        if isinstance(result, Exception) and not not_found:
+            print(f"Failed to remove {path}: {str(result)}")
+            continue
+        removed.append(path)
+        if kind == 'file':
+            manifest.forget(path)
+    for rel_dir in stale_dirs:
+        if posixpath.dirname(rel_dir) in stale_dirs or rel_dir in removed:
+            manifest.forget_folder(rel_dir)
+    return removed
+
+def needs_upload(file_path, rel_path, manifest):
+    """Return (content_hash, stat) if the file changed since its last sync, else None"""
+    stat = os.stat(file_path)
+    entry = manifest.get(rel_path)
+    if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+        return None
+    content_hash = file_hash(file_path)
+    if entry and entry['hash'] == content_hash:
+        # Touched but unchanged, remember the new mtime so we skip hashing next time
+        manifest.record(rel_path, content_hash, entry['file_id'], stat, entry.get('parent'), entry.get('name'))
+        return None
+    return content_hash, stat
+
+def resume_upload(request, resumable_uri, size):
+    """Point an upload request at an earlier session, returning the file if that session finished"""
+    # An empty PUT asks Drive how many bytes of the session it already has
+    resp, content = request.http.request(
+        resumable_uri, method='PUT', headers={'Content-Range': f"bytes */{size}", 'Content-Length': '0'}
+    )
+    if resp.status in (200, 201):
+        return json.loads(content)
+    if resp.status != 308:
+        raise HttpError(resp, content, uri=resumable_uri)
+    received = resp.get('range')
+    request.resumable_uri = resumable_uri
+    request.resumable_progress = int(received.rsplit('-', 1)[1]) + 1 if received else 0
+    return None
+
+def upload_file(service, parent_id, file_path, manifest):
+    """Upload, update or move one file, returning 'skipped', 'created', 'updated' or 'moved'"""
+    rel_path = remote_name(file_path)
+    name = os.path.basename(file_path)
+    entry = manifest.get(rel_path)
+
+    # Entries from flat uploads have no parent recorded and live in the root folder
+    old_parent = (entry.get('parent') or manifest.root_id) if entry else None
+    moved = entry is not None and (old_parent != parent_id or entry.get('name') != name)
+    move_args = {'addParents': parent_id, 'removeParents': old_parent} if moved else {}
+
+    changed = needs_upload(file_path, rel_path, manifest)
+    if changed is None and not moved:
+        return 'skipped'
+    if changed is None:
+        request = service.files().update(fileId=entry['file_id'], body={'name': name}, fields='id', **move_args)
+        response = with_backoff(request.execute, f"Move of {rel_path}")
+        manifest.record(rel_path, entry['hash'], response.get('id'), os.stat(file_path), parent_id, name)
+        return 'moved'
+    content_hash, stat = changed
+
+    media = MediaFileUpload(file_path, chunksize=CHUNK_SIZE, resumable=True)
+    if entry and entry.get('file_id'):
+        request = service.files().update(
+            fileId=entry['file_id'], body={'name': name}, media_body=media, fields='id', **move_args
+        )
+        action = 'updated'
+    else:
+        file_metadata = {'name': name, 'parents': [parent_id]}
+        request = service.files().create(body=file_metadata, media_body=media, fields='id')
+        action = 'created'
+
+    response = None
+    pending = manifest.get_pending(rel_path)
+    if pending and pending['hash'] == content_hash:
+        # Continue the upload session from the previous run where Drive left off
+        print(f"Resuming interrupted upload for {rel_path}")
+        try:
+            response = with_backoff(
+                lambda: resume_upload(request, pending['uri'], media.size()), f"Resume of {rel_path}"
+            )
+        except HttpError as e:
+            if e.resp.status not in (404, 410):
+                raise
+            # Session expired, start over with a fresh one
+            manifest.clear_pending(rel_path)
+            pending = None
+
+    while response is None:
+        try:
+            status, response = with_backoff(request.next_chunk, f"Upload of {rel_path}")
+        except HttpError as e:
+            if pending and e.resp.status in (404, 410):
+                # Session expired, start over with a fresh one
+                manifest.clear_pending(rel_path)
+                pending = None
+                request.resumable_uri = None
+                request.resumable_progress = 0
+                continue
+            raise
+        if request.resumable_uri and (not pending or pending['uri'] != request.resumable_uri):
+            manifest.set_pending(rel_path, content_hash, request.resumable_uri)
+            pending = manifest.get_pending(rel_path)
+        if status and stat.st_size > CHUNK_SIZE:
+            print(f"{rel_path}: {int(status.progress() * 100)}%")
+
+    manifest.record(rel_path, content_hash, response.get('id'), stat, parent_id, name)
+    return action
+
+_thread_local = threading.local()
+
+def get_thread_service(service_factory):
+    # Drive service objects wrap a non thread-safe httplib2 connection
+    service = getattr(_thread_local, 'service', None)
+    if service is None:
+        service = _thread_local.service = service_factory()
+    return service
+
+def sync_files(files, folders, service_factory, manifest, max_workers=MAX_WORKERS):
+    """Upload changed files concurrently with a bounded worker pool"""
+    results = {'created': [], 'updated': [], 'moved': [], 'skipped': [], 'failed': []}
+    total_files = len(files)
+
+    def worker(file_path):
+        parent_id = folders[posixpath.dirname(remote_name(file_path))]
+        return upload_file(get_thread_service(service_factory), parent_id, file_path, manifest)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(worker, file_path): file_path for file_path in files}
+        for index, future in enumerate(as_completed(futures), 1):
+            file_path = futures[future]
+            try:
+                action = future.result()
+                results[action].append(file_path)
+                if action != 'skipped':
+                    print(f"[{index}/{total_files}] {action}: {file_path}")
+            except Exception as e:
+                print(f"[{index}/{total_files}] failed: {file_path}: {str(e)}")
+                results['failed'].append(file_path)
+
+            if index % MANIFEST_SAVE_INTERVAL == 0:
+                manifest.save()
+
+    manifest.save()
+    return results
 
 def collect_files():
     files_to_upload = []
@@ -149,56 +537,65 @@ def collect_files():
     
     return files_to_upload
 
-def main():
-    print("\n=== Starting Google Drive upload process ===\n")
+def main(service_factory=create_drive_service, manifest_path=MANIFEST_PATH, max_workers=MAX_WORKERS,
+         remove_mode=REMOVE_MODE, force=False):
+    print("\n=== Starting Google Drive sync ===\n")
     
-    service = create_drive_service()
+    service = service_factory()
     if not service:
         print("Failed to create Drive service")
         return False
 
-    folder_id = create_folder(service)
+    manifest = SyncManifest(manifest_path)
+    # The cached root folder id saves a lookup on every run
+    folder_id = manifest.root_id or create_folder(service)
     if not folder_id:
         print("Failed to create folder")
         return False
+    manifest.bind_folder(folder_id)
 
-    print("\n=== Beginning file upload ===\n")
-    
     files_to_upload = collect_files()
     total_files = len(files_to_upload)
-    uploaded_files = []
-    failed_files = []
-    
-    print(f"Total files to upload: {total_files}\n")
-    
-    for index, file_path in enumerate(files_to_upload, 1):
-        print(f"\nProcessing file {index}/{total_files}: {file_path}")
-        if upload_file(service, folder_id, file_path, maintain_structure=True):
-            uploaded_files.append(file_path)
-        else:
-            failed_files.append(file_path)
-            
-        # Print progress summary every 5 files
-        if index % 5 == 0 or index == total_files:
-            print(f"\nProgress Summary:")
-            print(f"Files processed: {index}/{total_files}")
-            print(f"Successfully uploaded: {len(uploaded_files)}")
-            print(f"Failed uploads: {len(failed_files)}")
+    local_paths = {remote_name(file_path) for file_path in files_to_upload}
+    rel_dirs = {posixpath.dirname(path) for path in local_paths}
+    print(f"Total files to check: {total_files}\n")
+
+    start = time.time()
+    try:
+        folders = ensure_folders(service, rel_dirs, manifest)
+    except Exception as e:
+        print(f"Error mirroring folder structure: {str(e)}")
+        print(f"If the Drive folder was deleted, remove {manifest_path} to start over")
+        manifest.save()
+        return False
+
+    results = sync_files(files_to_upload, folders, service_factory, manifest, max_workers)
+    removed = remove_deleted(service, manifest, local_paths, rel_dirs, remove_mode, force)
+    manifest.save()
     
-    print("\n=== Upload Summary ===")
+    print("\n=== Sync Summary ===")
     print(f"Total files processed: {total_files}")
-    print(f"Successfully uploaded: {len(uploaded_files)}")
-    print(f"Failed uploads: {len(failed_files)}")
+    print(f"Created: {len(results['created'])}")
+    print(f"Updated: {len(results['updated'])}")
+    print(f"Moved: {len(results['moved'])}")
+    print(f"Removed remotely: {len(removed)}")
+    print(f"Unchanged (skipped): {len(results['skipped'])}")
+    print(f"Failed: {len(results['failed'])}")
+    print(f"Elapsed: {time.time() - start:.1f}s")
     
-    if failed_files:
+    if results['failed']:
         print("\nFailed files:")
-        for file in failed_files:
+        for file in results['failed']:
             print(f"- {file}")
         return False
     
-    print("\n=== All files uploaded successfully! ===")
+    print("\n=== All files synced successfully! ===")
     return True
 
 if __name__ == '__main__':
-    success = main()
+    parser = argparse.ArgumentParser(description='Mirror the project files to Google Drive')
+    parser.add_argument('--force', action='store_true',
+                        help='Remove remote files even when most or all of them are gone locally')
+    args = parser.parse_args()
+    success = main(force=args.force)
     exit(0 if success else 1)
@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from .database import db
+from .models import Document
+from .downloads import compute_file_hash
+from .text_extraction import (
+    count_pages, extract_pages, ExtractionError, ExtractionUnavailable
+)
+from .rule_engine import get_rule_set, risk_level_for
+from .sections import IncrementalScorer, merge_findings
+from .retention import restore_document, restore_payload
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Estimate used until the first pages of a document have been timed
+DEFAULT_SECONDS_PER_PAGE = 0.5
+
+# Minimum seconds between progress commits while pages stream in
+PROGRESS_COMMIT_INTERVAL = 1.0
+
+# Statuses after which a document's progress no longer changes
+FINAL_STATUSES = ('processed', 'error')
+
+# Comment line sent on a stream unchanged for KEEPALIVE_INTERVAL seconds, so proxies do not close it as idle
+KEEPALIVE_INTERVAL = 15
+KEEPALIVE_EVENT = b': keep-alive\n\n'
+
+def previous_version(user_id, original_filename, revision_of_id=None):
+    """The user's latest analyzed upload this lease revises, named explicitly or by file name"""
+    if user_id is None:
+        return None
+    query = Document.query.filter(
+        Document.user_id == user_id, Document.status == 'processed', Document.storage_tier != 'purged'
+    )
+    if revision_of_id:
+        return query.filter(Document.id == revision_of_id).first()
+    return query.filter(Document.original_filename == original_filename).order_by(Document.id.desc()).first()
+
+def register_upload(file_path, original_filename, stored_filename, batch_id=None, user_id=None, revision_of_id=None):
+    """Create the Document row for an uploaded lease, every upload gets its own"""
+    # Only ever linked to the same user's earlier version: a shared row would hand one user another's analysis
+    previous = previous_version(user_id, original_filename, revision_of_id)
+    document = Document(stored_filename=stored_filename)
+    db.session.add(document)
+
+    document.original_filename = original_filename
+    document.batch_id = batch_id
+    document.user_id = user_id
+    document.revision_of_id = previous.id if previous else None
+    document.file_path = stored_filename
+    document.file_size = os.path.getsize(file_path)
+    document.content_hash = compute_file_hash(file_path)
+    document.upload_date = datetime.utcnow()
+    document.pages_extracted = 0
+    document.analysis_started_at = None
+    document.error_message = None
+    # Set here rather than left to column defaults, retention must see a fresh hot upload
+    document.storage_tier = 'hot'
+    document.archive_path = None
+    document.payload_archived_at = None
+    document.restored_at = None
+    try:
+        document.page_count = count_pages(file_path)
+        document.status = 'pending'
+    except (ExtractionError, ExtractionUnavailable) as e:
+        document.page_count = None
+        document.status = 'error'
+        document.error_message = str(e)
+        logger.error(f"Error reading uploaded lease {stored_filename}: {str(e)}")
+    db.session.commit()
+    return document
+
+def discard_upload(file_path, document):
+    """Remove an upload that will never be analyzed, file and row both"""
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+    db.session.delete(document)
+    db.session.commit()
+
+def run_analysis(app, document_id):
+    """Extract a document's pages and score each one as soon as it is ready"""
+    with app.app_context():
+        document = db.session.get(Document, document_id)
+        if document is None or not document.page_count or document.storage_tier == 'purged':
+            return
+        # Re-analysis needs the previous section index and, without cached text, the file
+        restore_document(document)
+        previous_index, previous_factors = document.section_index, document.risk_factors
+        if previous_index is None and document.revision_of_id:
+            # First analysis of a revised lease, only its new or edited sections are scanned
+            base = db.session.get(Document, document.revision_of_id)
+            if base is not None and base.status == 'processed' and base.storage_tier != 'purged':
+                restore_payload(base)
+                previous_index, previous_factors = base.section_index, base.risk_factors
+                # Surviving findings keep their ids, so their resolved marks carry over too
+                if document.annotations is None:
+                    document.annotations = base.annotations
+        file_path = os.path.join(app.config['UPLOAD_FOLDER'], document.file_path)
+        document.status = 'processing'
+        document.analysis_started_at = datetime.utcnow()
+        db.session.commit()
+
+        last_commit = time.monotonic()
+        try:
+            scorer = IncrementalScorer(get_rule_set(app.config['RULES_FOLDER']), previous_index)
+            for page_number, text in extract_pages(
+                file_path, document.content_hash, document.page_count,
+                app.config['TEXT_CACHE_FOLDER'], app.config['EXTRACTION_PROCESSES']
+            ):
+                scorer.feed(page_number, text)
+                document.pages_extracted = page_number
+                if time.monotonic() - last_commit >= PROGRESS_COMMIT_INTERVAL:
+                    db.session.commit()
+                    last_commit = time.monotonic()
+
+            findings = merge_findings(previous_factors, scorer.findings())
+            document.risk_factors = findings
+            document.risk_level = risk_level_for(findings)
+            document.section_index = scorer.section_index()
+            document.review_status = 'completed'
+            document.last_reviewed = datetime.utcnow()
+            document.status = 'processed'
+            logger.info(
+                f"Analyzed document {document_id}: {scorer.stats['rescanned']} of "
+                f"{scorer.stats['sections']} sections rescanned, "
+                f"{len(scorer.changed_rules)} changed rules, {scorer.stats['chars_scanned']} chars scanned"
+            )
+        except Exception as e:
+            document.status = 'error'
+            document.error_message = str(e)
+            logger.error(f"Error analyzing document {document_id}: {str(e)}")
+        finally:
+            try:
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Error storing analysis state for document {document_id}: {str(e)}")
+            db.session.remove()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def start_analysis(app, document_id):
+    """Run the analysis pipeline for a document in the background"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=app.config['ANALYSIS_WORKERS'], thread_name_prefix='lease-analysis'
+            )
+    return _executor.submit(run_analysis, app, document_id)
+
+def analysis_progress(document):
+    """Progress and time-remaining estimate from the pages actually processed"""
+    page_count = document.page_count or 0
+    done = document.pages_extracted or 0
+    if document.status == 'processed':
+        remaining = 0
+    elif done and document.analysis_started_at:
+        elapsed = (datetime.utcnow() - document.analysis_started_at).total_seconds()
+        remaining = elapsed / done * (page_count - done)
+    else:
+        remaining = page_count * DEFAULT_SECONDS_PER_PAGE
+    return {
+        'status': document.status,
+        'fileName': document.original_filename,
+        'pageCount': page_count,
+        'pagesProcessed': done,
+        'percent': 100 if document.status == 'processed' else (int(done * 100 / page_count) if page_count else 0),
+        'secondsRemaining': int(round(remaining)),
+        'error': document.error_message if document.status == 'error' else None
+    }
+
+def progress_event(progress):
+    """Server-sent event carrying one analysis_progress payload"""
+    return f"data: {json.dumps(progress, separators=(',', ':'))}\n\n".encode('utf-8')
+
+def stale_documents(rule_set):
+    """Analyzed documents whose stored section index predates the current rules"""
+    # Archived documents are only rescored once someone opens them again
+    return [
+        document for document in Document.query.filter_by(
+            status='processed', storage_tier='hot', payload_archived_at=None
+        )
+        if (document.section_index or {}).get('rules') != rule_set.fingerprints
+    ]
+
+def rescore_stale_documents(app):
+    """Re-run changed rules over analyzed documents, reusing their cached page text"""
+    with app.app_context():
+        stale_ids = [document.id for document in stale_documents(get_rule_set(app.config['RULES_FOLDER']))]
+        db.session.remove()
+    for document_id in stale_ids:
+        run_analysis(app, document_id)
+    logger.info(f"Rescored {len(stale_ids)} documents after rule changes")
+    return len(stale_ids)
+
+if __name__ == '__main__':
+    # Re-score after editing rule files: python -m leasecheck.analysis
+    from .app import create_app
+    count = rescore_stale_documents(create_app())
+    print(f"Rescored {count} documents")
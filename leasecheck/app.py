@@ -1,9 +1,10 @@
 from flask import Flask, render_template, flash
 import os
 from flask_wtf.csrf import CSRFProtect
-from flask_talisman import Talisman
+from werkzeug.middleware.proxy_fix import ProxyFix
 import logging
 import sys
+import threading
 from importlib import import_module
 
 # Configure logging
@@ -19,8 +20,7 @@ def check_required_modules():
         ('flask', 'Flask'),
         ('flask_wtf', 'Flask-WTF'),
         ('flask_sqlalchemy', 'Flask-SQLAlchemy'),
-        ('flask_migrate', 'Flask-Migrate'),
-        ('flask_talisman', 'Flask-Talisman')
+        ('flask_migrate', 'Flask-Migrate')
     ]
     
     missing_modules = []
@@ -32,6 +32,23 @@ def check_required_modules():
     
     return missing_modules
 
+_background_lock = threading.Lock()
+
+def register_background_worker(app, start):
+    """Have start(app) run in each process that serves requests, never in a forking master"""
+    app.extensions.setdefault('background_workers', []).append(start)
+
+def start_background_workers(app):
+    """Start the registered background threads once in this process"""
+    if app.extensions.get('background_pid') == os.getpid():
+        return
+    with _background_lock:
+        if app.extensions.get('background_pid') == os.getpid():
+            return
+        app.extensions['background_pid'] = os.getpid()
+        for start in app.extensions.get('background_workers', []):
+            start(app)
+
 def create_app():
     """Application factory function"""
     app = Flask(__name__)
@@ -63,55 +80,140 @@ def create_app():
     app.config['STATIC_FOLDER'] = 'static'
     app.config['TEMPLATES_AUTO_RELOAD'] = True
     app.config['TEMPLATE_FOLDER'] = 'templates'
+    # Document storage and download configuration
+    app.config['UPLOAD_FOLDER'] = os.environ.get("UPLOAD_FOLDER", os.path.join(app.instance_path, 'uploads'))
+    app.config['DOWNLOAD_OFFLOAD'] = os.environ.get("DOWNLOAD_OFFLOAD")  # None, 'x-sendfile' or 'x-accel-redirect'
+    app.config['DOWNLOAD_ACCEL_PREFIX'] = os.environ.get("DOWNLOAD_ACCEL_PREFIX", "/protected-uploads/")
+    # Lease analysis configuration
+    app.config['TEXT_CACHE_FOLDER'] = os.environ.get("TEXT_CACHE_FOLDER", os.path.join(app.instance_path, 'text_cache'))
+    app.config['EXTRACTION_PROCESSES'] = int(os.environ.get("EXTRACTION_PROCESSES", "2"))
+    app.config['ANALYSIS_WORKERS'] = int(os.environ.get("ANALYSIS_WORKERS", "2"))
+    app.config['BATCH_MAX_LEASES'] = int(os.environ.get("BATCH_MAX_LEASES", "6"))
+    app.config['RULES_FOLDER'] = os.environ.get("RULES_FOLDER", os.path.join(app.root_path, 'rules'))
+    app.config['PROGRESS_STREAM_INTERVAL'] = float(os.environ.get("PROGRESS_STREAM_INTERVAL", "1"))
+    app.config['PROGRESS_STREAM_TIMEOUT'] = float(os.environ.get("PROGRESS_STREAM_TIMEOUT", "600"))
+    app.config['ASGI_MODE'] = False  # Set by leasecheck.asgi when served by an ASGI server
+    # Document retention configuration, 0 days disables a step
+    app.config['ARCHIVE_FOLDER'] = os.environ.get("ARCHIVE_FOLDER", os.path.join(app.instance_path, 'archive'))
+    app.config['ARCHIVE_AFTER_DAYS'] = int(os.environ.get("ARCHIVE_AFTER_DAYS", "90"))
+    app.config['PAYLOAD_ARCHIVE_AFTER_DAYS'] = int(os.environ.get("PAYLOAD_ARCHIVE_AFTER_DAYS", "180"))
+    app.config['PURGE_AFTER_DAYS'] = int(os.environ.get("PURGE_AFTER_DAYS", "0"))
+    app.config['RETENTION_BATCH_SIZE'] = int(os.environ.get("RETENTION_BATCH_SIZE", "100"))
+    app.config['RETENTION_WORKER'] = os.environ.get("RETENTION_WORKER", "false").lower() == "true"
+    app.config['RETENTION_INTERVAL'] = float(os.environ.get("RETENTION_INTERVAL", "3600"))
+    # Attorney directory configuration
+    app.config['ATTORNEY_INDEX_REFRESH'] = float(os.environ.get("ATTORNEY_INDEX_REFRESH", "300"))
+
+    # Report delivery configuration
+    app.config['REPORT_FOLDER'] = os.environ.get("REPORT_FOLDER", os.path.join(app.instance_path, 'reports'))
+    app.config['REPORT_RENDER_PROCESSES'] = int(os.environ.get("REPORT_RENDER_PROCESSES", "2"))
+    app.config['REPORT_DELIVERY_WORKER'] = os.environ.get("REPORT_DELIVERY_WORKER", "false").lower() == "true"
+    app.config['REPORT_DELIVERY_WORKERS'] = int(os.environ.get("REPORT_DELIVERY_WORKERS", "2"))
+    app.config['REPORT_DELIVERY_BATCH_SIZE'] = int(os.environ.get("REPORT_DELIVERY_BATCH_SIZE", "20"))
+    app.config['REPORT_DELIVERY_POLL_INTERVAL'] = float(os.environ.get("REPORT_DELIVERY_POLL_INTERVAL", "5"))
+    app.config['MAIL_SERVER'] = os.environ.get("MAIL_SERVER", "localhost")
+    app.config['MAIL_PORT'] = int(os.environ.get("MAIL_PORT", "25"))
+    app.config['MAIL_USE_TLS'] = os.environ.get("MAIL_USE_TLS", "false").lower() == "true"
+    app.config['MAIL_USERNAME'] = os.environ.get("MAIL_USERNAME")
+    app.config['MAIL_PASSWORD'] = os.environ.get("MAIL_PASSWORD")
+    app.config['MAIL_DEFAULT_SENDER'] = os.environ.get("MAIL_DEFAULT_SENDER", "reports@leasecheck.app")
+    # Stripe configuration
+    app.config['STRIPE_SECRET_KEY'] = os.environ.get("STRIPE_SECRET_KEY")
+    app.config['STRIPE_WEBHOOK_SECRET'] = os.environ.get("STRIPE_WEBHOOK_SECRET")
+    app.config['STRIPE_WEBHOOK_TOLERANCE'] = int(os.environ.get("STRIPE_WEBHOOK_TOLERANCE", "300"))
+    app.config['STRIPE_EVENT_WORKER'] = os.environ.get("STRIPE_EVENT_WORKER", "false").lower() == "true"
+    app.config['STRIPE_EVENT_BATCH_SIZE'] = int(os.environ.get("STRIPE_EVENT_BATCH_SIZE", "200"))
+    app.config['STRIPE_EVENT_POLL_INTERVAL'] = float(os.environ.get("STRIPE_EVENT_POLL_INTERVAL", "2"))
+    # Session store configuration
+    app.config['SESSION_BACKEND'] = os.environ.get("SESSION_BACKEND", "database")  # database, redis or cookie
+    app.config['SESSION_REDIS_URL'] = os.environ.get("SESSION_REDIS_URL", "redis://localhost:6379/0")
+    app.config['PERMANENT_SESSION_LIFETIME'] = int(os.environ.get("SESSION_TTL", str(7 * 24 * 3600)))
+    app.config['SESSION_PURGE_INTERVAL'] = float(os.environ.get("SESSION_PURGE_INTERVAL", "600"))
+    app.config['SESSION_PURGE_BATCH_SIZE'] = int(os.environ.get("SESSION_PURGE_BATCH_SIZE", "1000"))
+    # Terms of service configuration
+    app.config['TERMS_VERSION'] = os.environ.get("TERMS_VERSION", "1.0")
+    app.config['TERMS_VERSION_REFRESH'] = int(os.environ.get("TERMS_VERSION_REFRESH", "60"))
+    app.config['TERMS_GATE_ENABLED'] = os.environ.get("TERMS_GATE_ENABLED", "true").lower() == "true"
+    # Plan entitlement configuration
+    app.config['ENTITLEMENTS_ENFORCED'] = os.environ.get("ENTITLEMENTS_ENFORCED", "false").lower() == "true"
+    app.config['ENTITLEMENT_CACHE_TIMEOUT'] = int(os.environ.get("ENTITLEMENT_CACHE_TIMEOUT", "3600"))
+
+    # Rate limiting configuration
+    app.config['RATE_LIMIT_ENABLED'] = os.environ.get("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    app.config['RATE_LIMIT_BACKEND'] = os.environ.get("RATE_LIMIT_BACKEND", "memory")  # memory or redis
+    app.config['RATE_LIMIT_REDIS_URL'] = os.environ.get("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/1")
+    app.config['RATE_LIMITS'] = os.environ.get("RATE_LIMITS", "")  # e.g. upload=20/60,auth=5/60:3
+
+    # Proxy configuration, X-Forwarded-* headers are only trusted from this many proxies in front
+    app.config['TRUSTED_PROXY_COUNT'] = int(os.environ.get("TRUSTED_PROXY_COUNT", "0"))
+
+    # Security header configuration
+    app.config['SECURITY_HSTS'] = os.environ.get("SECURITY_HSTS", "false").lower() == "true"
+    app.config['CSP_NONCE_ENABLED'] = os.environ.get("CSP_NONCE_ENABLED", "false").lower() == "true"
+    # Request profiling configuration (opt-in)
+    app.config['PROFILING_ENABLED'] = os.environ.get("PROFILING_ENABLED", "false").lower() == "true"
+    app.config['PROFILING_MODE'] = os.environ.get("PROFILING_MODE", "cprofile")  # cprofile or sampling
+    app.config['PROFILING_SAMPLE_RATE'] = float(os.environ.get("PROFILING_SAMPLE_RATE", "0"))
+    app.config['PROFILING_SAMPLE_INTERVAL'] = float(os.environ.get("PROFILING_SAMPLE_INTERVAL", "0.005"))
+    app.config['PROFILING_MAX_PROFILES'] = int(os.environ.get("PROFILING_MAX_PROFILES", "100"))
+    app.config['PROFILING_DIR'] = os.environ.get("PROFILING_DIR", os.path.join(app.instance_path, 'profiles'))
+    # Metrics configuration
+    app.config['METRICS_ENABLED'] = os.environ.get("METRICS_ENABLED", "false").lower() == "true"
+    app.config['METRICS_TOKEN'] = os.environ.get("METRICS_TOKEN")
+    app.config['METRICS_MULTIPROC_DIR'] = os.environ.get("METRICS_MULTIPROC_DIR")
+    app.config['METRICS_FLUSH_INTERVAL'] = float(os.environ.get("METRICS_FLUSH_INTERVAL", "5"))
+    app.config['STATIC_PRECOMPRESS_ON_STARTUP'] = os.environ.get("STATIC_PRECOMPRESS_ON_STARTUP", "false").lower() == "true"
     
     # Initialize extensions with app
     csrf.init_app(app)
+
+    if app.config['TRUSTED_PROXY_COUNT']:
+        # Client address, scheme and host as the proxies saw them, for rate limits and audit records
+        hops = app.config['TRUSTED_PROXY_COUNT']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops, x_host=hops)
     
     try:
         from .database import init_db, db
         from .cache import init_cache, cache
+        from .static_assets import init_static_assets
+        from .downloads import init_downloads
+        from .security import init_security_headers
+        from .profiling import init_profiling
+        from .metrics import init_metrics
+        from .text_extraction import init_text_extraction
+        from .report_renderer import init_report_renderer
+        from .report_delivery import init_report_delivery
+        from .search import init_search
+        from .stripe_events import init_stripe_events
+        from .sessions import init_sessions
+        from .rate_limit import init_rate_limit
+        from .retention import init_retention
         
+        init_profiling(app)
+        init_metrics(app)
         init_db(app)
+        init_search(app)
+        init_sessions(app)
         init_cache(app)
+        init_static_assets(app)
+        init_downloads(app)
+        init_text_extraction(app)
+        init_report_renderer(app)
+        init_report_delivery(app)
+        init_stripe_events(app)
+        init_rate_limit(app)
+        init_retention(app)
         logger.info("Database and cache initialization completed successfully")
     except Exception as e:
         logger.error(f"Failed to initialize application components: {str(e)}")
         raise
 
-    # Configure security headers with Talisman
-    csp = {
-        'default-src': ["'self'", "https://*"],
-        'script-src': [
-            "'self'",
-            "'unsafe-inline'",
-            "'unsafe-eval'",
-            "https://js.stripe.com",
-            "https://*"
-        ],
-        'style-src': ["'self'", "'unsafe-inline'", "https://*"],
-        'img-src': ["'self'", "data:", "https:", "https://*"],
-        'connect-src': [
-            "'self'",
-            "https://api.stripe.com",
-            "https://*",
-            "wss://*"
-        ],
-        'frame-src': [
-            "'self'",
-            "https://js.stripe.com",
-            "https://hooks.stripe.com",
-            "https://*"
-        ],
-        'font-src': ["'self'", "data:", "https://*"]
-    }
+    # Configure security headers
+    init_security_headers(app)
 
-    Talisman(
-        app,
-        content_security_policy=csp,
-        force_https=False,  # Set to False for development
-        strict_transport_security=False,
-        session_cookie_secure=False
-    )
+    # Threads start with the first request, so a gunicorn master that preloads the app
+    # forks its workers without them, and each worker starts its own
+    app.before_request(lambda: start_background_workers(app))
 
     # Register error handlers
     @app.errorhandler(404)
@@ -0,0 +1,219 @@
+import io
+import sys
+import asyncio
+import logging
+from sqlalchemy import select
+from flask import request, session, Response
+from .app import start_background_workers
+from .database import db
+from .models import Document
+from .analysis import analysis_progress, progress_event, FINAL_STATUSES, KEEPALIVE_EVENT, KEEPALIVE_INTERVAL
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Columns analysis_progress reads, so a poll never loads the JSON analysis payload
+PROGRESS_COLUMNS = (
+    Document.status, Document.original_filename, Document.page_count,
+    Document.pages_extracted, Document.analysis_started_at, Document.error_message
+)
+
+# Async drivers for the databases the app runs on
+ASYNC_DRIVERS = {
+    'sqlite': ('sqlite+aiosqlite', 'aiosqlite'),
+    'postgresql': ('postgresql+asyncpg', 'asyncpg')
+}
+
+STREAM_HEADERS = {'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no'}
+
+def wsgi_environ(scope):
+    """Minimal WSGI environ for an ASGI HTTP scope, enough to open the Flask session"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client')
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0] if client else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False
+    }
+    for name, value in scope.get('headers', []):
+        key = name.decode('latin-1').upper().replace('-', '_')
+        if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            key = f"HTTP_{key}"
+        value = value.decode('latin-1')
+        if key in environ:
+            # Cookie pairs are separated by semicolons, a comma would merge two cookies into one value
+            value = f"{environ[key]}{'; ' if key == 'HTTP_COOKIE' else ','}{value}"
+        environ[key] = value
+    return environ
+
+class ProgressReader:
+    """Reads a document's progress with the async database driver, or a short thread hop without one"""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        with flask_app.app_context():
+            self.sync_engine = db.engine
+        self.engine = self._async_engine(self.sync_engine.url)
+
+    def _async_engine(self, url):
+        driver = ASYNC_DRIVERS.get(url.get_backend_name())
+        if driver is None:
+            return None
+        try:
+            from sqlalchemy.ext.asyncio import create_async_engine
+            __import__(driver[1])
+            return create_async_engine(url.set(drivername=driver[0]))
+        except ImportError as e:
+            logger.warning(f"Async database driver unavailable, progress polls use threads: {str(e)}")
+            return None
+
+    @property
+    def mode(self):
+        return 'async' if self.engine is not None else 'thread'
+
+    def _query(self, document_id):
+        return select(*PROGRESS_COLUMNS).where(Document.id == document_id)
+
+    def _read_sync(self, document_id):
+        with self.sync_engine.connect() as connection:
+            return connection.execute(self._query(document_id)).first()
+
+    async def progress(self, document_id):
+        """analysis_progress payload of a document, or None if it is gone"""
+        if self.engine is not None:
+            async with self.engine.connect() as connection:
+                row = (await connection.execute(self._query(document_id))).first()
+        else:
+            row = await asyncio.to_thread(self._read_sync, document_id)
+        return analysis_progress(row) if row is not None else None
+
+    async def close(self):
+        if self.engine is not None:
+            await self.engine.dispose()
+
+class AsgiApplication:
+    """ASGI entry point serving long-lived routes natively and everything else through Flask"""
+
+    def __init__(self, flask_app):
+        try:
+            from asgiref.wsgi import WsgiToAsgi
+        except ImportError as e:
+            raise RuntimeError(f"The ASGI entry point needs the asgiref package: {str(e)}")
+        self.flask_app = flask_app
+        # Sync views run unchanged on the event loop's thread pool
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.progress = ProgressReader(flask_app)
+        self.routes = {'/api/document-progress/stream': self.progress_stream}
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        handler = self.routes.get(scope['path']) if scope['type'] == 'http' else None
+        if handler is not None and scope['method'] == 'GET':
+            return await handler(scope, receive, send)
+        return await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                start_background_workers(self.flask_app)
+                logger.info(f"ASGI application started (progress reads: {self.progress.mode})")
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.progress.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def _authorize(self):
+        """Same access rule as /api/document-progress, read from the Flask session"""
+        document_id = request.args.get('document_id', type=int) or session.get('document_id')
+        if not document_id:
+            return None
+        if document_id != session.get('document_id') and 'admin_id' not in session:
+            return None
+        return document_id
+
+    def _open_stream(self, scope):
+        """Access check wrapped in the app's request hooks, returning the document id (or None) and the response start"""
+        # As for the WSGI route, after_request hooks such as the security headers and request
+        # metrics run once the response starts, before any event is sent
+        flask_app = self.flask_app
+        with flask_app.request_context(wsgi_environ(scope)):
+            document_id = None
+            response = flask_app.preprocess_request()
+            if response is None:
+                document_id = self._authorize()
+                if document_id is None:
+                    response = ({'error': 'Document not found'}, 404)
+                else:
+                    response = Response(mimetype='text/event-stream', headers=STREAM_HEADERS)
+            response = flask_app.process_response(flask_app.make_response(response))
+            body = response.get_data() if document_id is None else None
+            headers = [
+                (key.lower().encode('latin-1'), value.encode('latin-1'))
+                for key, value in response.headers.items()
+                if document_id is None or key != 'Content-Length'
+            ]
+            return document_id, response.status_code, headers, body
+
+    async def progress_stream(self, scope, receive, send):
+        """Server-sent analysis progress that waits on the event loop instead of a thread"""
+        # The session lookup and request hooks are short blocking work, the long wait below is not
+        document_id, status, headers, body = await asyncio.to_thread(self._open_stream, scope)
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        if document_id is None:
+            return await send({'type': 'http.response.body', 'body': body})
+
+        config = self.flask_app.config
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + config['PROGRESS_STREAM_TIMEOUT']
+        disconnected = asyncio.ensure_future(self._wait_disconnect(receive))
+        try:
+            last, last_sent = None, loop.time()
+            while not disconnected.done():
+                progress = await self.progress.progress(document_id)
+                if progress is None:
+                    break
+                if progress != last:
+                    await send({'type': 'http.response.body', 'body': progress_event(progress), 'more_body': True})
+                    last, last_sent = progress, loop.time()
+                elif loop.time() - last_sent >= KEEPALIVE_INTERVAL:
+                    await send({'type': 'http.response.body', 'body': KEEPALIVE_EVENT, 'more_body': True})
+                    last_sent = loop.time()
+                if progress['status'] in FINAL_STATUSES or loop.time() >= deadline:
+                    break
+                await asyncio.wait([disconnected], timeout=config['PROGRESS_STREAM_INTERVAL'])
+            if not disconnected.done():
+                await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnected.cancel()
+
+    async def _wait_disconnect(self, receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+def create_asgi_app(flask_app=None):
+    """Wrap the Flask app for an ASGI server such as uvicorn"""
+    if flask_app is None:
+        from .app import create_app
+        flask_app = create_app()
+    # Lets templates switch from polling to the progress stream
+    flask_app.config['ASGI_MODE'] = True
+    return AsgiApplication(flask_app)
+
+# uvicorn leasecheck.asgi:application, wrapping the app built when the package is imported
+from . import app as package_app
+application = create_asgi_app(package_app)
@@ -0,0 +1,368 @@
+import re
+import csv
+import sys
+import math
+import time
+import heapq
+import hashlib
+import logging
+import argparse
+import threading
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import func
+from .database import db
+from .models import Attorney
+from .cache import cache, clear_cache_by_pattern
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# Grid cell of the in-memory index, about 11 km north-south
+INDEX_CELL_DEGREES = 0.1
+
+# Searches are answered from the centre of a cache cell of about 2 km,
+# so neighbours searching the same area share one cached result page
+CACHE_CELL_DEGREES = 0.02
+CACHE_TIMEOUT = 3600
+
+# Deepest result that can be paged to, bounds the work of one search
+MAX_RESULTS = 200
+
+IMPORT_CHUNK_SIZE = 5000
+
+COORDINATES = re.compile(r'^\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*$')
+
+def parse_specialties(value):
+    """Specialty names from a semicolon or pipe separated CSV field"""
+    return [name.strip() for name in re.split(r'[;|]', value or '') if name.strip()]
+
+def _specialty_key(name):
+    return ' '.join(name.lower().split()) if name else None
+
+def _place_key(text):
+    return ' '.join(re.sub(r'[^\w\s,]', ' ', text.lower()).replace(',', ' , ').split())
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+def _haversine_term(distance_km):
+    # Inverse of the last step of haversine_km, for comparing against raw terms
+    if distance_km >= math.pi * EARTH_RADIUS_KM:
+        return math.inf
+    return math.sin(distance_km / (2 * EARTH_RADIUS_KM)) ** 2
+
+def _csv_row(record):
+    def number(field, cast):
+        value = (record.get(field) or '').strip().rstrip('%')
+        return cast(value) if value else None
+
+    latitude, longitude = float(record['latitude']), float(record['longitude'])
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError(f"coordinates out of range: {latitude}, {longitude}")
+    name = (record.get('name') or '').strip()
+    if not name:
+        raise ValueError('missing name')
+    return {
+        'name': name,
+        'firm': (record.get('firm') or '').strip() or None,
+        'specialties': ';'.join(parse_specialties(record.get('specialties'))),
+        'city': (record.get('city') or '').strip() or None,
+        'state': (record.get('state') or '').strip() or None,
+        'postal_code': (record.get('postal_code') or '').strip() or None,
+        'latitude': latitude,
+        'longitude': longitude,
+        'years_experience': number('years_experience', int),
+        'rating': number('rating', float),
+        'cases': number('cases', int),
+        'success_rate': number('success_rate', float),
+        'email': (record.get('email') or '').strip() or None,
+        'phone': (record.get('phone') or '').strip() or None,
+        'updated_at': datetime.utcnow()
+    }
+
+def load_attorneys_csv(path, replace=False):
+    """Bulk load attorneys from a CSV file, returning (loaded, skipped) row counts"""
+    loaded = skipped = 0
+    chunk = []
+    try:
+        if replace:
+            Attorney.query.delete()
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            for line, record in enumerate(csv.DictReader(f), 2):
+                try:
+                    chunk.append(_csv_row(record))
+                except (KeyError, TypeError, ValueError) as e:
+                    skipped += 1
+                    logger.warning(f"Skipping attorney on line {line} of {path}: {str(e)}")
+                    continue
+                if len(chunk) >= IMPORT_CHUNK_SIZE:
+                    db.session.execute(db.insert(Attorney), chunk)
+                    loaded += len(chunk)
+                    chunk = []
+        if chunk:
+            db.session.execute(db.insert(Attorney), chunk)
+            loaded += len(chunk)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error loading attorneys from {path}: {str(e)}")
+        raise
+
+    invalidate_attorney_index()
+    clear_cache_by_pattern('attorneys_')
+    logger.info(f"Loaded {loaded} attorneys from {path}, skipped {skipped}")
+    return loaded, skipped
+
+class AttorneyIndex:
+    """Attorney locations bucketed in a lat/lon grid, one grid overall and one per specialty"""
+
+    def __init__(self, rows, signature=None, cell_degrees=INDEX_CELL_DEGREES):
+        # rows are (id, latitude, longitude, specialties, city, state, postal_code) tuples
+        self.signature = signature
+        self.cell_degrees = cell_degrees
+        self.lat_cells = math.ceil(180 / cell_degrees)
+        self.lon_cells = math.ceil(360 / cell_degrees)
+        self.grids = {None: {}}
+        self.counts = {None: 0}
+        self.specialties = {}
+        self.size = 0
+        places = {}
+
+        for attorney_id, latitude, longitude, specialties, city, state, postal_code in rows:
+            # Radians and cosine kept with the entry, the inner distance loop only needs sines
+            phi = math.radians(latitude)
+            entry = (phi, math.radians(longitude), math.cos(phi), attorney_id)
+            cell = self.cell(latitude, longitude)
+            self.grids[None].setdefault(cell, []).append(entry)
+            for name in parse_specialties(specialties):
+                key = _specialty_key(name)
+                self.specialties.setdefault(key, name)
+                self.grids.setdefault(key, {}).setdefault(cell, []).append(entry)
+                self.counts[key] = self.counts.get(key, 0) + 1
+            self.size += 1
+            self.counts[None] = self.size
+
+            # Searchable place names, located at the centroid of their attorneys
+            names = [postal_code]
+            if city:
+                names += [city, f"{city}, {state}" if state else None]
+            for name in filter(None, names):
+                total = places.setdefault(_place_key(name), [0.0, 0.0, 0])
+                total[0] += latitude
+                total[1] += longitude
+                total[2] += 1
+        self.places = {key: (lat / count, lon / count) for key, (lat, lon, count) in places.items()}
+
+    def cell(self, latitude, longitude):
+        row = min(self.lat_cells - 1, int((latitude + 90) / self.cell_degrees))
+        column = int((longitude + 180) / self.cell_degrees) % self.lon_cells
+        return row, column
+
+    def _ring(self, row, column, radius):
+        if radius == 0:
+            yield row, column
+            return
+        for i in range(row - radius, row + radius + 1):
+            if not 0 <= i < self.lat_cells:
+                continue
+            step = 1 if abs(i - row) == radius else 2 * radius
+            for j in range(column - radius, column + radius + 1, step):
+                yield i, j % self.lon_cells
+
+    def _outside_bound(self, latitude, longitude, row, column, radius):
+        """Lower bound on the distance to any point beyond the given ring"""
+        south = (row - radius) * self.cell_degrees - 90
+        north = (row + radius + 1) * self.cell_degrees - 90
+        lat_gaps = [latitude - south if south > -90 else math.inf, north - latitude if north < 90 else math.inf]
+        if 2 * radius + 1 >= self.lon_cells:
+            lon_gap = math.inf
+        else:
+            west = (column - radius) * self.cell_degrees - 180
+            east = (column + radius + 1) * self.cell_degrees - 180
+            lon_gap = min(longitude - west, east - longitude)
+        lat_km = min(lat_gaps) * KM_PER_DEGREE
+        if lon_gap == math.inf:
+            return lat_km
+        # Meridian gaps shrink toward the poles, measure them at the highest latitude of the band
+        widest = min(90.0, max(abs(south), abs(north)))
+        lon_km = 2 * EARTH_RADIUS_KM * math.asin(
+            min(1.0, math.cos(math.radians(widest)) * math.sin(math.radians(lon_gap) / 2))
+        )
+        return min(lat_km, lon_km)
+
+    def nearest(self, latitude, longitude, count, specialty=None, max_km=None):
+        """The count nearest attorney ids as (distance_km, id) pairs, closest first"""
+        key = _specialty_key(specialty)
+        grid = self.grids.get(key)
+        if not grid or count <= 0:
+            return []
+        row, column = self.cell(latitude, longitude)
+        phi, lam, cos_phi = math.radians(latitude), math.radians(longitude), math.cos(math.radians(latitude))
+        sin = math.sin
+        candidates = []
+        visited = set()
+        max_radius = max(self.lat_cells, self.lon_cells)
+        radius = 0
+        # Widen ring by ring until the count-th candidate is closer than anything unvisited
+        while radius <= max_radius and len(candidates) < self.counts[key]:
+            for cell in self._ring(row, column, radius):
+                if cell in visited:
+                    # Rings wider than the globe wrap onto cells already scanned
+                    continue
+                visited.add(cell)
+                # Ranked by the haversine term, which grows with distance, so
+                # asin and sqrt are only needed for the hits that are returned
+                candidates.extend(
+                    (sin((other_phi - phi) / 2) ** 2 + cos_phi * other_cos * sin((other_lam - lam) / 2) ** 2, attorney_id)
+                    for other_phi, other_lam, other_cos, attorney_id in grid.get(cell, ())
+                )
+            bound = _haversine_term(self._outside_bound(latitude, longitude, row, column, radius))
+            if max_km is not None and bound > _haversine_term(max_km):
+                break
+            if len(candidates) >= count and heapq.nsmallest(count, candidates)[-1][0] <= bound:
+                break
+            if len(visited) >= len(grid):
+                # Far from every attorney (mid-ocean, another continent) rings would sweep
+                # mostly empty cells, scanning the occupied ones left is cheaper from here
+                candidates.extend(
+                    (sin((other_phi - phi) / 2) ** 2 + cos_phi * other_cos * sin((other_lam - lam) / 2) ** 2, attorney_id)
+                    for cell, entries in grid.items() if cell not in visited
+                    for other_phi, other_lam, other_cos, attorney_id in entries
+                )
+                break
+            radius += 1
+        nearest = [
+            (2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(term))), attorney_id)
+            for term, attorney_id in heapq.nsmallest(count, candidates)
+        ]
+        if max_km is not None:
+            nearest = [hit for hit in nearest if hit[0] <= max_km]
+        return nearest
+
+    def locate(self, text):
+        """Coordinates for "lat, lng", a postal code, "city, state" or a city in the directory"""
+        match = COORDINATES.match(text or '')
+        if match:
+            latitude, longitude = float(match.group(1)), float(match.group(2))
+            if -90 <= latitude <= 90 and -180 <= longitude <= 180:
+                return latitude, longitude
+            return None
+        return self.places.get(_place_key(text or ''))
+
+def directory_signature():
+    """Cheap fingerprint of the attorney table, changes whenever rows are added or edited"""
+    count, last_id, last_update = db.session.query(
+        func.count(Attorney.id), func.max(Attorney.id), func.max(Attorney.updated_at)
+    ).one()
+    return hashlib.md5(f"{count}:{last_id}:{last_update}".encode()).hexdigest()[:12]
+
+def build_attorney_index(signature=None):
+    """Load every attorney location from the database into a fresh index"""
+    started = time.monotonic()
+    rows = db.session.query(
+        Attorney.id, Attorney.latitude, Attorney.longitude, Attorney.specialties,
+        Attorney.city, Attorney.state, Attorney.postal_code
+    ).yield_per(IMPORT_CHUNK_SIZE)
+    index = AttorneyIndex(rows, signature or directory_signature())
+    logger.info(f"Indexed {index.size} attorneys in {time.monotonic() - started:.2f}s")
+    return index
+
+_index = None
+_index_checked = 0.0
+_index_lock = threading.Lock()
+
+def get_attorney_index():
+    """Per-process index, rebuilt when the attorney table has changed"""
+    global _index, _index_checked
+    refresh = current_app.config['ATTORNEY_INDEX_REFRESH']
+    if _index is not None and time.monotonic() - _index_checked < refresh:
+        return _index
+    with _index_lock:
+        if _index is None or time.monotonic() - _index_checked >= refresh:
+            signature = directory_signature()
+            if _index is None or _index.signature != signature:
+                _index = build_attorney_index(signature)
+            _index_checked = time.monotonic()
+    return _index
+
+def invalidate_attorney_index():
+    """Drop this process's index, the next search rebuilds it"""
+    global _index
+    with _index_lock:
+        _index = None
+
+def _attorney_card(attorney, distance_km, specialty):
+    specialties = parse_specialties(attorney.specialties)
+    return {
+        'id': attorney.id,
+        'name': attorney.name,
+        'firm': attorney.firm,
+        'specialty': specialty or (specialties[0] if specialties else 'General Practice'),
+        'specialties': specialties,
+        'experience': f"{attorney.years_experience} years" if attorney.years_experience is not None else None,
+        'rating': attorney.rating,
+        'cases': attorney.cases,
+        'success': f"{attorney.success_rate:g}%" if attorney.success_rate is not None else None,
+        'city': attorney.city,
+        'state': attorney.state,
+        'email': attorney.email,
+        'phone': attorney.phone,
+        'distanceKm': round(distance_km, 1)
+    }
+
+def search_attorneys(latitude, longitude, specialty=None, page=1, per_page=12, max_km=None):
+    """One page of the nearest attorneys, cached per (geo cell, specialty, page)"""
+    index = get_attorney_index()
+    specialty = index.specialties.get(_specialty_key(specialty)) if specialty else None
+    row = int((latitude + 90) / CACHE_CELL_DEGREES)
+    column = int((longitude + 180) / CACHE_CELL_DEGREES)
+    cache_key = f"attorneys_{index.signature}_{row}_{column}_{_specialty_key(specialty)}_{page}_{per_page}_{max_km}"
+    result = cache.get(cache_key)
+    if result is not None:
+        return result
+
+    # Rank from the cell centre so every search in the cell gets the same page
+    centre = ((row + 0.5) * CACHE_CELL_DEGREES - 90, (column + 0.5) * CACHE_CELL_DEGREES - 180)
+    offset = (page - 1) * per_page
+    hits = index.nearest(*centre, count=offset + per_page + 1, specialty=specialty, max_km=max_km)
+    page_hits = hits[offset:offset + per_page]
+    attorneys = {
+        attorney.id: attorney
+        for attorney in Attorney.query.filter(Attorney.id.in_([attorney_id for _, attorney_id in page_hits]))
+    }
+    result = {
+        'results': [
+            _attorney_card(attorneys[attorney_id], distance, specialty)
+            for distance, attorney_id in page_hits if attorney_id in attorneys
+        ],
+        'page': page,
+        'perPage': per_page,
+        'hasMore': len(hits) > offset + per_page,
+        'specialty': specialty
+    }
+    cache.set(cache_key, result, timeout=CACHE_TIMEOUT)
+    return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load the attorney directory from a CSV file')
+    parser.add_argument('csv_path', help='CSV with name, specialties, city, state, postal_code, latitude, longitude, ...')
+    parser.add_argument('--replace', action='store_true', help='Delete the current directory first')
+    args = parser.parse_args(argv)
+
+    from .app import create_app
+    with create_app().app_context():
+        loaded, skipped = load_attorneys_csv(args.csv_path, replace=args.replace)
+    print(f"Loaded {loaded} attorneys, skipped {skipped} invalid rows")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
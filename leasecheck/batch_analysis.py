@@ -0,0 +1,216 @@
+import os
+import sys
+import json
+import uuid
+import shutil
+import logging
+import argparse
+from concurrent.futures import wait
+from werkzeug.utils import secure_filename
+from .database import db
+from .models import AnalysisBatch, Document
+from .analysis import register_upload, start_analysis
+from .entitlements import consume_analyses, QuotaExceeded
+from .rule_engine import SEVERITIES, get_rule_set
+from .retention import restore_payload
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Weight of each severity when ranking the leases of a batch, lower total is better
+SEVERITY_WEIGHTS = {'critical': 5, 'warning': 2, 'suggestion': 1}
+
+FINISHED_STATUSES = ('processed', 'error')
+
+def record_failed_upload(original_filename, stored_filename, batch_id, user_id, error):
+    """Document row for a batch lease that could not be stored, None if it cannot be recorded either"""
+    document = Document(
+        original_filename=original_filename,
+        stored_filename=stored_filename,
+        file_path=stored_filename,
+        file_size=0,
+        status='error',
+        error_message=f"Could not store this lease: {str(error)}",
+        batch_id=batch_id,
+        user_id=user_id,
+        pages_extracted=0
+    )
+    try:
+        db.session.add(document)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error recording failed lease {original_filename} in batch {batch_id}: {str(e)}")
+        return None
+    return document
+
+def create_batch(app, uploads, user_id=None, consume=False):
+    """Store several leases as one batch and start analyzing them concurrently"""
+    # uploads holds (original_filename, save) pairs, save(path) writes the file.
+    # The rules are compiled once up front and shared by every lease of the batch
+    get_rule_set(app.config['RULES_FOLDER'])
+
+    batch = AnalysisBatch(user_id=user_id)
+    db.session.add(batch)
+    db.session.commit()
+
+    document_ids = []
+    for position, (original_filename, save) in enumerate(uploads, 1):
+        # Unique even if a batch id is reused, an archive of an earlier file is named after it
+        stored_filename = f"{uuid.uuid4().hex}_batch{batch.id}_{position}_{secure_filename(original_filename) or 'lease.pdf'}"
+        file_path = os.path.join(app.config['UPLOAD_FOLDER'], stored_filename)
+        try:
+            save(file_path)
+            document = register_upload(
+                file_path, original_filename, stored_filename, batch_id=batch.id, user_id=user_id
+            )
+        except Exception as e:
+            # The rest of the batch still runs, the lease is recorded as failed so the
+            # batch payload and the CLI report it instead of silently dropping it
+            db.session.rollback()
+            logger.error(f"Error storing lease {original_filename} in batch {batch.id}: {str(e)}")
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            document = record_failed_upload(original_filename, stored_filename, batch.id, user_id, e)
+            if document is None:
+                continue
+        document_ids.append(document.id)
+
+    documents = [
+        document for document in Document.query.filter(Document.id.in_(document_ids))
+        if document.status != 'error'
+    ]
+    if consume and documents:
+        # Readable leases are charged together, a batch runs in full or not at all
+        try:
+            consume_analyses(user_id, [document.id for document in documents])
+        except QuotaExceeded as e:
+            logger.warning(f"Batch {batch.id} not started: {str(e)}")
+            for document in documents:
+                document.status = 'error'
+                document.error_message = 'No lease analyses left on your plan'
+            db.session.commit()
+            documents = []
+    futures = [start_analysis(app, document.id) for document in documents]
+    logger.info(f"Started batch {batch.id} with {len(futures)} of {len(uploads)} leases")
+    return batch, futures
+
+def batch_status(batch):
+    """Overall state of a batch from the state of its leases"""
+    statuses = [document.status for document in batch.documents]
+    if not statuses:
+        return 'failed'
+    if any(status not in FINISHED_STATUSES for status in statuses):
+        return 'processing'
+    if all(status == 'error' for status in statuses):
+        return 'failed'
+    return 'partial' if 'error' in statuses else 'completed'
+
+def compare_documents(documents):
+    """Side-by-side comparison of the risk factors of several analyzed leases"""
+    analyzed = [document for document in documents if document.status == 'processed']
+    for document in analyzed:
+        restore_payload(document)
+    rules = {}
+    summaries = []
+    for document in analyzed:
+        counts = dict.fromkeys(SEVERITIES, 0)
+        for factor in document.risk_factors or []:
+            counts[factor['severity']] = counts.get(factor['severity'], 0) + 1
+            row = rules.setdefault(factor.get('rule') or factor['title'], {
+                'rule': factor.get('rule'),
+                'title': factor['title'],
+                'severity': factor['severity'],
+                'documents': {}
+            })
+            row['documents'][str(document.id)] = {'id': factor['id'], 'page': factor.get('page')}
+        summaries.append({
+            'id': document.id,
+            'fileName': document.original_filename,
+            'riskLevel': (document.risk_level or 'unknown').capitalize(),
+            'counts': counts,
+            'score': sum(SEVERITY_WEIGHTS.get(severity, 0) * count for severity, count in counts.items())
+        })
+
+    ranked = sorted(summaries, key=lambda summary: summary['score'])
+    return {
+        'documents': summaries,
+        'recommended': ranked[0]['id'] if ranked else None,
+        'findings': sorted(
+            rules.values(),
+            key=lambda row: (SEVERITIES.index(row['severity']) if row['severity'] in SEVERITIES else len(SEVERITIES),
+                             -len(row['documents']), row['title'])
+        )
+    }
+
+def batch_payload(batch):
+    """JSON view of a batch, with the comparison once every lease has finished"""
+    status = batch_status(batch)
+    payload = {
+        'batchId': batch.id,
+        'status': status,
+        'documents': [
+            {
+                'id': document.id,
+                'fileName': document.original_filename,
+                'status': document.status,
+                'pageCount': document.page_count,
+                'pagesProcessed': document.pages_extracted,
+                'error': document.error_message if document.status == 'error' else None
+            }
+            for document in batch.documents
+        ]
+    }
+    if status in ('completed', 'partial'):
+        payload['comparison'] = compare_documents(batch.documents)
+    return payload
+
+def print_comparison(comparison):
+    """Print a comparison as a plain text table"""
+    documents = comparison['documents']
+    print(f"\n{'finding':<44}" + ''.join(f"{d['fileName'][:18]:>20}" for d in documents))
+    for row in comparison['findings']:
+        cells = []
+        for d in documents:
+            hit = row['documents'].get(str(d['id']))
+            cells.append('' if hit is None else f"x (page {hit['page']})" if hit['page'] else 'x')
+        label = f"[{row['severity']}] {row['title']}"
+        print(f"{label[:43]:<44}" + ''.join(f"{cell:>20}" for cell in cells))
+    print(f"\n{'risk level':<44}" + ''.join(f"{d['riskLevel']:>20}" for d in documents))
+    print(f"{'score (lower is better)':<44}" + ''.join(f"{d['score']:>20}" for d in documents))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Analyze several leases as one batch and compare them')
+    parser.add_argument('files', nargs='+', help='Lease PDF files')
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                        help='Page extraction processes shared by the whole batch')
+    parser.add_argument('--json', dest='json_path', help='Write the batch result as JSON to this file')
+    args = parser.parse_args(argv)
+
+    from .app import create_app
+    app = create_app()
+    app.config['EXTRACTION_PROCESSES'] = args.processes
+    app.config['ANALYSIS_WORKERS'] = len(args.files)
+    with app.app_context():
+        uploads = [
+            (os.path.basename(path), lambda target, source=path: shutil.copyfile(source, target))
+            for path in args.files
+        ]
+        batch, futures = create_batch(app, uploads)
+        batch_id = batch.id
+    wait(futures)
+
+    with app.app_context():
+        payload = batch_payload(db.session.get(AnalysisBatch, batch_id))
+    for document in payload['documents']:
+        if document['error']:
+            print(f"{document['fileName']}: {document['error']}")
+    if 'comparison' in payload:
+        print_comparison(payload['comparison'])
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(payload, f, indent=2)
+    return 0 if payload['status'] == 'completed' else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,6 +3,7 @@ from functools import wraps
 import logging
 import hashlib
 from datetime import datetime
+from .metrics import CACHE_LOOKUPS
 
 # Initialize cache
 cache = Cache()
@@ -15,6 +16,8 @@ CACHE_VERSION = "v1"
 
 def init_cache(app):
     """Initialize the caching system"""
+    # SimpleCache lives in process memory, so each gunicorn worker has its own copy and an
+    # invalidation only reaches the worker that made the change
     cache_config = {
         'CACHE_TYPE': 'simple',  # Use simple cache for development
         'CACHE_DEFAULT_TIMEOUT': 300,  # 5 minutes default timeout
@@ -24,8 +27,20 @@ def init_cache(app):
     
     app.config.update(cache_config)
     cache.init_app(app)
+    instrument_cache_backend(app.extensions['cache'][cache])
     logger.info("Cache initialized successfully")
 
+def instrument_cache_backend(backend):
+    """Count hits and misses on the backend used by every cache helper"""
+    original_get = backend.get
+
+    def get(key):
+        value = original_get(key)
+        CACHE_LOOKUPS.inc('hit' if value is not None else 'miss')
+        return value
+
+    backend.get = get
+
 def clear_all_caches():
     """Clear all cached data"""
     try:
@@ -48,7 +63,8 @@ def clear_cache_by_key(key):
 def clear_cache_by_pattern(pattern):
     """Clear all caches matching a pattern"""
     try:
-        keys = cache.cache._cache.keys()
+        # Snapshot the keys, deleting while iterating the live dict raises
+        keys = list(cache.cache._cache.keys())
         for key in keys:
             if pattern in str(key):
                 cache.delete(key)
@@ -57,6 +73,18 @@ def clear_cache_by_pattern(pattern):
         logger.error(f"Error clearing caches for pattern {pattern}: {str(e)}")
         raise
 
+def clear_cache_by_prefix(prefix):
+    """Clear all caches whose key starts with a prefix"""
+    try:
+        keys = list(cache.cache._cache.keys())
+        for key in keys:
+            if str(key).startswith(prefix):
+                cache.delete(key)
+        logger.info(f"Caches cleared for prefix: {prefix}")
+    except Exception as e:
+        logger.error(f"Error clearing caches for prefix {prefix}: {str(e)}")
+        raise
+
 def cached_with_key(key_prefix, timeout=300):
     """Custom caching decorator with versioned keys"""
     def decorator(f):
@@ -74,7 +102,8 @@ def clear_user_cache(user_email):
 
 def clear_document_cache(document_id):
     """Clear all caches related to a specific document"""
-    clear_cache_by_pattern(f'doc_{document_id}')
+    # The trailing separator keeps document 1 from clearing document 12's entries
+    clear_cache_by_prefix(f'doc_{document_id}_')
     logger.info(f"Document cache cleared for ID: {document_id}")
 
 def clear_plan_cache():
@@ -91,8 +120,11 @@ def get_cache_stats():
     """Get cache statistics"""
     try:
         total_keys = len(cache.cache._cache.keys())
+        lookups = CACHE_LOOKUPS.collect()
         return {
             'total_keys': total_keys,
+            'hits': lookups.get(('hit',), 0),
+            'misses': lookups.get(('miss',), 0),
             'version': CACHE_VERSION,
             'last_cleared': datetime.utcnow().isoformat()
         }
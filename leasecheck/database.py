@@ -1,4 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
+from flask_migrate import Migrate
+import os
 import logging
 from sqlalchemy import event, text
 from sqlalchemy.engine import Engine
@@ -14,6 +16,10 @@ logger = logging.getLogger(__name__)
 
 # Initialize SQLAlchemy
 db = SQLAlchemy()
+migrate = Migrate()
+
+# Shipped inside the package, so flask db commands work from any directory
+MIGRATIONS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
 
 class DatabaseError(Exception):
     """Custom exception for database errors"""
@@ -77,10 +83,11 @@ def init_db(app):
     try:
         # Initialize the db with the app
         db.init_app(app)
+        migrate.init_app(app, db, directory=MIGRATIONS_DIRECTORY, render_as_batch=True)
         logger.info("Database initialization successful")
         
         with app.app_context():
-            # Create all tables
+            # Create missing tables; columns added to existing tables need `flask db upgrade`
             db.create_all()
             logger.info("Database tables created successfully")
             
@@ -0,0 +1,117 @@
+import os
+import hashlib
+import logging
+from urllib.parse import quote
+from flask import current_app, request, send_file, make_response
+from werkzeug.security import safe_join
+from .database import db
+from .models import Document
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024  # 1 MB
+
+# Supported proxy offload modes for DOWNLOAD_OFFLOAD
+OFFLOAD_X_SENDFILE = 'x-sendfile'
+OFFLOAD_X_ACCEL = 'x-accel-redirect'
+
+def compute_file_hash(file_path):
+    """Compute the SHA-256 content hash of a file without loading it into memory"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def resolve_upload_path(filename):
+    """Resolve a filename inside UPLOAD_FOLDER, or None if it is unsafe or missing"""
+    file_path = safe_join(current_app.config['UPLOAD_FOLDER'], filename)
+    if file_path is None:
+        return None
+    if not os.path.isfile(file_path):
+        # Old uploads are compressed into the archive, bring them back on first download
+        document = Document.query.filter_by(stored_filename=filename, storage_tier='archived').first()
+        if document is None:
+            return None
+        from .retention import restore_file
+        return restore_file(document)
+    return file_path
+
+def get_document_etag(filename, file_path):
+    """Get the strong ETag for an uploaded file from its stored content hash"""
+    try:
+        document = Document.query.filter_by(stored_filename=filename).first()
+    except Exception as e:
+        logger.error(f"Error looking up document for {filename}: {str(e)}")
+        return None
+    if document is None:
+        return None
+
+    if not document.content_hash:
+        # Backfill the hash once so later downloads skip the file read
+        document.content_hash = compute_file_hash(file_path)
+        try:
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error storing content hash for {filename}: {str(e)}")
+    return document.content_hash
+
+def _offload_response(file_path, download_name, etag):
+    """Build an empty response that tells the front proxy to deliver the file"""
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    rel_path = os.path.relpath(file_path, upload_folder).replace(os.sep, '/')
+    prefix = current_app.config['DOWNLOAD_ACCEL_PREFIX'].rstrip('/')
+
+    if etag and request.if_none_match.contains(etag):
+        # Answer revalidation here, the proxy does not know our ETags
+        response = make_response('', 304)
+        response.set_etag(etag)
+        return response
+
+    response = make_response('')
+    response.headers['X-Accel-Redirect'] = f"{prefix}/{quote(rel_path)}"
+    response.headers['Content-Disposition'] = (
+        f"attachment; filename*=UTF-8''{quote(download_name)}"
+    )
+    # Let the proxy pick the Content-Type from the file it serves
+    del response.headers['Content-Type']
+    if etag:
+        response.set_etag(etag)
+    return response
+
+def send_document(file_path, download_name=None, etag=None):
+    """Send an uploaded document with Range, ETag and optional proxy offload support"""
+    download_name = download_name or os.path.basename(file_path)
+    mode = current_app.config.get('DOWNLOAD_OFFLOAD')
+
+    if mode == OFFLOAD_X_ACCEL:
+        return _offload_response(file_path, download_name, etag)
+
+    # send_file handles Range/If-Range/If-None-Match when conditional=True,
+    # and emits X-Sendfile with an empty body when USE_X_SENDFILE is set
+    response = send_file(
+        file_path,
+        as_attachment=True,
+        download_name=download_name,
+        conditional=True,
+        etag=etag if etag else True,
+        max_age=0
+    )
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.cache_control.private = True
+    return response
+
+def init_downloads(app):
+    """Configure document upload storage and download offloading"""
+    upload_folder = app.config['UPLOAD_FOLDER']
+    os.makedirs(upload_folder, exist_ok=True)
+
+    mode = app.config.get('DOWNLOAD_OFFLOAD')
+    if mode == OFFLOAD_X_SENDFILE:
+        app.config['USE_X_SENDFILE'] = True
+    elif mode not in (None, OFFLOAD_X_ACCEL):
+        logger.warning(f"Unknown DOWNLOAD_OFFLOAD mode '{mode}', serving files from Python")
+        app.config['DOWNLOAD_OFFLOAD'] = None
+    logger.info(f"Document downloads configured (offload: {app.config.get('DOWNLOAD_OFFLOAD') or 'none'})")
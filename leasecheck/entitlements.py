@@ -0,0 +1,243 @@
+import sys
+import json
+import logging
+import argparse
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func, select, update, or_
+from .database import db
+from .cache import cache
+from .models import AdminUser, Entitlement, EntitlementUsage, Payment
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Lease analyses and validity window bought with each plan, as advertised on /plans
+PLAN_QUOTAS = {
+    'basic': {'analyses': 1, 'valid_days': None},
+    'standard': {'analyses': 3, 'valid_days': 30},
+    'premium': {'analyses': 6, 'valid_days': 30}
+}
+
+# Payment statuses that grant analyses, and the one that takes them back
+GRANTING_STATUSES = ('succeeded', 'partially_refunded')
+REVOKING_STATUS = 'refunded'
+
+class QuotaExceeded(Exception):
+    """The user has fewer lease analyses left than requested"""
+    pass
+
+def _cache_key(user_id):
+    return f"entitlements_{user_id}"
+
+def _active_filter(now):
+    return [
+        Entitlement.revoked_at.is_(None),
+        Entitlement.used < Entitlement.granted,
+        or_(Entitlement.expires_at.is_(None), Entitlement.expires_at > now)
+    ]
+
+def _balance(buckets):
+    now = datetime.utcnow().timestamp()
+    return sum(remaining for expires_at, remaining in buckets if expires_at is None or expires_at > now)
+
+def refresh_balance(user_id):
+    """Reload a user's active grants from the database and write them to the cache"""
+    now = datetime.utcnow()
+    rows = db.session.execute(
+        select(Entitlement.expires_at, Entitlement.granted - Entitlement.used)
+        .where(Entitlement.user_id == user_id, *_active_filter(now))
+    )
+    # (expiry timestamp or None, analyses left) per grant, a user rarely has more than a few
+    buckets = [(expires_at.timestamp() if expires_at else None, remaining) for expires_at, remaining in rows]
+    if buckets:
+        cache.set(_cache_key(user_id), buckets, timeout=current_app.config['ENTITLEMENT_CACHE_TIMEOUT'])
+    else:
+        # Never cached, the next check must see a purchase recorded by the Stripe processor
+        cache.delete(_cache_key(user_id))
+    return buckets
+
+def remaining_analyses(user_id, needed=1):
+    """Lease analyses the user can still start, read from the cached balance when it covers needed"""
+    # Grants are written by the Stripe processor, whose cache writes never reach this
+    # process, so a balance short of needed is re-read before the caller refuses anything
+    buckets = cache.get(_cache_key(user_id))
+    if buckets is not None:
+        remaining = _balance(buckets)
+        if remaining >= needed:
+            return remaining
+    return _balance(refresh_balance(user_id))
+
+def entitlement_summary(user_id):
+    """Remaining analyses and each purchase's counters for the account API"""
+    grants = Entitlement.query.filter_by(user_id=user_id).order_by(Entitlement.created_at.desc()).all()
+    return {
+        'remaining': remaining_analyses(user_id),
+        'grants': [
+            {
+                'plan': grant.plan_name,
+                'granted': grant.granted,
+                'used': grant.used,
+                'expiresAt': grant.expires_at.isoformat() if grant.expires_at else None,
+                'revoked': grant.revoked_at is not None
+            }
+            for grant in grants
+        ]
+    }
+
+def consume_analyses(user_id, document_ids):
+    """Charge one analysis per document against the grants expiring soonest, all or nothing"""
+    needed = len(document_ids)
+    allocation = []
+    try:
+        while len(allocation) < needed:
+            now = datetime.utcnow()
+            grant = db.session.execute(
+                select(Entitlement.id, Entitlement.granted - Entitlement.used)
+                .where(Entitlement.user_id == user_id, *_active_filter(now))
+                .order_by(Entitlement.expires_at.is_(None), Entitlement.expires_at, Entitlement.id)
+                .limit(1)
+            ).first()
+            if grant is None:
+                raise QuotaExceeded(f"User {user_id} has {len(allocation)} of {needed} lease analyses left")
+
+            grant_id, available = grant
+            take = min(needed - len(allocation), available)
+            # The counter only moves if the grant still has room, so concurrent
+            # uploads can never spend more than was bought
+            updated = db.session.execute(
+                update(Entitlement)
+                .where(Entitlement.id == grant_id, Entitlement.used + take <= Entitlement.granted,
+                       Entitlement.revoked_at.is_(None))
+                .values(used=Entitlement.used + take)
+            ).rowcount
+            if updated:
+                allocation.extend([grant_id] * take)
+
+        db.session.add_all([
+            EntitlementUsage(entitlement_id=grant_id, document_id=document_id)
+            for grant_id, document_id in zip(allocation, document_ids)
+        ])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        refresh_balance(user_id)
+    return allocation
+
+def _users_by_email(emails):
+    if not emails:
+        return {}
+    rows = db.session.query(func.lower(AdminUser.email), AdminUser.id).filter(
+        func.lower(AdminUser.email).in_([email.lower() for email in emails])
+    )
+    return dict(rows)
+
+def _grant_values(payment, user_id):
+    quota = PLAN_QUOTAS[payment.plan_name]
+    return {
+        'user_id': user_id,
+        'stripe_payment_id': payment.stripe_payment_id,
+        'plan_name': payment.plan_name,
+        'granted': quota['analyses'],
+        'used': 0,
+        'expires_at': payment.created_at + timedelta(days=quota['valid_days']) if quota['valid_days'] else None,
+        'created_at': datetime.utcnow()
+    }
+
+def sync_entitlements(payment_ids):
+    """Grant or revoke analyses for payments whose status changed, returning the affected users"""
+    payments = Payment.query.filter(Payment.stripe_payment_id.in_(payment_ids)).all()
+    users = _users_by_email({payment.user_email for payment in payments if payment.user_email})
+    existing = {
+        grant.stripe_payment_id: grant
+        for grant in Entitlement.query.filter(Entitlement.stripe_payment_id.in_(payment_ids))
+    }
+
+    affected = set()
+    for payment in payments:
+        grant = existing.get(payment.stripe_payment_id)
+        if payment.status in GRANTING_STATUSES and grant is None:
+            user_id = users.get(payment.user_email.lower())
+            if user_id is None or payment.plan_name not in PLAN_QUOTAS:
+                logger.warning(f"Payment {payment.stripe_payment_id} has no matching account or plan, no analyses granted")
+                continue
+            db.session.add(Entitlement(**_grant_values(payment, user_id)))
+            affected.add(user_id)
+        elif payment.status == REVOKING_STATUS and grant is not None and grant.revoked_at is None:
+            grant.revoked_at = datetime.utcnow()
+            affected.add(grant.user_id)
+    return affected
+
+def reconcile_entitlements(fix=False):
+    """Check the counters against payments and the usage ledger, optionally repairing them"""
+    report = {'missing_grants': [], 'unrevoked_refunds': [], 'usage_mismatches': []}
+    affected = set()
+
+    # Paid purchases by a known account without a grant
+    granted = select(Entitlement.stripe_payment_id)
+    missing = Payment.query.filter(
+        Payment.status.in_(GRANTING_STATUSES),
+        Payment.plan_name.in_(PLAN_QUOTAS),
+        Payment.stripe_payment_id.not_in(granted)
+    ).all()
+    users = _users_by_email({payment.user_email for payment in missing if payment.user_email})
+    for payment in missing:
+        user_id = users.get(payment.user_email.lower()) if payment.user_email else None
+        if user_id is None:
+            continue
+        report['missing_grants'].append(payment.stripe_payment_id)
+        if fix:
+            db.session.add(Entitlement(**_grant_values(payment, user_id)))
+            affected.add(user_id)
+
+    # Refunded purchases whose analyses can still be spent
+    unrevoked = Entitlement.query.join(
+        Payment, Payment.stripe_payment_id == Entitlement.stripe_payment_id
+    ).filter(Payment.status == REVOKING_STATUS, Entitlement.revoked_at.is_(None)).all()
+    for grant in unrevoked:
+        report['unrevoked_refunds'].append(grant.stripe_payment_id)
+        if fix:
+            grant.revoked_at = datetime.utcnow()
+            affected.add(grant.user_id)
+
+    # Counters that drifted from the usage ledger
+    ledger = (
+        select(EntitlementUsage.entitlement_id, func.count(EntitlementUsage.id).label('count'))
+        .group_by(EntitlementUsage.entitlement_id)
+        .subquery()
+    )
+    drifted = db.session.query(Entitlement, func.coalesce(ledger.c.count, 0)).outerjoin(
+        ledger, ledger.c.entitlement_id == Entitlement.id
+    ).filter(Entitlement.used != func.coalesce(ledger.c.count, 0)).all()
+    for grant, count in drifted:
+        report['usage_mismatches'].append({'entitlement': grant.id, 'used': grant.used, 'ledger': count})
+        if fix:
+            grant.used = count
+            affected.add(grant.user_id)
+
+    if fix:
+        db.session.commit()
+        for user_id in affected:
+            refresh_balance(user_id)
+        logger.info(f"Reconciled entitlements for {len(affected)} users")
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Plan entitlement maintenance')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    reconcile_parser = subparsers.add_parser('reconcile', help='Verify quota counters against payments and usage')
+    reconcile_parser.add_argument('--fix', action='store_true', help='Repair the counters that disagree')
+    args = parser.parse_args(argv)
+
+    from .app import create_app
+    app = create_app()
+    with app.app_context():
+        report = reconcile_entitlements(fix=args.fix)
+    print(json.dumps(report, indent=2))
+    problems = sum(len(items) for items in report.values())
+    return 1 if problems and not args.fix else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
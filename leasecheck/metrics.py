@@ -0,0 +1,401 @@
+import os
+import json
+import time
+import atexit
+import bisect
+import logging
+import threading
+import weakref
+from flask import Response, current_app, g, request, abort
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE_LATEST = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Counters and histograms of exited workers, folded together in METRICS_MULTIPROC_DIR
+ARCHIVE_FILENAME = 'archive.json'
+
+class _ShardOwner:
+    """Marker kept in a thread's local storage, collected when the thread exits"""
+    __slots__ = ('__weakref__',)
+
+class _Metric:
+    """Base metric whose values live in per-thread shards"""
+    kind = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        # Values of threads that have exited, folded together so shards never pile up
+        self._retired = {}
+        self._shards = [self._retired]
+
+    def _shard(self):
+        # Only the owning thread writes to a shard, so updates need no lock;
+        # the registry lock is taken once per thread and when a scrape merges
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            # Thread-local values are dropped when their thread exits, which fires this
+            owner = self._local.owner = _ShardOwner()
+            weakref.finalize(owner, self._retire, shard)
+            with self.registry.lock:
+                self._shards.append(shard)
+        return shard
+
+    def _retire(self, shard):
+        with self.registry.lock:
+            # By identity, list.remove would compare dicts by value
+            self._shards = [other for other in self._shards if other is not shard]
+            for key, value in shard.items():
+                self._fold(key, value)
+
+    def _fold(self, key, value):
+        raise NotImplementedError
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {labels}")
+        return tuple(str(value) for value in labels)
+
+class Counter(_Metric):
+    """Monotonically increasing counter"""
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def _fold(self, key, value):
+        self._retired[key] = self._retired.get(key, 0) + value
+
+    def collect(self):
+        with self.registry.lock:
+            shards = [shard.copy() for shard in self._shards]
+        merged = {}
+        for shard in shards:
+            for key, value in shard.items():
+                merged[key] = merged.get(key, 0) + value
+        return merged
+
+class Histogram(_Metric):
+    """Cumulative histogram with fixed upper bounds"""
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        shard = self._shard()
+        key = self._key(labels)
+        state = shard.get(key)
+        if state is None:
+            # Per-bucket counts (last slot is +Inf), then sum
+            state = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def _fold(self, key, state):
+        current = self._retired.get(key)
+        self._retired[key] = list(state) if current is None else [a + b for a, b in zip(current, state)]
+
+    def collect(self):
+        with self.registry.lock:
+            shards = [{key: list(state) for key, state in shard.copy().items()} for shard in self._shards]
+        merged = {}
+        for shard in shards:
+            for key, state in shard.items():
+                if key in merged:
+                    merged[key] = [a + b for a, b in zip(merged[key], state)]
+                else:
+                    merged[key] = state
+        return merged
+
+class Gauge:
+    """Gauge whose value is read from a callback at scrape time"""
+    kind = 'gauge'
+
+    def __init__(self, registry, name, documentation, labelnames, callback):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+
+    def collect(self):
+        try:
+            return {tuple(str(v) for v in key): value for key, value in self.callback().items()}
+        except Exception as e:
+            logger.error(f"Error collecting gauge {self.name}: {str(e)}")
+            return {}
+
+class MetricsRegistry:
+    """Registry of metrics with optional multi-process aggregation"""
+
+    def __init__(self):
+        # Reentrant, a thread's shards can be retired by garbage collection inside a locked section
+        self.lock = threading.RLock()
+        self.metrics = {}
+        self.multiproc_dir = None
+        self._last_flush = 0.0
+
+    def _register(self, metric):
+        with self.lock:
+            if metric.name in self.metrics:
+                return self.metrics[metric.name]
+            self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(self, name, documentation, labelnames, buckets))
+
+    def gauge(self, name, documentation, labelnames, callback):
+        return self._register(Gauge(self, name, documentation, labelnames, callback))
+
+    def snapshot(self):
+        """Collect every metric of this process into a JSON-serializable dict"""
+        data = {}
+        for name, metric in list(self.metrics.items()):
+            values = metric.collect()
+            data[name] = {
+                'kind': metric.kind,
+                'help': metric.documentation,
+                'labelnames': list(metric.labelnames),
+                'buckets': list(getattr(metric, 'buckets', ())),
+                'values': [[list(key), value] for key, value in values.items()]
+            }
+        return data
+
+    def flush(self, force=False, interval=5.0):
+        """Write this process's snapshot to the shared directory"""
+        if not self.multiproc_dir:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_flush < interval:
+            return
+        self._last_flush = now
+        path = os.path.join(self.multiproc_dir, f"metrics_{os.getpid()}.json")
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump({'pid': os.getpid(), 'metrics': self.snapshot()}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"Error flushing metrics snapshot: {str(e)}")
+
+    def aggregate(self):
+        """Merge the snapshots of all worker processes"""
+        if not self.multiproc_dir:
+            return self.snapshot()
+
+        self.flush(force=True)
+        merged, folded = {}, set()
+        # Read first, a worker folded into it after this read still has its own file
+        archive = _read_snapshot(os.path.join(self.multiproc_dir, ARCHIVE_FILENAME))
+        if archive is not None:
+            _merge_metrics(merged, archive['metrics'])
+            folded = set(archive['folded'])
+        for entry in os.scandir(self.multiproc_dir):
+            if not (entry.name.startswith('metrics_') and entry.name.endswith('.json')):
+                continue
+            payload = _read_snapshot(entry.path)
+            if payload is None or payload['pid'] in folded:
+                continue
+            # Counters of exited workers still count, gauges only come from live ones
+            _merge_metrics(merged, payload['metrics'], gauges=_pid_alive(payload['pid']))
+        return _listed(merged)
+
+    def retire_process(self, pid):
+        """Fold an exited worker's counters and histograms into the archive and remove its snapshot"""
+        if not self.multiproc_dir:
+            return
+        path = os.path.join(self.multiproc_dir, f"metrics_{pid}.json")
+        payload = _read_snapshot(path)
+        if payload is None:
+            return
+        archive_path = os.path.join(self.multiproc_dir, ARCHIVE_FILENAME)
+        archive = _read_snapshot(archive_path) or {'folded': [], 'metrics': {}}
+        merged = {}
+        _merge_metrics(merged, archive['metrics'])
+        _merge_metrics(merged, payload['metrics'], gauges=False)
+        tmp_path = f"{archive_path}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                # Earlier pids' files are gone by now, only this one can still be read by a scrape
+                json.dump({'folded': [pid], 'metrics': _listed(merged)}, f)
+            os.replace(tmp_path, archive_path)
+            os.remove(path)
+        except OSError as e:
+            logger.error(f"Error archiving metrics of worker {pid}: {str(e)}")
+
+def _read_snapshot(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _merge_metrics(merged, metrics, gauges=True):
+    # merged maps names to metrics whose values are keyed by label tuples
+    for name, metric in metrics.items():
+        if metric['kind'] == 'gauge' and not gauges:
+            continue
+        target = merged.setdefault(name, dict(metric, values={}))
+        for key, value in metric['values']:
+            key = tuple(key)
+            if metric['kind'] == 'histogram':
+                current = target['values'].get(key)
+                target['values'][key] = value if current is None else [a + b for a, b in zip(current, value)]
+            else:
+                target['values'][key] = target['values'].get(key, 0) + value
+
+def _listed(merged):
+    for metric in merged.values():
+        metric['values'] = [[list(key), value] for key, value in metric['values'].items()]
+    return merged
+
+def _pid_alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(labelnames, key, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, key)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def render_exposition(snapshot):
+    """Render a snapshot in the Prometheus text exposition format"""
+    lines = []
+    for name in sorted(snapshot):
+        metric = snapshot[name]
+        labelnames = metric['labelnames']
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['kind']}")
+        for key, value in sorted(metric['values'], key=lambda item: item[0]):
+            if metric['kind'] == 'histogram':
+                cumulative = 0
+                bounds = [str(b) for b in metric['buckets']] + ['+Inf']
+                for bound, count in zip(bounds, value[:-1]):
+                    cumulative += count
+                    labels = _format_labels(labelnames, key, f'le="{bound}"')
+                    lines.append(f"{name}_bucket{labels} {cumulative}")
+                labels = _format_labels(labelnames, key)
+                lines.append(f"{name}_sum{labels} {value[-1]}")
+                lines.append(f"{name}_count{labels} {cumulative}")
+            else:
+                lines.append(f"{name}{_format_labels(labelnames, key)} {value}")
+    return '\n'.join(lines) + '\n'
+
+# Process-wide registry and the core application metrics
+registry = MetricsRegistry()
+
+REQUEST_LATENCY = registry.histogram(
+    'leasecheck_http_request_duration_seconds', 'HTTP request latency by endpoint',
+    ('endpoint', 'method')
+)
+REQUESTS_TOTAL = registry.counter(
+    'leasecheck_http_requests_total', 'HTTP requests by endpoint and status',
+    ('endpoint', 'method', 'status')
+)
+REQUEST_ERRORS = registry.counter(
+    'leasecheck_http_request_errors_total', 'HTTP 5xx responses by endpoint',
+    ('endpoint',)
+)
+UPLOAD_BYTES = registry.counter(
+    'leasecheck_upload_bytes_total', 'Bytes received in multipart uploads by endpoint',
+    ('endpoint',)
+)
+CACHE_LOOKUPS = registry.counter(
+    'leasecheck_cache_lookups_total', 'Cache lookups by result (hit or miss)',
+    ('result',)
+)
+
+def _start_timer():
+    g._metrics_start = time.perf_counter()
+
+def _record_request(response):
+    started = g.pop('_metrics_start', None)
+    endpoint = request.endpoint or 'unmatched'
+    method = request.method
+    if started is not None:
+        REQUEST_LATENCY.observe(time.perf_counter() - started, endpoint, method)
+    REQUESTS_TOTAL.inc(endpoint, method, response.status_code)
+    if response.status_code >= 500:
+        REQUEST_ERRORS.inc(endpoint)
+    if method == 'POST' and request.mimetype == 'multipart/form-data' and request.content_length:
+        UPLOAD_BYTES.inc(endpoint, amount=request.content_length)
+    registry.flush(interval=current_app.config['METRICS_FLUSH_INTERVAL'])
+    return response
+
+def _db_pool_stats():
+    """Read connection pool gauges from the SQLAlchemy engine"""
+    from .database import db
+    pool = db.engine.pool
+    stats = {}
+    for state in ('size', 'checkedin', 'checkedout', 'overflow'):
+        reader = getattr(pool, state, None)
+        if callable(reader):
+            stats[(state,)] = reader()
+    return stats
+
+def metrics_view():
+    """Expose metrics in the Prometheus text format"""
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f"Bearer {token}":
+        abort(401)
+    return Response(render_exposition(registry.aggregate()), mimetype=CONTENT_TYPE_LATEST)
+
+def enable_multiprocess(directory):
+    """Share this process's metrics through snapshots in directory"""
+    if registry.multiproc_dir == directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    registry.multiproc_dir = directory
+    atexit.register(registry.flush, force=True)
+
+def init_metrics(app):
+    """Wire request instrumentation and the /metrics endpoint into the app"""
+    if not app.config.get('METRICS_ENABLED', False):
+        return
+    if not app.config.get('METRICS_TOKEN'):
+        logger.warning("Metrics enabled without METRICS_TOKEN, /metrics is readable by anyone who can reach it")
+
+    multiproc_dir = app.config.get('METRICS_MULTIPROC_DIR')
+    if multiproc_dir:
+        enable_multiprocess(multiproc_dir)
+
+    def db_pool_stats():
+        with app.app_context():
+            return _db_pool_stats()
+
+    registry.gauge(
+        'leasecheck_db_pool_connections', 'SQLAlchemy connection pool state',
+        ('state',), db_pool_stats
+    )
+
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+    logger.info(f"Metrics enabled (multiprocess dir: {multiproc_dir or 'none'})")
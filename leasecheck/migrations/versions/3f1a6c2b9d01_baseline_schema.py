@@ -0,0 +1,94 @@
+"""baseline schema
+
+Revision ID: 3f1a6c2b9d01
+Revises: 
+Create Date: 2024-11-12 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1a6c2b9d01'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _has_table(name):
+    # databases set up before migrations existed already have these tables
+    return sa.inspect(op.get_bind()).has_table(name)
+
+
+def upgrade():
+    if not _has_table('admin_users'):
+        op.create_table('admin_users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('email', sa.String(length=255), nullable=False),
+        sa.Column('password_hash', sa.String(length=255), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email')
+        )
+    if not _has_table('documents'):
+        op.create_table('documents',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('original_filename', sa.String(length=255), nullable=False),
+        sa.Column('stored_filename', sa.String(length=255), nullable=False),
+        sa.Column('file_path', sa.String(length=500), nullable=False),
+        sa.Column('file_size', sa.Integer(), nullable=False),
+        sa.Column('upload_date', sa.DateTime(), nullable=False),
+        sa.Column('status', sa.String(length=50), nullable=False),
+        sa.Column('error_message', sa.Text(), nullable=True),
+        sa.Column('review_status', sa.String(length=50), nullable=True),
+        sa.Column('risk_level', sa.String(length=20), nullable=True),
+        sa.Column('risk_factors', sa.JSON(), nullable=True),
+        sa.Column('annotations', sa.JSON(), nullable=True),
+        sa.Column('last_reviewed', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('stored_filename')
+        )
+    if not _has_table('payments'):
+        op.create_table('payments',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('stripe_payment_id', sa.String(length=255), nullable=False),
+        sa.Column('user_email', sa.String(length=255), nullable=False),
+        sa.Column('amount', sa.Integer(), nullable=False),
+        sa.Column('currency', sa.String(length=3), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('plan_name', sa.String(length=50), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('stripe_payment_id')
+        )
+    if not _has_table('terms_acceptance'):
+        op.create_table('terms_acceptance',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_email', sa.String(length=255), nullable=False),
+        sa.Column('accepted_at', sa.DateTime(), nullable=False),
+        sa.Column('ip_address', sa.String(length=45), nullable=True),
+        sa.Column('terms_version', sa.String(length=50), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+        )
+    if not _has_table('support_tickets'):
+        op.create_table('support_tickets',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('document_id', sa.Integer(), nullable=False),
+        sa.Column('user_email', sa.String(length=255), nullable=False),
+        sa.Column('issue_type', sa.String(length=50), nullable=False),
+        sa.Column('description', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('resolved_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['document_id'], ['documents.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade():
+    op.drop_table('support_tickets')
+    op.drop_table('terms_acceptance')
+    op.drop_table('payments')
+    op.drop_table('documents')
+    op.drop_table('admin_users')
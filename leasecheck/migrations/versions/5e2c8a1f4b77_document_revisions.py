@@ -0,0 +1,47 @@
+"""document uploader and revision link
+
+Revision ID: 5e2c8a1f4b77
+Revises: 8b7e4d2a5c13
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e2c8a1f4b77'
+down_revision = '8b7e4d2a5c13'
+branch_labels = None
+depends_on = None
+
+
+def _columns(table):
+    return {column['name'] for column in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def _indexes(table):
+    return {index['name'] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    existing = _columns('documents')
+    if 'user_id' not in existing:
+        op.add_column('documents', sa.Column('user_id', sa.Integer(), nullable=True))
+    if 'revision_of_id' not in existing:
+        op.add_column('documents', sa.Column('revision_of_id', sa.Integer(), nullable=True))
+        # SQLite can only add a foreign key by rebuilding the table, see 8b7e4d2a5c13
+        if op.get_bind().dialect.name != 'sqlite':
+            op.create_foreign_key(
+                'fk_documents_revision_of_id_documents', 'documents', 'documents', ['revision_of_id'], ['id']
+            )
+    if 'ix_documents_user_id' not in _indexes('documents'):
+        op.create_index('ix_documents_user_id', 'documents', ['user_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_documents_user_id', table_name='documents')
+    if op.get_bind().dialect.name != 'sqlite':
+        op.drop_constraint('fk_documents_revision_of_id_documents', 'documents', type_='foreignkey')
+    op.drop_column('documents', 'revision_of_id')
+    op.drop_column('documents', 'user_id')
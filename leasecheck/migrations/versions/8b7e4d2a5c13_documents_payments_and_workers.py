@@ -0,0 +1,210 @@
+"""document pipeline, payment inbox, entitlements, sessions and retention
+
+Revision ID: 8b7e4d2a5c13
+Revises: 3f1a6c2b9d01
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b7e4d2a5c13'
+down_revision = '3f1a6c2b9d01'
+branch_labels = None
+depends_on = None
+
+# columns added to documents, NOT NULL ones get a server default for existing rows
+DOCUMENT_COLUMNS = (
+    ('content_hash', sa.String(length=64), None),
+    ('batch_id', sa.Integer(), None),
+    ('page_count', sa.Integer(), None),
+    ('pages_extracted', sa.Integer(), '0'),
+    ('analysis_started_at', sa.DateTime(), None),
+    ('section_index', sa.JSON(), None),
+    ('storage_tier', sa.String(length=20), 'hot'),
+    ('archive_path', sa.String(length=500), None),
+    ('payload_archived_at', sa.DateTime(), None),
+    ('restored_at', sa.DateTime(), None),
+)
+
+
+# db.create_all() at startup creates missing tables but never alters existing
+# ones, so each step only runs for what the database does not have yet
+def _has_table(name):
+    return sa.inspect(op.get_bind()).has_table(name)
+
+
+def _columns(table):
+    return {column['name'] for column in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def _indexes(table):
+    return {index['name'] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def _create_index(name, table, columns):
+    if name not in _indexes(table):
+        op.create_index(name, table, columns, unique=False)
+
+
+def upgrade():
+    if not _has_table('analysis_batches'):
+        op.create_table('analysis_batches',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+        )
+    if not _has_table('attorneys'):
+        op.create_table('attorneys',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=255), nullable=False),
+        sa.Column('firm', sa.String(length=255), nullable=True),
+        sa.Column('specialties', sa.String(length=500), nullable=False),
+        sa.Column('city', sa.String(length=100), nullable=True),
+        sa.Column('state', sa.String(length=50), nullable=True),
+        sa.Column('postal_code', sa.String(length=20), nullable=True),
+        sa.Column('latitude', sa.Float(), nullable=False),
+        sa.Column('longitude', sa.Float(), nullable=False),
+        sa.Column('years_experience', sa.Integer(), nullable=True),
+        sa.Column('rating', sa.Float(), nullable=True),
+        sa.Column('cases', sa.Integer(), nullable=True),
+        sa.Column('success_rate', sa.Float(), nullable=True),
+        sa.Column('email', sa.String(length=255), nullable=True),
+        sa.Column('phone', sa.String(length=50), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+        )
+    _create_index('ix_attorneys_postal_code', 'attorneys', ['postal_code'])
+    if not _has_table('entitlements'):
+        op.create_table('entitlements',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('stripe_payment_id', sa.String(length=255), nullable=False),
+        sa.Column('plan_name', sa.String(length=50), nullable=False),
+        sa.Column('granted', sa.Integer(), nullable=False),
+        sa.Column('used', sa.Integer(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=True),
+        sa.Column('revoked_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('stripe_payment_id')
+        )
+    _create_index('ix_entitlements_user_active', 'entitlements', ['user_id', 'expires_at'])
+    if not _has_table('sessions'):
+        op.create_table('sessions',
+        sa.Column('id', sa.String(length=64), nullable=False),
+        sa.Column('data', sa.Text(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+        )
+    _create_index('ix_sessions_expires_at', 'sessions', ['expires_at'])
+    if not _has_table('stripe_events'):
+        op.create_table('stripe_events',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('event_id', sa.String(length=255), nullable=False),
+        sa.Column('event_type', sa.String(length=100), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('stripe_created_at', sa.DateTime(), nullable=True),
+        sa.Column('received_at', sa.DateTime(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+        sa.Column('claim_token', sa.String(length=32), nullable=True),
+        sa.Column('locked_until', sa.DateTime(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('processed_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('event_id')
+        )
+    _create_index('ix_stripe_events_claim_token', 'stripe_events', ['claim_token'])
+    _create_index('ix_stripe_events_pending', 'stripe_events', ['status', 'next_attempt_at'])
+    if not _has_table('terms_versions'):
+        op.create_table('terms_versions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.String(length=50), nullable=False),
+        sa.Column('published_at', sa.DateTime(), nullable=False),
+        sa.Column('carried_over', sa.Boolean(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('version')
+        )
+    if not _has_table('document_archives'):
+        op.create_table('document_archives',
+        sa.Column('document_id', sa.Integer(), nullable=False),
+        sa.Column('payload', sa.LargeBinary(), nullable=False),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['document_id'], ['documents.id'], ),
+        sa.PrimaryKeyConstraint('document_id')
+        )
+    if not _has_table('entitlement_usage'):
+        op.create_table('entitlement_usage',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('entitlement_id', sa.Integer(), nullable=False),
+        sa.Column('document_id', sa.Integer(), nullable=True),
+        sa.Column('used_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['document_id'], ['documents.id'], ),
+        sa.ForeignKeyConstraint(['entitlement_id'], ['entitlements.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+    _create_index('ix_entitlement_usage_document_id', 'entitlement_usage', ['document_id'])
+    _create_index('ix_entitlement_usage_entitlement_id', 'entitlement_usage', ['entitlement_id'])
+    if not _has_table('report_deliveries'):
+        op.create_table('report_deliveries',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('document_id', sa.Integer(), nullable=False),
+        sa.Column('recipient_email', sa.String(length=255), nullable=False),
+        sa.Column('recipient_name', sa.String(length=255), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+        sa.Column('claim_token', sa.String(length=32), nullable=True),
+        sa.Column('locked_until', sa.DateTime(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['document_id'], ['documents.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+    _create_index('ix_report_deliveries_claim_token', 'report_deliveries', ['claim_token'])
+    _create_index('ix_report_deliveries_due', 'report_deliveries', ['status', 'next_attempt_at'])
+
+    existing = _columns('documents')
+    missing = [column for column in DOCUMENT_COLUMNS if column[0] not in existing]
+    for name, type_, default in missing:
+        op.add_column('documents', sa.Column(name, type_, nullable=default is None, server_default=default))
+    # SQLite can only add a foreign key by rebuilding the table, which its
+    # support_tickets references forbid, the ORM relationship works without it
+    if 'batch_id' not in existing and op.get_bind().dialect.name != 'sqlite':
+        op.create_foreign_key(
+            'fk_documents_batch_id_analysis_batches', 'documents', 'analysis_batches', ['batch_id'], ['id']
+        )
+    _create_index('ix_documents_batch_id', 'documents', ['batch_id'])
+    _create_index('ix_documents_content_hash', 'documents', ['content_hash'])
+    _create_index('ix_documents_tier_upload_date', 'documents', ['storage_tier', 'upload_date'])
+
+    if 'stripe_updated_at' not in _columns('payments'):
+        op.add_column('payments', sa.Column('stripe_updated_at', sa.DateTime(), nullable=True))
+    _create_index('ix_terms_acceptance_version_email', 'terms_acceptance', ['terms_version', 'user_email'])
+
+
+def downgrade():
+    op.drop_index('ix_terms_acceptance_version_email', table_name='terms_acceptance')
+    op.drop_column('payments', 'stripe_updated_at')
+    op.drop_index('ix_documents_tier_upload_date', table_name='documents')
+    op.drop_index('ix_documents_content_hash', table_name='documents')
+    op.drop_index('ix_documents_batch_id', table_name='documents')
+    if op.get_bind().dialect.name != 'sqlite':
+        op.drop_constraint('fk_documents_batch_id_analysis_batches', 'documents', type_='foreignkey')
+    for name, _, _ in reversed(DOCUMENT_COLUMNS):
+        op.drop_column('documents', name)
+    op.drop_table('report_deliveries')
+    op.drop_table('entitlement_usage')
+    op.drop_table('document_archives')
+    op.drop_table('terms_versions')
+    op.drop_table('stripe_events')
+    op.drop_table('sessions')
+    op.drop_table('entitlements')
+    op.drop_table('attorneys')
+    op.drop_table('analysis_batches')
@@ -0,0 +1,39 @@
+"""admin search index and sync triggers
+
+Revision ID: a7c3f9d2e815
+Revises: 5e2c8a1f4b77
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from alembic import op
+
+from leasecheck.search import SOURCES, create_search_index
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3f9d2e815'
+down_revision = '5e2c8a1f4b77'
+branch_labels = None
+depends_on = None
+
+
+# The statements are idempotent, so databases whose index was created on startup
+# by an earlier release only get their trigger functions replaced
+def upgrade():
+    connection = op.get_bind()
+    if connection.dialect.name in ('sqlite', 'postgresql'):
+        create_search_index(connection)
+
+
+def downgrade():
+    connection = op.get_bind()
+    for source in SOURCES.values():
+        table = source['table']
+        if connection.dialect.name == 'sqlite':
+            for event in ('insert', 'update', 'delete'):
+                op.execute(f"DROP TRIGGER IF EXISTS search_{table}_{event}")
+        elif connection.dialect.name == 'postgresql':
+            op.execute(f"DROP TRIGGER IF EXISTS search_index_{table} ON {table}")
+            op.execute(f"DROP FUNCTION IF EXISTS search_index_{table}()")
+    op.execute("DROP TABLE IF EXISTS search_vocab")
+    op.execute("DROP TABLE IF EXISTS search_index")
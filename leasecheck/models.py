@@ -3,6 +3,9 @@ from .database import db
 
 class TermsAcceptance(db.Model):
     __tablename__ = 'terms_acceptance'
+    __table_args__ = (
+        db.Index('ix_terms_acceptance_version_email', 'terms_version', 'user_email'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_email = db.Column(db.String(255), nullable=False)
@@ -21,6 +24,7 @@ class Payment(db.Model):
     status = db.Column(db.String(20), nullable=False)
     plan_name = db.Column(db.String(50), nullable=False)
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    stripe_updated_at = db.Column(db.DateTime)  # Creation time of the newest Stripe event applied
 
 class AdminUser(db.Model):
     __tablename__ = 'admin_users'
@@ -32,23 +36,40 @@ class AdminUser(db.Model):
 
 class Document(db.Model):
     __tablename__ = 'documents'
+    __table_args__ = (
+        db.Index('ix_documents_tier_upload_date', 'storage_tier', 'upload_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     original_filename = db.Column(db.String(255), nullable=False)
     stored_filename = db.Column(db.String(255), nullable=False, unique=True)
     file_path = db.Column(db.String(500), nullable=False)
     file_size = db.Column(db.Integer, nullable=False)  # Size in bytes
+    content_hash = db.Column(db.String(64), index=True)  # SHA-256 of the file, used as ETag
     upload_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     status = db.Column(db.String(50), nullable=False, default='pending')  # pending, processing, processed, error
     error_message = db.Column(db.Text)
+    batch_id = db.Column(db.Integer, db.ForeignKey('analysis_batches.id'), index=True)
+    user_id = db.Column(db.Integer, index=True)  # Uploader, None for CLI batches
+    revision_of_id = db.Column(db.Integer, db.ForeignKey('documents.id'))  # Earlier version of the same lease
+    page_count = db.Column(db.Integer)  # Read from the uploaded PDF
+    pages_extracted = db.Column(db.Integer, nullable=False, default=0)
+    analysis_started_at = db.Column(db.DateTime)
     
     # Review-related fields
     review_status = db.Column(db.String(50), default='not_started')  # not_started, in_progress, completed
     risk_level = db.Column(db.String(20))  # low, medium, high
     risk_factors = db.Column(db.JSON)
     annotations = db.Column(db.JSON)  # Store document annotations
+    section_index = db.Column(db.JSON)  # Per-section hashes and rule hits for incremental re-analysis
     last_reviewed = db.Column(db.DateTime)
     
+    # Retention tiering fields
+    storage_tier = db.Column(db.String(20), nullable=False, default='hot')  # hot, archived, purged
+    archive_path = db.Column(db.String(500))  # Compressed file inside ARCHIVE_FOLDER once archived
+    payload_archived_at = db.Column(db.DateTime)  # JSON columns moved to document_archives
+    restored_at = db.Column(db.DateTime)  # Last brought back from the archive, restarts the retention clock
+    
     def __repr__(self):
         return f'<Document {self.original_filename}>'
 
@@ -65,3 +86,124 @@ class SupportTicket(db.Model):
     resolved_at = db.Column(db.DateTime)
     
     document = db.relationship('Document', backref=db.backref('support_tickets', lazy=True))
+
+class ReportDelivery(db.Model):
+    __tablename__ = 'report_deliveries'
+    __table_args__ = (
+        db.Index('ix_report_deliveries_due', 'status', 'next_attempt_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id'), nullable=False)
+    recipient_email = db.Column(db.String(255), nullable=False)
+    recipient_name = db.Column(db.String(255))
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, sending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    claim_token = db.Column(db.String(32), index=True)  # set while a sender owns the job
+    locked_until = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+    
+    document = db.relationship('Document', backref=db.backref('report_deliveries', lazy=True))
+
+class AnalysisBatch(db.Model):
+    __tablename__ = 'analysis_batches'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    documents = db.relationship('Document', backref='batch', lazy=True, order_by='Document.id')
+
+class Attorney(db.Model):
+    __tablename__ = 'attorneys'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(255), nullable=False)
+    firm = db.Column(db.String(255))
+    specialties = db.Column(db.String(500), nullable=False, default='')  # Semicolon separated
+    city = db.Column(db.String(100))
+    state = db.Column(db.String(50))
+    postal_code = db.Column(db.String(20), index=True)
+    latitude = db.Column(db.Float, nullable=False)
+    longitude = db.Column(db.Float, nullable=False)
+    years_experience = db.Column(db.Integer)
+    rating = db.Column(db.Float)
+    cases = db.Column(db.Integer)
+    success_rate = db.Column(db.Float)  # Percent of cases won or settled favorably
+    email = db.Column(db.String(255))
+    phone = db.Column(db.String(50))
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<Attorney {self.name}>'
+
+class StripeEvent(db.Model):
+    __tablename__ = 'stripe_events'
+    __table_args__ = (
+        db.Index('ix_stripe_events_pending', 'status', 'next_attempt_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.String(255), unique=True, nullable=False)  # Stripe evt_ id, redeliveries are dropped
+    event_type = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # Raw signed body as received
+    stripe_created_at = db.Column(db.DateTime)
+    received_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, processing, processed, ignored, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    claim_token = db.Column(db.String(32), index=True)  # set while a processor owns the event
+    locked_until = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    processed_at = db.Column(db.DateTime)
+
+class Entitlement(db.Model):
+    __tablename__ = 'entitlements'
+    __table_args__ = (
+        db.Index('ix_entitlements_user_active', 'user_id', 'expires_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    stripe_payment_id = db.Column(db.String(255), unique=True, nullable=False)  # One grant per paid purchase
+    plan_name = db.Column(db.String(50), nullable=False)
+    granted = db.Column(db.Integer, nullable=False)  # Lease analyses bought
+    used = db.Column(db.Integer, nullable=False, default=0)
+    expires_at = db.Column(db.DateTime)  # None for plans without a validity window
+    revoked_at = db.Column(db.DateTime)  # Set when the payment is refunded
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    usages = db.relationship('EntitlementUsage', backref='entitlement', lazy=True)
+
+class EntitlementUsage(db.Model):
+    __tablename__ = 'entitlement_usage'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    entitlement_id = db.Column(db.Integer, db.ForeignKey('entitlements.id'), nullable=False, index=True)
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id'), index=True)
+    used_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class ServerSessionRecord(db.Model):
+    __tablename__ = 'sessions'
+    
+    id = db.Column(db.String(64), primary_key=True)  # Opaque id, the only thing kept in the cookie
+    data = db.Column(db.Text, nullable=False)  # Tagged JSON, as Flask serializes cookie sessions
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class TermsVersion(db.Model):
+    __tablename__ = 'terms_versions'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.String(50), unique=True, nullable=False)
+    published_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    carried_over = db.Column(db.Boolean, nullable=False, default=False)  # Earlier acceptances were copied forward
+
+class DocumentArchive(db.Model):
+    __tablename__ = 'document_archives'
+    
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id'), primary_key=True)
+    payload = db.Column(db.LargeBinary, nullable=False)  # gzip JSON of risk_factors, annotations and section_index
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
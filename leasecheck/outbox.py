@@ -0,0 +1,199 @@
+import uuid
+import logging
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import func, or_, and_
+from .database import db
+from .metrics import registry
+from .app import register_background_worker
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+class Outbox:
+    """Claim, lease and retry bookkeeping for a table of queued background jobs"""
+
+    def __init__(self, model, name, waiting, working, max_attempts, retry_base_delay,
+                 retry_max_delay=None, lease=timedelta(minutes=5), order_by=None, key='id'):
+        self.model = model
+        self.name = name
+        self.waiting = waiting  # status of jobs waiting for their next attempt
+        self.working = working  # status of claimed jobs, under a lease
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay  # seconds, doubled after every failed attempt
+        self.retry_max_delay = retry_max_delay
+        self.lease = lease  # a crashed worker's jobs become claimable again after this
+        self.order_by = order_by if order_by is not None else model.id
+        self.key = key  # column that names a job in log lines
+        self.worker = None
+
+    def due_filter(self, now):
+        model = self.model
+        return or_(
+            and_(model.status == self.waiting, model.next_attempt_at <= now),
+            and_(model.status == self.working, model.locked_until < now)
+        )
+
+    def claim(self, limit):
+        """Atomically claim up to limit due jobs, returning the claim token and the claimed ids"""
+        model = self.model
+        now = datetime.utcnow()
+        candidate_ids = [
+            row.id for row in db.session.query(model.id)
+            .filter(self.due_filter(now))
+            .order_by(self.order_by, model.id)
+            .limit(limit)
+        ]
+        if not candidate_ids:
+            return None, []
+
+        # The due conditions are re-checked in the UPDATE, so concurrent workers
+        # in other processes can never claim the same row twice
+        token = uuid.uuid4().hex
+        db.session.query(model).filter(
+            model.id.in_(candidate_ids), self.due_filter(now)
+        ).update({
+            'status': self.working,
+            'claim_token': token,
+            'locked_until': now + self.lease,
+            'attempts': model.attempts + 1
+        }, synchronize_session=False)
+        db.session.commit()
+        claimed = db.session.query(model.id).filter_by(claim_token=token).order_by(self.order_by, model.id)
+        return token, [row.id for row in claimed]
+
+    def retry_delay(self, attempts):
+        delay = self.retry_base_delay * (2 ** (attempts - 1))
+        if self.retry_max_delay is not None:
+            delay = min(self.retry_max_delay, delay)
+        return timedelta(seconds=delay)
+
+    def failure(self, job, error, permanent=False):
+        """Outcome of a failed attempt, a retry with backoff until the attempts run out"""
+        label = f"{self.name} {getattr(job, self.key)}"
+        if permanent or job.attempts >= self.max_attempts:
+            logger.error(f"{label} failed permanently: {str(error)}")
+            return {'status': 'failed', 'last_error': str(error)[:2000]}
+        next_attempt_at = datetime.utcnow() + self.retry_delay(job.attempts)
+        logger.warning(
+            f"{label} failed (attempt {job.attempts}/{self.max_attempts}), "
+            f"retrying at {next_attempt_at.isoformat()}: {str(error)}"
+        )
+        return {'status': self.waiting, 'next_attempt_at': next_attempt_at, 'last_error': str(error)[:2000]}
+
+    def settle(self, token, outcomes):
+        """Write (job, outcome) pairs claimed under token and drop the claim, returning the ids still held"""
+        model = self.model
+        groups, labels = {}, {}
+        for job, outcome in outcomes:
+            groups.setdefault(tuple(sorted(outcome.items())), []).append(job.id)
+            labels[job.id] = getattr(job, self.key)
+
+        # A lease can run out mid-batch, the token check keeps this worker from
+        # overwriting whatever the worker that claimed a job next decided. The
+        # token is only cleared once the held rows are read back under the write lock
+        held = set()
+        for outcome, ids in groups.items():
+            mine = db.session.query(model).filter(model.id.in_(ids), model.claim_token == token)
+            mine.update(dict(outcome), synchronize_session=False)
+            held.update(row.id for row in mine.with_entities(model.id))
+        if held:
+            db.session.query(model).filter(model.id.in_(held), model.claim_token == token).update(
+                {'claim_token': None, 'locked_until': None}, synchronize_session=False
+            )
+        for job_id in labels.keys() - held:
+            logger.warning(f"{self.name} {labels[job_id]} was claimed again before it finished, result dropped")
+        return held
+
+    def stats(self):
+        """Count jobs by status"""
+        model = self.model
+        rows = db.session.query(model.status, func.count(model.id)).group_by(model.status)
+        return {(status,): count for status, count in rows}
+
+    def wake(self):
+        """Wake this process's worker, if it runs one, after queueing a job"""
+        worker = self.worker
+        if worker is not None:
+            worker.wake()
+
+    def start_worker(self, app, build):
+        if self.worker is None:
+            self.worker = build(app)
+            self.worker.start()
+            logger.info(f"{self.name} worker started")
+
+    def register(self, app, build, metric, description, enabled):
+        """Export the job counts and schedule the in-process worker if enabled"""
+
+        def collect_stats():
+            with app.app_context():
+                return self.stats()
+
+        registry.gauge(metric, description, ('status',), collect_stats)
+
+        if enabled:
+            register_background_worker(app, lambda app: self.start_worker(app, build))
+
+    def run_standalone(self, build):
+        """Run a worker in the foreground of a process of its own"""
+        from .app import create_app
+        worker = build(create_app())
+        logger.info(f"Running standalone {self.name.lower()} worker")
+        worker.run()
+
+class OutboxWorker:
+    """Background thread that claims due jobs and hands them to handle(app, token, ids) in batches"""
+
+    def __init__(self, app, outbox, handle, workers=1, batch_size=100, poll_interval=5.0, name='outbox'):
+        self.app = app
+        self.outbox = outbox
+        self.handle = handle
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        # One worker handles its batches on the dispatcher thread itself
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name) if workers > 1 else None
+        self._thread = threading.Thread(target=self.run, name=name, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+
+    def run_once(self):
+        """Claim due jobs and handle them in batches, returning how many were handled"""
+        with self.app.app_context():
+            try:
+                token, claimed = self.outbox.claim(self.batch_size * self.workers)
+            finally:
+                db.session.remove()
+        if not claimed:
+            return 0
+        batches = [claimed[i:i + self.batch_size] for i in range(0, len(claimed), self.batch_size)]
+        if self._pool is None:
+            return sum(self.handle(self.app, token, batch) for batch in batches)
+        return sum(self._pool.map(lambda batch: self.handle(self.app, token, batch), batches))
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                handled = self.run_once()
+            except Exception as e:
+                logger.error(f"Error in {self.outbox.name.lower()} worker: {str(e)}")
+                handled = 0
+            if not handled:
+                # A burst is drained batch after batch, then the worker waits for the next wake
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
@@ -0,0 +1,15 @@
+import multiprocessing
+
+# Importing the package builds the app, so the fork server does it once up front and
+# every pool process starts from that copy instead of importing it again
+PRELOAD_MODULES = ['leasecheck']
+
+def pool_context():
+    """Multiprocessing context for pools started from a threaded web worker"""
+    # Forking a process that runs request and background threads can copy a lock another
+    # thread holds, so pool processes come from a single-threaded fork server instead
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return None
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(PRELOAD_MODULES)
+    return context
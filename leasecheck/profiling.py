@@ -0,0 +1,170 @@
+import os
+import sys
+import time
+import random
+import logging
+import cProfile
+import threading
+from collections import Counter
+from flask import current_app, g, request
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile-Token'
+PROFILE_TOKEN_SALT = 'leasecheck-profile'
+PROFILE_TOKEN_MAX_AGE = 3600  # 1 hour
+
+MODE_CPROFILE = 'cprofile'
+MODE_SAMPLING = 'sampling'
+
+# File suffix for each capture mode
+PROFILE_SUFFIXES = {
+    MODE_CPROFILE: '.prof',       # pstats format, open with snakeviz or flameprof
+    MODE_SAMPLING: '.folded'      # collapsed stacks, open with flamegraph.pl or speedscope
+}
+
+class StackSampler:
+    """Sample one thread's call stack on a timer and count collapsed stacks"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(names))] += 1
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+def _serializer(app):
+    return URLSafeTimedSerializer(app.config['SECRET_KEY'], salt=PROFILE_TOKEN_SALT)
+
+def generate_profile_token(app=None):
+    """Generate a signed token that forces profiling of requests carrying it"""
+    return _serializer(app or current_app).dumps('profile')
+
+def _has_valid_token():
+    """Check the on-demand profiling header against SECRET_KEY"""
+    token = request.headers.get(PROFILE_HEADER)
+    if not token:
+        return False
+    try:
+        _serializer(current_app).loads(token, max_age=PROFILE_TOKEN_MAX_AGE)
+        return True
+    except BadSignature:
+        logger.warning(f"Rejected invalid profiling token for {request.path}")
+        return False
+
+def _should_profile():
+    """Decide whether the current request gets profiled"""
+    if request.endpoint == 'static':
+        return False
+    if _has_valid_token():
+        return True
+    rate = current_app.config['PROFILING_SAMPLE_RATE']
+    return rate > 0 and random.random() < rate
+
+def start_profiling():
+    """Start a profiler for sampled or explicitly requested requests"""
+    if not _should_profile():
+        return
+
+    mode = current_app.config['PROFILING_MODE']
+    if mode == MODE_SAMPLING:
+        profiler = StackSampler(threading.get_ident(), current_app.config['PROFILING_SAMPLE_INTERVAL'])
+        profiler.start()
+    else:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already active in this interpreter
+            return
+    g._profiler = (mode, profiler, time.perf_counter())
+
+def stop_profiling(exc=None):
+    """Stop the active profiler and store the captured profile"""
+    active = g.pop('_profiler', None)
+    if active is None:
+        return
+    mode, profiler, started = active
+    if mode == MODE_SAMPLING:
+        profiler.stop()
+    else:
+        profiler.disable()
+
+    elapsed_ms = int((time.perf_counter() - started) * 1000)
+    endpoint = (request.endpoint or 'unknown').replace('.', '-')
+    name = f"{time.strftime('%Y%m%dT%H%M%S')}_{endpoint}_{elapsed_ms}ms_{os.getpid()}{PROFILE_SUFFIXES[mode]}"
+    path = os.path.join(current_app.config['PROFILING_DIR'], name)
+    try:
+        if mode == MODE_SAMPLING:
+            profiler.dump(path)
+        else:
+            profiler.dump_stats(path)
+        prune_profiles(current_app.config['PROFILING_DIR'], current_app.config['PROFILING_MAX_PROFILES'])
+        logger.info(f"Stored profile {name}")
+    except OSError as e:
+        logger.error(f"Error storing profile {name}: {str(e)}")
+
+def list_profiles(profile_dir):
+    """List stored profiles, newest first"""
+    try:
+        entries = [
+            entry for entry in os.scandir(profile_dir)
+            if entry.is_file() and entry.name.endswith(tuple(PROFILE_SUFFIXES.values()))
+        ]
+    except FileNotFoundError:
+        return []
+    entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+    return [
+        {'name': entry.name, 'size': entry.stat().st_size, 'created_at': entry.stat().st_mtime}
+        for entry in entries
+    ]
+
+def prune_profiles(profile_dir, max_profiles):
+    """Delete the oldest profiles beyond max_profiles"""
+    for stale in list_profiles(profile_dir)[max_profiles:]:
+        try:
+            os.remove(os.path.join(profile_dir, stale['name']))
+        except FileNotFoundError:
+            pass
+
+def init_profiling(app):
+    """Register the opt-in request profiling hooks"""
+    if not app.config.get('PROFILING_ENABLED'):
+        return
+    if app.config['PROFILING_MODE'] not in PROFILE_SUFFIXES:
+        logger.warning(f"Unknown PROFILING_MODE '{app.config['PROFILING_MODE']}', using cprofile")
+        app.config['PROFILING_MODE'] = MODE_CPROFILE
+
+    os.makedirs(app.config['PROFILING_DIR'], exist_ok=True)
+    app.before_request(start_profiling)
+    app.teardown_request(stop_profiling)
+    logger.info(
+        f"Request profiling enabled ({app.config['PROFILING_MODE']}, "
+        f"sample rate {app.config['PROFILING_SAMPLE_RATE']})"
+    )
@@ -0,0 +1,209 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, request, session, jsonify, render_template
+from .metrics import registry
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# By default only requests that do work are counted, page loads and polling are never throttled
+LIMITED_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+RATE_LIMIT_DECISIONS = registry.counter(
+    'leasecheck_rate_limit_decisions_total', 'Rate limited requests by policy and outcome',
+    ('policy', 'outcome')
+)
+
+class Policy:
+    """Token bucket refilled with limit tokens every period seconds, holding at most burst"""
+    __slots__ = ('name', 'limit', 'period', 'burst', 'scope', 'rate')
+
+    def __init__(self, name, limit, period, burst=None, scope='ip'):
+        self.name = name
+        self.limit = limit
+        self.period = period
+        self.burst = burst or limit
+        self.scope = scope  # ip, or user to fall back to the ip only for anonymous requests
+        self.rate = limit / period
+
+    def __repr__(self):
+        return f'<Policy {self.name} {self.limit}/{self.period}s burst {self.burst}>'
+
+DEFAULT_POLICIES = {
+    # Password guessing on the login and signup forms
+    'auth': Policy('auth', 10, 60, burst=5, scope='ip'),
+    # Each lease upload ties up an analysis worker and PDF extraction processes
+    'upload': Policy('upload', 10, 60, burst=5, scope='user'),
+    # Every saved report sends an email
+    'email': Policy('email', 5, 600, burst=3, scope='user'),
+    # Support tickets and terms acceptance
+    'forms': Policy('forms', 20, 60, burst=10, scope='ip'),
+    # Attorney searches, an uncached location can scan the whole directory
+    'search': Policy('search', 60, 60, burst=20, scope='ip')
+}
+
+def parse_policy_overrides(value, policies):
+    """Apply RATE_LIMITS overrides such as "upload=20/60,auth=5/60:3" (limit/period[:burst])"""
+    policies = dict(policies)
+    for item in filter(None, (part.strip() for part in (value or '').split(','))):
+        name, _, spec = item.partition('=')
+        if name not in policies:
+            raise ValueError(f"Unknown rate limit policy {name!r}")
+        rate, _, burst = spec.partition(':')
+        limit, _, period = rate.partition('/')
+        policies[name] = Policy(
+            name, int(limit), float(period or 60), burst=int(burst) if burst else None,
+            scope=policies[name].scope
+        )
+    return policies
+
+class MemoryBackend:
+    """Token buckets in this process, enough for a single worker"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        # Least recently used first, so evicting the longest idle client is O(1)
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, policy):
+        """Take a token, returning 0 if allowed or the seconds until one is available"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.pop(key, None)
+            tokens = policy.burst if bucket is None else min(policy.burst, bucket[0] + (now - bucket[1]) * policy.rate)
+            if tokens >= 1:
+                tokens -= 1
+                retry_after = 0
+            else:
+                retry_after = (1 - tokens) / policy.rate
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                # An idle client's bucket has most likely refilled, forgetting it loses nothing
+                self._buckets.popitem(last=False)
+        return retry_after
+
+    def size(self):
+        return len(self._buckets)
+
+# Refill and take a token atomically, so limits hold across every worker using the server
+TOKEN_BUCKET_SCRIPT = """
+local state = redis.call('HMGET', KEYS[1], 't', 'ts')
+local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local tokens = tonumber(state[1])
+if tokens == nil then
+    tokens = burst
+else
+    tokens = math.min(burst, tokens + math.max(0, now - tonumber(state[2])) * rate)
+end
+local retry = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    retry = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 't', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil((burst - tokens) / rate) + 1)
+return tostring(retry)
+"""
+
+class RedisBackend:
+    """Token buckets in Redis shared by all workers, one round trip per check"""
+
+    def __init__(self, url, prefix='ratelimit:'):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError(f"RATE_LIMIT_BACKEND=redis needs the redis package: {str(e)}")
+        self.client = redis.Redis.from_url(url, socket_timeout=0.05)
+        self.script = self.client.register_script(TOKEN_BUCKET_SCRIPT)
+        self.prefix = prefix
+
+    def hit(self, key, policy):
+        return float(self.script(keys=[self.prefix + key], args=[policy.rate, policy.burst, time.time()]))
+
+    def size(self):
+        return None
+
+class RateLimiter:
+    """Check requests against named policies on the configured backend"""
+
+    def __init__(self, backend, policies):
+        self.backend = backend
+        self.policies = policies
+
+    def client_key(self, policy):
+        if policy.scope == 'user' and 'user_id' in session:
+            return f"{policy.name}:u{session['user_id']}"
+        return f"{policy.name}:{request.remote_addr}"
+
+    def check(self, policy_name):
+        """Seconds the client must wait before this policy allows another request, 0 if allowed"""
+        policy = self.policies[policy_name]
+        try:
+            retry_after = self.backend.hit(self.client_key(policy), policy)
+        except Exception as e:
+            # A shared backend outage must not take the site down with it
+            logger.warning(f"Rate limit backend error for {policy_name}: {str(e)}")
+            RATE_LIMIT_DECISIONS.inc(policy_name, 'error')
+            return 0
+        RATE_LIMIT_DECISIONS.inc(policy_name, 'limited' if retry_after else 'allowed')
+        return retry_after
+
+def too_many_requests(retry_after):
+    """429 response telling the client when to retry"""
+    seconds = max(1, int(retry_after + 0.999))
+    if request.path.startswith('/api/') or (request.accept_mimetypes.accept_json and not request.accept_mimetypes.accept_html):
+        response = jsonify({'error': 'Too many requests, please try again later', 'retryAfter': seconds})
+        response.status_code = 429
+    else:
+        response = current_app.make_response((render_template('errors/429.html', retry_after=seconds), 429))
+    response.headers['Retry-After'] = str(seconds)
+    return response
+
+def rate_limit(policy_name, methods=LIMITED_METHODS):
+    """Throttle a view's POST requests, or the given methods, with the named policy"""
+    def decorator(view):
+        @wraps(view)
+        def decorated_function(*args, **kwargs):
+            limiter = current_app.extensions.get('rate_limiter')
+            if limiter is not None and request.method in methods:
+                retry_after = limiter.check(policy_name)
+                if retry_after:
+                    return too_many_requests(retry_after)
+            return view(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+def init_rate_limit(app):
+    """Configure the rate limiter backend and per-route policies"""
+    if not app.config['RATE_LIMIT_ENABLED']:
+        logger.info("Rate limiting disabled")
+        return
+    policies = parse_policy_overrides(app.config['RATE_LIMITS'], DEFAULT_POLICIES)
+    if app.config['RATE_LIMIT_BACKEND'] == 'redis':
+        backend = RedisBackend(app.config['RATE_LIMIT_REDIS_URL'])
+    elif app.config['RATE_LIMIT_BACKEND'] == 'memory':
+        backend = MemoryBackend()
+    else:
+        raise ValueError(f"Unknown RATE_LIMIT_BACKEND {app.config['RATE_LIMIT_BACKEND']!r}, expected memory or redis")
+    app.extensions['rate_limiter'] = RateLimiter(backend, policies)
+
+    if isinstance(backend, MemoryBackend):
+        registry.gauge(
+            'leasecheck_rate_limit_buckets', 'Clients tracked by the in-process rate limiter',
+            ('backend',), lambda: {('memory',): backend.size()}
+        )
+    logger.info(f"Rate limiting initialized ({app.config['RATE_LIMIT_BACKEND']}): {list(policies.values())}")
+
+def warn_per_process_limits(app, workers):
+    """Log when several workers would each enforce their own in-memory limits"""
+    limiter = app.extensions.get('rate_limiter')
+    if workers > 1 and limiter is not None and isinstance(limiter.backend, MemoryBackend):
+        logger.warning(
+            f"Rate limits are kept per process and {workers} workers each enforce them, "
+            f"clients get up to {workers}x the configured limits. Set RATE_LIMIT_BACKEND=redis to share them"
+        )
@@ -0,0 +1,146 @@
+import os
+import smtplib
+import logging
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from .database import db
+from .models import Document, ReportDelivery
+from .report_renderer import get_report_pdf, RendererUnavailable
+from .outbox import Outbox, OutboxWorker
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 6
+RETRY_BASE_DELAY = 30  # seconds, doubled after every failed attempt
+RETRY_MAX_DELAY = 3600  # 1 hour
+CLAIM_LEASE = timedelta(minutes=5)  # a crashed sender's jobs become claimable again after this
+
+outbox = Outbox(
+    ReportDelivery, 'Report delivery', waiting='queued', working='sending',
+    max_attempts=MAX_ATTEMPTS, retry_base_delay=RETRY_BASE_DELAY, retry_max_delay=RETRY_MAX_DELAY,
+    lease=CLAIM_LEASE, order_by=ReportDelivery.next_attempt_at
+)
+
+class PermanentDeliveryError(Exception):
+    """Delivery failure that retrying will not fix"""
+    pass
+
+def enqueue_report_delivery(document_id, email, name=None):
+    """Add a report delivery to the outbox and wake the in-process sender"""
+    delivery = ReportDelivery(document_id=document_id, recipient_email=email, recipient_name=name)
+    db.session.add(delivery)
+    db.session.commit()
+    outbox.wake()
+    logger.info(f"Queued report delivery {delivery.id} for document {document_id}")
+    return delivery
+
+def claim_due_deliveries(limit):
+    """Atomically claim up to limit due deliveries, returning the claimed rows"""
+    token, claimed = outbox.claim(limit)
+    if not claimed:
+        return []
+    return ReportDelivery.query.filter(ReportDelivery.id.in_(claimed)).order_by(outbox.order_by, ReportDelivery.id).all()
+
+def build_message(app, delivery, document, pdf):
+    """Build the report email with the PDF attached"""
+    message = EmailMessage()
+    message['Subject'] = f"Your LeaseCheck risk report for {document.original_filename}"
+    message['From'] = app.config['MAIL_DEFAULT_SENDER']
+    message['To'] = delivery.recipient_email
+    greeting = f"Hi {delivery.recipient_name}," if delivery.recipient_name else "Hi,"
+    message.set_content(
+        f"{greeting}\n\n"
+        f"Attached is the LeaseCheck risk report for {document.original_filename}.\n\n"
+        "This report does not constitute legal advice. If anything in it concerns you, "
+        "consider contacting a local attorney.\n\n"
+        "The LeaseCheck Team\n"
+    )
+    base_name = os.path.splitext(document.original_filename)[0]
+    message.add_attachment(pdf, maintype='application', subtype='pdf', filename=f"{base_name}_risk_report.pdf")
+    return message
+
+def open_smtp_connection(app):
+    """Open one SMTP connection to be reused for a whole batch"""
+    connection = smtplib.SMTP(app.config['MAIL_SERVER'], app.config['MAIL_PORT'], timeout=30)
+    if app.config['MAIL_USE_TLS']:
+        connection.starttls()
+    if app.config['MAIL_USERNAME']:
+        connection.login(app.config['MAIL_USERNAME'], app.config['MAIL_PASSWORD'])
+    return connection
+
+def send_batch(app, token, delivery_ids):
+    """Send a batch of deliveries claimed under token over a single SMTP connection"""
+    with app.app_context():
+        deliveries = ReportDelivery.query.filter(
+            ReportDelivery.id.in_(delivery_ids), ReportDelivery.claim_token == token
+        ).all()
+        documents = {
+            document.id: document for document in
+            Document.query.filter(Document.id.in_({d.document_id for d in deliveries}))
+        }
+        pdfs = {}
+        outcomes = []
+        connection = None
+        try:
+            for delivery in deliveries:
+                document = documents.get(delivery.document_id)
+                try:
+                    if document is None:
+                        raise PermanentDeliveryError(f"Document {delivery.document_id} no longer exists")
+                    if document.id not in pdfs:
+                        pdfs[document.id] = get_report_pdf(app, document)
+                    if connection is None:
+                        connection = open_smtp_connection(app)
+                    connection.send_message(build_message(app, delivery, document, pdfs[document.id]))
+                    outcomes.append((delivery, {'status': 'sent', 'sent_at': datetime.utcnow(), 'last_error': None}))
+                except (PermanentDeliveryError, RendererUnavailable) as e:
+                    outcomes.append((delivery, outbox.failure(delivery, e, permanent=True)))
+                except smtplib.SMTPRecipientsRefused as e:
+                    outcomes.append((delivery, outbox.failure(delivery, e, permanent=True)))
+                except (smtplib.SMTPException, OSError) as e:
+                    outcomes.append((delivery, outbox.failure(delivery, e)))
+                    if isinstance(e, (smtplib.SMTPServerDisconnected, OSError)):
+                        # The connection is gone, reopen it for the rest of the batch
+                        connection = None
+                except Exception as e:
+                    outcomes.append((delivery, outbox.failure(delivery, e)))
+            # Written once the sends are done, so no write lock is held while talking to SMTP
+            settled = len(outbox.settle(token, outcomes))
+            db.session.commit()
+        finally:
+            if connection is not None:
+                try:
+                    connection.quit()
+                except (smtplib.SMTPException, OSError):
+                    pass
+            db.session.remove()
+    return settled
+
+class ReportDeliveryWorker(OutboxWorker):
+    """Background sender that drains the outbox with a pool of SMTP workers"""
+
+    def __init__(self, app, workers=2, batch_size=20, poll_interval=5.0):
+        super().__init__(
+            app, outbox, send_batch, workers=workers, batch_size=batch_size,
+            poll_interval=poll_interval, name='report-sender'
+        )
+
+def build_worker(app):
+    return ReportDeliveryWorker(
+        app,
+        workers=app.config['REPORT_DELIVERY_WORKERS'],
+        batch_size=app.config['REPORT_DELIVERY_BATCH_SIZE'],
+        poll_interval=app.config['REPORT_DELIVERY_POLL_INTERVAL']
+    )
+
+def init_report_delivery(app):
+    """Configure report delivery and schedule the in-process sender if enabled"""
+    outbox.register(
+        app, build_worker, 'leasecheck_report_outbox_jobs', 'Report delivery outbox jobs by status',
+        enabled=app.config.get('REPORT_DELIVERY_WORKER')
+    )
+
+if __name__ == '__main__':
+    # Standalone sender: python -m leasecheck.report_delivery
+    outbox.run_standalone(build_worker)
@@ -0,0 +1,149 @@
+import os
+import glob
+import json
+import uuid
+import hashlib
+import atexit
+import logging
+import threading
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from .risk_report import build_risk_report
+from .retention import restore_payload
+from .process_pool import pool_context
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+REPORT_TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), 'templates', 'reports')
+REPORT_TEMPLATE = 'risk_report_pdf.html'
+REPORT_STYLESHEET = 'risk_report_pdf.css'
+
+REPORT_FIELDS = ('riskLevel', 'findings', 'recommendations')
+
+class RendererUnavailable(RuntimeError):
+    """PDF rendering is not possible in this environment"""
+    pass
+
+@lru_cache(maxsize=1)
+def _load_assets():
+    """Parse the report template, stylesheet and fonts once per process"""
+    try:
+        from weasyprint import CSS
+        from weasyprint.text.fonts import FontConfiguration
+    except (ImportError, OSError) as e:
+        # OSError covers WeasyPrint installed without its Pango system libraries
+        raise RendererUnavailable(f"WeasyPrint is not available, cannot render PDF reports: {str(e)}")
+
+    env = Environment(
+        loader=FileSystemLoader(REPORT_TEMPLATE_DIR),
+        autoescape=select_autoescape(['html']),
+        auto_reload=False
+    )
+    template = env.get_template(REPORT_TEMPLATE)
+    font_config = FontConfiguration()
+    with open(os.path.join(REPORT_TEMPLATE_DIR, REPORT_STYLESHEET)) as f:
+        stylesheet = CSS(string=f.read(), font_config=font_config)
+    return template, stylesheet, font_config
+
+def report_context(document):
+    """Plain, picklable render input for a document, built where the DB session lives"""
+    restore_payload(document)
+    return {
+        'document': {
+            'id': document.id,
+            'original_filename': document.original_filename,
+            'last_reviewed': document.last_reviewed
+        },
+        'report': build_risk_report(document, REPORT_FIELDS)
+    }
+
+def render_report(context):
+    """Render a report context to PDF bytes using the cached per-process assets"""
+    from weasyprint import HTML
+    template, stylesheet, font_config = _load_assets()
+    html = template.render(**context)
+    return HTML(string=html, base_url=REPORT_TEMPLATE_DIR).write_pdf(
+        stylesheets=[stylesheet], font_config=font_config
+    )
+
+def _warm_worker():
+    """Pool initializer, pays the template and font setup before the first job"""
+    try:
+        _load_assets()
+    except RendererUnavailable as e:
+        logger.error(str(e))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_render_pool(processes):
+    """Shared process pool so layout work never holds the web worker's GIL"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=processes, mp_context=pool_context(), initializer=_warm_worker)
+            atexit.register(shutdown_render_pool)
+            logger.info(f"Started report render pool with {processes} processes")
+        return _pool
+
+def shutdown_render_pool():
+    """Stop the render pool, waiting for running jobs"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
+
+def report_pdf_path(folder, document):
+    """Cached PDF path, keyed by document id, the review it reflects and its annotations"""
+    reviewed = document.last_reviewed.strftime('%Y%m%d%H%M%S') if document.last_reviewed else 'initial'
+    # Resolving a finding changes the report without a new review
+    annotations = json.dumps(document.annotations or {}, sort_keys=True, separators=(',', ':'))
+    digest = hashlib.sha256(annotations.encode('utf-8')).hexdigest()[:12]
+    return os.path.join(folder, f"risk_report_{document.id}_{reviewed}_{digest}.pdf")
+
+def remove_stale_report_pdfs(app, document):
+    """Delete cached PDFs of a document that no longer match its current state"""
+    current = report_pdf_path(app.config['REPORT_FOLDER'], document)
+    for path in glob.glob(os.path.join(app.config['REPORT_FOLDER'], f"risk_report_{document.id}_*.pdf")):
+        if path != current:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+def render_report_pdf(app, document):
+    """Render a document's report, in the process pool when one is configured"""
+    context = report_context(document)
+    processes = app.config.get('REPORT_RENDER_PROCESSES', 0)
+    if processes > 0:
+        # Check availability in this process first, so a missing dependency fails fast
+        _load_assets()
+        return get_render_pool(processes).submit(render_report, context).result()
+    return render_report(context)
+
+def get_report_pdf_path(app, document):
+    """Path of the report PDF, rendering it only once per document review and annotations"""
+    # The annotations in the path must be the real ones, not an archived row's empty columns
+    restore_payload(document)
+    path = report_pdf_path(app.config['REPORT_FOLDER'], document)
+    if not os.path.exists(path):
+        pdf = render_report_pdf(app, document)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(pdf)
+        os.replace(tmp_path, path)
+        logger.info(f"Rendered report PDF for document {document.id}")
+    return path
+
+def get_report_pdf(app, document):
+    """Report PDF bytes, rendered once per document review"""
+    with open(get_report_pdf_path(app, document), 'rb') as f:
+        return f.read()
+
+def init_report_renderer(app):
+    """Prepare the folder that caches rendered report PDFs"""
+    os.makedirs(app.config['REPORT_FOLDER'], exist_ok=True)
+    logger.info(f"Report renderer configured ({app.config.get('REPORT_RENDER_PROCESSES', 0)} render processes)")
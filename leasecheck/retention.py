@@ -0,0 +1,350 @@
+import os
+import sys
+import glob
+import gzip
+import json
+import uuid
+import shutil
+import logging
+import argparse
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import update, or_, and_
+from .database import db
+from .models import Document, DocumentArchive
+from .text_extraction import page_cache_path
+from .app import register_background_worker
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+COPY_CHUNK_SIZE = 1024 * 1024  # 1 MB
+# Columns moved to document_archives, only reports and re-analysis read them
+PAYLOAD_COLUMNS = ('risk_factors', 'annotations', 'section_index')
+# Documents still queued or being analyzed are never touched
+FINISHED_STATUSES = ('processed', 'error')
+
+def _aged(cutoff):
+    """Uploaded before the cutoff and not brought back from the archive since"""
+    return and_(
+        Document.upload_date < cutoff,
+        or_(Document.restored_at.is_(None), Document.restored_at < cutoff)
+    )
+
+def _batches(query, batch_size):
+    """Yield rows of an id-ordered query in keyset batches, each read in its own short transaction"""
+    last_id = 0
+    while True:
+        rows = query.filter(Document.id > last_id).order_by(Document.id).limit(batch_size).all()
+        # End the read transaction before any file work, so no lock is held meanwhile
+        db.session.commit()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def _upload_path(app, stored_filename):
+    return os.path.join(app.config['UPLOAD_FOLDER'], stored_filename)
+
+def _archive_path(app, archive_name):
+    return os.path.join(app.config['ARCHIVE_FOLDER'], archive_name)
+
+def _remove_report_pdfs(app, document_id):
+    for path in glob.glob(os.path.join(app.config['REPORT_FOLDER'], f"risk_report_{document_id}_*.pdf")):
+        _remove(path)
+
+def _tmp_path(target):
+    # Unique per writer, several worker processes may each run the retention job
+    return f"{target}.{uuid.uuid4().hex}.tmp"
+
+def compress_file(source, target):
+    """Gzip a file to target through a temporary file, synced before it replaces target"""
+    tmp_path = _tmp_path(target)
+    try:
+        with open(source, 'rb') as src, open(tmp_path, 'wb') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp_path, target)
+    except BaseException:
+        _remove(tmp_path)
+        raise
+
+def decompress_file(source, target):
+    """Expand a gzip archive back to target through a temporary file"""
+    tmp_path = _tmp_path(target)
+    try:
+        with gzip.open(source, 'rb') as src, open(tmp_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+        os.replace(tmp_path, target)
+    except BaseException:
+        _remove(tmp_path)
+        raise
+
+def archive_files(app, days, batch_size=100, dry_run=False):
+    """Compress uploads older than days into ARCHIVE_FOLDER, returning the number archived"""
+    os.makedirs(app.config['ARCHIVE_FOLDER'], exist_ok=True)
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    query = db.session.query(Document.id, Document.file_path).filter(
+        Document.storage_tier == 'hot',
+        Document.status.in_(FINISHED_STATUSES),
+        Document.file_path.isnot(None),
+        _aged(cutoff)
+    )
+    archived = 0
+    for rows in _batches(query, batch_size):
+        done = []
+        for document_id, stored_filename in rows:
+            source = _upload_path(app, stored_filename)
+            archive_name = f"{stored_filename}.gz"
+            target = _archive_path(app, archive_name)
+            if not os.path.isfile(source):
+                # Compressed by a run that stopped before recording it, or never stored at all
+                if os.path.isfile(target):
+                    done.append((document_id, archive_name, None))
+                continue
+            if dry_run:
+                archived += 1
+                continue
+            try:
+                compress_file(source, target)
+            except Exception as e:
+                logger.error(f"Error archiving document {document_id}: {str(e)}")
+                continue
+            done.append((document_id, archive_name, source))
+
+        for document_id, archive_name, _ in done:
+            # Conditional, a document restored meanwhile keeps its hot copy
+            archived += db.session.execute(
+                update(Document)
+                .where(Document.id == document_id, Document.storage_tier == 'hot')
+                .values(storage_tier='archived', archive_path=archive_name)
+            ).rowcount
+        db.session.commit()
+        # Originals go only once the archived state is committed
+        for document_id, _, source in done:
+            if source:
+                _remove(source)
+            _remove_report_pdfs(app, document_id)
+    return archived
+
+def archive_payloads(app, days, batch_size=100, dry_run=False):
+    """Move the JSON analysis columns of documents older than days to document_archives"""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    query = Document.query.filter(
+        Document.payload_archived_at.is_(None),
+        Document.storage_tier != 'purged',
+        Document.status.in_(FINISHED_STATUSES),
+        _aged(cutoff)
+    )
+    archived = 0
+    for documents in _batches(query, batch_size):
+        if dry_run:
+            archived += len(documents)
+            continue
+        now = datetime.utcnow()
+        for document in documents:
+            payload = {column: getattr(document, column) for column in PAYLOAD_COLUMNS}
+            # merge, a row left by an earlier restore that failed to delete it is overwritten
+            db.session.merge(DocumentArchive(
+                document_id=document.id,
+                payload=gzip.compress(json.dumps(payload, separators=(',', ':')).encode('utf-8')),
+                archived_at=now
+            ))
+            for column in PAYLOAD_COLUMNS:
+                setattr(document, column, None)
+            document.payload_archived_at = now
+        try:
+            db.session.commit()
+            archived += len(documents)
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error archiving analysis payloads: {str(e)}")
+    return archived
+
+def _remove_text_cache(app, content_hashes):
+    """Drop cached page text no longer shared with a kept document"""
+    if not content_hashes:
+        return
+    kept = {
+        content_hash for content_hash, in db.session.query(Document.content_hash).filter(
+            Document.content_hash.in_(content_hashes), Document.storage_tier != 'purged'
+        )
+    }
+    db.session.commit()
+    for content_hash in content_hashes - kept:
+        folder = os.path.dirname(page_cache_path(app.config['TEXT_CACHE_FOLDER'], content_hash, 1))
+        shutil.rmtree(folder, ignore_errors=True)
+
+def purge_documents(app, days, batch_size=100, dry_run=False):
+    """Delete the files and analysis of documents older than days, keeping the row as a tombstone"""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    query = db.session.query(
+        Document.id, Document.file_path, Document.archive_path, Document.content_hash
+    ).filter(
+        Document.storage_tier != 'purged',
+        Document.status.in_(FINISHED_STATUSES),
+        _aged(cutoff)
+    )
+    purged = 0
+    for rows in _batches(query, batch_size):
+        if dry_run:
+            purged += len(rows)
+            continue
+        ids = [row.id for row in rows]
+        db.session.query(DocumentArchive).filter(DocumentArchive.document_id.in_(ids)).delete(
+            synchronize_session=False
+        )
+        # The row stays so payments, usage and batches keep their references
+        purged += db.session.execute(
+            update(Document)
+            .where(Document.id.in_(ids), Document.storage_tier != 'purged')
+            .values(
+                storage_tier='purged', archive_path=None, payload_archived_at=None,
+                **{column: None for column in PAYLOAD_COLUMNS}
+            )
+        ).rowcount
+        db.session.commit()
+        for row in rows:
+            if row.file_path:
+                _remove(_upload_path(app, row.file_path))
+            if row.archive_path:
+                _remove(_archive_path(app, row.archive_path))
+            _remove_report_pdfs(app, row.id)
+        _remove_text_cache(app, {row.content_hash for row in rows if row.content_hash})
+    return purged
+
+def restore_payload(document):
+    """Bring a document's archived analysis back into its row, returning whether it was archived"""
+    if document.payload_archived_at is None:
+        return False
+    archive = db.session.get(DocumentArchive, document.id)
+    if archive is not None:
+        payload = json.loads(gzip.decompress(archive.payload))
+        for column in PAYLOAD_COLUMNS:
+            setattr(document, column, payload.get(column))
+        db.session.delete(archive)
+    document.payload_archived_at = None
+    document.restored_at = datetime.utcnow()
+    try:
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error restoring analysis of document {document.id}: {str(e)}")
+        raise
+    logger.info(f"Restored archived analysis of document {document.id}")
+    return True
+
+def restore_file(document):
+    """Decompress an archived upload back into UPLOAD_FOLDER, returning its path or None"""
+    if document.storage_tier != 'archived' or not document.archive_path:
+        return None
+    app = current_app._get_current_object()
+    source = _archive_path(app, document.archive_path)
+    target = _upload_path(app, document.file_path)
+    try:
+        decompress_file(source, target)
+    except Exception as e:
+        logger.error(f"Error restoring file of document {document.id}: {str(e)}")
+        return None
+    db.session.execute(
+        update(Document)
+        .where(Document.id == document.id, Document.storage_tier == 'archived')
+        .values(storage_tier='hot', archive_path=None, restored_at=datetime.utcnow())
+    )
+    db.session.commit()
+    _remove(source)
+    db.session.refresh(document)
+    logger.info(f"Restored archived file of document {document.id}")
+    return target
+
+def restore_document(document):
+    """Make an archived document fully hot again before it is re-analyzed"""
+    restore_payload(document)
+    restore_file(document)
+
+def remove_archived_copies(document):
+    """Delete a document's archive file and payload row ahead of deleting the document"""
+    if document.archive_path:
+        _remove(_archive_path(current_app._get_current_object(), document.archive_path))
+    db.session.query(DocumentArchive).filter_by(document_id=document.id).delete(synchronize_session=False)
+
+def run_retention(app, dry_run=False):
+    """Apply every configured retention step once, returning the documents each step moved"""
+    batch_size = app.config['RETENTION_BATCH_SIZE']
+    counts = {}
+    with app.app_context():
+        try:
+            if app.config['PURGE_AFTER_DAYS'] > 0:
+                # Purge first, so nothing is archived only to be deleted moments later
+                counts['purged'] = purge_documents(app, app.config['PURGE_AFTER_DAYS'], batch_size, dry_run)
+            if app.config['ARCHIVE_AFTER_DAYS'] > 0:
+                counts['files_archived'] = archive_files(app, app.config['ARCHIVE_AFTER_DAYS'], batch_size, dry_run)
+            if app.config['PAYLOAD_ARCHIVE_AFTER_DAYS'] > 0:
+                counts['payloads_archived'] = archive_payloads(
+                    app, app.config['PAYLOAD_ARCHIVE_AFTER_DAYS'], batch_size, dry_run
+                )
+        finally:
+            db.session.remove()
+    logger.info(f"Retention run{' (dry run)' if dry_run else ''}: {counts}")
+    return counts
+
+class RetentionWorker:
+    """Background thread that applies the retention policy every interval"""
+
+    def __init__(self, app, interval):
+        self.app = app
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self.run, name='retention', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                run_retention(self.app)
+            except Exception as e:
+                logger.error(f"Error applying retention policy: {str(e)}")
+
+_worker = None
+
+def start_retention_worker(app):
+    global _worker
+    if _worker is None:
+        _worker = RetentionWorker(app, app.config['RETENTION_INTERVAL'])
+        _worker.start()
+        logger.info("Retention worker started")
+
+def init_retention(app):
+    """Schedule the in-process retention job if enabled"""
+    if app.config['RETENTION_WORKER']:
+        register_background_worker(app, start_retention_worker)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Document retention tiering')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    run_parser = subparsers.add_parser('run', help='Archive and purge documents past their retention age')
+    run_parser.add_argument('--dry-run', action='store_true', help='Only count the documents each step would move')
+    args = parser.parse_args(argv)
+
+    from .app import create_app
+    counts = run_retention(create_app(), dry_run=args.dry_run)
+    print(json.dumps(counts, indent=2))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
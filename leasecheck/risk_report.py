@@ -0,0 +1,124 @@
+import json
+import gzip
+import hashlib
+import logging
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+from .cache import cache, clear_document_cache
+from .models import Document
+from .retention import restore_payload
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+RISK_REPORT_TIMEOUT = 3600  # 1 hour, entries are invalidated on re-review anyway
+
+# Fields returned when the client does not ask for specific ones
+DEFAULT_FIELDS = ('riskLevel', 'findings', 'recommendations')
+AVAILABLE_FIELDS = DEFAULT_FIELDS + ('document', 'annotations')
+
+# Payloads smaller than this are not worth compressing
+GZIP_MIN_SIZE = 1024
+
+# Document columns whose change means the report must be rebuilt
+REPORT_COLUMNS = ('risk_level', 'risk_factors', 'annotations', 'last_reviewed', 'review_status')
+
+def parse_fields(raw):
+    """Parse a comma separated field list, returning None if any field is unknown"""
+    if not raw:
+        return DEFAULT_FIELDS
+    fields = tuple(sorted({field.strip() for field in raw.split(',') if field.strip()}))
+    if not fields or any(field not in AVAILABLE_FIELDS for field in fields):
+        return None
+    return fields
+
+def risk_report_cache_key(document_id, fields):
+    """Cache key per document and field set, matched by clear_document_cache"""
+    return f"doc_{document_id}_risk_report_{'-'.join(fields)}"
+
+def _resolved_ids(annotations):
+    if isinstance(annotations, dict):
+        return {str(i) for i in annotations.get('resolved', [])}
+    return set()
+
+def build_risk_report(document, fields=DEFAULT_FIELDS):
+    """Build the risk report payload for a document"""
+    factors = document.risk_factors or []
+    resolved = _resolved_ids(document.annotations)
+    payload = {}
+
+    if 'riskLevel' in fields:
+        payload['riskLevel'] = (document.risk_level or 'unknown').capitalize()
+    if 'findings' in fields:
+        payload['findings'] = [
+            {
+                'id': factor.get('id', index),
+                'severity': factor.get('severity', 'info'),
+                'title': factor.get('title', ''),
+                'description': factor.get('description', ''),
+                'resolved': str(factor.get('id', index)) in resolved
+            }
+            for index, factor in enumerate(factors, 1)
+        ]
+    if 'recommendations' in fields:
+        payload['recommendations'] = [
+            {'title': factor.get('title', ''), 'description': factor['recommendation']}
+            for factor in factors
+            if factor.get('recommendation')
+        ]
+    if 'document' in fields:
+        payload['document'] = {
+            'id': document.id,
+            'filename': document.original_filename,
+            'reviewStatus': document.review_status,
+            'lastReviewed': document.last_reviewed.isoformat() if document.last_reviewed else None
+        }
+    if 'annotations' in fields:
+        payload['annotations'] = document.annotations or {}
+    return payload
+
+def encode_payload(payload):
+    """Serialize once into compact JSON, with a gzip variant and ETag"""
+    body = json.dumps(payload, separators=(',', ':'), sort_keys=True).encode('utf-8')
+    return {
+        'json': body,
+        'gzip': gzip.compress(body, compresslevel=6) if len(body) >= GZIP_MIN_SIZE else None,
+        'etag': hashlib.sha256(body).hexdigest()[:32]
+    }
+
+def get_risk_report(document_id, fields=DEFAULT_FIELDS):
+    """Get the encoded risk report for a document, building and caching it on a miss"""
+    key = risk_report_cache_key(document_id, fields)
+    encoded = cache.get(key)
+    if encoded is not None:
+        return encoded
+
+    document = Document.query.get(document_id)
+    if document is None or document.storage_tier == 'purged':
+        return None
+    restore_payload(document)
+    encoded = encode_payload(build_risk_report(document, fields))
+    cache.set(key, encoded, timeout=RISK_REPORT_TIMEOUT)
+    return encoded
+
+@event.listens_for(Document, 'after_update')
+def invalidate_risk_report(mapper, connection, target):
+    """Note documents whose report changed, their cache entries go once the change commits"""
+    state = inspect(target)
+    if any(state.attrs[column].history.has_changes() for column in REPORT_COLUMNS):
+        # Clearing now, at flush time, would let a concurrent request cache the old row again
+        object_session(target).info.setdefault('stale_risk_reports', set()).add(target.id)
+
+@event.listens_for(Session, 'after_commit')
+def clear_stale_risk_reports(session):
+    """Drop the cached reports of documents changed by the committed transaction"""
+    for document_id in session.info.pop('stale_risk_reports', ()):
+        try:
+            clear_document_cache(document_id)
+        except Exception as e:
+            logger.error(f"Error invalidating risk report for document {document_id}: {str(e)}")
+
+@event.listens_for(Session, 'after_rollback')
+def forget_stale_risk_reports(session):
+    # Nothing changed, the cached reports are still current
+    session.info.pop('stale_risk_reports', None)
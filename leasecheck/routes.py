@@ -1,14 +1,33 @@
 import os
-from flask import Blueprint, render_template, redirect, url_for, flash, request, send_file, jsonify, session, current_app, make_response
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, session, current_app, send_from_directory, send_file, abort, stream_with_context
 from .database import db, safe_transaction, DatabaseError, retry_on_operational_error
 from .forms import TermsAcceptanceForm
-from .models import TermsAcceptance, Payment, AdminUser, Document, SupportTicket
+from .models import TermsAcceptance, Payment, AdminUser, Document, SupportTicket, AnalysisBatch
+from .risk_report import parse_fields, get_risk_report
+from .report_delivery import enqueue_report_delivery
+from .report_renderer import get_report_pdf_path, remove_stale_report_pdfs, RendererUnavailable
+from .analysis import (
+    register_upload, discard_upload, start_analysis, analysis_progress, progress_event,
+    FINAL_STATUSES, KEEPALIVE_EVENT, KEEPALIVE_INTERVAL
+)
+from .entitlements import remaining_analyses, consume_analyses, entitlement_summary, QuotaExceeded
+from .attorneys import get_attorney_index, search_attorneys, MAX_RESULTS
+from .search import search, SOURCES as SEARCH_KINDS, SearchUnavailable
+from .stripe_events import verify_signature, record_event, create_payment_intent, SignatureVerificationError
+from .app import csrf
+from .sessions import rotate_session
+from .rate_limit import rate_limit
+from .terms import terms_required, record_acceptance, has_accepted, session_email, safe_next_url
+from .profiling import list_profiles, generate_profile_token
+from .downloads import resolve_upload_path, get_document_etag, send_document
+from .retention import restore_payload, remove_archived_copies
 from .cache import (
     cache, clear_all_caches, clear_cache_by_key, clear_cache_by_pattern,
     clear_user_cache, clear_document_cache, clear_plan_cache, clear_admin_cache,
     get_cache_stats, cached_with_key
 )
 from datetime import datetime, timedelta
+import time
 import logging
 from werkzeug.utils import secure_filename
 import uuid
@@ -16,6 +35,7 @@ from jinja2.exceptions import TemplateNotFound
 from flask_wtf import FlaskForm
 from wtforms import FileField, StringField, SelectField, TextAreaField
 from wtforms.validators import DataRequired, Email
+from email_validator import validate_email, EmailNotValidError
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -97,8 +117,7 @@ class LeaseUploadForm(FlaskForm):
 def index():
     """Landing page route"""
     try:
-        response = make_response(render_template('components/welcome/welcome.html'))
-        return add_security_headers(response)
+        return render_template('components/welcome/welcome.html')
     except Exception as e:
         logger.error(f"Error rendering index page: {str(e)}")
         return "Error loading page", 500
@@ -106,20 +125,17 @@ def index():
 @bp.route('/onboarding')
 def onboarding():
     """Onboarding page route"""
-    response = make_response(render_template('components/onboarding/onboarding.html'))
-    return add_security_headers(response)
+    return render_template('components/onboarding/onboarding.html')
 
 @bp.route('/select-plan')
 def select_plan():
     """Select plan page route"""
-    response = make_response(render_template('components/select_plan/select_plan.html', plans=PLANS))
-    return add_security_headers(response)
+    return render_template('components/select_plan/select_plan.html', plans=PLANS)
 
 @bp.route('/account-setup')
 def account_setup():
     """Account setup page route"""
-    response = make_response(render_template('components/account_setup/account_setup.html'))
-    return add_security_headers(response)
+    return render_template('components/account_setup/account_setup.html')
 
 @bp.route('/preview/<component_name>')
 def preview_component(component_name):
@@ -220,7 +236,7 @@ def preview_component(component_name):
                 }
             })
         
-        response = make_response(render_template(
+        return render_template(
             'preview.html',
             component_name=component_name,
             component_template=component_template,
@@ -229,9 +245,7 @@ def preview_component(component_name):
             available_components=available_components,
             port=port,
             **extra_data
-        ))
-        
-        return add_security_headers(response)
+        )
     
     except TemplateNotFound as e:
         logger.error(f"Template not found: {str(e)}")
@@ -242,23 +256,229 @@ def preview_component(component_name):
         flash('Error rendering component preview', 'error')
         return redirect(url_for('main.index'))
 
+@bp.route('/api/risk-report')
+def api_risk_report():
+    """Risk report payload for the current (or an explicitly requested) document"""
+    document_id = request.args.get('document_id', type=int) or session.get('document_id')
+    if not document_id:
+        return jsonify({'error': 'No document selected'}), 404
+    if document_id != session.get('document_id') and 'admin_id' not in session:
+        return jsonify({'error': 'Document not found'}), 404
+
+    fields = parse_fields(request.args.get('fields'))
+    if fields is None:
+        return jsonify({'error': 'Unknown field requested'}), 400
+
+    report = get_risk_report(document_id, fields)
+    if report is None:
+        return jsonify({'error': 'Document not found'}), 404
+
+    if report['gzip'] is not None and request.accept_encodings['gzip'] > 0:
+        response = current_app.response_class(report['gzip'], mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = current_app.response_class(report['json'], mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    response.set_etag(report['etag'])
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@bp.route('/api/document-progress')
+def api_document_progress():
+    """Analysis progress of the current (or an explicitly requested) document"""
+    document_id = request.args.get('document_id', type=int) or session.get('document_id')
+    if not document_id:
+        return jsonify({'error': 'No document selected'}), 404
+    if document_id != session.get('document_id') and 'admin_id' not in session:
+        return jsonify({'error': 'Document not found'}), 404
+    document = Document.query.get(document_id)
+    if document is None:
+        return jsonify({'error': 'Document not found'}), 404
+    response = jsonify(analysis_progress(document))
+    response.cache_control.no_store = True
+    return response
+
+@bp.route('/api/document-progress/stream')
+def api_document_progress_stream():
+    """Analysis progress pushed as server-sent events until the review finishes"""
+    document_id = request.args.get('document_id', type=int) or session.get('document_id')
+    if not document_id:
+        return jsonify({'error': 'No document selected'}), 404
+    if document_id != session.get('document_id') and 'admin_id' not in session:
+        return jsonify({'error': 'Document not found'}), 404
+    interval = current_app.config['PROGRESS_STREAM_INTERVAL']
+    deadline = time.monotonic() + current_app.config['PROGRESS_STREAM_TIMEOUT']
+
+    @stream_with_context
+    def generate():
+        # Holds a worker thread for the whole review, the ASGI entry point serves
+        # this path without one (leasecheck.asgi)
+        last, last_sent = None, time.monotonic()
+        while True:
+            document = db.session.get(Document, document_id)
+            if document is None:
+                return
+            progress = analysis_progress(document)
+            # End the read, so the next poll sees the analysis worker's commits
+            db.session.rollback()
+            if progress != last:
+                yield progress_event(progress)
+                last, last_sent = progress, time.monotonic()
+            elif time.monotonic() - last_sent >= KEEPALIVE_INTERVAL:
+                yield KEEPALIVE_EVENT
+                last_sent = time.monotonic()
+            if progress['status'] in FINAL_STATUSES or time.monotonic() >= deadline:
+                return
+            time.sleep(interval)
+
+    response = current_app.response_class(generate(), mimetype='text/event-stream')
+    response.cache_control.no_store = True
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@bp.route('/toggle-error-resolved/<int:error_id>', methods=['POST'])
+def toggle_error_resolved(error_id):
+    """Mark a finding of the current document as resolved, or unresolved again"""
+    document_id = session.get('document_id')
+    document = Document.query.get(document_id) if document_id else None
+    if document is None:
+        return jsonify({'success': False, 'message': 'No document selected'}), 404
+    restore_payload(document)
+    if not any(factor.get('id') == error_id for factor in document.risk_factors or []):
+        return jsonify({'success': False, 'message': 'Issue not found'}), 404
+
+    annotations = dict(document.annotations or {})
+    resolved = set(annotations.get('resolved', []))
+    resolved.symmetric_difference_update({error_id})
+    annotations['resolved'] = sorted(resolved)
+    document.annotations = annotations
+    try:
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error updating resolved issues for document {document_id}: {str(e)}")
+        return jsonify({'success': False, 'message': 'Error updating issue'}), 500
+    remove_stale_report_pdfs(current_app._get_current_object(), document)
+    return jsonify({'success': True, 'resolved': error_id in resolved})
+
+@bp.route('/api/risk-report.pdf')
+def api_risk_report_pdf():
+    """PDF export of the current document's risk report"""
+    document_id = session.get('document_id')
+    document = Document.query.get(document_id) if document_id else None
+    if document is None:
+        return jsonify({'error': 'No document selected'}), 404
+
+    try:
+        path = get_report_pdf_path(current_app._get_current_object(), document)
+    except RendererUnavailable as e:
+        logger.error(f"Error rendering report PDF: {str(e)}")
+        return jsonify({'error': 'PDF export is not available'}), 503
+
+    base_name = os.path.splitext(document.original_filename)[0]
+    response = send_file(path, as_attachment=True, download_name=f"{base_name}_risk_report.pdf",
+                         conditional=True, max_age=0)
+    response.cache_control.private = True
+    return response
+
+@bp.route('/api/attorneys')
+@rate_limit('search', methods=('GET',))
+def api_attorneys():
+    """Nearest attorneys to a location, one page at a time"""
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = min(50, max(1, request.args.get('per_page', 12, type=int)))
+    if page * per_page > MAX_RESULTS:
+        return jsonify({'error': f"Only the nearest {MAX_RESULTS} attorneys can be listed"}), 400
+    max_km = request.args.get('radius_km', type=float)
+
+    try:
+        index = get_attorney_index()
+        latitude = request.args.get('lat', type=float)
+        longitude = request.args.get('lng', type=float)
+        if latitude is None or longitude is None:
+            location = index.locate(request.args.get('location', ''))
+            if location is None:
+                return jsonify({'error': 'Location not found', 'results': []}), 404
+            latitude, longitude = location
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            return jsonify({'error': 'Invalid coordinates'}), 400
+        result = search_attorneys(
+            latitude, longitude, specialty=request.args.get('specialty') or None,
+            page=page, per_page=per_page, max_km=max_km
+        )
+    except Exception as e:
+        logger.error(f"Error searching attorneys: {str(e)}")
+        return jsonify({'error': 'Error searching attorneys'}), 500
+
+    response = jsonify(result)
+    response.cache_control.public = True
+    response.cache_control.max_age = 300
+    return response
+
+@bp.route('/api/attorneys/specialties')
+def api_attorney_specialties():
+    """Specialties present in the attorney directory"""
+    try:
+        index = get_attorney_index()
+    except Exception as e:
+        logger.error(f"Error loading attorney specialties: {str(e)}")
+        return jsonify({'error': 'Error loading specialties'}), 500
+    response = jsonify({'specialties': sorted(index.specialties.values())})
+    response.cache_control.public = True
+    response.cache_control.max_age = 300
+    return response
+
 # Add new routes for Review Flow Components
 @bp.route('/save-report', methods=['GET', 'POST'])
 def save_report():
     """Save report page route"""
     if request.method == 'POST':
-        email = request.form.get('email')
-        name = request.form.get('name')
-        # TODO: Implement report saving logic
-        return jsonify({'success': True, 'message': 'Report saved successfully'})
-    response = make_response(render_template('components/save_report/save_report.html'))
-    return add_security_headers(response)
+        return queue_report_delivery()
+    return render_template(
+        'components/save_report/save_report.html',
+        component_name='save_report',
+        component_title='Save Report',
+        header_title='Save Your Report',
+        email=session_email()
+    )
+
+@bp.route('/api/save-report', methods=['POST'])
+@rate_limit('email')
+def api_save_report():
+    """Queue the current risk report for email delivery"""
+    return queue_report_delivery()
+
+def queue_report_delivery():
+    """Validate a save-report submission and add it to the delivery outbox"""
+    data = request.get_json(silent=True) or request.form
+    email = (data.get('email') or '').strip()
+    name = (data.get('name') or '').strip() or None
+    document_id = session.get('document_id')
+
+    if not document_id:
+        return jsonify({'success': False, 'message': 'No report to send'}), 400
+    try:
+        email = validate_email(email, check_deliverability=False).normalized
+    except EmailNotValidError:
+        return jsonify({'success': False, 'message': 'Please enter a valid email address'}), 400
+
+    try:
+        enqueue_report_delivery(document_id, email, name)
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error queuing report delivery: {str(e)}")
+        return jsonify({'success': False, 'message': 'Error saving report'}), 500
+
+    if request.is_json:
+        return jsonify({'success': True, 'message': 'Report queued for delivery',
+                        'redirect': url_for('main.report_sent')})
+    return redirect(url_for('main.report_sent'))
 
 @bp.route('/report-sent')
 def report_sent():
     """Report sent confirmation page route"""
-    response = make_response(render_template('components/report_sent/report_sent.html'))
-    return add_security_headers(response)
+    return render_template('components/report_sent/report_sent.html')
 
 @bp.route('/thank-you')
 def thank_you():
@@ -271,23 +491,24 @@ def thank_you():
             'Contact a local attorney if needed'
         ]
     }
-    response = make_response(render_template('components/thank_you/thank_you.html', **extra_data))
-    return add_security_headers(response)
+    return render_template('components/thank_you/thank_you.html', **extra_data)
 
 @bp.route('/legal-stuff')
 def legal_stuff():
     """Legal information page route"""
-    response = make_response(render_template('components/legal_stuff/legal_stuff.html'))
-    return add_security_headers(response)
+    return render_template(
+        'components/legal_stuff/legal_stuff.html',
+        form=TermsAcceptanceForm(email=session_email()),
+        next_url=request.args.get('next')
+    )
 
 @bp.route('/preview/legal_stuff')
 def preview_legal_stuff():
     """Preview the legal_stuff component"""
-    response = make_response(render_template('preview.html',
+    return render_template('preview.html',
                            component_name='legal_stuff',
                            component_template='components/legal_stuff/legal_stuff.html',
-                           available_components=get_available_components()))
-    return add_security_headers(response)
+                           available_components=get_available_components())
 
 @bp.route('/admin/settings')
 def admin_settings():
@@ -295,8 +516,7 @@ def admin_settings():
     if 'admin_id' not in session:
         return redirect(url_for('main.login'))
     admin_user = AdminUser.query.get(session['admin_id'])
-    response = make_response(render_template('admin_settings.html', admin_user=admin_user))
-    return add_security_headers(response)
+    return render_template('admin_settings.html', admin_user=admin_user)
 
 @bp.route('/admin/settings/update', methods=['POST'])
 def admin_settings_update():
@@ -321,8 +541,7 @@ def admin_users():
     if 'admin_id' not in session:
         return redirect(url_for('main.login'))
     users = AdminUser.query.all()
-    response = make_response(render_template('admin_users.html', users=users))
-    return add_security_headers(response)
+    return render_template('admin_users.html', users=users)
 
 @bp.route('/admin/users/add', methods=['POST'])
 def admin_users_add():
@@ -363,8 +582,7 @@ def admin_documents():
     if 'admin_id' not in session:
         return redirect(url_for('main.login'))
     documents = Document.query.all()
-    response = make_response(render_template('admin_documents.html', documents=documents))
-    return add_security_headers(response)
+    return render_template('admin_documents.html', documents=documents)
 
 @bp.route('/admin/documents/add', methods=['POST'])
 def admin_documents_add():
@@ -397,6 +615,7 @@ def admin_documents_delete(document_id):
     if document:
         if os.path.exists(os.path.join(current_app.config['UPLOAD_FOLDER'], document.file_path)):
             os.remove(os.path.join(current_app.config['UPLOAD_FOLDER'], document.file_path))
+        remove_archived_copies(document)
         db.session.delete(document)
         db.session.commit()
         flash('Document deleted successfully', 'success')
@@ -411,8 +630,7 @@ def admin_support():
     if 'admin_id' not in session:
         return redirect(url_for('main.login'))
     tickets = SupportTicket.query.all()
-    response = make_response(render_template('admin_support.html', tickets=tickets))
-    return add_security_headers(response)
+    return render_template('admin_support.html', tickets=tickets)
 
 @bp.route('/admin/support/mark-resolved/<int:ticket_id>')
 def admin_support_mark_resolved(ticket_id):
@@ -444,19 +662,86 @@ def admin_support_delete(ticket_id):
         flash('Error deleting ticket', 'error')
         return redirect(url_for('main.admin_support'))
 
+def run_admin_search():
+    """Admin search over the request's q, kind and page arguments"""
+    kind = request.args.get('kind') or None
+    if kind not in SEARCH_KINDS:
+        kind = None
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = min(100, max(1, request.args.get('per_page', 20, type=int)))
+    return search(request.args.get('q', ''), kind=kind, page=page, per_page=per_page)
+
+@bp.route('/admin/search')
+def admin_search():
+    """Search documents, support tickets and transactions"""
+    if 'admin_id' not in session:
+        return redirect(url_for('main.login'))
+    try:
+        result = run_admin_search()
+    except Exception as e:
+        logger.error(f"Error running admin search: {str(e)}")
+        flash('Search is not available', 'error')
+        result = None
+    return render_template('admin/search.html', result=result, kinds=sorted(SEARCH_KINDS),
+                           query=request.args.get('q', ''), kind=request.args.get('kind', ''))
+
+@bp.route('/admin/api/search')
+def admin_api_search():
+    """Ranked, paginated admin search as JSON"""
+    if 'admin_id' not in session:
+        return jsonify({'error': 'Admin login required'}), 401
+    try:
+        result = run_admin_search()
+    except SearchUnavailable as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        logger.error(f"Error running admin search: {str(e)}")
+        return jsonify({'error': 'Error running search'}), 500
+    response = jsonify(result)
+    response.cache_control.no_store = True
+    return response
+
+@bp.route('/admin/profiles')
+def admin_profiles():
+    """List captured request profiles"""
+    if 'admin_id' not in session:
+        return redirect(url_for('main.login'))
+    if not current_app.config.get('PROFILING_ENABLED'):
+        return jsonify({'enabled': False, 'profiles': []})
+    profiles = list_profiles(current_app.config['PROFILING_DIR'])
+    for profile in profiles:
+        profile['download_url'] = url_for('main.admin_profile_download', name=profile['name'])
+    return jsonify({
+        'enabled': True,
+        'mode': current_app.config['PROFILING_MODE'],
+        'sample_rate': current_app.config['PROFILING_SAMPLE_RATE'],
+        'token': generate_profile_token(),
+        'profiles': profiles
+    })
+
+@bp.route('/admin/profiles/<name>')
+def admin_profile_download(name):
+    """Download a captured request profile"""
+    if 'admin_id' not in session:
+        return redirect(url_for('main.login'))
+    if not current_app.config.get('PROFILING_ENABLED'):
+        abort(404)
+    return send_from_directory(current_app.config['PROFILING_DIR'], name, as_attachment=True, max_age=0)
+
 @bp.route('/admin/login')
 def admin_login():
     """Admin login page"""
-    response = make_response(render_template('admin_login.html'))
-    return add_security_headers(response)
+    return render_template('admin_login.html')
 
 @bp.route('/admin/login', methods=['POST'])
+@rate_limit('auth')
 def admin_login_post():
     """Process admin login"""
     email = request.form.get('email')
     password = request.form.get('password')
     admin_user = AdminUser.query.filter_by(email=email).first()
     if admin_user and admin_user.check_password(password):
+        rotate_session(session)
         session['admin_id'] = admin_user.id
         flash('Login successful', 'success')
         return redirect(url_for('main.admin_settings'))
@@ -474,14 +759,15 @@ def admin_logout():
 @bp.route('/documents/<filename>')
 def download_document(filename):
     """Download a document"""
-    file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-    if os.path.exists(file_path):
-        return send_file(file_path, as_attachment=True)
+    file_path = resolve_upload_path(filename)
+    if file_path:
+        return send_document(file_path, etag=get_document_etag(filename, file_path))
     else:
         flash('File not found', 'error')
         return redirect(url_for('main.index'))
 
 @bp.route('/support', methods=['GET', 'POST'])
+@rate_limit('forms')
 def support():
     """Support ticket submission page"""
     if 'user_id' not in session:
@@ -497,14 +783,12 @@ def support():
             return redirect(url_for('main.support'))
         else:
             flash('Please fill in all fields', 'error')
-    response = make_response(render_template('support.html'))
-    return add_security_headers(response)
+    return render_template('support.html')
 
 @bp.route('/plans')
 def plans():
     """Plans page"""
-    response = make_response(render_template('plans.html', plans=PLANS))
-    return add_security_headers(response)
+    return render_template('plans.html', plans=PLANS)
 
 @bp.route('/payment/<plan_name>')
 def payment(plan_name):
@@ -513,8 +797,7 @@ def payment(plan_name):
         return redirect(url_for('main.login'))
     plan = PLANS.get(plan_name)
     if plan:
-        response = make_response(render_template('payment.html', plan=plan))
-        return add_security_headers(response)
+        return render_template('payment.html', plan=plan)
     else:
         flash('Invalid plan selected', 'error')
         return redirect(url_for('main.plans'))
@@ -526,17 +809,69 @@ def payment_success(plan_name):
         return redirect(url_for('main.login'))
     plan = PLANS.get(plan_name)
     if plan:
-        new_payment = Payment(user_id=session['user_id'], plan_name=plan_name, amount=plan['price'], timestamp=datetime.now())
-        db.session.add(new_payment)
-        db.session.commit()
-        flash('Payment successful! You can now access your selected plan.', 'success')
-        response = make_response(render_template('payment_success.html', plan=plan))
-        return add_security_headers(response)
+        # Payments are recorded from Stripe webhooks; the redirect only reports the outcome
+        payment_intent = request.args.get('payment_intent')
+        payment = Payment.query.filter_by(stripe_payment_id=payment_intent).first() if payment_intent else None
+        outcome = payment.status if payment else request.args.get('redirect_status', 'succeeded')
+        if outcome in ('succeeded', 'processing'):
+            return render_template('payment_status.html', plan=plan, status='success')
+        return render_template('payment_status.html', plan=plan, status='error')
     else:
         flash('Invalid plan selected', 'error')
         return redirect(url_for('main.plans'))
 
+@bp.route('/webhooks/stripe', methods=['POST'])
+@csrf.exempt
+def stripe_webhook():
+    """Verify a Stripe webhook and append it to the event inbox"""
+    secret = current_app.config.get('STRIPE_WEBHOOK_SECRET')
+    if not secret:
+        return jsonify({'error': 'Webhooks are not configured'}), 503
+    payload = request.get_data()
+    try:
+        verify_signature(
+            payload, request.headers.get('Stripe-Signature'), secret,
+            tolerance=current_app.config['STRIPE_WEBHOOK_TOLERANCE']
+        )
+        event_id, recorded = record_event(payload)
+    except SignatureVerificationError as e:
+        logger.warning(f"Rejected Stripe webhook: {str(e)}")
+        return jsonify({'error': 'Invalid signature'}), 400
+    except ValueError as e:
+        return jsonify({'error': f"Invalid event: {str(e)}"}), 400
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error recording Stripe event: {str(e)}")
+        return jsonify({'error': 'Error recording event'}), 500
+    # Processing happens in the event worker, Stripe only needs a fast 2xx
+    return jsonify({'received': event_id, 'duplicate': not recorded})
+
+@bp.route('/api/payment-intent', methods=['POST'])
+@rate_limit('forms')
+@terms_required
+def api_payment_intent():
+    """Start paying for a plan, the client confirms the returned secret with Stripe.js"""
+    email = session_email()
+    if not email:
+        return jsonify({'error': 'Login required'}), 401
+    plan_name = (request.get_json(silent=True) or {}).get('plan') or request.form.get('plan')
+    if plan_name not in PLANS:
+        return jsonify({'error': 'Invalid plan selected'}), 400
+    secret_key = current_app.config.get('STRIPE_SECRET_KEY')
+    if not secret_key:
+        return jsonify({'error': 'Payments are not configured'}), 503
+    try:
+        client_secret = create_payment_intent(
+            secret_key, email, plan_name, int(round(PLANS[plan_name]['price'] * 100))
+        )
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error creating payment intent: {str(e)}")
+        return jsonify({'error': 'Error starting payment'}), 502
+    return jsonify({'clientSecret': client_secret})
+
 @bp.route('/checkout')
+@terms_required
 def checkout():
     """Checkout page route"""
     plan_id = request.args.get('plan')
@@ -545,8 +880,7 @@ def checkout():
         return redirect(url_for('main.select_plan'))
     
     plan = PLANS[plan_id]
-    response = make_response(render_template('components/checkout/checkout.html', plan=plan))
-    return add_security_headers(response)
+    return render_template('components/checkout/checkout.html', plan=plan)
 
 @bp.route('/payment/cancel')
 def payment_cancel():
@@ -557,34 +891,31 @@ def payment_cancel():
 @bp.route('/terms')
 def terms():
     """Terms and conditions page"""
-    form = TermsAcceptanceForm()
-    response = make_response(render_template('terms.html', form=form))
-    return add_security_headers(response)
+    return redirect(url_for('main.legal_stuff', next=request.args.get('next')))
 
 @bp.route('/terms', methods=['POST'])
+@rate_limit('forms')
 def terms_post():
     """Process terms and conditions acceptance"""
     form = TermsAcceptanceForm(request.form)
+    next_url = safe_next_url(request.args.get('next')) or url_for('main.index')
     if form.validate_on_submit():
-        if 'user_id' in session:
-            existing_acceptance = TermsAcceptance.query.filter_by(user_id=session['user_id']).first()
-            if existing_acceptance:
-                flash('You have already accepted the terms', 'info')
-                return redirect(url_for('main.index'))
-            else:
-                new_acceptance = TermsAcceptance(user_id=session['user_id'], timestamp=datetime.now())
-                db.session.add(new_acceptance)
-                db.session.commit()
-                flash('Terms accepted successfully', 'success')
-                return redirect(url_for('main.index'))
-        else:
+        email = session_email()
+        if email is None:
             flash('Please login to accept the terms', 'error')
             return redirect(url_for('main.login'))
+        if has_accepted(email):
+            flash('You have already accepted the terms', 'info')
+        else:
+            record_acceptance(email, ip_address=request.remote_addr)
+            flash('Terms accepted successfully', 'success')
+        return redirect(next_url)
     else:
         flash('Please accept the terms', 'error')
-        return render_template('terms.html', form=form)
+        return redirect(url_for('main.legal_stuff', next=request.args.get('next')))
 
 @bp.route('/signup', methods=['GET', 'POST'])
+@rate_limit('auth')
 def signup():
     """Sign up page"""
     if 'user_id' in session:
@@ -602,15 +933,17 @@ def signup():
                 new_user = AdminUser(name=name, email=email, password=password)
                 db.session.add(new_user)
                 db.session.commit()
+                rotate_session(session)
                 session['user_id'] = new_user.id
+                session['user_email'] = new_user.email
                 flash('Signup successful', 'success')
                 return redirect(url_for('main.index'))
         else:
             flash('Please fill in all fields', 'error')
-    response = make_response(render_template('signup.html'))
-    return add_security_headers(response)
+    return render_template('signup.html')
 
 @bp.route('/login', methods=['GET', 'POST'])
+@rate_limit('auth')
 def login():
     """Login page"""
     if 'user_id' in session:
@@ -620,18 +953,20 @@ def login():
         password = request.form.get('password')
         user = AdminUser.query.filter_by(email=email).first()
         if user and user.check_password(password):
+            rotate_session(session)
             session['user_id'] = user.id
+            session['user_email'] = user.email
             flash('Login successful', 'success')
             return redirect(url_for('main.index'))
         else:
             flash('Invalid email or password', 'error')
-    response = make_response(render_template('login.html'))
-    return add_security_headers(response)
+    return render_template('login.html')
 
 @bp.route('/logout')
 def logout():
     """Logout"""
     session.pop('user_id', None)
+    session.pop('user_email', None)
     flash('Logged out successfully', 'success')
     return redirect(url_for('main.index'))
 
@@ -640,26 +975,108 @@ def lease_analysis():
     """Lease analysis page"""
     if 'user_id' not in session:
         return redirect(url_for('main.login'))
-    response = make_response(render_template('lease_analysis.html'))
-    return add_security_headers(response)
+    return render_template('lease_analysis.html')
 
 @bp.route('/lease-analysis/upload', methods=['POST'])
+@rate_limit('upload')
+@terms_required
 def lease_analysis_upload():
     """Upload lease document for analysis"""
     if 'user_id' not in session:
         return redirect(url_for('main.login'))
+    enforced = current_app.config['ENTITLEMENTS_ENFORCED']
+    if enforced and remaining_analyses(session['user_id']) < 1:
+        flash('You have no lease analyses left. Choose a plan to continue.', 'error')
+        return redirect(url_for('main.plans'))
     file = request.files.get('file')
     if file:
-        filename = secure_filename(file.filename)
-        file.save(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
-        # Process the uploaded file (e.g., send for analysis)
-        # ...
+        # Unique per upload, two users sending "lease.pdf" must never share a file
+        filename = f"{uuid.uuid4().hex}_{secure_filename(file.filename) or 'lease.pdf'}"
+        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+        file.save(file_path)
+        try:
+            document = register_upload(
+                file_path, file.filename, filename, user_id=session['user_id'],
+                revision_of_id=request.form.get('revision_of', type=int)
+            )
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error registering uploaded lease {filename}: {str(e)}")
+            flash('Error processing uploaded lease', 'error')
+            return redirect(url_for('main.lease_analysis'))
+        if document.status == 'error':
+            flash('The uploaded file could not be read as a PDF', 'error')
+            return redirect(url_for('main.lease_analysis'))
+        if enforced:
+            try:
+                consume_analyses(session['user_id'], [document.id])
+            except QuotaExceeded:
+                # Another upload spent the last analysis meanwhile, keep nothing of this one
+                discard_upload(file_path, document)
+                flash('You have no lease analyses left. Choose a plan to continue.', 'error')
+                return redirect(url_for('main.plans'))
+        session['document_id'] = document.id
+        start_analysis(current_app._get_current_object(), document.id)
         flash('Lease document uploaded successfully', 'success')
         return redirect(url_for('main.lease_analysis'))
     else:
         flash('Please select a file to upload', 'error')
         return redirect(url_for('main.lease_analysis'))
 
+@bp.route('/api/batches', methods=['POST'])
+@rate_limit('upload')
+@terms_required
+def api_create_batch():
+    """Upload several leases at once for analysis and comparison"""
+    # Imported here, not with the other views: building the app must not import the
+    # module that python -m leasecheck.batch_analysis is about to run as __main__
+    from .batch_analysis import create_batch, batch_payload
+    if 'user_id' not in session:
+        return jsonify({'error': 'Login required'}), 401
+    files = [file for file in request.files.getlist('files') if file and file.filename]
+    if not files:
+        return jsonify({'error': 'No lease files uploaded'}), 400
+    if len(files) > current_app.config['BATCH_MAX_LEASES']:
+        return jsonify({'error': f"At most {current_app.config['BATCH_MAX_LEASES']} leases per batch"}), 400
+    if current_app.config['ENTITLEMENTS_ENFORCED'] and remaining_analyses(session['user_id'], len(files)) < len(files):
+        return jsonify({'error': 'Not enough lease analyses left on your plan'}), 402
+
+    try:
+        batch, _ = create_batch(
+            current_app._get_current_object(),
+            [(file.filename, file.save) for file in files],
+            user_id=session['user_id'],
+            consume=current_app.config['ENTITLEMENTS_ENFORCED']
+        )
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error creating analysis batch: {str(e)}")
+        return jsonify({'error': 'Error creating batch'}), 500
+    response = jsonify(batch_payload(batch))
+    response.status_code = 202
+    response.headers['Location'] = url_for('main.api_batch', batch_id=batch.id)
+    return response
+
+@bp.route('/api/entitlements')
+def api_entitlements():
+    """Lease analyses left on the user's plans"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Login required'}), 401
+    response = jsonify(entitlement_summary(session['user_id']))
+    response.cache_control.no_store = True
+    return response
+
+@bp.route('/api/batches/<int:batch_id>')
+def api_batch(batch_id):
+    """Progress of a batch, with the side-by-side comparison once it has finished"""
+    from .batch_analysis import batch_payload
+    batch = AnalysisBatch.query.get(batch_id)
+    if batch is None or (batch.user_id != session.get('user_id') and 'admin_id' not in session):
+        return jsonify({'error': 'Batch not found'}), 404
+    response = jsonify(batch_payload(batch))
+    response.cache_control.no_store = True
+    return response
+
 @bp.route('/lease-analysis/result/<filename>')
 def lease_analysis_result(filename):
     """Display lease analysis results"""
@@ -667,17 +1084,16 @@ def lease_analysis_result(filename):
         return redirect(url_for('main.login'))
     # Retrieve analysis results from database or cache based on filename
     # ...
-    response = make_response(render_template('lease_analysis_result.html', filename=filename))
-    return add_security_headers(response)
+    return render_template('lease_analysis_result.html', filename=filename)
 
 @bp.route('/lease-analysis/download/<filename>')
 def lease_analysis_download(filename):
     """Download lease analysis results"""
     if 'user_id' not in session:
         return redirect(url_for('main.login'))
-    file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-    if os.path.exists(file_path):
-        return send_file(file_path, as_attachment=True)
+    file_path = resolve_upload_path(filename)
+    if file_path:
+        return send_document(file_path, etag=get_document_etag(filename, file_path))
     else:
         flash('File not found', 'error')
         return redirect(url_for('main.lease_analysis'))
@@ -717,14 +1133,6 @@ def get_available_components():
         logger.error(f"Error scanning components directory: {str(e)}")
         return {'primary': [], 'supporting': []}
 
-def add_security_headers(response):
-    """Add security headers to response"""
-    response.headers['X-Frame-Options'] = 'DENY'
-    response.headers['X-Content-Type-Options'] = 'nosniff'
-    response.headers['X-XSS-Protection'] = '1; mode=block'
-    response.headers['Content-Security-Policy'] = "default-src 'self'"
-    return response
-
 @bp.route('/preview')
 def preview_index():
     """Redirect to the first available component preview"""
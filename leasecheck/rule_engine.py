@@ -0,0 +1,313 @@
+import os
+import re
+import json
+import hashlib
+import logging
+from functools import lru_cache
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_RULES_FOLDER = os.path.join(os.path.dirname(__file__), 'rules')
+
+SEVERITIES = ('critical', 'warning', 'suggestion')
+
+# Characters of context kept around a match for the finding's excerpt
+EXCERPT_RADIUS = 80
+
+KEYWORD_GROUP = 'kw'
+
+# Characters of a rule's literal prefix used to find the rules that may match at an offset
+CHECK_KEY_LENGTH = 3
+_LEADING_WORD = re.compile(r'\S*')
+
+# Rule fields that decide what a rule matches; other fields only change the wording
+MATCH_FIELDS = ('keywords', 'patterns', 'when')
+
+class RuleError(ValueError):
+    """A rule file is malformed"""
+    pass
+
+def load_rules(folder=DEFAULT_RULES_FOLDER):
+    """Load and validate every rule from the JSON files in a folder"""
+    rules, seen = [], set()
+    for name in sorted(os.listdir(folder)):
+        if not name.endswith('.json'):
+            continue
+        with open(os.path.join(folder, name)) as f:
+            data = json.load(f)
+        for rule in data.get('rules', []):
+            rule_id = rule.get('id')
+            if not rule_id or rule_id in seen:
+                raise RuleError(f"{name}: missing or duplicate rule id {rule_id!r}")
+            if rule.get('severity') not in SEVERITIES:
+                raise RuleError(f"{name}: rule {rule_id} has unknown severity {rule.get('severity')!r}")
+            if rule.get('when', 'present') not in ('present', 'absent'):
+                raise RuleError(f"{name}: rule {rule_id} has unknown condition {rule.get('when')!r}")
+            if not rule.get('keywords') and not rule.get('patterns'):
+                raise RuleError(f"{name}: rule {rule_id} has no keywords or patterns")
+            for pattern in rule.get('patterns', []):
+                # Compiled alone and as RuleSet embeds it, a bad pattern otherwise only fails
+                # once every rule is merged into one regex, with no hint of which rule broke it
+                try:
+                    compiled = re.compile(pattern, re.IGNORECASE)
+                    re.compile(f"(?:{pattern})", re.IGNORECASE)
+                except (re.error, TypeError) as e:
+                    raise RuleError(f"{name}: rule {rule_id} has an invalid pattern {pattern!r}: {str(e)}")
+                if compiled.groupindex:
+                    raise RuleError(f"{name}: rule {rule_id} pattern {pattern!r} uses named groups, reserved by the engine")
+            seen.add(rule_id)
+            rules.append(dict(rule, category=data.get('category', os.path.splitext(name)[0])))
+    return rules
+
+def rule_fingerprint(rule):
+    """Hash of the fields that decide what a rule matches"""
+    match_spec = {field: rule.get(field) for field in MATCH_FIELDS}
+    return hashlib.sha256(json.dumps(match_spec, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+def _check_key(text):
+    # Leading characters up to the first whitespace, which may be any run of spaces in a lease
+    return _LEADING_WORD.match(text[:CHECK_KEY_LENGTH]).group().lower()
+
+def _normalize(phrase):
+    return ' '.join(phrase.lower().split())
+
+def _char_pattern(char):
+    # Any run of whitespace, including line breaks from extraction, separates words
+    return r'\s+' if char == ' ' else re.escape(char)
+
+def _trie_pattern(node):
+    branches = [_char_pattern(char) + _trie_pattern(child) for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ''
+    body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    if '' in node:
+        # A phrase ends here, the greedy optional prefers longer phrases sharing this prefix
+        body = f'(?:{body})?'
+    return body
+
+def build_keyword_pattern(phrases):
+    """Regex matching any of the phrases, with shared prefixes merged into one trie"""
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[''] = {}
+    return rf'(?<!\w){_trie_pattern(trie)}(?!\w)'
+
+_META_CHARS = set('.^$*+?{}[]|()')
+_QUANTIFIERS = set('*+?{')
+
+def _top_level_alternation(pattern):
+    depth, escaped, in_class = 0, False, False
+    for char in pattern:
+        if escaped:
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif in_class:
+            in_class = char != ']'
+        elif char == '[':
+            in_class = True
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == '|' and depth == 0:
+            return True
+    return False
+
+def literal_prefix(pattern):
+    """Split a regex into its leading literal text and the remaining pattern"""
+    if _top_level_alternation(pattern):
+        return '', pattern
+    literal, i = [], 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\' and i + 1 < len(pattern) and not pattern[i + 1].isalnum():
+            token, length = pattern[i + 1], 2
+        elif char != '\\' and char not in _META_CHARS:
+            token, length = char, 1
+        else:
+            break
+        if i + length < len(pattern) and pattern[i + length] in _QUANTIFIERS:
+            # The last literal is repeated or optional, it belongs to the remainder
+            break
+        literal.append(token)
+        i += length
+    return ''.join(literal).lower(), pattern[i:]
+
+def _prefix_trie_pattern(node):
+    branches = [re.escape(char) + _prefix_trie_pattern(child) for char, child in sorted(node.items()) if char]
+    branches += [f"(?P<{group}>{rest})" for group, rest in node.get('', [])]
+    return branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+
+def build_prefix_pattern(entries):
+    """Regex over (literal prefix, group, remainder) entries, with prefixes merged into a trie"""
+    trie = {}
+    for prefix, group, rest in entries:
+        node = trie
+        for char in prefix:
+            node = node.setdefault(char, {})
+        node.setdefault('', []).append((group, rest))
+    return _prefix_trie_pattern(trie)
+
+class RuleSet:
+    """Rules compiled into one combined regex, so text is scanned once for all of them"""
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.fingerprints = {rule['id']: rule_fingerprint(rule) for rule in rules}
+        self.keyword_rules = {}
+        self._subsets = {}
+
+        for index, rule in enumerate(rules):
+            for keyword in rule.get('keywords', []):
+                self.keyword_rules.setdefault(_normalize(keyword), []).append(index)
+
+        # Keywords share one trie alternative. Regex rules get a named group each,
+        # hung off a second trie of their literal prefixes, so the engine only
+        # tries a rule's pattern where its leading text already matched
+        entries = []
+        for index, rule in enumerate(rules):
+            for number, pattern in enumerate(rule.get('patterns', [])):
+                group = f"r{index}_{number}"
+                prefix, rest = literal_prefix(pattern)
+                entries.append((prefix, group, rest))
+
+        alternatives = []
+        if self.keyword_rules:
+            alternatives.append(f"(?P<{KEYWORD_GROUP}>{build_keyword_pattern(self.keyword_rules)})")
+        if entries:
+            alternatives.append(build_prefix_pattern(entries))
+        # Wrapped in a lookahead so a match never consumes text, and a rule whose
+        # match starts inside another rule's match (say "deposit returned within"
+        # inside "security deposit returned") is still found
+        self.regex = re.compile(f"(?=(?:{'|'.join(alternatives)}))" if alternatives else r'(?!)', re.IGNORECASE)
+
+        # The combined regex reports one alternative per offset, so where it hits,
+        # every keyword and pattern that could start there is checked on its own.
+        # Keyed by their first few literal characters; patterns without any can start anywhere
+        self.checks = {}
+        self.unanchored = []
+        for phrase, indices in self.keyword_rules.items():
+            self._add_check(phrase, re.compile(build_keyword_pattern([phrase]), re.IGNORECASE), indices)
+        for index, rule in enumerate(rules):
+            for pattern in rule.get('patterns', []):
+                self._add_check(literal_prefix(pattern)[0], re.compile(pattern, re.IGNORECASE), [index])
+
+    def _add_check(self, prefix, regex, indices):
+        key = _check_key(prefix)
+        if key:
+            self.checks.setdefault(key, []).append((regex, indices))
+        else:
+            self.unanchored.append((regex, indices))
+
+    def _candidates(self, text, start):
+        key = _check_key(text[start:start + CHECK_KEY_LENGTH])
+        candidates = list(self.unanchored)
+        for length in range(1, len(key) + 1):
+            candidates.extend(self.checks.get(key[:length], ()))
+        return candidates
+
+    def match(self, text):
+        """First match of every rule in text, as {rule_id: excerpt}"""
+        hits = {}
+        found = set()
+        for match in self.regex.finditer(text):
+            start = match.start()
+            for regex, indices in self._candidates(text, start):
+                if found.issuperset(indices):
+                    continue
+                candidate = regex.match(text, start)
+                if candidate is None:
+                    continue
+                for index in indices:
+                    if index not in found:
+                        found.add(index)
+                        end = candidate.end()
+                        hits[self.rules[index]['id']] = ' '.join(
+                            text[max(0, start - EXCERPT_RADIUS):end + EXCERPT_RADIUS].split()
+                        )
+            if len(found) == len(self.rules):
+                break
+        return hits
+
+    def subset(self, rule_ids):
+        """Compiled rule set of only the given rules, built once per id set"""
+        key = frozenset(rule_ids)
+        subset = self._subsets.get(key)
+        if subset is None:
+            subset = self._subsets[key] = RuleSet([rule for rule in self.rules if rule['id'] in key])
+        return subset
+
+    def scanner(self):
+        return RuleScanner(self)
+
+    def evaluate(self, pages):
+        """Scan (page_number, text) pairs and return the resulting findings"""
+        scanner = self.scanner()
+        for page_number, text in pages:
+            scanner.feed(page_number, text)
+        return scanner.findings()
+
+class RuleScanner:
+    """Incremental scan state, fed one page at a time as pages are extracted"""
+
+    def __init__(self, rule_set):
+        self.rule_set = rule_set
+        self.hits = {}
+
+    def add_hits(self, page_number, hits):
+        """Record {rule_id: excerpt} hits, keeping the earliest one per rule"""
+        for rule_id, excerpt in hits.items():
+            if rule_id not in self.hits:
+                self.hits[rule_id] = (page_number, excerpt)
+
+    def feed(self, page_number, text):
+        self.add_hits(page_number, self.rule_set.match(text))
+
+    def findings(self):
+        """Risk factors in Document.risk_factors shape, ordered by severity"""
+        fired = []
+        for rule in self.rule_set.rules:
+            hit = self.hits.get(rule['id'])
+            if rule.get('when', 'present') == 'absent':
+                if hit is None:
+                    fired.append((rule, None, None))
+            elif hit is not None:
+                fired.append((rule, hit[0], hit[1]))
+
+        fired.sort(key=lambda item: SEVERITIES.index(item[0]['severity']))
+        return [
+            {
+                'id': number,
+                'rule': rule['id'],
+                'category': rule['category'],
+                'severity': rule['severity'],
+                'title': rule['title'],
+                'description': rule['description'],
+                'recommendation': rule.get('recommendation'),
+                'page': page,
+                'excerpt': excerpt
+            }
+            for number, (rule, page, excerpt) in enumerate(fired, 1)
+        ]
+
+def risk_level_for(findings):
+    """Overall risk level from the most severe finding"""
+    severities = {finding['severity'] for finding in findings}
+    if 'critical' in severities:
+        return 'high'
+    if 'warning' in severities:
+        return 'medium'
+    return 'low'
+
+@lru_cache(maxsize=4)
+def get_rule_set(folder=DEFAULT_RULES_FOLDER):
+    """Compiled rules for a folder, built once per process"""
+    rules = load_rules(folder)
+    rule_set = RuleSet(rules)
+    logger.info(f"Compiled {len(rules)} lease rules from {folder}")
+    return rule_set
@@ -0,0 +1,380 @@
+import re
+import sys
+import logging
+import argparse
+from sqlalchemy import text, inspect
+from .database import db
+from .models import Document, SupportTicket, Payment
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Indexed records: the source table, the SQL for the title and body of an
+# entry ({row} is the row alias) and the columns whose updates re-index it.
+# Entry ids are source id * KIND_SLOTS + code, so a source row maps to one entry
+SOURCES = {
+    'document': {
+        'code': 1,
+        'table': 'documents',
+        'title': "coalesce({row}.original_filename, '')",
+        'body': "coalesce({row}.status, '')",
+        'columns': ('original_filename', 'status')
+    },
+    'ticket': {
+        'code': 2,
+        'table': 'support_tickets',
+        'title': "coalesce({row}.issue_type, '')",
+        'body': "coalesce({row}.description, '') || ' ' || coalesce({row}.user_email, '') || ' ' || coalesce({row}.status, '')",
+        'columns': ('issue_type', 'description', 'user_email', 'status')
+    },
+    'transaction': {
+        'code': 3,
+        'table': 'payments',
+        'title': "coalesce({row}.stripe_payment_id, '')",
+        'body': "coalesce({row}.user_email, '') || ' ' || coalesce({row}.plan_name, '') || ' ' || coalesce({row}.status, '')",
+        'columns': ('stripe_payment_id', 'user_email', 'plan_name', 'status')
+    }
+}
+KIND_SLOTS = 4
+KINDS_BY_CODE = {source['code']: kind for kind, source in SOURCES.items()}
+
+# Relative weight of a title match over a body match when ranking
+TITLE_WEIGHT = 10.0
+
+# Typed words at least this long are corrected when nothing in the index starts with them
+MIN_FUZZY_LENGTH = 4
+MAX_CORRECTIONS = 5
+EDIT_ALPHABET = 'abcdefghijklmnopqrstuvwxyz0123456789'
+
+# Broad queries rank only their newest matches by relevance, so the cost of a
+# search stays flat however many rows a common prefix matches
+RANK_WINDOW = 2000
+
+# Letters and digits only, so "pi_3Nx" and "bob@example.com" split like the index does
+TOKEN = re.compile(r'[^\W_]+')
+
+class SearchUnavailable(Exception):
+    """The database backend has no supported full-text search"""
+    pass
+
+def _backend():
+    dialect = db.engine.dialect.name
+    if dialect not in ('sqlite', 'postgresql'):
+        raise SearchUnavailable(f"Full-text search is not supported on {dialect}")
+    return dialect
+
+def parse_query(query):
+    """Lower-cased tokens of each whitespace separated word of a query"""
+    words = [TOKEN.findall(word.lower()) for word in (query or '').split()]
+    return [tokens for tokens in words if tokens]
+
+def single_edits(word):
+    """Every string one deletion, transposition, substitution or insertion away from word"""
+    splits = [(word[:i], word[i:]) for i in range(len(word) + 1)]
+    edits = {left + right[1:] for left, right in splits if right}
+    edits |= {left + right[1] + right[0] + right[2:] for left, right in splits if len(right) > 1}
+    edits |= {left + char + right[1:] for left, right in splits if right for char in EDIT_ALPHABET}
+    edits |= {left + char + right for left, right in splits for char in EDIT_ALPHABET}
+    edits.discard(word)
+    return edits
+
+def _trigger_sql_sqlite(kind, source):
+    entry_id = "{row}.id * %d + %d" % (KIND_SLOTS, source['code'])
+    insert = (
+        f"INSERT INTO search_index (rowid, kind, title, body) VALUES "
+        f"({entry_id.format(row='NEW')}, '{kind}', {source['title'].format(row='NEW')}, {source['body'].format(row='NEW')});"
+    )
+    delete = f"DELETE FROM search_index WHERE rowid = {entry_id.format(row='OLD')};"
+    table = source['table']
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS search_{table}_insert AFTER INSERT ON {table} BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS search_{table}_update AFTER UPDATE OF {', '.join(source['columns'])} "
+        f"ON {table} BEGIN {delete} {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS search_{table}_delete AFTER DELETE ON {table} BEGIN {delete} END"
+    ]
+
+def _trigger_sql_postgresql(kind, source):
+    table = source['table']
+    entry_id = "{row}.id * %d + %d" % (KIND_SLOTS, source['code'])
+    return [
+        f"""CREATE OR REPLACE FUNCTION search_index_{table}() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                DELETE FROM search_index WHERE id = {entry_id.format(row='OLD')};
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO search_index (id, kind, title, body) VALUES (
+                    {entry_id.format(row='NEW')}, '{kind}',
+                    {source['title'].format(row='NEW')}, {source['body'].format(row='NEW')}
+                );
+            END IF;
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql""",
+        f"DROP TRIGGER IF EXISTS search_index_{table} ON {table}",
+        f"CREATE TRIGGER search_index_{table} AFTER INSERT OR DELETE OR UPDATE OF {', '.join(source['columns'])} "
+        f"ON {table} FOR EACH ROW EXECUTE FUNCTION search_index_{table}()"
+    ]
+
+# Objects the sync triggers are made of on each backend, checked at startup
+SEARCH_TRIGGERS = {
+    'sqlite': [f"search_{source['table']}_{event}" for source in SOURCES.values() for event in ('insert', 'update', 'delete')],
+    'postgresql': [f"search_index_{source['table']}" for source in SOURCES.values()]
+}
+
+def search_schema_statements(backend):
+    """DDL for the search index and the triggers that keep it in sync"""
+    if backend == 'sqlite':
+        return [
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+            "kind UNINDEXED, title, body, tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_vocab USING fts5vocab(search_index, 'row')"
+        ] + [sql for kind, source in SOURCES.items() for sql in _trigger_sql_sqlite(kind, source)]
+    return [
+        "CREATE TABLE IF NOT EXISTS search_index ("
+        "id BIGINT PRIMARY KEY, kind VARCHAR(20) NOT NULL, "
+        "title TEXT NOT NULL DEFAULT '', body TEXT NOT NULL DEFAULT '', "
+        "document TSVECTOR GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('simple', title), 'A') || setweight(to_tsvector('simple', body), 'B')"
+        ") STORED)",
+        "CREATE INDEX IF NOT EXISTS ix_search_index_document ON search_index USING GIN (document)"
+    ] + [sql for kind, source in SOURCES.items() for sql in _trigger_sql_postgresql(kind, source)]
+
+def create_search_index(connection):
+    """Create the search index and its sync triggers on a connection, backfilling a new index"""
+    backend = connection.dialect.name
+    created = not inspect(connection).has_table('search_index')
+    for statement in search_schema_statements(backend):
+        connection.execute(text(statement))
+    if backend == 'postgresql':
+        _create_trigram_index(connection)
+    if created:
+        _fill_search_index(connection, backend)
+
+def _create_trigram_index(connection):
+    # Typo tolerance on Postgres needs pg_trgm, which may need a superuser to install.
+    # The savepoint keeps a refused extension from aborting the rest of the transaction
+    try:
+        with connection.begin_nested():
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            connection.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_search_index_trgm ON search_index "
+                "USING GIN ((title || ' ' || body) gin_trgm_ops)"
+            ))
+    except Exception as e:
+        logger.warning(f"Search typo tolerance disabled, pg_trgm is unavailable: {str(e)}")
+
+def missing_search_objects(connection, backend):
+    """Names of the search table and triggers the database does not have"""
+    if backend == 'sqlite':
+        query = "SELECT name FROM sqlite_master WHERE type = 'trigger'"
+    else:
+        query = "SELECT tgname FROM pg_trigger WHERE NOT tgisinternal"
+    missing = [] if inspect(connection).has_table('search_index') else ['search_index']
+    existing = {row[0] for row in connection.execute(text(query))}
+    return missing + [name for name in SEARCH_TRIGGERS[backend] if name not in existing]
+
+def _fill_search_index(connection, backend):
+    id_column = 'rowid' if backend == 'sqlite' else 'id'
+    connection.execute(text("DELETE FROM search_index"))
+    for kind, source in SOURCES.items():
+        connection.execute(text(
+            f"INSERT INTO search_index ({id_column}, kind, title, body) "
+            f"SELECT s.id * {KIND_SLOTS} + {source['code']}, '{kind}', "
+            f"{source['title'].format(row='s')}, {source['body'].format(row='s')} "
+            f"FROM {source['table']} s"
+        ))
+    if backend == 'sqlite':
+        connection.execute(text("INSERT INTO search_index (search_index) VALUES ('optimize')"))
+
+def rebuild_search_index():
+    """Re-index every source row from scratch"""
+    backend = _backend()
+    with db.engine.begin() as connection:
+        _fill_search_index(connection, backend)
+    logger.info("Search index rebuilt")
+
+def _has_prefix(connection, token):
+    return connection.execute(
+        text("SELECT 1 FROM search_vocab WHERE term >= :low AND term < :high LIMIT 1"),
+        {'low': token, 'high': token + '\uffff'}
+    ).first() is not None
+
+def _corrections(connection, token):
+    """Indexed terms one typo away from a token, most common first"""
+    candidates = sorted(single_edits(token))
+    params = {f"t{i}": term for i, term in enumerate(candidates)}
+    rows = connection.execute(
+        text(f"SELECT term, doc FROM search_vocab WHERE term IN ({', '.join(':' + name for name in params)})"),
+        params
+    ).all()
+    return [term for term, _ in sorted(rows, key=lambda row: -row[1])[:MAX_CORRECTIONS]]
+
+def _match_expression_sqlite(connection, words):
+    clauses, corrections = [], {}
+    for tokens in words:
+        phrase = f'"{" ".join(tokens)}"*'
+        token = tokens[0]
+        if len(tokens) == 1 and len(token) >= MIN_FUZZY_LENGTH and not _has_prefix(connection, token):
+            alternatives = _corrections(connection, token)
+            if alternatives:
+                corrections[token] = alternatives
+                phrase = '(' + ' OR '.join(f'"{term}"' for term in alternatives) + ')'
+        clauses.append(phrase)
+    return '{title body} : (' + ' AND '.join(clauses) + ')', corrections
+
+def _search_sqlite(words, kind, limit, offset):
+    # Returns the hits and the corrections made to misspelled words
+    with db.engine.connect() as connection:
+        expression, corrections = _match_expression_sqlite(connection, words)
+        # The kind is part of the entry id, filtering on it is cheaper than matching the kind column
+        kind_filter = f"AND rowid % {KIND_SLOTS} = {SOURCES[kind]['code']}" if kind else ""
+        # FTS5 walks matches newest first and stops at the window, only the window is scored
+        rows = connection.execute(
+            text(
+                "WITH recent AS ("
+                f"SELECT rowid, bm25(search_index, 0.0, {TITLE_WEIGHT}, 1.0) AS score, substr(body, 1, 160) AS snippet "
+                f"FROM search_index WHERE search_index MATCH :expression {kind_filter} ORDER BY rowid DESC LIMIT :window"
+                ") SELECT rowid, snippet FROM recent ORDER BY score, rowid DESC LIMIT :limit OFFSET :offset"
+            ),
+            {'expression': expression, 'window': max(RANK_WINDOW, offset + limit), 'limit': limit, 'offset': offset}
+        ).all()
+    return rows, corrections
+
+def _search_postgresql(words, kind, limit, offset):
+    # Returns the hits and whether they come from the typo-tolerant fallback
+    # Adjacent tokens of one word must be adjacent in the entry, the last one matches as a prefix
+    tsquery = ' & '.join('(' + ' <-> '.join(tokens[:-1] + [tokens[-1] + ':*']) + ')' for tokens in words)
+    kind_filter = "AND kind = :kind" if kind else ""
+    params = {'tsquery': tsquery, 'kind': kind, 'window': max(RANK_WINDOW, offset + limit),
+              'limit': limit, 'offset': offset}
+    with db.engine.connect() as connection:
+        rows = connection.execute(
+            text(
+                "WITH recent AS ("
+                "SELECT id, ts_rank_cd(document, query) AS score, left(body, 160) AS snippet "
+                "FROM search_index, to_tsquery('simple', :tsquery) query "
+                f"WHERE document @@ query {kind_filter} ORDER BY id DESC LIMIT :window"
+                ") SELECT id, snippet FROM recent ORDER BY score DESC, id DESC LIMIT :limit OFFSET :offset"
+            ),
+            params
+        ).all()
+        if rows or offset:
+            return rows, False
+        # Nothing matched exactly, fall back to trigram word similarity for typos
+        try:
+            params['phrase'] = ' '.join(token for tokens in words for token in tokens)
+            rows = connection.execute(
+                text(
+                    "SELECT id, left(body, 160) FROM search_index "
+                    f"WHERE :phrase <% (title || ' ' || body) {kind_filter} "
+                    "ORDER BY word_similarity(:phrase, title || ' ' || body) DESC LIMIT :limit"
+                ),
+                params
+            ).all()
+        except Exception as e:
+            logger.warning(f"Fuzzy search failed: {str(e)}")
+            rows = []
+    return rows, bool(rows)
+
+def _hydrate(hits):
+    """Result rows for (entry id, snippet) hits, in hit order"""
+    ids = {kind: [] for kind in SOURCES}
+    for entry_id, _ in hits:
+        ids[KINDS_BY_CODE[entry_id % KIND_SLOTS]].append(entry_id // KIND_SLOTS)
+    records = {}
+    for kind, model in (('document', Document), ('ticket', SupportTicket), ('transaction', Payment)):
+        if ids[kind]:
+            records.update({(kind, row.id): row for row in model.query.filter(model.id.in_(ids[kind]))})
+
+    results = []
+    for entry_id, snippet in hits:
+        kind = KINDS_BY_CODE[entry_id % KIND_SLOTS]
+        record = records.get((kind, entry_id // KIND_SLOTS))
+        if record is None:
+            continue
+        if kind == 'document':
+            result = {'title': record.original_filename, 'date': record.upload_date, 'status': record.status}
+        elif kind == 'ticket':
+            result = {'title': f"{record.issue_type} - {record.user_email}", 'date': record.created_at, 'status': record.status}
+        else:
+            result = {'title': f"{record.stripe_payment_id} - {record.user_email}", 'date': record.created_at,
+                      'status': record.status, 'amount': record.amount, 'plan': record.plan_name}
+        result.update({
+            'kind': kind,
+            'id': record.id,
+            'snippet': snippet,
+            'date': result['date'].isoformat() if result['date'] else None
+        })
+        results.append(result)
+    return results
+
+def search(query, kind=None, page=1, per_page=20):
+    """Ranked page of documents, tickets and transactions matching a query"""
+    if kind is not None and kind not in SOURCES:
+        raise ValueError(f"Unknown search kind {kind!r}")
+    words = parse_query(query)
+    result = {'query': query, 'kind': kind, 'page': page, 'perPage': per_page,
+              'results': [], 'hasMore': False, 'corrections': {}, 'fuzzy': False}
+    if not words:
+        return result
+
+    offset = (page - 1) * per_page
+    # One extra row tells whether there is a next page without counting every match
+    if _backend() == 'sqlite':
+        hits, corrections = _search_sqlite(words, kind, per_page + 1, offset)
+        fuzzy = bool(corrections)
+    else:
+        hits, fuzzy = _search_postgresql(words, kind, per_page + 1, offset)
+        corrections = {}
+    result.update({
+        'results': _hydrate(hits[:per_page]),
+        'hasMore': len(hits) > per_page,
+        'corrections': corrections,
+        'fuzzy': fuzzy
+    })
+    return result
+
+def init_search(app):
+    """Check the full-text search index and its sync triggers exist"""
+    with app.app_context():
+        try:
+            backend = _backend()
+            with db.engine.begin() as connection:
+                missing = missing_search_objects(connection, backend)
+                # Like create_all for tables, a SQLite database gets what it lacks on startup.
+                # Postgres takes the DDL from the migration, run by `flask db upgrade`
+                if missing and backend == 'sqlite':
+                    create_search_index(connection)
+                    missing = []
+            if missing:
+                logger.warning(
+                    f"Search index is incomplete, run `flask --app leasecheck db upgrade`: missing {', '.join(missing)}"
+                )
+            else:
+                logger.info("Search index ready")
+        except SearchUnavailable as e:
+            logger.warning(str(e))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Admin full-text search index')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    subcommands.add_parser('rebuild', help='Re-index every document, ticket and transaction')
+    query_parser = subcommands.add_parser('query', help='Run a search from the command line')
+    query_parser.add_argument('query')
+    query_parser.add_argument('--kind', choices=sorted(SOURCES))
+    args = parser.parse_args(argv)
+
+    from .app import create_app
+    with create_app().app_context():
+        if args.command == 'rebuild':
+            rebuild_search_index()
+        else:
+            result = search(args.query, kind=args.kind)
+            for word, terms in result['corrections'].items():
+                print(f"{word}: searched for {', '.join(terms)}")
+            for hit in result['results']:
+                print(f"[{hit['kind']} {hit['id']}] {hit['title']}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
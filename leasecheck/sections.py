@@ -0,0 +1,98 @@
+import re
+import hashlib
+from .rule_engine import RuleScanner
+
+# Clause headings such as "12.", "4.2", "4.2)", "Section 7" or "ARTICLE IV" start a new section
+SECTION_HEADING = re.compile(
+    r'^[ \t]*(?:\d+(?:\.\d+)+[.)]?\s|\d+[.)]\s|(?:section|article|clause)\s+[\divxlc]+\b)',
+    re.IGNORECASE | re.MULTILINE
+)
+PARAGRAPH_BREAK = re.compile(r'\n[ \t]*\n')
+
+def split_sections(text):
+    """Split a page into clause sections, falling back to paragraphs without headings"""
+    starts = [match.start() for match in SECTION_HEADING.finditer(text)]
+    if starts:
+        bounds = ([0] if starts[0] > 0 else []) + starts + [len(text)]
+        sections = [text[start:end] for start, end in zip(bounds, bounds[1:])]
+    else:
+        sections = PARAGRAPH_BREAK.split(text)
+    return [section for section in sections if section.strip()]
+
+def section_fingerprint(text):
+    """Hash of a section's wording, insensitive to reflow and case"""
+    return hashlib.sha256(' '.join(text.lower().split()).encode('utf-8')).hexdigest()[:20]
+
+class IncrementalScorer:
+    """Score a lease section by section, reusing stored results for unchanged sections"""
+
+    def __init__(self, rule_set, previous_index=None):
+        previous_index = previous_index or {}
+        self.rule_set = rule_set
+        self.scanner = RuleScanner(rule_set)
+        self.sections = []
+        self.stats = {'sections': 0, 'rescanned': 0, 'reused': 0, 'chars_scanned': 0}
+        self._seen = {}
+
+        # Only rules whose matching fields changed need to look at unchanged sections again
+        previous_rules = previous_index.get('rules', {})
+        self.changed_rules = {
+            rule_id for rule_id, fingerprint in rule_set.fingerprints.items()
+            if previous_rules.get(rule_id) != fingerprint
+        }
+        self.previous_hits = {
+            section['hash']: section['hits'] for section in previous_index.get('sections', [])
+        }
+
+    def _score(self, section, fingerprint):
+        stored = self.previous_hits.get(fingerprint)
+        if stored is None:
+            self.stats['rescanned'] += 1
+            self.stats['chars_scanned'] += len(section)
+            return self.rule_set.match(section)
+
+        self.stats['reused'] += 1
+        hits = {
+            rule_id: excerpt for rule_id, excerpt in stored.items()
+            if rule_id in self.rule_set.fingerprints and rule_id not in self.changed_rules
+        }
+        if self.changed_rules:
+            hits.update(self.rule_set.subset(self.changed_rules).match(section))
+            self.stats['chars_scanned'] += len(section)
+        return hits
+
+    def feed(self, page_number, text):
+        """Score every section of one page"""
+        for section in split_sections(text):
+            fingerprint = section_fingerprint(section)
+            self.stats['sections'] += 1
+            # Repeated boilerplate within one lease is scored once
+            hits = self._seen.get(fingerprint)
+            if hits is None:
+                hits = self._seen[fingerprint] = self._score(section, fingerprint)
+            self.sections.append({'hash': fingerprint, 'page': page_number, 'hits': hits})
+            self.scanner.add_hits(page_number, hits)
+
+    def findings(self):
+        return self.scanner.findings()
+
+    def section_index(self):
+        """Per-section hashes and hits to store for the next re-analysis"""
+        return {'rules': dict(self.rule_set.fingerprints), 'sections': self.sections}
+
+def merge_findings(previous_factors, findings):
+    """Keep the ids of findings that survive a re-analysis, so resolved marks stay attached"""
+    previous_ids = {
+        factor['rule']: factor['id'] for factor in previous_factors or [] if factor.get('rule')
+    }
+    next_id = max([factor.get('id', 0) for factor in previous_factors or []] + [0]) + 1
+    merged = []
+    for finding in findings:
+        finding = dict(finding)
+        if finding['rule'] in previous_ids:
+            finding['id'] = previous_ids[finding['rule']]
+        else:
+            finding['id'] = next_id
+            next_id += 1
+        merged.append(finding)
+    return merged
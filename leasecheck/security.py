@@ -0,0 +1,157 @@
+import logging
+import secrets
+from types import MappingProxyType
+from flask import current_app, g, request
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Content Security Policy for rendered pages
+CSP_POLICY = {
+    'default-src': ["'self'", "https://*"],
+    'script-src': [
+        "'self'",
+        "'unsafe-inline'",
+        "'unsafe-eval'",
+        "https://js.stripe.com",
+        "https://*"
+    ],
+    'style-src': ["'self'", "'unsafe-inline'", "https://*"],
+    'img-src': ["'self'", "data:", "https:", "https://*"],
+    'connect-src': [
+        "'self'",
+        "https://api.stripe.com",
+        "https://*",
+        "wss://*"
+    ],
+    'frame-src': [
+        "'self'",
+        "https://js.stripe.com",
+        "https://hooks.stripe.com",
+        "https://*"
+    ],
+    'font-src': ["'self'", "data:", "https://*"],
+    'frame-ancestors': ["'none'"]
+}
+
+# JSON endpoints never load sub-resources
+API_CSP_POLICY = {
+    'default-src': ["'none'"],
+    'frame-ancestors': ["'none'"]
+}
+
+# Headers shared by every response
+BASE_HEADERS = {
+    'X-Frame-Options': 'DENY',
+    'X-Content-Type-Options': 'nosniff',
+    'X-XSS-Protection': '1; mode=block',
+    'Referrer-Policy': 'strict-origin-when-cross-origin',
+    'Permissions-Policy': 'browsing-topics=()'
+}
+
+# Route classes and the extra headers each one carries
+HEADER_CLASS_PAGE = 'page'
+HEADER_CLASS_ADMIN = 'admin'
+HEADER_CLASS_API = 'api'
+HEADER_CLASS_STATIC = 'static'
+
+NONCE_PLACEHOLDER = '{nonce}'
+
+def build_csp(policy, nonce=False):
+    """Serialize a CSP policy dict, optionally leaving a nonce slot in script-src"""
+    directives = []
+    for directive, sources in policy.items():
+        sources = list(sources)
+        if nonce and directive == 'script-src':
+            # Browsers ignore 'unsafe-inline' next to a nonce anyway, so every inline
+            # script must carry csp_nonce() and inline on* handlers are not allowed
+            sources = [source for source in sources if source != "'unsafe-inline'"]
+            sources.append(f"'nonce-{NONCE_PLACEHOLDER}'")
+        directives.append(f"{directive} {' '.join(sources)}")
+    return '; '.join(directives)
+
+def build_header_sets(app):
+    """Precompute the immutable header set for each route class"""
+    base = dict(BASE_HEADERS)
+    if app.config.get('SECURITY_HSTS'):
+        base['Strict-Transport-Security'] = 'max-age=31536000; includeSubDomains'
+
+    page_csp = build_csp(CSP_POLICY)
+    header_sets = {
+        HEADER_CLASS_PAGE: {**base, 'Content-Security-Policy': page_csp},
+        HEADER_CLASS_ADMIN: {
+            **base,
+            'Content-Security-Policy': page_csp,
+            'Cache-Control': 'no-store'
+        },
+        HEADER_CLASS_API: {**base, 'Content-Security-Policy': build_csp(API_CSP_POLICY)},
+        HEADER_CLASS_STATIC: {'X-Content-Type-Options': 'nosniff'}
+    }
+    return MappingProxyType({
+        name: tuple(headers.items()) for name, headers in header_sets.items()
+    })
+
+def header_class(name):
+    """Decorator to pin a view to a specific security header class"""
+    def decorator(f):
+        f._security_header_class = name
+        return f
+    return decorator
+
+def _resolve_header_class(endpoint):
+    """Work out the header class for an endpoint, cached per endpoint"""
+    state = current_app.extensions['security_headers']
+    cached = state['endpoint_classes'].get(endpoint)
+    if cached is not None:
+        return cached
+
+    view = current_app.view_functions.get(endpoint)
+    if view is not None and hasattr(view, '_security_header_class'):
+        name = view._security_header_class
+    elif endpoint == 'static':
+        name = HEADER_CLASS_STATIC
+    elif endpoint and endpoint.split('.')[-1].startswith('admin'):
+        name = HEADER_CLASS_ADMIN
+    elif request.path.startswith('/api/'):
+        name = HEADER_CLASS_API
+    else:
+        name = HEADER_CLASS_PAGE
+
+    if endpoint is not None:
+        state['endpoint_classes'][endpoint] = name
+    return name
+
+def csp_nonce():
+    """Get the CSP nonce for the current request, generating it on first use"""
+    nonce = getattr(g, '_csp_nonce', None)
+    if nonce is None:
+        nonce = g._csp_nonce = secrets.token_urlsafe(16)
+    return nonce
+
+def apply_security_headers(response):
+    """Apply the precomputed header set for the current route class"""
+    state = current_app.extensions['security_headers']
+    name = _resolve_header_class(request.endpoint)
+    headers = response.headers
+
+    for key, value in state['header_sets'][name]:
+        if key not in headers:
+            headers[key] = value
+
+    nonce = getattr(g, '_csp_nonce', None)
+    if state['nonce_enabled'] and nonce is not None and name in (HEADER_CLASS_PAGE, HEADER_CLASS_ADMIN):
+        headers['Content-Security-Policy'] = state['nonce_csp'].replace(NONCE_PLACEHOLDER, nonce)
+    return response
+
+def init_security_headers(app):
+    """Register a single after_request layer for all security headers"""
+    app.extensions['security_headers'] = {
+        'header_sets': build_header_sets(app),
+        'nonce_enabled': bool(app.config.get('CSP_NONCE_ENABLED')),
+        'nonce_csp': build_csp(CSP_POLICY, nonce=True),
+        'endpoint_classes': {}
+    }
+    app.config.setdefault('SESSION_COOKIE_HTTPONLY', True)
+    app.jinja_env.globals['csp_nonce'] = csp_nonce
+    app.after_request(apply_security_headers)
+    logger.info("Security headers initialized")
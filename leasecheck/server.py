@@ -0,0 +1,149 @@
+import os
+import sys
+import json
+import atexit
+import shutil
+import tempfile
+import logging
+import argparse
+import multiprocessing
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+WORKER_CLASSES = ('gthread', 'gevent')
+
+def _env_int(environ, name, default):
+    value = environ.get(name)
+    return int(value) if value not in (None, '') else default
+
+def server_settings(environ=None, cpu_count=None):
+    """Gunicorn settings for this machine, each overridable from the environment"""
+    environ = os.environ if environ is None else environ
+    cpu_count = cpu_count or multiprocessing.cpu_count()
+    worker_class = environ.get('SERVER_WORKER_CLASS', 'gthread')
+    if worker_class not in WORKER_CLASSES:
+        raise ValueError(f"Unknown SERVER_WORKER_CLASS {worker_class!r}, expected gthread or gevent")
+
+    if worker_class == 'gevent':
+        # Greenlets cover the concurrency, one worker per core is enough
+        workers = _env_int(environ, 'WEB_CONCURRENCY', cpu_count)
+    else:
+        # Each worker also owns analysis threads and, once used, extraction and render
+        # process pools, so fewer workers with more threads beats the classic 2 x CPU + 1
+        workers = _env_int(environ, 'WEB_CONCURRENCY', cpu_count + 1)
+
+    settings = {
+        'bind': environ.get('SERVER_BIND', f"0.0.0.0:{environ.get('PORT', '5000')}"),
+        'worker_class': worker_class,
+        'workers': max(1, workers),
+        'threads': max(1, _env_int(environ, 'SERVER_THREADS', 4)),
+        'worker_connections': _env_int(environ, 'SERVER_WORKER_CONNECTIONS', 1000),
+        # Workers share the master's app copy-on-write, except under gevent, whose
+        # patches must be in place before the app opens connections and locks
+        'preload_app': environ.get('SERVER_PRELOAD', str(worker_class != 'gevent')).lower() == 'true',
+        # Keep idle client connections open, longer than the proxy in front keeps its own
+        'keepalive': _env_int(environ, 'SERVER_KEEPALIVE', 5),
+        # Uploads and report rendering can take a while, but never this long
+        'timeout': _env_int(environ, 'SERVER_TIMEOUT', 60),
+        'graceful_timeout': _env_int(environ, 'SERVER_GRACEFUL_TIMEOUT', 30),
+        # Recycle workers now and then, staggered so they never restart together
+        'max_requests': _env_int(environ, 'SERVER_MAX_REQUESTS', 1000),
+        'max_requests_jitter': _env_int(environ, 'SERVER_MAX_REQUESTS_JITTER', 100),
+        'accesslog': environ.get('SERVER_ACCESS_LOG', '-') or None,
+        'errorlog': '-',
+        'pidfile': environ.get('SERVER_PIDFILE') or None,
+        'proc_name': 'leasecheck'
+    }
+    # The heartbeat file is touched constantly, keep it off a disk that can stall
+    if os.path.isdir('/dev/shm'):
+        settings['worker_tmp_dir'] = '/dev/shm'
+    return settings
+
+def post_fork(server, worker):
+    """Drop database connections inherited from the master, each worker opens its own"""
+    from . import app as package_app
+    from .database import db
+    with package_app.app_context():
+        db.engine.dispose(close=False)
+
+def child_exit(server, worker):
+    """Fold an exited worker's metrics into the shared archive, so snapshots never pile up"""
+    from .metrics import registry
+    registry.retire_process(worker.pid)
+
+def _remove_metrics_dir(directory, master_pid):
+    # Workers inherit this hook through the fork, only the master cleans up
+    if os.getpid() == master_pid:
+        shutil.rmtree(directory, ignore_errors=True)
+
+def share_metrics_dir(flask_app):
+    """Give the workers a common METRICS_MULTIPROC_DIR when metrics are on and none is set"""
+    if not flask_app.config.get('METRICS_ENABLED') or flask_app.config.get('METRICS_MULTIPROC_DIR'):
+        return None
+    from .metrics import enable_multiprocess
+    directory = tempfile.mkdtemp(prefix='leasecheck-metrics-', dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+    # The environment reaches workers that build their own app, the config the preloaded one
+    os.environ['METRICS_MULTIPROC_DIR'] = directory
+    flask_app.config['METRICS_MULTIPROC_DIR'] = directory
+    # Registered first so it runs last, after the master's own final flush
+    atexit.register(_remove_metrics_dir, directory, os.getpid())
+    enable_multiprocess(directory)
+    return directory
+
+def build_server(settings):
+    """Gunicorn application serving leasecheck with the given settings"""
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError as e:
+        raise RuntimeError(f"The production server needs the gunicorn package: {str(e)}")
+
+    class LeaseCheckServer(BaseApplication):
+        def __init__(self):
+            self.options = settings
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                if value is not None:
+                    self.cfg.set(key, value)
+            self.cfg.set('post_fork', post_fork)
+            self.cfg.set('child_exit', child_exit)
+
+        def load(self):
+            from .rate_limit import warn_per_process_limits
+            if self.cfg.preload_app:
+                # Importing the package already built the app in the master, share it
+                from . import app
+            else:
+                # Each worker builds its own after the fork, with gevent's patches in place
+                from .app import create_app
+                app = create_app()
+            warn_per_process_limits(app, self.cfg.workers)
+            return app
+
+    return LeaseCheckServer()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run leasecheck under gunicorn with settings tuned for this machine')
+    parser.add_argument('--check', action='store_true', help='Print the computed settings and exit')
+    args = parser.parse_args(argv)
+
+    settings = server_settings()
+    if args.check:
+        print(json.dumps(settings, indent=2))
+        return 0
+    logger.info(
+        f"Starting {settings['workers']} {settings['worker_class']} workers on {settings['bind']}"
+        f"{' (preloaded)' if settings['preload_app'] else ''}"
+    )
+    if settings['workers'] > 1:
+        from . import app as package_app
+        directory = share_metrics_dir(package_app)
+        if directory:
+            logger.info(f"Workers share metrics through {directory}")
+    build_server(settings).run()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,307 @@
+import re
+import sys
+import logging
+import secrets
+import argparse
+import threading
+from datetime import datetime, timedelta
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from sqlalchemy import select, insert, update, delete
+from .database import db
+from .models import ServerSessionRecord
+from .app import register_background_worker
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+SESSION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{43}$')  # secrets.token_urlsafe(32)
+
+serializer = TaggedJSONSerializer()
+
+class DatabaseSessionStore:
+    """Sessions in the app database (SQLite or Postgres), a stand-in where Redis is not deployed"""
+
+    def __init__(self, app):
+        self.app = app
+        self.engine = None
+
+    def _engine(self):
+        # A separate connection, so saving the session never commits the request's db.session
+        if self.engine is None:
+            with self.app.app_context():
+                self.engine = db.engine
+        return self.engine
+
+    def load(self, sid):
+        with self._engine().connect() as connection:
+            row = connection.execute(
+                select(ServerSessionRecord.data, ServerSessionRecord.expires_at)
+                .where(ServerSessionRecord.id == sid, ServerSessionRecord.expires_at > datetime.utcnow())
+            ).first()
+        if row is None:
+            return None
+        return serializer.loads(row.data), row.expires_at
+
+    def save(self, sid, data, expires_at):
+        values = {'data': serializer.dumps(data), 'expires_at': expires_at}
+        with self._engine().begin() as connection:
+            updated = connection.execute(
+                update(ServerSessionRecord).where(ServerSessionRecord.id == sid).values(**values)
+            ).rowcount
+            if not updated:
+                connection.execute(insert(ServerSessionRecord).values(id=sid, **values))
+
+    def touch(self, sid, expires_at):
+        with self._engine().begin() as connection:
+            connection.execute(
+                update(ServerSessionRecord).where(ServerSessionRecord.id == sid).values(expires_at=expires_at)
+            )
+
+    def delete(self, sid):
+        with self._engine().begin() as connection:
+            connection.execute(delete(ServerSessionRecord).where(ServerSessionRecord.id == sid))
+
+    def purge_expired(self, batch_size=1000):
+        """Delete expired sessions in short batches, so writers are never blocked for long"""
+        purged = 0
+        while True:
+            with self._engine().begin() as connection:
+                expired = select(ServerSessionRecord.id).where(
+                    ServerSessionRecord.expires_at <= datetime.utcnow()
+                ).limit(batch_size)
+                deleted = connection.execute(
+                    delete(ServerSessionRecord).where(ServerSessionRecord.id.in_(expired))
+                ).rowcount
+            purged += deleted
+            if deleted < batch_size:
+                return purged
+
+class RedisSessionStore:
+    """Sessions in Redis, which expires keys itself"""
+
+    def __init__(self, url, prefix='session:'):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError(f"SESSION_BACKEND=redis needs the redis package: {str(e)}")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def load(self, sid):
+        pipeline = self.client.pipeline()
+        pipeline.get(self.prefix + sid)
+        pipeline.ttl(self.prefix + sid)
+        data, ttl = pipeline.execute()
+        if data is None:
+            return None
+        return serializer.loads(data.decode('utf-8')), datetime.utcnow() + timedelta(seconds=max(ttl, 0))
+
+    def _ttl(self, expires_at):
+        return max(1, int((expires_at - datetime.utcnow()).total_seconds()))
+
+    def save(self, sid, data, expires_at):
+        self.client.setex(self.prefix + sid, self._ttl(expires_at), serializer.dumps(data))
+
+    def touch(self, sid, expires_at):
+        self.client.expire(self.prefix + sid, self._ttl(expires_at))
+
+    def delete(self, sid):
+        self.client.delete(self.prefix + sid)
+
+    def purge_expired(self, batch_size=1000):
+        return 0
+
+class ServerSession(SessionMixin):
+    """Session whose data is only fetched from the store when a route first reads or writes it"""
+
+    def __init__(self, store, sid=None):
+        self.store = store
+        self.sid = sid
+        self.new = sid is None
+        self.modified = False
+        self.accessed = False
+        self.expires_at = None
+        self.stale_sid = None
+        self._data = None
+
+    @property
+    def loaded(self):
+        return self._data is not None
+
+    def _load(self):
+        if self._data is None:
+            self.accessed = True
+            record = self.store.load(self.sid) if self.sid else None
+            if record is None:
+                # Unknown or expired id: start afresh under a new id rather than adopting the old one
+                self._data = {}
+                self.new = True
+            else:
+                self._data, self.expires_at = record
+        return self._data
+
+    def regenerate(self):
+        """Move the data to a new id, called when the user's privileges change"""
+        self._load()
+        if not self.new:
+            self.stale_sid = self.sid
+        self.sid = None
+        self.new = True
+        self.modified = True
+
+    def __getitem__(self, key):
+        return self._load()[key]
+
+    def __setitem__(self, key, value):
+        self._load()[key] = value
+        self.modified = True
+
+    def __delitem__(self, key):
+        del self._load()[key]
+        self.modified = True
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+class ServerSessionInterface(SessionInterface):
+    """Keep session data server side and only an opaque session id in the cookie"""
+
+    def __init__(self, store, refresh_ratio=0.5):
+        self.store = store
+        # Expiry is only pushed back once less than this share of the lifetime is left,
+        # so a session that is merely read is not rewritten on every request
+        self.refresh_ratio = refresh_ratio
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if not sid or not SESSION_ID_PATTERN.match(sid):
+            sid = None
+        return ServerSession(self.store, sid)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.accessed:
+            response.vary.add('Cookie')
+        if not session.loaded:
+            # The route never touched the session, skip the store entirely
+            return
+        if session.stale_sid:
+            self.store.delete(session.stale_sid)
+
+        if not session:
+            if session.sid:
+                if not session.new:
+                    self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        lifetime = app.permanent_session_lifetime
+        now = datetime.utcnow()
+        expires_at = now + lifetime
+        if session.modified or session.new:
+            if session.new:
+                session.sid = secrets.token_urlsafe(32)
+            self.store.save(session.sid, dict(session), expires_at)
+        elif session.expires_at - now < lifetime * self.refresh_ratio:
+            self.store.touch(session.sid, expires_at)
+        else:
+            return
+
+        response.set_cookie(
+            name, session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app)
+        )
+
+class SessionPurger:
+    """Background thread that deletes expired sessions every interval"""
+
+    def __init__(self, store, interval, batch_size):
+        self.store = store
+        self.interval = interval
+        self.batch_size = batch_size
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self.run, name='session-purge', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                purged = self.store.purge_expired(self.batch_size)
+                if purged:
+                    logger.info(f"Purged {purged} expired sessions")
+            except Exception as e:
+                logger.error(f"Error purging expired sessions: {str(e)}")
+
+def rotate_session(session):
+    """Issue a new session id after login, when the session is stored server side"""
+    if isinstance(session, ServerSession):
+        session.regenerate()
+
+def build_session_store(app):
+    """Session store selected by SESSION_BACKEND, or None for Flask's signed cookie"""
+    backend = app.config['SESSION_BACKEND']
+    if backend == 'database':
+        return DatabaseSessionStore(app)
+    if backend == 'redis':
+        return RedisSessionStore(app.config['SESSION_REDIS_URL'])
+    if backend == 'cookie':
+        return None
+    raise ValueError(f"Unknown SESSION_BACKEND {backend!r}, expected database, redis or cookie")
+
+_purger = None
+
+def start_session_purger(app):
+    global _purger
+    if _purger is None:
+        _purger = SessionPurger(
+            app.extensions['session_store'], app.config['SESSION_PURGE_INTERVAL'], app.config['SESSION_PURGE_BATCH_SIZE']
+        )
+        _purger.start()
+
+def init_sessions(app):
+    """Install the server-side session interface and schedule the expired session purge"""
+    store = build_session_store(app)
+    if store is None:
+        logger.info("Using signed cookie sessions")
+        return
+    app.session_interface = ServerSessionInterface(store)
+    app.extensions['session_store'] = store
+    # Redis expires keys itself, only the database store needs sweeping
+    if isinstance(store, DatabaseSessionStore) and app.config['SESSION_PURGE_INTERVAL'] > 0:
+        register_background_worker(app, start_session_purger)
+    logger.info(f"Server-side sessions initialized ({app.config['SESSION_BACKEND']})")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Server-side session maintenance')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('purge', help='Delete expired sessions now')
+    args = parser.parse_args(argv)
+
+    from .app import create_app
+    app = create_app()
+    store = app.extensions.get('session_store')
+    if store is None:
+        print('Sessions are stored in cookies, nothing to purge')
+        return 0
+    print(f"Purged {store.purge_expired(app.config['SESSION_PURGE_BATCH_SIZE'])} expired sessions")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,6 +4,7 @@ document.addEventListener('DOMContentLoaded', function() {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
+                'X-CSRFToken': document.querySelector('meta[name="csrf-token"]').content
             }
         })
         .then(response => response.json())
@@ -29,10 +30,11 @@ document.addEventListener('DOMContentLoaded', function() {
                     <h3>${data.title}</h3>
                     <p>${data.description}</p>
                     <div class="modal-actions">
-                        <button onclick="closeModal()">Close</button>
+                        <button class="close-modal">Close</button>
                     </div>
                 </div>
             `;
+            modal.querySelector('.close-modal').addEventListener('click', () => modal.remove());
             document.body.appendChild(modal);
         })
         .catch(error => console.error('Error:', error));
@@ -46,6 +48,15 @@ document.addEventListener('DOMContentLoaded', function() {
         window.location.href = '/support-issue';
     };
 
+    document.querySelectorAll('[data-toggle-resolved]').forEach(function(button) {
+        button.addEventListener('click', () => window.toggleResolved(button.dataset.toggleResolved));
+    });
+    document.querySelectorAll('[data-show-details]').forEach(function(button) {
+        button.addEventListener('click', () => window.showDetails(button.dataset.showDetails));
+    });
+    document.getElementById('downloadReportButton').addEventListener('click', window.downloadReport);
+    document.getElementById('proceedToSupportButton').addEventListener('click', window.proceedToSupport);
+
     function updateErrorCount() {
         const unresolvedErrors = document.querySelectorAll('.error-item:not(.resolved)').length;
         const errorStatus = document.querySelector('.error-status');
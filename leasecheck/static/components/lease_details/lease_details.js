@@ -26,4 +26,11 @@ document.addEventListener('DOMContentLoaded', function() {
             });
         }
     };
+
+    document.getElementById('confirmDetailsButton').addEventListener('click', window.confirmDetails);
+    document.querySelectorAll('.action-buttons [data-href]').forEach(function(button) {
+        button.addEventListener('click', function() {
+            window.location.href = button.dataset.href;
+        });
+    });
 });
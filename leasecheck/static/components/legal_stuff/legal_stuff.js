@@ -34,6 +34,12 @@ document.addEventListener('DOMContentLoaded', function() {
                 return;
             }
 
+            if (this.form.dataset.submit === 'server') {
+                // Record the acceptance, the server redirects to the next step
+                this.form.submit();
+                return;
+            }
+
             try {
                 // In preview mode, just redirect to the next step
                 window.location.href = '/preview/checkout';
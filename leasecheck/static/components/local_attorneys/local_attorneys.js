@@ -1,104 +1,172 @@
 document.addEventListener('DOMContentLoaded', function() {
-    const mockAttorneys = [
-        {
-            name: "Sarah Johnson",
-            specialty: "Real Estate Law",
-            experience: "15 years",
-            rating: 4.8,
-            cases: 250,
-            success: "95%"
-        },
-        {
-            name: "Michael Chen",
-            specialty: "Property Law",
-            experience: "12 years",
-            rating: 4.9,
-            cases: 180,
-            success: "92%"
-        },
-        {
-            name: "Emily Rodriguez",
-            specialty: "Housing Law",
-            experience: "8 years",
-            rating: 4.7,
-            cases: 120,
-            success: "90%"
+    const PER_PAGE = 12;
+    const grid = document.getElementById('attorneysGrid');
+    const noResults = document.getElementById('noResults');
+    const noResultsMessage = document.getElementById('noResultsMessage');
+    const locationInput = document.getElementById('locationInput');
+    const specialtySelect = document.getElementById('specialtySelect');
+    const loadMoreButton = document.getElementById('loadMoreButton');
+    const defaultMessage = noResultsMessage ? noResultsMessage.textContent : '';
+
+    let currentQuery = null;
+    let currentPage = 0;
+
+    function loadSpecialties() {
+        if (!specialtySelect) return;
+        fetch('/api/attorneys/specialties')
+            .then(response => response.ok ? response.json() : { specialties: [] })
+            .then(data => {
+                data.specialties.forEach(name => {
+                    const option = document.createElement('option');
+                    option.value = name;
+                    option.textContent = name;
+                    specialtySelect.appendChild(option);
+                });
+            })
+            .catch(error => console.error('Error loading specialties:', error));
+    }
+
+    function showNoResults(message) {
+        if (noResultsMessage) {
+            noResultsMessage.textContent = message || defaultMessage;
         }
-    ];
+        noResults.style.display = 'block';
+    }
 
     function searchAttorneys() {
-        const location = document.getElementById('locationInput').value;
-        const grid = document.getElementById('attorneysGrid');
-        const noResults = document.getElementById('noResults');
+        const location = locationInput.value.trim();
 
         // Clear existing results
         grid.innerHTML = '';
+        loadMoreButton.style.display = 'none';
 
-        if (location.trim() === '') {
-            noResults.style.display = 'block';
+        if (location === '') {
+            showNoResults('Enter a city, state or ZIP code to find attorneys near you.');
             return;
         }
 
-        // For demo purposes, always show mock attorneys
-        mockAttorneys.forEach(attorney => {
-            const card = createAttorneyCard(attorney);
-            grid.appendChild(card);
+        currentQuery = {
+            location: location,
+            specialty: specialtySelect ? specialtySelect.value : ''
+        };
+        currentPage = 0;
+        loadNextPage();
+    }
+
+    function loadNextPage() {
+        const params = new URLSearchParams({
+            location: currentQuery.location,
+            page: currentPage + 1,
+            per_page: PER_PAGE
         });
+        if (currentQuery.specialty) {
+            params.set('specialty', currentQuery.specialty);
+        }
+        const query = currentQuery;
+        loadMoreButton.disabled = true;
 
-        noResults.style.display = mockAttorneys.length === 0 ? 'block' : 'none';
+        fetch(`/api/attorneys?${params}`)
+            .then(response => response.json().then(data => ({ ok: response.ok, data: data })))
+            .then(({ ok, data }) => {
+                // Ignore a slow response to a search that has since been replaced
+                if (query !== currentQuery) return;
+                if (!ok) {
+                    showNoResults(data.error === 'Location not found'
+                        ? 'We could not find that location. Try a ZIP code or "City, ST".'
+                        : defaultMessage);
+                    return;
+                }
+
+                currentPage = data.page;
+                data.results.forEach(attorney => grid.appendChild(createAttorneyCard(attorney)));
+                if (grid.children.length === 0) {
+                    showNoResults();
+                } else {
+                    noResults.style.display = 'none';
+                }
+                loadMoreButton.style.display = data.hasMore ? 'inline-block' : 'none';
+            })
+            .catch(error => {
+                console.error('Error searching attorneys:', error);
+                showNoResults('Something went wrong while searching. Please try again.');
+            })
+            .finally(() => {
+                loadMoreButton.disabled = false;
+            });
+    }
+
+    function createStat(label, value) {
+        const item = document.createElement('div');
+        item.className = 'stat-item';
+        const labelElement = document.createElement('div');
+        labelElement.className = 'stat-label';
+        labelElement.textContent = label;
+        const valueElement = document.createElement('div');
+        valueElement.className = 'stat-value';
+        valueElement.textContent = value === null || value === undefined ? '-' : value;
+        item.append(labelElement, valueElement);
+        return item;
     }
 
     function createAttorneyCard(attorney) {
         const card = document.createElement('div');
         card.className = 'attorney-card';
-        
-        card.innerHTML = `
-            <div class="attorney-photo">👤</div>
-            <h3 class="attorney-name">${attorney.name}</h3>
-            <div class="attorney-specialty">${attorney.specialty}</div>
-            <div class="attorney-stats">
-                <div class="stat-item">
-                    <div class="stat-label">Experience</div>
-                    <div class="stat-value">${attorney.experience}</div>
-                </div>
-                <div class="stat-item">
-                    <div class="stat-label">Rating</div>
-                    <div class="stat-value">${attorney.rating}/5</div>
-                </div>
-                <div class="stat-item">
-                    <div class="stat-label">Cases</div>
-                    <div class="stat-value">${attorney.cases}</div>
-                </div>
-                <div class="stat-item">
-                    <div class="stat-label">Success Rate</div>
-                    <div class="stat-value">${attorney.success}</div>
-                </div>
-            </div>
-            <button class="contact-btn" onclick="contactAttorney('${attorney.name}')">Contact Attorney</button>
-        `;
-        
+
+        const photo = document.createElement('div');
+        photo.className = 'attorney-photo';
+        photo.textContent = '👤';
+
+        const name = document.createElement('h3');
+        name.className = 'attorney-name';
+        name.textContent = attorney.name;
+
+        const specialty = document.createElement('div');
+        specialty.className = 'attorney-specialty';
+        specialty.textContent = attorney.specialty;
+
+        const place = document.createElement('div');
+        place.className = 'attorney-location';
+        const town = [attorney.city, attorney.state].filter(Boolean).join(', ');
+        place.textContent = `${town ? town + ' · ' : ''}${attorney.distanceKm} km away`;
+
+        const stats = document.createElement('div');
+        stats.className = 'attorney-stats';
+        stats.append(
+            createStat('Experience', attorney.experience),
+            createStat('Rating', attorney.rating === null ? null : `${attorney.rating}/5`),
+            createStat('Cases', attorney.cases),
+            createStat('Success Rate', attorney.success)
+        );
+
+        const contact = document.createElement('button');
+        contact.className = 'contact-btn';
+        contact.textContent = 'Contact Attorney';
+        contact.addEventListener('click', () => contactAttorney(attorney));
+
+        card.append(photo, name, specialty, place, stats, contact);
         return card;
     }
 
-    function contactAttorney(attorneyName) {
+    function contactAttorney(attorney) {
         // Store attorney name in session storage for the acknowledgment page
-        sessionStorage.setItem('selectedAttorney', attorneyName);
+        sessionStorage.setItem('selectedAttorney', attorney.name);
+        sessionStorage.setItem('selectedAttorneyId', attorney.id);
         window.location.href = "/preview/lawyer_message_acknowledgment";
     }
 
-    // Initialize search on page load
-    searchAttorneys();
+    loadSpecialties();
 
     // Add event listener to search button
-    const searchButton = document.querySelector('.search-btn');
+    const searchButton = document.querySelector('.search-box .search-btn');
     if (searchButton) {
         searchButton.addEventListener('click', searchAttorneys);
     }
 
+    loadMoreButton.addEventListener('click', loadNextPage);
+
     // Add event listener for Enter key on search input
-    const searchInput = document.getElementById('locationInput');
-    if (searchInput) {
-        searchInput.addEventListener('keypress', function(e) {
+    if (locationInput) {
+        locationInput.addEventListener('keypress', function(e) {
             if (e.key === 'Enter') {
                 searchAttorneys();
             }
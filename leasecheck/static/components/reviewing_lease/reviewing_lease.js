@@ -11,13 +11,19 @@ document.addEventListener('DOMContentLoaded', function() {
             this.progressText = document.getElementById('progressText');
             this.statusList = document.getElementById('statusList');
             this.pageCount = document.getElementById('pageCount');
+            this.fileName = document.getElementById('fileName');
+            this.documentId = document.getElementById('reviewContainer').dataset.documentId;
+            // Only set when served through the ASGI entry point, where a stream holds no worker thread
+            this.progressStreamUrl = document.getElementById('reviewContainer').dataset.progressStream;
             this.timeRemaining = document.getElementById('timeRemaining');
             this.cancelButton = document.getElementById('cancelReview');
             this.currentProgress = 0;
             this.statuses = ['document', 'clauses', 'compliance', 'risks', 'report'];
             this.currentStatusIndex = 0;
             
-            // Mock data for preview
+            this.pollInterval = 1000;
+
+            // Mock data for preview, used when no document has been uploaded
             this.mockData = {
                 pageCount: 12,
                 totalTime: 90 // 90 seconds for preview
@@ -29,10 +35,73 @@ document.addEventListener('DOMContentLoaded', function() {
         }
 
         startReview() {
+            if (this.documentId) {
+                if (this.progressStreamUrl && window.EventSource) {
+                    this.streamProgress();
+                } else {
+                    this.pollProgress();
+                }
+                return;
+            }
             this.initializeReview();
             this.startProgressSimulation();
         }
 
+        async pollProgress() {
+            try {
+                const response = await fetch(`/api/document-progress?document_id=${this.documentId}`);
+                if (!response.ok) {
+                    throw new Error(`Progress request failed with status ${response.status}`);
+                }
+                const progress = await response.json();
+                this.applyProgress(progress);
+
+                if (progress.status === 'processed') {
+                    this.completeReview();
+                    return;
+                }
+                if (progress.status === 'error') {
+                    this.progressText.textContent = progress.error || 'Error analyzing lease';
+                    return;
+                }
+            } catch (error) {
+                console.error('Error fetching review progress:', error);
+            }
+            this.progressTimeout = setTimeout(() => this.pollProgress(), this.pollInterval);
+        }
+
+        streamProgress() {
+            const source = new EventSource(`${this.progressStreamUrl}?document_id=${this.documentId}`);
+            source.onmessage = (event) => {
+                const progress = JSON.parse(event.data);
+                this.applyProgress(progress);
+                if (progress.status === 'processed') {
+                    source.close();
+                    this.completeReview();
+                } else if (progress.status === 'error') {
+                    source.close();
+                    this.progressText.textContent = progress.error || 'Error analyzing lease';
+                }
+            };
+            source.onerror = () => {
+                // Stream ended early or was refused, carry on by polling
+                source.close();
+                this.pollProgress();
+            };
+        }
+
+        applyProgress(progress) {
+            this.fileName.textContent = progress.fileName;
+            this.pageCount.textContent = `${progress.pageCount} pages`;
+            this.updateProgress(progress.percent);
+            this.updateTimeRemaining(progress.secondsRemaining);
+
+            // Advance the status list in step with the real progress
+            while (this.currentStatusIndex < Math.floor(progress.percent / 20)) {
+                this.updateStatus();
+            }
+        }
+
         initializeReview() {
             this.updateDocumentInfo();
         }
@@ -111,6 +180,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
         handleCancel() {
             if (confirm('Are you sure you want to cancel the review? All progress will be lost.')) {
+                clearTimeout(this.progressTimeout);
                 window.location.href = '/lease-upload';
             }
         }
@@ -59,24 +59,9 @@ document.addEventListener('DOMContentLoaded', function() {
             `).join('');
         }
 
-        async handleSaveReport() {
-            try {
-                const response = await fetch('/api/save-report', {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json',
-                    }
-                });
-                
-                if (response.ok) {
-                    this.showSuccess('Report saved successfully');
-                } else {
-                    throw new Error('Failed to save report');
-                }
-            } catch (error) {
-                console.error('Error saving report:', error);
-                this.showError('Failed to save report');
-            }
+        handleSaveReport() {
+            // The save page asks where to send the report and carries the CSRF token
+            window.location.href = '/save-report';
         }
 
         handleContactAttorney() {
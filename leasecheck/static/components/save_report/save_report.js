@@ -12,13 +12,14 @@ document.addEventListener('DOMContentLoaded', function() {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
+                    'X-CSRFToken': data.csrf_token || '',
                 },
                 body: JSON.stringify(data)
             })
             .then(response => response.json())
             .then(data => {
                 if (data.success) {
-                    window.location.href = '/preview/report_sent';
+                    window.location.href = data.redirect || '/report-sent';
                 } else {
                     alert('Error saving report. Please try again.');
                 }
@@ -29,3 +29,12 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 });
+
+// Shared button behaviour, declared with data attributes since the nonce CSP blocks onclick
+document.addEventListener('click', function(event) {
+    if (event.target.closest('[data-history-back]')) {
+        window.history.back();
+    } else if (event.target.closest('[data-window-close]')) {
+        window.close();
+    }
+});
@@ -0,0 +1,158 @@
+import os
+import gzip
+import logging
+import mimetypes
+from flask import current_app, request, send_from_directory, abort
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional, gzip is always available
+    brotli = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Asset types worth compressing; PNG/JPEG/WOFF2 are already compressed
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.html', '.json', '.txt', '.xml', '.map')
+
+# Only keep a compressed sibling if it saves at least this fraction of the original
+MIN_COMPRESSION_RATIO = 0.9
+
+# Encodings in order of preference, mapped to the sibling file suffix
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+def _compress_gzip(data):
+    """Gzip compress data reproducibly (fixed mtime)"""
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+def _compress_brotli(data):
+    """Brotli compress data at maximum quality"""
+    return brotli.compress(data, quality=11)
+
+def _is_stale(source_path, target_path):
+    """Check whether a compressed sibling is missing or older than its source"""
+    if not os.path.exists(target_path):
+        return True
+    return os.path.getmtime(target_path) < os.path.getmtime(source_path)
+
+def build_precompressed(static_folder, force=False):
+    """Write .gz (and .br if available) siblings for every compressible static asset"""
+    compressors = [('.gz', _compress_gzip)]
+    if brotli is not None:
+        compressors.append(('.br', _compress_brotli))
+    else:
+        logger.info("Brotli not installed, writing gzip siblings only")
+
+    stats = {'written': 0, 'skipped': 0, 'unchanged': 0}
+    for root, _, files in os.walk(static_folder):
+        for name in files:
+            if not name.lower().endswith(COMPRESSIBLE_EXTENSIONS):
+                continue
+            source_path = os.path.join(root, name)
+            with open(source_path, 'rb') as f:
+                data = f.read()
+
+            for suffix, compress in compressors:
+                target_path = source_path + suffix
+                if not force and not _is_stale(source_path, target_path):
+                    stats['unchanged'] += 1
+                    continue
+                compressed = compress(data)
+                if len(compressed) > len(data) * MIN_COMPRESSION_RATIO:
+                    # Not worth the decode cost, drop any outdated sibling
+                    if os.path.exists(target_path):
+                        os.remove(target_path)
+                    stats['skipped'] += 1
+                    continue
+                tmp_path = target_path + '.tmp'
+                with open(tmp_path, 'wb') as f:
+                    f.write(compressed)
+                os.replace(tmp_path, target_path)
+                stats['written'] += 1
+
+    logger.info(f"Precompressed static assets: {stats}")
+    return stats
+
+def scan_precompressed(static_folder):
+    """Map each static asset path to the encodings that have a sibling on disk"""
+    variants = {}
+    for root, _, files in os.walk(static_folder):
+        present = set(files)
+        for name in files:
+            available = tuple(
+                encoding for encoding, suffix in ENCODINGS if name + suffix in present
+            )
+            if available:
+                rel_path = os.path.relpath(os.path.join(root, name), static_folder)
+                variants[rel_path.replace(os.sep, '/')] = available
+    return variants
+
+def _available_encodings(filename):
+    """Get the precompressed encodings available for a static file"""
+    app = current_app
+    if app.debug:
+        # Assets change under the reloader, so look at the disk every time
+        static_path = safe_join(app.static_folder, filename)
+        if static_path is None:
+            return ()
+        return tuple(
+            encoding for encoding, suffix in ENCODINGS
+            if os.path.exists(static_path + suffix)
+        )
+    return app.extensions['static_assets'].get(filename, ())
+
+def choose_encoding(accept_encodings, available):
+    """Pick the best available encoding the client accepts, or None for identity"""
+    for encoding in available:
+        if accept_encodings[encoding] > 0:
+            return encoding
+    return None
+
+def send_static_file(filename):
+    """Serve a static file, preferring a precompressed sibling when accepted"""
+    app = current_app
+    if not app.static_folder:
+        abort(404)
+
+    available = _available_encodings(filename)
+    encoding = choose_encoding(request.accept_encodings, available) if available else None
+    max_age = app.get_send_file_max_age(filename)
+
+    if encoding is None:
+        response = send_from_directory(app.static_folder, filename, max_age=max_age)
+    else:
+        suffix = dict(ENCODINGS)[encoding]
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        # send_file streams through wsgi.file_wrapper, which lets servers
+        # such as gunicorn use sendfile() for zero-copy delivery
+        response = send_from_directory(
+            app.static_folder, filename + suffix, mimetype=mimetype, max_age=max_age
+        )
+        response.headers['Content-Encoding'] = encoding
+
+    if available:
+        # Caches must key on Accept-Encoding whenever variants exist
+        response.vary.add('Accept-Encoding')
+    return response
+
+def init_static_assets(app):
+    """Serve precompressed static assets through the default static endpoint"""
+    if not app.static_folder or 'static' not in app.view_functions:
+        logger.warning("No static endpoint registered, skipping precompressed assets")
+        return
+
+    if app.config.get('STATIC_PRECOMPRESS_ON_STARTUP'):
+        build_precompressed(app.static_folder)
+
+    app.extensions['static_assets'] = scan_precompressed(app.static_folder)
+    app.view_functions['static'] = send_static_file
+    logger.info(
+        f"Precompressed static assets enabled ({len(app.extensions['static_assets'])} assets)"
+    )
+
+if __name__ == '__main__':
+    import sys
+    logging.basicConfig(level=logging.INFO)
+    folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+    build_precompressed(folder, force='--force' in sys.argv)
@@ -0,0 +1,270 @@
+import hmac
+import json
+import time
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import func, or_, case
+from sqlalchemy.dialects import postgresql, sqlite
+from .database import db
+from .models import Payment, StripeEvent
+from .outbox import Outbox, OutboxWorker
+from .entitlements import sync_entitlements, refresh_balance
+from .app import register_background_worker
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+SIGNATURE_SCHEME = 'v1'
+DEFAULT_TOLERANCE = 300  # seconds a signed timestamp stays valid, as in Stripe's own libraries
+
+MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 10  # seconds, doubled after every failed attempt
+CLAIM_LEASE = timedelta(minutes=5)  # a crashed processor's events become claimable again after this
+
+inbox = Outbox(
+    StripeEvent, 'Stripe event', waiting='pending', working='processing',
+    max_attempts=MAX_ATTEMPTS, retry_base_delay=RETRY_BASE_DELAY, lease=CLAIM_LEASE, key='event_id'
+)
+
+# Payment intent events and the Payment.status they leave behind
+PAYMENT_INTENT_STATUSES = {
+    'payment_intent.succeeded': 'succeeded',
+    'payment_intent.processing': 'processing',
+    'payment_intent.payment_failed': 'failed',
+    'payment_intent.canceled': 'canceled'
+}
+
+class SignatureVerificationError(Exception):
+    """A webhook body does not carry a valid, fresh Stripe signature"""
+    pass
+
+def sign_payload(payload, secret, timestamp=None):
+    """Stripe-Signature header for a payload, used to send locally signed test events"""
+    timestamp = int(time.time() if timestamp is None else timestamp)
+    signed = f"{timestamp}.".encode() + payload
+    signature = hmac.new(secret.encode(), signed, hashlib.sha256).hexdigest()
+    return f"t={timestamp},{SIGNATURE_SCHEME}={signature}"
+
+def verify_signature(payload, header, secret, tolerance=DEFAULT_TOLERANCE):
+    """Check a Stripe-Signature header against the raw request body with Stripe's own verifier"""
+    try:
+        import stripe
+    except ImportError as e:
+        raise RuntimeError(f"Verifying Stripe webhooks needs the stripe package: {str(e)}")
+    try:
+        stripe.Webhook.construct_event(payload, header or '', secret, tolerance=tolerance)
+    except stripe.SignatureVerificationError as e:
+        raise SignatureVerificationError(str(e))
+
+def _insert(model):
+    # ON CONFLICT needs the dialect's own insert construct
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(model)
+    if dialect == 'sqlite':
+        return sqlite.insert(model)
+    raise RuntimeError(f"Stripe event ingestion needs SQLite or Postgres, not {dialect}")
+
+def record_event(payload):
+    """Append a verified event to the inbox, returning (event_id, newly_recorded)"""
+    event = json.loads(payload)
+    if not isinstance(event, dict):
+        raise ValueError('Event is not a JSON object')
+    event_id, event_type = event.get('id'), event.get('type')
+    if not event_id or not event_type:
+        raise ValueError('Event has no id or type')
+    created = event.get('created')
+
+    # Stripe redelivers events, the unique event id turns a redelivery into a no-op
+    statement = _insert(StripeEvent).values(
+        event_id=event_id,
+        event_type=event_type,
+        payload=payload.decode('utf-8'),
+        stripe_created_at=datetime.utcfromtimestamp(created) if isinstance(created, int) else None,
+        received_at=datetime.utcnow(),
+        status='pending',
+        attempts=0,
+        next_attempt_at=datetime.utcnow()
+    ).on_conflict_do_nothing(index_elements=['event_id'])
+    inserted = db.session.execute(statement).rowcount == 1
+    db.session.commit()
+
+    if inserted:
+        inbox.wake()
+    return event_id, inserted
+
+def claim_pending_events(limit):
+    """Atomically claim up to limit due events, oldest first, returning the claim token and their ids"""
+    return inbox.claim(limit)
+
+def payment_row(event):
+    """Payment upsert values for an event, or None for events that do not touch payments"""
+    event_type = event['type']
+    obj = event['data']['object']
+    metadata = obj.get('metadata') or {}
+    row = {
+        'currency': (obj.get('currency') or 'usd').upper(),
+        'user_email': metadata.get('email') or obj.get('receipt_email') or '',
+        'plan_name': metadata.get('plan') or '',
+        'created_at': datetime.utcfromtimestamp(obj.get('created') or event['created']),
+        'stripe_updated_at': datetime.utcfromtimestamp(event['created'])
+    }
+    if event_type in PAYMENT_INTENT_STATUSES:
+        row.update({
+            'stripe_payment_id': obj['id'],
+            'amount': obj.get('amount_received') or obj.get('amount') or 0,
+            'status': PAYMENT_INTENT_STATUSES[event_type]
+        })
+    elif event_type == 'checkout.session.completed' and obj.get('payment_intent'):
+        row.update({
+            'stripe_payment_id': obj['payment_intent'],
+            'amount': obj.get('amount_total') or 0,
+            'status': 'succeeded' if obj.get('payment_status') == 'paid' else 'pending',
+            'user_email': row['user_email'] or (obj.get('customer_details') or {}).get('email') or ''
+        })
+    elif event_type == 'charge.refunded' and obj.get('payment_intent'):
+        row.update({
+            'stripe_payment_id': obj['payment_intent'],
+            'amount': obj.get('amount') or 0,
+            'status': 'refunded' if obj.get('refunded') else 'partially_refunded'
+        })
+    else:
+        return None
+    return row
+
+def upsert_payments(rows):
+    """Insert or update payments in one statement, never letting an older event win"""
+    statement = _insert(Payment)
+    excluded = statement.excluded
+    newer = or_(Payment.stripe_updated_at.is_(None), Payment.stripe_updated_at <= excluded.stripe_updated_at)
+    statement = statement.on_conflict_do_update(
+        index_elements=['stripe_payment_id'],
+        set_={
+            'status': case((newer, excluded.status), else_=Payment.status),
+            'amount': case((newer, excluded.amount), else_=Payment.amount),
+            'currency': case((newer, excluded.currency), else_=Payment.currency),
+            'stripe_updated_at': case((newer, excluded.stripe_updated_at), else_=Payment.stripe_updated_at),
+            # Refund events carry no metadata, so any event may fill in a blank email or plan
+            'user_email': func.coalesce(func.nullif(Payment.user_email, ''), excluded.user_email),
+            'plan_name': func.coalesce(func.nullif(Payment.plan_name, ''), excluded.plan_name)
+        }
+    )
+    db.session.execute(statement, rows)
+
+def create_payment_intent(secret_key, user_email, plan_name, amount):
+    """Create a Stripe payment intent for a plan and record it against the buyer, returning its client secret"""
+    try:
+        import stripe
+    except ImportError as e:
+        raise RuntimeError(f"Taking payments needs the stripe package: {str(e)}")
+    # The metadata is what lets the webhook events grant the plan to this account
+    intent = stripe.PaymentIntent.create(
+        api_key=secret_key,
+        amount=amount,
+        currency='usd',
+        receipt_email=user_email,
+        metadata={'email': user_email, 'plan': plan_name},
+        automatic_payment_methods={'enabled': True}
+    )
+    # Recorded now too, so the buyer is known even if an event arrives without metadata.
+    # No stripe_updated_at, every event for the intent overrides this pending status
+    statement = _insert(Payment).values(
+        stripe_payment_id=intent['id'], user_email=user_email, amount=amount, currency='USD',
+        status='pending', plan_name=plan_name, created_at=datetime.utcnow()
+    ).on_conflict_do_nothing(index_elements=['stripe_payment_id'])
+    db.session.execute(statement)
+    db.session.commit()
+    return intent['client_secret']
+
+def _merge_rows(current, row):
+    # Keep the newest event's status, and the first email and plan any event carried
+    newest = row if current['stripe_updated_at'] <= row['stripe_updated_at'] else current
+    merged = dict(newest)
+    for key in ('user_email', 'plan_name'):
+        merged[key] = current[key] or row[key]
+    merged['created_at'] = min(current['created_at'], row['created_at'])
+    return merged
+
+def process_batch(app, token, event_ids):
+    """Apply a batch of events claimed under token with a single payment upsert"""
+    with app.app_context():
+        try:
+            events = StripeEvent.query.filter(StripeEvent.id.in_(event_ids), StripeEvent.claim_token == token).all()
+            outcomes, payments = [], {}
+            now = datetime.utcnow()
+            for event in events:
+                try:
+                    row = payment_row(json.loads(event.payload))
+                except (ValueError, KeyError, TypeError) as e:
+                    outcomes.append((event, inbox.failure(event, f"Unreadable event: {str(e)}")))
+                    continue
+                outcomes.append((event, {'status': 'ignored' if row is None else 'processed', 'processed_at': now}))
+                if row is not None:
+                    payments[event.id] = row
+
+            try:
+                # Events whose claim was lost are left to the processor that holds them now
+                held = inbox.settle(token, outcomes)
+                rows = {}
+                for event_id in sorted(held & payments.keys()):
+                    # Several events for one payment in a batch collapse to the newest
+                    row = payments[event_id]
+                    current = rows.get(row['stripe_payment_id'])
+                    rows[row['stripe_payment_id']] = row if current is None else _merge_rows(current, row)
+                affected_users = set()
+                if rows:
+                    upsert_payments(list(rows.values()))
+                    # Purchases and refunds move the quota counters in the same transaction
+                    affected_users = sync_entitlements(list(rows))
+                db.session.commit()
+                for user_id in affected_users:
+                    refresh_balance(user_id)
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Error applying Stripe event batch: {str(e)}")
+                # The rollback restored the claims, settle again with the applied events failed
+                inbox.settle(token, [
+                    (event, inbox.failure(event, e) if event.id in payments else outcome) for event, outcome in outcomes
+                ])
+                db.session.commit()
+                return 0
+            return len(held)
+        finally:
+            db.session.remove()
+
+class StripeEventWorker(OutboxWorker):
+    """Background processor that drains the Stripe event inbox in batches"""
+
+    def __init__(self, app, batch_size=200, poll_interval=2.0):
+        super().__init__(
+            app, inbox, process_batch, batch_size=batch_size, poll_interval=poll_interval, name='stripe-events'
+        )
+
+def build_worker(app):
+    return StripeEventWorker(
+        app,
+        batch_size=app.config['STRIPE_EVENT_BATCH_SIZE'],
+        poll_interval=app.config['STRIPE_EVENT_POLL_INTERVAL']
+    )
+
+def warn_without_event_worker(app):
+    logger.warning(
+        "STRIPE_WEBHOOK_SECRET is set but STRIPE_EVENT_WORKER is off, webhook events are only "
+        "recorded until a processor runs (python -m leasecheck.stripe_events)"
+    )
+
+def init_stripe_events(app):
+    """Configure Stripe event ingestion and schedule the in-process processor if enabled"""
+    inbox.register(
+        app, build_worker, 'leasecheck_stripe_inbox_events', 'Stripe webhook inbox events by status',
+        enabled=app.config.get('STRIPE_EVENT_WORKER')
+    )
+
+    if not app.config.get('STRIPE_EVENT_WORKER') and app.config.get('STRIPE_WEBHOOK_SECRET'):
+        # Only in processes that serve requests, the standalone processor builds the same app
+        register_background_worker(app, warn_without_event_worker)
+
+if __name__ == '__main__':
+    # Standalone processor: python -m leasecheck.stripe_events
+    inbox.run_standalone(build_worker)
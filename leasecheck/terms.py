@@ -0,0 +1,196 @@
+import sys
+import uuid
+import logging
+import argparse
+from datetime import datetime
+from functools import wraps
+from urllib.parse import urlsplit
+from flask import current_app, session, request, redirect, url_for, flash, jsonify
+from sqlalchemy import select, insert, func, exists, literal
+from sqlalchemy.orm import aliased
+from .database import db
+from .cache import cache
+from .models import AdminUser, TermsAcceptance, TermsVersion
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+ACCEPTANCE_TIMEOUT = 24 * 3600  # seconds, entries are also orphaned when the version tag changes
+# The cache is per process, an acceptance recorded by another worker is seen within this
+NOT_ACCEPTED_TIMEOUT = 30  # seconds
+BULK_CHUNK_SIZE = 1000
+
+def current_terms_version():
+    """Newest published terms version, falling back to TERMS_VERSION before any is published"""
+    version = cache.get('terms_current')
+    if version is None:
+        latest = TermsVersion.query.order_by(TermsVersion.published_at.desc(), TermsVersion.id.desc()).first()
+        version = latest.version if latest else current_app.config['TERMS_VERSION']
+        # Other processes pick up a newly published version within this refresh window
+        cache.set('terms_current', version, timeout=current_app.config['TERMS_VERSION_REFRESH'])
+    return version
+
+def _version_tag(version):
+    tag = cache.get(f"terms_tag_{version}")
+    if tag is None:
+        tag = uuid.uuid4().hex
+        cache.set(f"terms_tag_{version}", tag, timeout=0)
+    return tag
+
+def invalidate_terms_version(version):
+    """Drop every cached acceptance for a version by giving it a new tag"""
+    cache.set(f"terms_tag_{version}", uuid.uuid4().hex, timeout=0)
+    cache.delete('terms_current')
+
+def _acceptance_key(email, version):
+    return f"terms_{version}_{_version_tag(version)}_{email.lower()}"
+
+def has_accepted(email, version=None):
+    """Whether the email has accepted the terms version, answered from the cache when possible"""
+    version = version or current_terms_version()
+    key = _acceptance_key(email, version)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached == 1
+    accepted = db.session.query(exists().where(
+        TermsAcceptance.terms_version == version,
+        TermsAcceptance.user_email == email.lower()
+    )).scalar()
+    cache.set(key, 1 if accepted else 0, timeout=ACCEPTANCE_TIMEOUT if accepted else NOT_ACCEPTED_TIMEOUT)
+    return accepted
+
+def record_acceptance(email, ip_address=None, version=None):
+    """Record one acceptance, returning False if the email had already accepted"""
+    return record_acceptances([(email, ip_address)], version=version) == 1
+
+def record_acceptances(rows, version=None):
+    """Record (email, ip_address) acceptances in bulk, skipping emails that already accepted"""
+    version = version or current_terms_version()
+    # Emails are stored lowercased so the gate check can use the (version, email) index
+    pending = {}
+    for email, ip_address in rows:
+        pending.setdefault(email.lower(), ip_address)
+
+    recorded = 0
+    keys = list(pending)
+    for offset in range(0, len(keys), BULK_CHUNK_SIZE):
+        chunk = keys[offset:offset + BULK_CHUNK_SIZE]
+        accepted = {
+            email for email, in db.session.query(TermsAcceptance.user_email).filter(
+                TermsAcceptance.terms_version == version,
+                TermsAcceptance.user_email.in_(chunk)
+            )
+        }
+        now = datetime.utcnow()
+        new_rows = [
+            {'user_email': email, 'ip_address': pending[email], 'terms_version': version, 'accepted_at': now}
+            for email in chunk if email not in accepted
+        ]
+        if new_rows:
+            db.session.execute(insert(TermsAcceptance), new_rows)
+        db.session.commit()
+        recorded += len(new_rows)
+        # Write-through, the next gate check for these emails is a cache hit
+        cache.set_many({_acceptance_key(email, version): 1 for email in chunk}, timeout=ACCEPTANCE_TIMEOUT)
+    return recorded
+
+def backfill_acceptances(from_version, to_version, batch_size=BULK_CHUNK_SIZE):
+    """Copy acceptances of one version to another in id-range batches, returning rows copied"""
+    newer = aliased(TermsAcceptance)
+    last_id, copied = 0, 0
+    max_id = db.session.query(func.max(TermsAcceptance.id)).scalar() or 0
+    while last_id < max_id:
+        source = select(
+            TermsAcceptance.user_email, TermsAcceptance.accepted_at,
+            TermsAcceptance.ip_address, literal(to_version)
+        ).where(
+            TermsAcceptance.terms_version == from_version,
+            TermsAcceptance.id > last_id,
+            TermsAcceptance.id <= last_id + batch_size,
+            ~exists().where(newer.terms_version == to_version, newer.user_email == TermsAcceptance.user_email)
+        )
+        copied += db.session.execute(insert(TermsAcceptance).from_select(
+            ['user_email', 'accepted_at', 'ip_address', 'terms_version'], source
+        )).rowcount
+        db.session.commit()
+        last_id += batch_size
+    return copied
+
+def publish_terms_version(version, carry_over=False):
+    """Make a version current, optionally carrying earlier acceptances forward"""
+    previous = current_terms_version()
+    copied = 0
+    if carry_over and previous != version:
+        # Copied before the version becomes current, so no worker ever finds a carried-over user missing
+        copied = backfill_acceptances(previous, version)
+    db.session.add(TermsVersion(version=version, carried_over=carry_over))
+    db.session.commit()
+    invalidate_terms_version(version)
+    logger.info(f"Published terms version {version} (previous {previous}, {copied} acceptances carried over)")
+    return copied
+
+def session_email():
+    """Email of the signed-in user, kept in the session after the first lookup"""
+    if 'user_id' not in session:
+        return None
+    email = session.get('user_email')
+    if email is None:
+        user = db.session.get(AdminUser, session['user_id'])
+        if user is None:
+            return None
+        email = session['user_email'] = user.email
+    return email
+
+def safe_next_url(url):
+    """A path on this site to return to after accepting the terms, or None"""
+    if not url or not url.startswith('/'):
+        return None
+    # Browsers read a backslash as a slash and drop tabs and newlines, so /\evil.com leaves the site
+    if '\\' in url or any(ord(char) < 32 for char in url):
+        return None
+    parts = urlsplit(url)
+    if parts.scheme or parts.netloc:
+        return None
+    return url
+
+def terms_required(view):
+    """Send visitors to login, and signed-in users to the legal page until they accept the current terms"""
+    @wraps(view)
+    def decorated_function(*args, **kwargs):
+        if current_app.config['TERMS_GATE_ENABLED']:
+            email = session_email()
+            if email is None:
+                if request.path.startswith('/api/'):
+                    return jsonify({'error': 'Login required'}), 401
+                flash('Please login to continue', 'info')
+                return redirect(url_for('main.login'))
+            if not has_accepted(email):
+                if request.path.startswith('/api/'):
+                    return jsonify({'error': 'The current terms have not been accepted'}), 403
+                flash('Please accept the current terms to continue', 'info')
+                return redirect(url_for('main.legal_stuff', next=request.full_path))
+        return view(*args, **kwargs)
+    return decorated_function
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Terms version management')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    publish_parser = subparsers.add_parser('publish', help='Publish a new terms version')
+    publish_parser.add_argument('version', help='Version label, e.g. 2025-01-15')
+    publish_parser.add_argument('--carry-over', action='store_true',
+                                help='Count acceptances of the previous version for this one')
+    subparsers.add_parser('current', help='Print the current terms version')
+    args = parser.parse_args(argv)
+
+    from .app import create_app
+    app = create_app()
+    with app.app_context():
+        if args.command == 'publish':
+            copied = publish_terms_version(args.version, carry_over=args.carry_over)
+            print(f"Published {args.version}, {copied} acceptances carried over")
+        else:
+            print(current_terms_version())
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+import os
+import uuid
+import atexit
+import logging
+import threading
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from .process_pool import pool_context
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Open readers kept per worker process, so each PDF's xref is parsed once, not once per page
+READER_CACHE_SIZE = 8
+
+class ExtractionUnavailable(RuntimeError):
+    """Text extraction is not possible in this environment"""
+    pass
+
+class ExtractionError(RuntimeError):
+    """The uploaded file could not be read as a PDF"""
+    pass
+
+def _pdf_reader_class():
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise ExtractionUnavailable("pypdf is not installed, cannot extract lease text")
+    return PdfReader
+
+@lru_cache(maxsize=READER_CACHE_SIZE)
+def _open_reader(path, mtime):
+    """Parse a PDF once per process; mtime in the key drops readers of replaced files"""
+    return _pdf_reader_class()(path)
+
+def _reader(path):
+    try:
+        return _open_reader(path, os.path.getmtime(path))
+    except ExtractionUnavailable:
+        raise
+    except Exception as e:
+        raise ExtractionError(f"Could not read {os.path.basename(path)}: {str(e)}")
+
+def count_pages(path):
+    """Real page count of an uploaded PDF"""
+    return len(_reader(path).pages)
+
+def extract_page_text(path, page_number):
+    """Extract the text of one page (1-based), run inside the extraction pool"""
+    page = _reader(path).pages[page_number - 1]
+    try:
+        return page.extract_text() or ''
+    except Exception as e:
+        logger.error(f"Error extracting page {page_number} of {os.path.basename(path)}: {str(e)}")
+        return ''
+
+def page_cache_path(folder, content_hash, page_number):
+    """Cached text of one page, keyed by file content so re-uploads reuse it"""
+    return os.path.join(folder, content_hash[:2], content_hash, f"{page_number}.txt")
+
+def read_cached_page(folder, content_hash, page_number):
+    try:
+        with open(page_cache_path(folder, content_hash, page_number), encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+def write_cached_page(folder, content_hash, page_number, text):
+    path = page_cache_path(folder, content_hash, page_number)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_extraction_pool(processes):
+    """Shared process pool for page extraction"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=processes, mp_context=pool_context())
+            atexit.register(shutdown_extraction_pool)
+            logger.info(f"Started text extraction pool with {processes} processes")
+        return _pool
+
+def shutdown_extraction_pool():
+    """Stop the extraction pool, waiting for running jobs"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
+
+def extract_pages(path, content_hash, page_count, cache_folder, processes=0):
+    """Yield (page_number, text) in page order as soon as each page is ready"""
+    # Uncached pages are all submitted up front, so page 1 reaches the consumer
+    # while later pages are still being extracted
+    pending = {}
+    if processes > 0:
+        pool = get_extraction_pool(processes)
+        for page_number in range(1, page_count + 1):
+            if not os.path.exists(page_cache_path(cache_folder, content_hash, page_number)):
+                pending[page_number] = pool.submit(extract_page_text, path, page_number)
+
+    try:
+        for page_number in range(1, page_count + 1):
+            future = pending.pop(page_number, None)
+            if future is not None:
+                text = future.result()
+            else:
+                text = read_cached_page(cache_folder, content_hash, page_number)
+                if text is not None:
+                    yield page_number, text
+                    continue
+                text = extract_page_text(path, page_number)
+            write_cached_page(cache_folder, content_hash, page_number, text)
+            yield page_number, text
+    finally:
+        # The consumer stopped early, don't keep the pool busy with unwanted pages
+        for future in pending.values():
+            future.cancel()
+
+def init_text_extraction(app):
+    """Prepare the per-page text cache folder"""
+    os.makedirs(app.config['TEXT_CACHE_FOLDER'], exist_ok=True)
+    logger.info(f"Text extraction configured ({app.config['EXTRACTION_PROCESSES']} extraction processes)")
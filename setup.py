@@ -14,7 +14,10 @@ setup(
         "leasecheck": [
             "templates/*.html",
             "static/css/*.css",
-            "static/images/*"
+            "static/images/*",
+            "rules/*.json",
+            "migrations/*",
+            "migrations/versions/*.py"
         ],
     },
 )
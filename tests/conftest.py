@@ -0,0 +1,34 @@
+import os
+import shutil
+import tempfile
+
+import pytest
+
+# Importing the package builds the app, so point it at throwaway storage first
+_workdir = tempfile.mkdtemp(prefix='leasecheck-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_workdir, 'leasecheck.db')}"
+for _name, _folder in (
+    ('UPLOAD_FOLDER', 'uploads'), ('TEXT_CACHE_FOLDER', 'text_cache'), ('ARCHIVE_FOLDER', 'archive'),
+    ('REPORT_FOLDER', 'reports'), ('PROFILING_DIR', 'profiles')
+):
+    os.environ[_name] = os.path.join(_workdir, _folder)
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_workdir, ignore_errors=True)
+
+@pytest.fixture(scope='session')
+def app():
+    from leasecheck import app
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False, RATE_LIMIT_ENABLED=False)
+    return app
+
+@pytest.fixture
+def db(app):
+    """The database inside an app context, emptied again after the test"""
+    from leasecheck.database import db
+    with app.app_context():
+        yield db
+        db.session.remove()
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+        db.session.commit()
@@ -0,0 +1,96 @@
+import os
+
+import pytest
+
+from leasecheck import analysis
+from leasecheck.analysis import register_upload, run_analysis
+from leasecheck.models import Document
+from leasecheck.sections import IncrementalScorer
+
+LEASE = [
+    "1. Rent. The tenant pays rent of $1,500 on the first day of each month.\n",
+    "2. Deposit. The tenant pays a security deposit of $1,500, returned within 14 days of move-out.\n",
+    "3. Entry. The landlord gives 24 hours written notice before entering the premises.\n"
+]
+
+class Uploads:
+    """Scorers built by run_analysis, with extraction served from the text each upload wrote"""
+
+    def __init__(self):
+        self.scorers = []
+        self.texts = {}
+
+    @property
+    def stats(self):
+        return self.scorers[-1].stats
+
+@pytest.fixture
+def uploads(app, monkeypatch):
+    recorder = Uploads()
+
+    class RecordingScorer(IncrementalScorer):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            recorder.scorers.append(self)
+
+    monkeypatch.setattr(analysis, 'IncrementalScorer', RecordingScorer)
+    monkeypatch.setattr(analysis, 'count_pages', lambda path: 1)
+    monkeypatch.setattr(analysis, 'extract_pages', lambda path, content_hash, *args: [(1, recorder.texts[content_hash])])
+    return recorder
+
+def upload(app, db, uploads, sections, user_id=1, name='lease.pdf', **kwargs):
+    text = ''.join(sections)
+    stored = f"{len(uploads.scorers)}_{name}"
+    path = os.path.join(app.config['UPLOAD_FOLDER'], stored)
+    with open(path, 'w') as f:
+        f.write(text)
+    document = register_upload(path, name, stored, user_id=user_id, **kwargs)
+    uploads.texts[document.content_hash] = text
+    run_analysis(app, document.id)
+    db.session.expire_all()
+    return db.session.get(Document, document.id)
+
+def test_revised_upload_rescans_only_the_edited_section(app, db, uploads):
+    first = upload(app, db, uploads, LEASE)
+    assert first.status == 'processed'
+    assert uploads.stats['rescanned'] == 3
+
+    revised = list(LEASE)
+    revised[1] = "2. Deposit. The tenant pays a non-refundable deposit of $1,500.\n"
+    second = upload(app, db, uploads, revised)
+
+    assert second.revision_of_id == first.id
+    assert second.status == 'processed'
+    assert uploads.stats['rescanned'] == 1
+    assert uploads.stats['reused'] == 2
+    rules = {factor['rule']: factor['id'] for factor in second.risk_factors}
+    assert 'deposit-nonrefundable' in rules
+    # Findings of the first version that survive keep their ids
+    for factor in first.risk_factors:
+        if factor['rule'] in rules:
+            assert rules[factor['rule']] == factor['id']
+
+def test_resolved_marks_carry_over_to_the_revision(app, db, uploads):
+    first = upload(app, db, uploads, LEASE)
+    kept = first.risk_factors[0]
+    first.annotations = {'resolved': [kept['id']]}
+    db.session.commit()
+
+    second = upload(app, db, uploads, LEASE[:2] + ["3. Entry. The landlord may enter without notice.\n"])
+    assert second.annotations == {'resolved': [kept['id']]}
+
+def test_another_users_lease_is_never_the_base(app, db, uploads):
+    first = upload(app, db, uploads, LEASE, user_id=1)
+    second = upload(app, db, uploads, LEASE, user_id=2)
+    assert second.revision_of_id is None
+    assert uploads.stats['rescanned'] == 3
+
+    # Nor when named explicitly
+    third = upload(app, db, uploads, LEASE, user_id=2, name='other.pdf', revision_of_id=first.id)
+    assert third.revision_of_id is None
+
+def test_explicit_revision_links_a_renamed_file(app, db, uploads):
+    first = upload(app, db, uploads, LEASE)
+    second = upload(app, db, uploads, LEASE, name='lease-v2.pdf', revision_of_id=first.id)
+    assert second.revision_of_id == first.id
+    assert uploads.stats['rescanned'] == 0
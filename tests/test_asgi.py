@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from leasecheck import metrics
+from leasecheck.asgi import AsgiApplication, wsgi_environ
+from leasecheck.models import Document
+
+STREAM_PATH = '/api/document-progress/stream'
+
+def scope(headers, query=b''):
+    return {
+        'type': 'http', 'method': 'GET', 'path': STREAM_PATH, 'root_path': '', 'scheme': 'http',
+        'query_string': query, 'headers': headers, 'http_version': '1.1',
+        'server': ('localhost', 80), 'client': ('127.0.0.1', 0)
+    }
+
+def test_repeated_cookie_headers_stay_separate_cookies():
+    environ = wsgi_environ(scope([
+        (b'cookie', b'session=abc'), (b'cookie', b'theme=dark'),
+        (b'accept', b'text/html'), (b'accept', b'*/*')
+    ]))
+    assert environ['HTTP_COOKIE'] == 'session=abc; theme=dark'
+    assert environ['HTTP_ACCEPT'] == 'text/html,*/*'
+
+@pytest.fixture
+def request_metrics(app, monkeypatch):
+    """The hooks init_metrics adds when METRICS_ENABLED is on"""
+    monkeypatch.setitem(app.before_request_funcs, None, [*app.before_request_funcs.get(None, []), metrics._start_timer])
+    monkeypatch.setitem(app.after_request_funcs, None, [metrics._record_request, *app.after_request_funcs.get(None, [])])
+    return lambda status: metrics.REQUESTS_TOTAL.collect().get(
+        ('main.api_document_progress_stream', 'GET', str(status)), 0
+    )
+
+def stream(app, headers, query=b''):
+    application = AsgiApplication(app)
+    messages = []
+
+    async def receive():
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        messages.append(message)
+
+    async def run():
+        try:
+            await application(scope(headers, query), receive, send)
+        finally:
+            await application.progress.close()
+    asyncio.run(run())
+    start = messages[0]
+    return start['status'], dict(start['headers']), b''.join(message.get('body', b'') for message in messages[1:])
+
+def session_cookie(app, document_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['document_id'] = document_id
+    return [(b'cookie', b'theme=dark'), (b'cookie', f"session={client.get_cookie('session').value}".encode())]
+
+def test_native_stream_gets_security_headers_and_metrics(app, db, request_metrics):
+    document = Document(
+        original_filename='lease.pdf', stored_filename='lease.pdf', file_path='lease.pdf',
+        file_size=1024, status='processed', page_count=2, pages_extracted=2
+    )
+    db.session.add(document)
+    db.session.commit()
+    before = request_metrics(200)
+
+    status, headers, body = stream(app, session_cookie(app, document.id))
+    assert status == 200
+    assert headers[b'content-type'].startswith(b'text/event-stream')
+    assert headers[b'cache-control'] == b'no-store'
+    assert b'content-security-policy' in headers
+    assert headers[b'x-content-type-options'] == b'nosniff'
+    assert b'content-length' not in headers
+    assert b'"status": "processed"' in body or b'"status":"processed"' in body
+    assert request_metrics(200) == before + 1
+
+def test_native_stream_refusal_gets_security_headers_and_metrics(app, db, request_metrics):
+    before = request_metrics(404)
+    status, headers, body = stream(app, [], query=b'document_id=999')
+    assert status == 404
+    assert b'content-security-policy' in headers
+    assert b'Document not found' in body
+    assert request_metrics(404) == before + 1
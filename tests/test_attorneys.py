@@ -0,0 +1,116 @@
+import random
+
+import pytest
+
+from leasecheck import attorneys
+from leasecheck.attorneys import AttorneyIndex, haversine_km, load_attorneys_csv, search_attorneys
+from leasecheck.cache import cache
+
+SPECIALTIES = ('Real Estate Law', 'Tenant Rights', 'Contract Law')
+
+def random_rows(count, seed=7):
+    """Index rows spread over the globe, crowded around a few cities, the poles and the antimeridian"""
+    rng = random.Random(seed)
+    centres = [(40.7, -74.0), (34.05, -118.25), (89.5, 0.0), (-89.5, 90.0), (0.0, 179.95), (10.0, -179.95)]
+    rows = []
+    for attorney_id in range(1, count + 1):
+        if rng.random() < 0.5:
+            latitude, longitude = rng.uniform(-90, 90), rng.uniform(-180, 180)
+        else:
+            latitude, longitude = rng.choice(centres)
+            latitude = max(-90.0, min(90.0, latitude + rng.gauss(0, 0.3)))
+            longitude = (longitude + rng.gauss(0, 0.3) + 180) % 360 - 180
+        specialties = ';'.join(rng.sample(SPECIALTIES, rng.randint(1, 2)))
+        rows.append((attorney_id, latitude, longitude, specialties, None, None, None))
+    return rows
+
+def brute_force(rows, latitude, longitude, count, specialty=None, max_km=None):
+    hits = sorted(
+        (haversine_km(latitude, longitude, row[1], row[2]), row[0]) for row in rows
+        if specialty is None or specialty in row[3].split(';')
+    )
+    if max_km is not None:
+        hits = [hit for hit in hits if hit[0] <= max_km]
+    return hits[:count]
+
+@pytest.mark.parametrize('specialty', [None, 'Tenant Rights'])
+def test_nearest_matches_a_brute_force_scan(specialty):
+    rows = random_rows(2000)
+    index = AttorneyIndex(rows)
+    rng = random.Random(11)
+    queries = [(40.7, -74.0), (90.0, 0.0), (-90.0, 0.0), (5.0, 180.0), (5.0, -180.0), (-45.0, 170.0)]
+    queries += [(rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(50)]
+    for latitude, longitude in queries:
+        for count in (1, 10):
+            expected = brute_force(rows, latitude, longitude, count, specialty)
+            found = index.nearest(latitude, longitude, count, specialty=specialty)
+            assert [attorney_id for _, attorney_id in found] == [attorney_id for _, attorney_id in expected]
+            assert [distance for distance, _ in found] == pytest.approx([distance for distance, _ in expected])
+
+def test_nearest_stops_at_the_distance_limit():
+    rows = random_rows(500)
+    index = AttorneyIndex(rows)
+    found = index.nearest(40.7, -74.0, 1000, max_km=50)
+    assert [attorney_id for _, attorney_id in found] == [
+        attorney_id for _, attorney_id in brute_force(rows, 40.7, -74.0, 1000, max_km=50)
+    ]
+    assert found and all(distance <= 50 for distance, _ in found)
+
+def test_unknown_specialty_and_empty_index_find_nothing():
+    assert AttorneyIndex(random_rows(10)).nearest(0, 0, 5, specialty='Maritime Law') == []
+    assert AttorneyIndex([]).nearest(0, 0, 5) == []
+
+def test_locate_places_coordinates_and_postal_codes():
+    index = AttorneyIndex([
+        (1, 40.0, -74.0, 'Tenant Rights', 'Springfield', 'NJ', '07081'),
+        (2, 42.0, -74.0, 'Tenant Rights', 'Springfield', 'NJ', '07081'),
+        (3, 39.8, -89.6, 'Tenant Rights', 'Springfield', 'IL', '62701')
+    ])
+    assert index.locate('springfield,  nj') == (41.0, -74.0)
+    assert index.locate('62701') == (39.8, -89.6)
+    assert index.locate(' 12.5, -45 ') == (12.5, -45.0)
+    assert index.locate('95, 0') is None
+    assert index.locate('Shelbyville') is None
+
+CSV = """name,firm,specialties,city,state,postal_code,latitude,longitude,years_experience,rating,cases,success_rate
+Ada Park,Park LLP,Tenant Rights;Real Estate Law,Newark,NJ,07102,40.73,-74.17,12,4.8,300,91%
+Bo Chen,,Real Estate Law,Newark,NJ,07102,40.74,-74.18,,,,
+,,Tenant Rights,Newark,NJ,07102,40.73,-74.17,,,,
+Far Away,,Tenant Rights,Nowhere,,,123,-74.17,,,,
+Cy Diaz,,Contract Law|Tenant Rights,Trenton,NJ,08608,40.22,-74.76,,,,
+"""
+
+@pytest.fixture
+def directory(app, db, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'ATTORNEY_INDEX_REFRESH', 0)
+    path = tmp_path / 'attorneys.csv'
+    path.write_text(CSV)
+    cache.clear()
+    yield load_attorneys_csv(str(path))
+    attorneys.invalidate_attorney_index()
+    cache.clear()
+
+def test_csv_load_skips_invalid_rows(directory):
+    assert directory == (3, 2)
+
+def test_search_pages_the_nearest_attorneys(directory):
+    first = search_attorneys(40.73, -74.17, per_page=2)
+    assert [card['name'] for card in first['results']] == ['Ada Park', 'Bo Chen']
+    assert first['hasMore']
+    assert first['results'][0]['success'] == '91%'
+
+    second = search_attorneys(40.73, -74.17, page=2, per_page=2)
+    assert [card['name'] for card in second['results']] == ['Cy Diaz']
+    assert not second['hasMore']
+
+    specialist = search_attorneys(40.73, -74.17, specialty='tenant  rights')
+    assert specialist['specialty'] == 'Tenant Rights'
+    assert [card['name'] for card in specialist['results']] == ['Ada Park', 'Cy Diaz']
+
+def test_loading_more_attorneys_refreshes_the_index(directory, tmp_path):
+    search_attorneys(40.73, -74.17)
+    path = tmp_path / 'more.csv'
+    path.write_text(CSV.splitlines()[0] + '\nDee Eng,,Tenant Rights,Newark,NJ,07102,40.7301,-74.1701,,,,\n')
+    load_attorneys_csv(str(path))
+
+    assert 'Dee Eng' in [card['name'] for card in search_attorneys(40.73, -74.17)['results']]
@@ -0,0 +1,47 @@
+import os
+import subprocess
+import sys
+
+from leasecheck.batch_analysis import create_batch, batch_payload
+from leasecheck.models import AnalysisBatch, Document
+
+def write_bytes(data):
+    def save(path):
+        with open(path, 'wb') as f:
+            f.write(data)
+    return save
+
+def fail_to_save(path):
+    raise OSError('No space left on device')
+
+def test_lease_that_cannot_be_stored_is_reported(app, db):
+    batch, futures = create_batch(app, [
+        ('lease_a.pdf', fail_to_save),
+        ('lease_b.pdf', write_bytes(b'not a pdf')),
+    ], user_id=7)
+
+    assert futures == []
+    payload = batch_payload(db.session.get(AnalysisBatch, batch.id))
+    assert payload['status'] == 'failed'
+    failed, unreadable = payload['documents']
+    assert failed['fileName'] == 'lease_a.pdf' and failed['status'] == 'error'
+    assert failed['error'] == 'Could not store this lease: No space left on device'
+    assert unreadable['fileName'] == 'lease_b.pdf' and unreadable['status'] == 'error'
+
+    stored = Document.query.filter_by(original_filename='lease_a.pdf').one()
+    assert stored.user_id == 7 and stored.file_size == 0
+    assert not os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], stored.stored_filename))
+
+def test_cli_runs_without_runpy_warnings(app, db, tmp_path):
+    lease = tmp_path / 'lease.pdf'
+    lease.write_bytes(b'not a pdf')
+
+    result = subprocess.run(
+        [sys.executable, '-m', 'leasecheck.batch_analysis', str(lease), '--processes', '1'],
+        capture_output=True, text=True, timeout=120,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+
+    assert 'RuntimeWarning' not in result.stderr
+    assert result.stdout.startswith('lease.pdf: ')
+    assert result.returncode == 1
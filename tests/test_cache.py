@@ -0,0 +1,17 @@
+from leasecheck.cache import cache, clear_document_cache
+from leasecheck.risk_report import risk_report_cache_key
+
+def test_clearing_a_document_leaves_other_documents_cached(app):
+    with app.app_context():
+        cache.clear()
+        for document_id in (1, 11, 21):
+            cache.set(risk_report_cache_key(document_id, ('riskLevel',)), {'document': document_id})
+        cache.set('admin_doc_1_summary', 'kept')
+
+        clear_document_cache(1)
+
+        assert cache.get(risk_report_cache_key(1, ('riskLevel',))) is None
+        assert cache.get(risk_report_cache_key(11, ('riskLevel',))) == {'document': 11}
+        assert cache.get(risk_report_cache_key(21, ('riskLevel',))) == {'document': 21}
+        assert cache.get('admin_doc_1_summary') == 'kept'
+        cache.clear()
@@ -0,0 +1,123 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from leasecheck.cache import cache
+from leasecheck.entitlements import (
+    remaining_analyses, consume_analyses, refresh_balance, reconcile_entitlements, QuotaExceeded
+)
+from leasecheck.models import Document, Entitlement, EntitlementUsage, Payment, AdminUser
+
+USER_ID = 7
+
+def grant(db, payment_id, granted, used=0, expires_at=None, user_id=USER_ID):
+    """A grant written straight to the database, as the Stripe processor would from its own process"""
+    row = Entitlement(
+        user_id=user_id, stripe_payment_id=payment_id, plan_name='standard',
+        granted=granted, used=used, expires_at=expires_at
+    )
+    db.session.add(row)
+    db.session.commit()
+    return row
+
+def documents(db, count):
+    rows = [
+        Document(original_filename=f"lease_{n}.pdf", stored_filename=f"ent_{n}.pdf", file_path=f"ent_{n}.pdf", file_size=1)
+        for n in range(count)
+    ]
+    db.session.add_all(rows)
+    db.session.commit()
+    return [row.id for row in rows]
+
+@pytest.fixture(autouse=True)
+def empty_cache(app):
+    cache.clear()
+
+def test_purchase_in_another_process_counts_at_once(db):
+    # The quota check before paying found nothing
+    assert remaining_analyses(USER_ID) == 0
+
+    grant(db, 'pi_paid', 3)
+    assert remaining_analyses(USER_ID) == 3
+
+def test_cached_balance_too_small_is_read_again(db):
+    grant(db, 'pi_first', 1)
+    assert remaining_analyses(USER_ID) == 1
+    grant(db, 'pi_second', 3)
+
+    # Enough for one upload, answered from the cache
+    assert remaining_analyses(USER_ID) == 1
+    # Not enough for a batch of three, so the database is asked
+    assert remaining_analyses(USER_ID, 3) == 4
+
+def test_expired_grants_do_not_count(db):
+    grant(db, 'pi_old', 3, expires_at=datetime.utcnow() - timedelta(days=1))
+    grant(db, 'pi_new', 1, expires_at=datetime.utcnow() + timedelta(days=1))
+    assert remaining_analyses(USER_ID) == 1
+
+def test_consume_spends_soonest_expiring_grant_first(db):
+    later = grant(db, 'pi_later', 3, expires_at=datetime.utcnow() + timedelta(days=20))
+    sooner = grant(db, 'pi_sooner', 1, expires_at=datetime.utcnow() + timedelta(days=2))
+    ids = documents(db, 2)
+
+    allocation = consume_analyses(USER_ID, ids)
+    assert allocation == [sooner.id, later.id]
+    db.session.expire_all()
+    assert (sooner.used, later.used) == (1, 1)
+    assert EntitlementUsage.query.count() == 2
+    assert remaining_analyses(USER_ID) == 2
+
+def test_consume_is_all_or_nothing(db):
+    row = grant(db, 'pi_small', 2)
+    ids = documents(db, 3)
+
+    with pytest.raises(QuotaExceeded):
+        consume_analyses(USER_ID, ids)
+    db.session.expire_all()
+    assert row.used == 0
+    assert EntitlementUsage.query.count() == 0
+    assert remaining_analyses(USER_ID) == 2
+
+def test_concurrent_consumers_never_overspend(app, db):
+    row = grant(db, 'pi_race', 5)
+    ids = documents(db, 20)
+    spent, refused = [], []
+
+    def spend(document_id):
+        with app.app_context():
+            try:
+                consume_analyses(USER_ID, [document_id])
+                spent.append(document_id)
+            except QuotaExceeded:
+                refused.append(document_id)
+
+    threads = [threading.Thread(target=spend, args=(document_id,)) for document_id in ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    db.session.expire_all()
+    assert len(spent) == 5
+    assert len(refused) == 15
+    assert row.used == EntitlementUsage.query.count() == 5
+
+def test_reconcile_reports_and_repairs_drift(db):
+    db.session.add(AdminUser(id=USER_ID, email='tenant@example.com', password_hash='unused'))
+    db.session.add(Payment(
+        stripe_payment_id='pi_missing', user_email='tenant@example.com', amount=29.0,
+        currency='usd', status='succeeded', plan_name='standard', created_at=datetime.utcnow()
+    ))
+    drifted = grant(db, 'pi_drifted', 3, used=2)
+
+    report = reconcile_entitlements()
+    assert report['missing_grants'] == ['pi_missing']
+    assert report['usage_mismatches'] == [{'entitlement': drifted.id, 'used': 2, 'ledger': 0}]
+
+    reconcile_entitlements(fix=True)
+    db.session.expire_all()
+    assert drifted.used == 0
+    assert Entitlement.query.filter_by(stripe_payment_id='pi_missing').one().granted == 3
+    assert reconcile_entitlements() == {'missing_grants': [], 'unrevoked_refunds': [], 'usage_mismatches': []}
+    assert refresh_balance(USER_ID)
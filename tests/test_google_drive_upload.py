@@ -0,0 +1,319 @@
+import os
+import json
+import itertools
+
+import httplib2
+import pytest
+from googleapiclient.http import HttpRequest
+
+import google_drive_upload as gdu
+
+FOLDER = gdu.FOLDER_MIME_TYPE
+
+class FakeDriveHttp:
+    """Drive's resumable upload protocol: start a session, PUT byte ranges, query progress"""
+
+    def __init__(self, drive):
+        self.drive = drive
+
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        headers = {key.lower(): value for key, value in (headers or {}).items()}
+        if uri.startswith('https://drive.fake/upload/'):
+            return self._start(uri, method, body)
+        return self._put(uri, body, headers)
+
+    def _start(self, uri, method, body):
+        session_uri = f"https://drive.fake/session/{next(self.drive.ids)}"
+        file_id = uri.rsplit('/', 1)[1] if method == 'PATCH' else None
+        self.drive.sessions[session_uri] = {
+            'file_id': file_id, 'metadata': json.loads(body or '{}'), 'data': bytearray(), 'done': None
+        }
+        self.drive.started.append(session_uri)
+        return httplib2.Response({'status': 200, 'location': session_uri}), b''
+
+    def _put(self, uri, body, headers):
+        session = self.drive.sessions.get(uri)
+        if session is None:
+            return httplib2.Response({'status': 404}), b'{"error": "session expired"}'
+        first, total = headers['content-range'].split(' ', 1)[1].split('/')
+        if first == '*':
+            # Status query
+            if session['done']:
+                return httplib2.Response({'status': 200}), json.dumps(session['done']).encode()
+            return self._incomplete(session)
+
+        start = int(first.split('-')[0])
+        assert start == len(session['data']), 'chunk does not continue where the session left off'
+        chunk = body.read() if hasattr(body, 'read') else body
+        session['data'].extend(chunk)
+        self.drive.chunks_sent += 1
+        if len(session['data']) < int(total):
+            return self._incomplete(session)
+        session['done'] = self.drive.store(session)
+        return httplib2.Response({'status': 200}), json.dumps(session['done']).encode()
+
+    def _incomplete(self, session):
+        headers = {'status': 308}
+        if session['data']:
+            headers['range'] = f"bytes=0-{len(session['data']) - 1}"
+        return httplib2.Response(headers), b''
+
+class FakeRequest:
+    def __init__(self, run):
+        self.run = run
+
+    def execute(self):
+        return self.run()
+
+class FakeBatch:
+    def __init__(self, callback):
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        for request_id, request in self.requests:
+            try:
+                self.callback(request_id, request.execute(), None)
+            except Exception as e:
+                self.callback(request_id, None, e)
+
+class FakeFiles:
+    def __init__(self, drive):
+        self.drive = drive
+
+    def list(self, q, spaces, fields=None, pageSize=100, pageToken=None):
+        self.drive.list_calls += 1
+        parent = q.split("'")[1] if ' in parents' in q else None
+        name = q.split("name='")[1].split("'")[0] if "name='" in q else None
+        matches = [
+            {'id': file_id, 'name': item['name']}
+            for file_id, item in sorted(self.drive.items.items())
+            if item['mimeType'] == FOLDER and not item['trashed']
+            and (parent is None or parent in item['parents']) and (name is None or item['name'] == name)
+        ]
+        offset = int(pageToken or 0)
+        page = {'files': matches[offset:offset + pageSize]}
+        if offset + pageSize < len(matches):
+            page['nextPageToken'] = str(offset + pageSize)
+        return FakeRequest(lambda: page)
+
+    def create(self, body, fields=None, media_body=None):
+        if media_body is not None:
+            return self.drive.media_request('POST', 'https://drive.fake/upload/files', body, media_body)
+        return FakeRequest(lambda: {'id': self.drive.add(body)})
+
+    def update(self, fileId, body=None, fields=None, media_body=None, addParents=None, removeParents=None):
+        if media_body is not None:
+            return self.drive.media_request('PATCH', f"https://drive.fake/upload/{fileId}", body, media_body)
+
+        def run():
+            item = self.drive.items[fileId]
+            item.update(body or {})
+            if addParents:
+                item['parents'] = [addParents]
+            return {'id': fileId}
+        return FakeRequest(run)
+
+    def delete(self, fileId):
+        return FakeRequest(lambda: self.drive.items.pop(fileId) and None)
+
+class FakeDrive:
+    """Just enough of the Drive v3 service for the sync script"""
+
+    def __init__(self):
+        self.ids = (f"id{number}" for number in itertools.count(1))
+        self.items = {}
+        self.sessions = {}
+        self.started = []
+        self.chunks_sent = 0
+        self.list_calls = 0
+        self.http = FakeDriveHttp(self)
+
+    def add(self, body, content=None):
+        file_id = next(self.ids)
+        self.items[file_id] = {
+            'name': body['name'], 'parents': body.get('parents', []),
+            'mimeType': body.get('mimeType', 'application/octet-stream'), 'trashed': False, 'content': content
+        }
+        return file_id
+
+    def store(self, session):
+        if session['file_id']:
+            self.items[session['file_id']]['content'] = bytes(session['data'])
+            return {'id': session['file_id']}
+        return {'id': self.add(session['metadata'], bytes(session['data']))}
+
+    def media_request(self, method, uri, body, media):
+        return HttpRequest(
+            self.http, lambda resp, content: json.loads(content), uri, method=method,
+            body=json.dumps(body or {}), headers={'content-type': 'application/json'}, resumable=media
+        )
+
+    def files(self):
+        return FakeFiles(self)
+
+    def new_batch_http_request(self, callback):
+        return FakeBatch(callback)
+
+    def by_name(self, name):
+        return [item for item in self.items.values() if item['name'] == name and not item['trashed']]
+
+@pytest.fixture
+def drive():
+    return FakeDrive()
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(gdu, 'RETRY_DELAY', 0)
+    monkeypatch.setattr(gdu, 'MAX_RETRY_DELAY', 0)
+    monkeypatch.setattr(gdu.random, 'uniform', lambda low, high: 0)
+    return tmp_path
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+
+def sync(drive, files, manifest):
+    folders = gdu.ensure_folders(drive, {os.path.dirname(path) for path in files}, manifest)
+    return gdu.sync_files(files, folders, lambda: drive, manifest, max_workers=1)
+
+def bound_manifest(drive):
+    manifest = gdu.SyncManifest()
+    manifest.bind_folder(drive.add({'name': 'LeaseCheck_Files', 'mimeType': FOLDER}))
+    return manifest
+
+def test_manifest_skips_unchanged_and_uploads_changed_files(drive, workspace):
+    write('docs/a.txt', b'first')
+    write('docs/b.txt', b'second')
+    manifest = bound_manifest(drive)
+
+    results = sync(drive, ['docs/a.txt', 'docs/b.txt'], manifest)
+    assert sorted(results['created']) == ['docs/a.txt', 'docs/b.txt']
+
+    results = sync(drive, ['docs/a.txt', 'docs/b.txt'], gdu.SyncManifest())
+    assert sorted(results['skipped']) == ['docs/a.txt', 'docs/b.txt']
+
+    write('docs/b.txt', b'second, edited')
+    results = sync(drive, ['docs/a.txt', 'docs/b.txt'], gdu.SyncManifest())
+    assert results['updated'] == ['docs/b.txt']
+    assert results['skipped'] == ['docs/a.txt']
+    assert drive.by_name('b.txt')[0]['content'] == b'second, edited'
+
+def test_manifest_ignores_touched_but_unchanged_file(drive, workspace):
+    write('a.txt', b'same bytes')
+    manifest = bound_manifest(drive)
+    sync(drive, ['a.txt'], manifest)
+
+    os.utime('a.txt', ns=(1, 1))
+    results = sync(drive, ['a.txt'], manifest)
+    assert results['skipped'] == ['a.txt']
+    assert manifest.get('a.txt')['mtime_ns'] == 1
+
+def test_moved_file_is_reparented_without_reupload(drive, workspace):
+    write('old/a.txt', b'content')
+    manifest = bound_manifest(drive)
+    sync(drive, ['old/a.txt'], manifest)
+    file_id = manifest.get('old/a.txt')['file_id']
+    chunks = drive.chunks_sent
+
+    # Same path, but the recorded parent no longer matches the mirrored folder
+    entry = manifest.get('old/a.txt')
+    manifest.record('old/a.txt', entry['hash'], file_id, os.stat('old/a.txt'), 'elsewhere', 'a.txt')
+    results = sync(drive, ['old/a.txt'], manifest)
+    assert results['moved'] == ['old/a.txt']
+    assert drive.chunks_sent == chunks
+    assert drive.items[file_id]['parents'] == [manifest.folders()['old']]
+
+def test_remove_deleted_trashes_files_gone_locally(drive, workspace):
+    write('docs/a.txt', b'a')
+    write('docs/b.txt', b'b')
+    manifest = bound_manifest(drive)
+    sync(drive, ['docs/a.txt', 'docs/b.txt'], manifest)
+    removed_id = manifest.get('docs/b.txt')['file_id']
+
+    removed = gdu.remove_deleted(drive, manifest, {'docs/a.txt'}, {'docs'})
+    assert removed == ['docs/b.txt']
+    assert drive.items[removed_id]['trashed']
+    assert manifest.get('docs/b.txt') is None
+
+def test_interrupted_upload_resumes_from_drive_progress(drive, workspace, monkeypatch):
+    monkeypatch.setattr(gdu, 'CHUNK_SIZE', 256 * 1024)
+    monkeypatch.setattr(gdu, 'MAX_RETRIES', 0)
+    content = os.urandom(256 * 1024 * 3 + 100)
+    write('big.bin', content)
+    manifest = bound_manifest(drive)
+
+    # The third chunk never arrives and the run gives up
+    original_put = drive.http._put
+
+    def drop_third_chunk(uri, body, headers):
+        if drive.chunks_sent == 2 and not headers['content-range'].startswith('bytes */'):
+            raise ConnectionResetError('connection dropped mid-upload')
+        return original_put(uri, body, headers)
+    monkeypatch.setattr(drive.http, '_put', drop_third_chunk)
+    results = sync(drive, ['big.bin'], manifest)
+    assert results['failed'] == ['big.bin']
+    assert manifest.get_pending('big.bin') is not None
+    monkeypatch.setattr(drive.http, '_put', original_put)
+
+    # The next run asks Drive where the session stopped and sends only the rest
+    results = sync(drive, ['big.bin'], gdu.SyncManifest())
+    assert results['created'] == ['big.bin']
+    assert len(drive.started) == 1
+    assert drive.chunks_sent == 4
+    assert drive.by_name('big.bin')[0]['content'] == content
+    assert gdu.SyncManifest().get_pending('big.bin') is None
+
+def test_expired_upload_session_starts_over(drive, workspace, monkeypatch):
+    monkeypatch.setattr(gdu, 'CHUNK_SIZE', 256 * 1024)
+    content = os.urandom(256 * 1024 + 10)
+    write('big.bin', content)
+    manifest = bound_manifest(drive)
+    manifest.set_pending('big.bin', gdu.file_hash('big.bin'), 'https://drive.fake/session/gone')
+
+    results = sync(drive, ['big.bin'], manifest)
+    assert results['created'] == ['big.bin']
+    assert drive.by_name('big.bin')[0]['content'] == content
+
+def test_folder_listing_follows_every_page(drive, workspace):
+    manifest = bound_manifest(drive)
+    root = manifest.root_id
+    for number in range(1500):
+        drive.add({'name': f"dir{number:04d}", 'mimeType': FOLDER, 'parents': [root]})
+    existing = {item['name']: file_id for file_id, item in drive.items.items() if item['name'].startswith('dir')}
+
+    folders = gdu.ensure_folders(drive, {'dir1499', 'dir0000'}, manifest)
+    # dir1499 is on the second page, it must be found rather than created again
+    assert folders['dir1499'] == existing['dir1499']
+    assert len(drive.by_name('dir1499')) == 1
+    assert drive.list_calls == 2
+
+def test_empty_local_tree_removes_nothing(drive, workspace):
+    write('docs/a.txt', b'a')
+    write('docs/b.txt', b'b')
+    manifest = bound_manifest(drive)
+    sync(drive, ['docs/a.txt', 'docs/b.txt'], manifest)
+
+    # Run from the wrong directory, collect_files() finds nothing
+    assert gdu.remove_deleted(drive, manifest, set(), set()) == []
+    assert not any(item['trashed'] for item in drive.items.values())
+    assert sorted(manifest.paths()) == ['docs/a.txt', 'docs/b.txt']
+
+    removed = gdu.remove_deleted(drive, manifest, set(), set(), force=True)
+    assert sorted(removed) == ['docs', 'docs/a.txt', 'docs/b.txt']
+
+def test_removing_most_synced_files_needs_force(drive, workspace):
+    for name in 'abcd':
+        write(f"docs/{name}.txt", name.encode())
+    manifest = bound_manifest(drive)
+    sync(drive, [f"docs/{name}.txt" for name in 'abcd'], manifest)
+
+    assert gdu.remove_deleted(drive, manifest, {'docs/a.txt'}, {'docs'}) == []
+    assert len(manifest.paths()) == 4
+    removed = gdu.remove_deleted(drive, manifest, {'docs/a.txt'}, {'docs'}, force=True)
+    assert sorted(removed) == ['docs/b.txt', 'docs/c.txt', 'docs/d.txt']
@@ -0,0 +1,62 @@
+import json
+import os
+
+import pytest
+
+from leasecheck import server
+from leasecheck.metrics import ARCHIVE_FILENAME, MetricsRegistry
+
+DEAD_PID = 2 ** 22 + 1  # above the default pid_max, never a live process
+
+def write_snapshot(directory, pid, requests, latency, pool_size):
+    metrics = {
+        'requests': {'kind': 'counter', 'help': 'Requests', 'labelnames': ['status'], 'buckets': [],
+                     'values': [[['200'], requests]]},
+        'latency': {'kind': 'histogram', 'help': 'Latency', 'labelnames': [], 'buckets': [0.1],
+                    'values': [[[], latency]]},
+        'pool': {'kind': 'gauge', 'help': 'Pool', 'labelnames': ['state'], 'buckets': [],
+                 'values': [[['idle'], pool_size]]}
+    }
+    with open(os.path.join(directory, f"metrics_{pid}.json"), 'w') as f:
+        json.dump({'pid': pid, 'metrics': metrics}, f)
+
+def values(snapshot, name):
+    return {tuple(key): value for key, value in snapshot[name]['values']}
+
+@pytest.fixture
+def registry(tmp_path):
+    registry = MetricsRegistry()
+    registry.multiproc_dir = str(tmp_path)
+    return registry
+
+def test_exited_workers_are_folded_into_the_archive(registry, tmp_path):
+    write_snapshot(tmp_path, DEAD_PID, requests=3, latency=[1, 2, 0.3], pool_size=4)
+    write_snapshot(tmp_path, DEAD_PID + 1, requests=5, latency=[0, 1, 0.5], pool_size=2)
+    before = registry.aggregate()
+
+    registry.retire_process(DEAD_PID)
+    registry.retire_process(DEAD_PID + 1)
+
+    assert sorted(os.listdir(tmp_path)) == sorted([ARCHIVE_FILENAME, f"metrics_{os.getpid()}.json"])
+    after = registry.aggregate()
+    assert values(after, 'requests') == values(before, 'requests') == {('200',): 8}
+    assert values(after, 'latency') == {(): [1, 3, 0.8]}
+    # Gauges of dead workers never count
+    assert 'pool' not in before and 'pool' not in after
+
+def test_worker_still_on_disk_is_not_counted_twice(registry, tmp_path):
+    write_snapshot(tmp_path, DEAD_PID, requests=3, latency=[1, 0, 0.05], pool_size=1)
+    registry.retire_process(DEAD_PID)
+    # A scrape that listed the directory before the file was removed
+    write_snapshot(tmp_path, DEAD_PID, requests=3, latency=[1, 0, 0.05], pool_size=1)
+
+    assert values(registry.aggregate(), 'requests') == {('200',): 3}
+
+def test_gunicorn_child_exit_retires_the_worker(registry, tmp_path, monkeypatch):
+    monkeypatch.setattr('leasecheck.metrics.registry', registry)
+    write_snapshot(tmp_path, DEAD_PID, requests=2, latency=[1, 0, 0.05], pool_size=1)
+
+    server.child_exit(None, type('Worker', (), {'pid': DEAD_PID})())
+
+    assert not os.path.exists(os.path.join(tmp_path, f"metrics_{DEAD_PID}.json"))
+    assert values(registry.aggregate(), 'requests') == {('200',): 2}
@@ -0,0 +1,117 @@
+import pytest
+from flask import Flask
+
+from leasecheck import rate_limit
+from leasecheck.rate_limit import MemoryBackend, Policy, RateLimiter, parse_policy_overrides
+
+class Clock:
+    """Stands in for the time module, moved forward by hand"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit, 'time', clock)
+    return clock
+
+def test_burst_is_allowed_then_limited(clock):
+    backend = MemoryBackend()
+    policy = Policy('test', 6, 60, burst=3)
+
+    assert [backend.hit('a', policy) for _ in range(3)] == [0, 0, 0]
+    # One token is refilled every 10 seconds
+    assert backend.hit('a', policy) == pytest.approx(10)
+
+def test_tokens_refill_with_time_up_to_the_burst(clock):
+    backend = MemoryBackend()
+    policy = Policy('test', 6, 60, burst=3)
+    for _ in range(3):
+        backend.hit('a', policy)
+
+    clock.now += 5
+    assert backend.hit('a', policy) == pytest.approx(5)
+    clock.now += 5
+    assert backend.hit('a', policy) == 0
+
+    # A long idle spell refills only to the burst
+    clock.now += 3600
+    assert [backend.hit('a', policy) for _ in range(3)] == [0, 0, 0]
+    assert backend.hit('a', policy) > 0
+
+def test_limited_hits_do_not_push_the_retry_back(clock):
+    backend = MemoryBackend()
+    policy = Policy('test', 1, 10, burst=1)
+    backend.hit('a', policy)
+
+    assert backend.hit('a', policy) == pytest.approx(10)
+    clock.now += 4
+    assert backend.hit('a', policy) == pytest.approx(6)
+
+def test_clients_have_separate_buckets(clock):
+    backend = MemoryBackend()
+    policy = Policy('test', 1, 60, burst=1)
+
+    assert backend.hit('a', policy) == 0
+    assert backend.hit('b', policy) == 0
+    assert backend.hit('a', policy) > 0
+
+def test_least_recently_used_buckets_are_evicted(clock):
+    backend = MemoryBackend(max_keys=2)
+    policy = Policy('test', 1, 60, burst=1)
+    backend.hit('a', policy)
+    backend.hit('b', policy)
+    backend.hit('a', policy)
+    backend.hit('c', policy)
+
+    assert backend.size() == 2
+    # b was the idlest and starts over with a full bucket, a is still limited
+    assert backend.hit('a', policy) > 0
+    assert backend.hit('b', policy) == 0
+
+def test_policy_overrides_keep_the_scope():
+    policies = parse_policy_overrides('upload=20/30:4', rate_limit.DEFAULT_POLICIES)
+    upload = policies['upload']
+    assert (upload.limit, upload.period, upload.burst, upload.scope) == (20, 30.0, 4, 'user')
+    assert policies['auth'] is rate_limit.DEFAULT_POLICIES['auth']
+
+    with pytest.raises(ValueError):
+        parse_policy_overrides('nope=1/1', rate_limit.DEFAULT_POLICIES)
+
+class BrokenBackend:
+    def hit(self, key, policy):
+        raise ConnectionError('redis is down')
+
+def limited_client(backend):
+    site = Flask(__name__)
+    site.secret_key = 'test'
+    site.extensions['rate_limiter'] = RateLimiter(backend, {'test': Policy('test', 1, 60, burst=2)})
+
+    @site.route('/submit', methods=['GET', 'POST'])
+    @rate_limit.rate_limit('test')
+    def submit():
+        return 'ok'
+
+    return site.test_client()
+
+def test_decorated_view_answers_429_with_retry_after(clock):
+    client = limited_client(MemoryBackend())
+    assert [client.post('/submit').status_code for _ in range(2)] == [200, 200]
+
+    response = client.post('/submit', headers={'Accept': 'application/json'})
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '60'
+    assert response.get_json()['retryAfter'] == 60
+    # Only the limited methods count
+    assert client.get('/submit').status_code == 200
+
+def test_backend_errors_let_requests_through():
+    client = limited_client(BrokenBackend())
+    assert [client.post('/submit').status_code for _ in range(3)] == [200, 200, 200]
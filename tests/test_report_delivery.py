@@ -0,0 +1,174 @@
+import smtplib
+from datetime import datetime, timedelta
+
+import pytest
+
+from leasecheck import report_delivery
+from leasecheck.models import Document, ReportDelivery
+from leasecheck.report_delivery import claim_due_deliveries, send_batch, MAX_ATTEMPTS, CLAIM_LEASE
+
+class FakeSMTP:
+    def __init__(self, error=None):
+        self.error = error
+        self.sent = []
+        self.on_send = None
+
+    def send_message(self, message):
+        if self.on_send is not None:
+            self.on_send(message)
+        if self.error is not None:
+            raise self.error
+        self.sent.append(message)
+
+    def quit(self):
+        pass
+
+@pytest.fixture
+def smtp(monkeypatch):
+    connection = FakeSMTP()
+    monkeypatch.setattr(report_delivery, 'open_smtp_connection', lambda app: connection)
+    monkeypatch.setattr(report_delivery, 'get_report_pdf', lambda app, document: b'%PDF-1.4 report')
+    return connection
+
+@pytest.fixture
+def document(db):
+    document = Document(
+        original_filename='lease.pdf', stored_filename='stored_lease.pdf', file_path='stored_lease.pdf',
+        file_size=1024, status='processed'
+    )
+    db.session.add(document)
+    db.session.commit()
+    return document
+
+def queue(db, document, count=1, **values):
+    deliveries = [
+        ReportDelivery(document_id=document.id, recipient_email=f"tenant{number}@example.com", **values)
+        for number in range(count)
+    ]
+    db.session.add_all(deliveries)
+    db.session.commit()
+    return [delivery.id for delivery in deliveries]
+
+def reload(db, delivery_id):
+    db.session.expire_all()
+    return db.session.get(ReportDelivery, delivery_id)
+
+def test_claim_takes_each_due_delivery_once(db, document):
+    ids = queue(db, document, count=3)
+
+    claimed = claim_due_deliveries(limit=2)
+    assert len(claimed) == 2
+    assert all(delivery.status == 'sending' and delivery.attempts == 1 for delivery in claimed)
+    assert len({delivery.claim_token for delivery in claimed}) == 1
+
+    rest = claim_due_deliveries(limit=10)
+    assert [delivery.id for delivery in rest] == [i for i in ids if i not in {d.id for d in claimed}]
+    assert claim_due_deliveries(limit=10) == []
+
+def test_claim_skips_deliveries_not_due_yet(db, document):
+    queue(db, document, next_attempt_at=datetime.utcnow() + timedelta(minutes=1))
+    assert claim_due_deliveries(limit=10) == []
+
+def test_expired_lease_is_claimed_again(db, document):
+    delivery_id, = queue(db, document)
+    first, = claim_due_deliveries(limit=10)
+    first_token = first.claim_token
+    assert claim_due_deliveries(limit=10) == []
+
+    # The sender that claimed it died, its lease runs out
+    delivery = reload(db, delivery_id)
+    delivery.locked_until = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+
+    again, = claim_due_deliveries(limit=10)
+    assert again.id == delivery_id
+    assert again.attempts == 2
+    assert again.claim_token != first_token
+    assert again.locked_until > datetime.utcnow() + CLAIM_LEASE - timedelta(minutes=1)
+
+def test_sent_delivery_is_released(app, db, document, smtp):
+    delivery_id, = queue(db, document, recipient_name='Sam')
+    claimed, = claim_due_deliveries(limit=10)
+
+    assert send_batch(app, claimed.claim_token, [delivery_id]) == 1
+    delivery = reload(db, delivery_id)
+    assert delivery.status == 'sent'
+    assert delivery.claim_token is None and delivery.locked_until is None
+    assert [message['To'] for message in smtp.sent] == ['tenant0@example.com']
+
+def test_result_of_a_lost_claim_is_dropped(app, db, document, smtp):
+    ids = queue(db, document, count=2)
+    claimed = claim_due_deliveries(limit=10)
+    token = claimed[0].claim_token
+
+    def steal(message):
+        # The lease ran out mid-batch and another sender claimed the second delivery
+        if message['To'] == 'tenant1@example.com':
+            with db.engine.begin() as connection:
+                connection.execute(
+                    ReportDelivery.__table__.update()
+                    .where(ReportDelivery.id == ids[1])
+                    .values(claim_token='other-sender')
+                )
+    smtp.on_send = steal
+
+    assert send_batch(app, token, ids) == 1
+    assert reload(db, ids[0]).status == 'sent'
+    stolen = reload(db, ids[1])
+    assert stolen.status == 'sending' and stolen.claim_token == 'other-sender'
+
+    # A batch whose claim is gone before it starts sends nothing
+    smtp.sent.clear()
+    assert send_batch(app, token, [ids[1]]) == 0
+    assert smtp.sent == []
+
+def test_transient_failure_is_retried_with_backoff(app, db, document, smtp):
+    delivery_id, = queue(db, document)
+    smtp.error = smtplib.SMTPServerDisconnected('connection lost')
+
+    claimed, = claim_due_deliveries(limit=10)
+    send_batch(app, claimed.claim_token, [delivery_id])
+    delivery = reload(db, delivery_id)
+    assert delivery.status == 'queued'
+    assert delivery.claim_token is None
+    assert delivery.next_attempt_at > datetime.utcnow() + timedelta(seconds=20)
+    assert 'connection lost' in delivery.last_error
+    # Not due again until the backoff has passed
+    assert claim_due_deliveries(limit=10) == []
+
+def test_delivery_fails_for_good_after_max_attempts(app, db, document, smtp):
+    delivery_id, = queue(db, document, attempts=MAX_ATTEMPTS - 1)
+    smtp.error = smtplib.SMTPServerDisconnected('connection lost')
+
+    claimed, = claim_due_deliveries(limit=10)
+    send_batch(app, claimed.claim_token, [delivery_id])
+    delivery = reload(db, delivery_id)
+    assert delivery.status == 'failed'
+    assert delivery.attempts == MAX_ATTEMPTS
+
+def test_refused_recipient_is_not_retried(app, db, document, smtp):
+    delivery_id, = queue(db, document)
+    smtp.error = smtplib.SMTPRecipientsRefused({'tenant0@example.com': (550, b'no such user')})
+
+    claimed, = claim_due_deliveries(limit=10)
+    send_batch(app, claimed.claim_token, [delivery_id])
+    assert reload(db, delivery_id).status == 'failed'
+
+def test_save_report_form_is_prefilled_and_queues_a_delivery(app, db, document):
+    from leasecheck.models import AdminUser
+    user = AdminUser(email='tenant@example.com', password_hash='unused')
+    db.session.add(user)
+    db.session.commit()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = user.id
+        session['document_id'] = document.id
+
+    page = client.get('/save-report')
+    assert b'value="tenant@example.com"' in page.data
+    assert b'name="csrf_token"' in page.data
+
+    response = client.post('/save-report', data={'email': 'tenant@example.com', 'name': 'Tenant'})
+    assert response.status_code == 302
+    assert response.headers['Location'] == '/report-sent'
+    assert ReportDelivery.query.one().recipient_email == 'tenant@example.com'
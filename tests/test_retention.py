@@ -0,0 +1,130 @@
+import os
+import uuid
+import shutil
+from datetime import datetime, timedelta
+
+import pytest
+
+from leasecheck.models import Document, DocumentArchive
+from leasecheck.retention import (
+    archive_files, archive_payloads, purge_documents, restore_document, run_retention
+)
+from leasecheck.text_extraction import page_cache_path
+
+PDF = b'%PDF-1.4 lease ' * 200
+RISK_FACTORS = [{'rule': 'deposit-withheld', 'severity': 'high'}]
+ANNOTATIONS = {'1': ['The deposit is non-refundable.']}
+SECTION_INDEX = {'sections': [{'hash': 'abc', 'rules': ['deposit-withheld']}]}
+
+FOLDERS = ('UPLOAD_FOLDER', 'ARCHIVE_FOLDER', 'REPORT_FOLDER', 'TEXT_CACHE_FOLDER')
+
+@pytest.fixture
+def folders(app):
+    for key in FOLDERS:
+        os.makedirs(app.config[key], exist_ok=True)
+    yield app.config
+    for key in FOLDERS:
+        shutil.rmtree(app.config[key], ignore_errors=True)
+
+def old_document(db, folders, age_days=400, content_hash='ab' * 32):
+    stored = f"{uuid.uuid4().hex}.pdf"
+    with open(os.path.join(folders['UPLOAD_FOLDER'], stored), 'wb') as f:
+        f.write(PDF)
+    document = Document(
+        original_filename='lease.pdf', stored_filename=stored, file_path=stored, file_size=len(PDF),
+        content_hash=content_hash, status='processed', upload_date=datetime.utcnow() - timedelta(days=age_days),
+        risk_factors=RISK_FACTORS, annotations=ANNOTATIONS, section_index=SECTION_INDEX
+    )
+    db.session.add(document)
+    db.session.commit()
+    return document
+
+def upload_path(folders, document):
+    return os.path.join(folders['UPLOAD_FOLDER'], document.file_path)
+
+def test_archive_then_restore_round_trip(app, db, folders):
+    document = old_document(db, folders)
+    report = os.path.join(folders['REPORT_FOLDER'], f"risk_report_{document.id}_1.pdf")
+    open(report, 'wb').close()
+
+    assert archive_files(app, days=30) == 1
+    assert archive_payloads(app, days=30) == 1
+
+    db.session.expire_all()
+    document = db.session.get(Document, document.id)
+    assert document.storage_tier == 'archived'
+    assert not os.path.exists(upload_path(folders, document))
+    assert os.path.isfile(os.path.join(folders['ARCHIVE_FOLDER'], document.archive_path))
+    assert not os.path.exists(report)
+    assert document.risk_factors is None and document.section_index is None
+    assert db.session.get(DocumentArchive, document.id) is not None
+
+    restore_document(document)
+
+    db.session.expire_all()
+    document = db.session.get(Document, document.id)
+    assert document.storage_tier == 'hot'
+    assert document.archive_path is None and document.payload_archived_at is None
+    with open(upload_path(folders, document), 'rb') as f:
+        assert f.read() == PDF
+    assert os.listdir(folders['ARCHIVE_FOLDER']) == []
+    assert (document.risk_factors, document.annotations, document.section_index) == (
+        RISK_FACTORS, ANNOTATIONS, SECTION_INDEX
+    )
+    assert db.session.get(DocumentArchive, document.id) is None
+
+    # The retention clock restarts from the restore
+    assert archive_files(app, days=30) == 0
+    assert archive_payloads(app, days=30) == 0
+    assert purge_documents(app, days=30) == 0
+
+def test_purge_keeps_a_tombstone_and_shared_text(app, db, folders):
+    document = old_document(db, folders)
+    shared = old_document(db, folders, content_hash='cd' * 32)
+    recent = old_document(db, folders, age_days=1, content_hash='cd' * 32)
+    for content_hash in ('ab' * 32, 'cd' * 32):
+        cached = page_cache_path(folders['TEXT_CACHE_FOLDER'], content_hash, 1)
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        open(cached, 'w').close()
+    archive_files(app, days=30)
+    archive_payloads(app, days=30)
+
+    assert purge_documents(app, days=30) == 2
+
+    db.session.expire_all()
+    purged = db.session.get(Document, document.id)
+    assert purged.storage_tier == 'purged'
+    assert purged.archive_path is None and purged.risk_factors is None and purged.payload_archived_at is None
+    assert DocumentArchive.query.count() == 0
+    assert os.listdir(folders['ARCHIVE_FOLDER']) == []
+    assert not os.path.exists(page_cache_path(folders['TEXT_CACHE_FOLDER'], 'ab' * 32, 1))
+    # The recent upload still uses the page text of the same file
+    assert os.path.exists(page_cache_path(folders['TEXT_CACHE_FOLDER'], 'cd' * 32, 1))
+    assert db.session.get(Document, recent.id).storage_tier == 'hot'
+    assert os.path.isfile(upload_path(folders, recent))
+    assert db.session.get(Document, shared.id).storage_tier == 'purged'
+
+    assert purge_documents(app, days=30) == 0
+
+def test_unfinished_documents_are_left_alone(app, db, folders):
+    document = old_document(db, folders)
+    document.status = 'processing'
+    db.session.commit()
+
+    assert archive_files(app, days=30) == 0
+    assert archive_payloads(app, days=30) == 0
+    assert purge_documents(app, days=30) == 0
+    assert os.path.isfile(upload_path(folders, document))
+
+def test_dry_run_only_counts(app, db, folders, monkeypatch):
+    document = old_document(db, folders)
+    monkeypatch.setitem(app.config, 'PURGE_AFTER_DAYS', 0)
+    monkeypatch.setitem(app.config, 'ARCHIVE_AFTER_DAYS', 30)
+    monkeypatch.setitem(app.config, 'PAYLOAD_ARCHIVE_AFTER_DAYS', 30)
+
+    assert run_retention(app, dry_run=True) == {'files_archived': 1, 'payloads_archived': 1}
+
+    db.session.expire_all()
+    document = db.session.get(Document, document.id)
+    assert document.storage_tier == 'hot' and document.risk_factors == RISK_FACTORS
+    assert os.path.isfile(upload_path(folders, document))
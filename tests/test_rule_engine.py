@@ -0,0 +1,119 @@
+import json
+import random
+import re
+
+import pytest
+
+from leasecheck.rule_engine import RuleError, RuleSet, load_rules
+
+# Pattern rules in the shipped set, with text that should fire each of them
+PATTERN_SAMPLES = (
+    "A late fee of 15 percent of the monthly rent applies.",
+    "The late  charge shall be twenty\npercent of rent.",
+    "Landlord may enter the premises at any time.",
+    "The security deposit is non-refundable deposit in part.",
+    "This lease shall renew automatically for successive terms.",
+    "Landlord will give 24 (24) hours' written notice before entry.",
+    "The deposit shall be returned within thirty days.",
+    "Landlord will refund the security deposit within 21 days.",
+    "Tenant pays three months' rent as a security deposit.",
+    "Tenant waives all rights under the implied warranty of habitability.",
+    "Tenant must give ninety days prior written notice.",
+)
+
+FILLER_WORDS = (
+    'the tenant shall pay rent on first day of each month landlord premises deposit notice '
+    'repair late fee grace period days written entry lease term renew'
+).split()
+
+def naive_match(rules, text):
+    """Ids of the rules that fire anywhere in text, one search per keyword and pattern"""
+    fired = set()
+    for rule in rules:
+        patterns = [
+            r'(?<!\w)' + r'\s+'.join(re.escape(word) for word in keyword.split()) + r'(?!\w)'
+            for keyword in rule.get('keywords', [])
+        ]
+        patterns += rule.get('patterns', [])
+        if any(re.search(pattern, text, re.IGNORECASE) for pattern in patterns):
+            fired.add(rule['id'])
+    return fired
+
+def synthetic_texts(rules, count, seed=3):
+    """Texts mixing filler with rule keywords, broken by random whitespace and casing"""
+    rng = random.Random(seed)
+    phrases = [keyword for rule in rules for keyword in rule.get('keywords', [])] + list(PATTERN_SAMPLES)
+    texts = []
+    for _ in range(count):
+        parts = []
+        for _ in range(rng.randint(5, 40)):
+            if rng.random() < 0.3:
+                phrase = rng.choice(phrases)
+                # Clip some phrases so near misses are scanned too
+                if rng.random() < 0.2:
+                    phrase = phrase[:rng.randint(1, len(phrase))]
+                parts.append(phrase.upper() if rng.random() < 0.1 else phrase)
+            else:
+                parts.append(rng.choice(FILLER_WORDS))
+        texts.append(''.join(part + rng.choice((' ', '  ', '\n', ', ', '')) for part in parts))
+    return texts
+
+def write_rules(folder, name, rules, category='fees'):
+    folder.joinpath(name).write_text(json.dumps({'category': category, 'rules': rules}))
+
+def rule(rule_id, **fields):
+    return dict({'id': rule_id, 'severity': 'warning', 'title': rule_id, 'description': rule_id}, **fields)
+
+def test_engine_matches_the_naive_matcher_on_shipped_rules():
+    rules = load_rules()
+    rule_set = RuleSet(rules)
+    for text in synthetic_texts(rules, 300):
+        assert set(rule_set.match(text)) == naive_match(rules, text), text
+
+def test_engine_matches_the_naive_matcher_with_overlapping_rules():
+    # Keywords sharing prefixes, keywords inside other keywords and patterns with
+    # and without a literal prefix all compete for the same offsets
+    rules = [
+        rule('deposit', keywords=['deposit']),
+        rule('deposit-returned', keywords=['security deposit returned', 'deposit returned within']),
+        rule('late', keywords=['late', 'late fee', 'late fees']),
+        rule('days', patterns=[r'\d+\s+days']),
+        rule('notice', patterns=[r'(?:written|verbal)\s+notice']),
+        rule('fee-percent', patterns=[r'late\s+fee[^.]{0,30}?\d+\s*percent']),
+        rule('entry', patterns=[r'enter\w*\s+(?:the\s+)?premises']),
+    ]
+    rule_set = RuleSet(rules)
+    rng = random.Random(5)
+    vocabulary = [
+        'security', 'deposit', 'returned', 'within', '30', 'days', 'late', 'fee', 'fees', 'lateness',
+        'written', 'notice', 'of', '10', 'percent', 'enters', 'entering', 'the', 'premises', 'deposits'
+    ]
+    for _ in range(500):
+        text = ''.join(rng.choice(vocabulary) + rng.choice((' ', '\n', '. ', '')) for _ in range(rng.randint(1, 25)))
+        assert set(rule_set.match(text)) == naive_match(rules, text), text
+
+def test_first_match_and_absent_rules_in_findings():
+    rules = [
+        rule('deposit', keywords=['security deposit'], severity='critical'),
+        rule('grace', keywords=['grace period'], when='absent', severity='suggestion'),
+    ]
+    for item in rules:
+        item['category'] = 'deposits'
+    findings = RuleSet(rules).evaluate([(1, 'No deposit here.'), (2, 'The security\ndeposit is due.'), (3, 'Security deposit again.')])
+
+    assert [(finding['rule'], finding['page']) for finding in findings] == [('deposit', 2), ('grace', None)]
+    assert 'security deposit is due' in findings[0]['excerpt']
+
+def test_invalid_pattern_names_the_file_and_rule(tmp_path):
+    write_rules(tmp_path, 'fees.json', [rule('fee-ok', keywords=['late fee'])])
+    write_rules(tmp_path, 'termination.json', [rule('termination-broken', patterns=[r'notice\s+(?:of'])])
+
+    with pytest.raises(RuleError, match=r"termination\.json: rule termination-broken has an invalid pattern"):
+        load_rules(str(tmp_path))
+
+@pytest.mark.parametrize('pattern', [r'notice)|(of', r'(?P<days>\d+) days', r'fee (?i)late'])
+def test_patterns_that_would_break_the_combined_regex_are_refused(tmp_path, pattern):
+    write_rules(tmp_path, 'fees.json', [rule('fee-broken', patterns=[pattern])])
+
+    with pytest.raises(RuleError, match=r"fees\.json: rule fee-broken"):
+        load_rules(str(tmp_path))
@@ -0,0 +1,118 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+
+from leasecheck.models import Document, Payment, SupportTicket
+from leasecheck.search import (
+    init_search, missing_search_objects, parse_query, rebuild_search_index, search, single_edits
+)
+
+@pytest.fixture
+def records(db):
+    document = Document(
+        original_filename='Maple Street Lease.pdf', stored_filename='maple.pdf', file_path='maple.pdf',
+        file_size=1, status='processed'
+    )
+    db.session.add(document)
+    db.session.flush()
+    db.session.add_all([
+        SupportTicket(document_id=document.id, user_email='bob@example.com', issue_type='billing',
+                      description='Charged twice for the maple lease review'),
+        SupportTicket(document_id=document.id, user_email='ann@example.com', issue_type='analysis',
+                      description='Deposit clause was not flagged'),
+        Payment(stripe_payment_id='pi_3NxAbc', user_email='bob@example.com', amount=2900,
+                status='succeeded', plan_name='standard', created_at=datetime.utcnow())
+    ])
+    db.session.commit()
+    return document
+
+def kinds(result):
+    return sorted((hit['kind'], hit['title']) for hit in result['results'])
+
+def test_query_words_split_like_the_index():
+    assert parse_query('  pi_3Nx  Bob@Example.com ') == [['pi', '3nx'], ['bob', 'example', 'com']]
+    assert parse_query('-- !!') == []
+
+def test_single_edits_are_one_typo_away():
+    edits = single_edits('rent')
+    assert {'ret', 'rnet', 'rant', 'rents'} <= edits
+    assert 'rent' not in edits and 'tern' not in edits
+
+def test_every_kind_is_found_by_prefix(records):
+    assert kinds(search('mapl')) == [
+        ('document', 'Maple Street Lease.pdf'), ('ticket', 'billing - bob@example.com')
+    ]
+    assert kinds(search('pi_3Nx')) == [('transaction', 'pi_3NxAbc - bob@example.com')]
+    assert kinds(search('bob@exa', kind='transaction')) == [('transaction', 'pi_3NxAbc - bob@example.com')]
+    # Every word must match
+    assert kinds(search('maple twice')) == [('ticket', 'billing - bob@example.com')]
+
+def test_title_matches_rank_first(records):
+    # The ticket is newer, but only mentions maple in its description
+    assert [hit['kind'] for hit in search('maple')['results']] == ['document', 'ticket']
+
+def test_triggers_follow_inserts_updates_and_deletes(records, db):
+    ticket = SupportTicket.query.filter_by(issue_type='analysis').one()
+    ticket.description = 'Renewal clause was not flagged'
+    db.session.commit()
+    assert search('deposit')['results'] == []
+    assert kinds(search('renewal')) == [('ticket', 'analysis - ann@example.com')]
+
+    db.session.delete(ticket)
+    db.session.commit()
+    assert search('renewal')['results'] == []
+
+    # Bulk inserts that bypass the ORM are indexed too
+    db.session.execute(db.insert(Payment), [{
+        'stripe_payment_id': 'pi_bulk', 'user_email': 'cy@example.com', 'amount': 100,
+        'status': 'succeeded', 'plan_name': 'premium', 'created_at': datetime.utcnow()
+    }])
+    db.session.commit()
+    assert kinds(search('premium')) == [('transaction', 'pi_bulk - cy@example.com')]
+
+def test_misspelled_words_are_corrected(records):
+    result = search('flaged')
+    assert result['fuzzy']
+    assert result['corrections'] == {'flaged': ['flagged']}
+    assert kinds(result) == [('ticket', 'analysis - ann@example.com')]
+    # Short words are only matched as prefixes
+    assert search('bxb')['results'] == []
+
+def test_pages_report_whether_more_follow(records, db):
+    db.session.add_all([
+        Document(original_filename=f'Oak lease {number}.pdf', stored_filename=f'oak{number}.pdf',
+                 file_path=f'oak{number}.pdf', file_size=1)
+        for number in range(5)
+    ])
+    db.session.commit()
+
+    first = search('oak', page=1, per_page=3)
+    second = search('oak', page=2, per_page=3)
+    assert (len(first['results']), first['hasMore']) == (3, True)
+    assert (len(second['results']), second['hasMore']) == (2, False)
+    assert not {hit['id'] for hit in first['results']} & {hit['id'] for hit in second['results']}
+
+def test_rebuild_matches_the_trigger_maintained_index(records, db):
+    before = kinds(search('example'))
+    with db.engine.begin() as connection:
+        connection.execute(text("DELETE FROM search_index"))
+    assert search('example')['results'] == []
+
+    rebuild_search_index()
+    assert kinds(search('example')) == before
+
+def test_unknown_kind_is_rejected(records):
+    with pytest.raises(ValueError):
+        search('maple', kind='user')
+
+def test_startup_only_recreates_missing_sqlite_objects(app, db):
+    with db.engine.begin() as connection:
+        assert missing_search_objects(connection, 'sqlite') == []
+        connection.execute(text("DROP TRIGGER search_payments_update"))
+        assert missing_search_objects(connection, 'sqlite') == ['search_payments_update']
+
+    init_search(app)
+
+    with db.engine.begin() as connection:
+        assert missing_search_objects(connection, 'sqlite') == []
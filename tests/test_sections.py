@@ -0,0 +1,87 @@
+from leasecheck.rule_engine import RuleSet
+from leasecheck.sections import IncrementalScorer, merge_findings, section_fingerprint, split_sections
+
+PAGE = (
+    "RESIDENTIAL LEASE\n"
+    "1. Rent. Tenant pays rent on the first day of each month. A late fee applies after five days.\n"
+    "2. Deposit. Tenant pays a security deposit.\n"
+    "Section 3 Entry. Landlord may enter with notice.\n"
+)
+
+def rule(rule_id, **fields):
+    return dict({
+        'id': rule_id, 'category': 'terms', 'severity': 'warning', 'title': rule_id, 'description': rule_id
+    }, **fields)
+
+RULES = [
+    rule('late-fee', keywords=['late fee']),
+    rule('deposit', keywords=['security deposit']),
+    rule('entry', patterns=[r'may\s+enter']),
+]
+
+def fired(findings):
+    # Excerpts differ, the scorer cuts them from the section rather than the page
+    return [(finding['rule'], finding['page']) for finding in findings]
+
+def score(rule_set, pages, previous_index=None):
+    scorer = IncrementalScorer(rule_set, previous_index)
+    for page_number, text in pages:
+        scorer.feed(page_number, text)
+    return scorer
+
+def test_sections_start_at_clause_headings():
+    sections = split_sections(PAGE)
+    assert [section[:10] for section in sections] == ['RESIDENTIA', '1. Rent. T', '2. Deposit', 'Section 3 ']
+    assert ''.join(sections) == PAGE
+
+def test_pages_without_headings_split_on_paragraphs():
+    assert split_sections("First paragraph.\n\n  \n\nSecond\nparagraph.\n") == [
+        'First paragraph.', 'Second\nparagraph.\n'
+    ]
+
+def test_fingerprint_ignores_reflow_and_case():
+    assert section_fingerprint("Tenant pays\n  the RENT.") == section_fingerprint("tenant pays the rent.")
+    assert section_fingerprint("Tenant pays the rent.") != section_fingerprint("Tenant pays no rent.")
+
+def test_incremental_score_matches_a_full_scan():
+    rule_set = RuleSet(RULES)
+    first = score(rule_set, [(1, PAGE)])
+    assert first.stats['rescanned'] == 4
+    assert fired(first.findings()) == fired(rule_set.evaluate([(1, PAGE)]))
+
+    revised = PAGE.replace('security deposit', 'refundable sum')
+    second = score(rule_set, [(1, revised)], first.section_index())
+    assert (second.stats['rescanned'], second.stats['reused']) == (1, 3)
+    assert fired(second.findings()) == fired(rule_set.evaluate([(1, revised)]))
+    assert 'deposit' not in {finding['rule'] for finding in second.findings()}
+
+def test_changed_rules_rescan_unchanged_sections():
+    first = score(RuleSet(RULES), [(1, PAGE)])
+
+    changed = [RULES[0], rule('deposit', keywords=['refundable']), RULES[2]]
+    second = score(RuleSet(changed), [(1, PAGE)], first.section_index())
+    assert second.changed_rules == {'deposit'}
+    assert second.stats['rescanned'] == 0
+    assert {finding['rule'] for finding in second.findings()} == {'late-fee', 'entry'}
+
+    # Removed rules lose their stored hits, added rules are matched against every section
+    added = [RULES[0], rule('grace', keywords=['five days'])]
+    third = score(RuleSet(added), [(1, PAGE)], first.section_index())
+    assert {finding['rule'] for finding in third.findings()} == {'late-fee', 'grace'}
+
+def test_repeated_sections_are_scored_once():
+    clause = "9. Notices. Landlord may enter with notice.\n"
+    scorer = score(RuleSet(RULES), [(1, clause), (2, clause.upper())])
+    assert scorer.stats['sections'] == 2
+    assert scorer.stats['rescanned'] == 1
+    assert [section['page'] for section in scorer.section_index()['sections']] == [1, 2]
+    # The earliest page is reported
+    assert scorer.findings()[0]['page'] == 1
+
+def test_surviving_findings_keep_their_ids():
+    previous = [{'id': 1, 'rule': 'late-fee'}, {'id': 4, 'rule': 'deposit'}]
+    findings = [{'rule': 'entry'}, {'rule': 'deposit'}, {'rule': 'grace'}]
+    assert [(finding['rule'], finding['id']) for finding in merge_findings(previous, findings)] == [
+        ('entry', 5), ('deposit', 4), ('grace', 6)
+    ]
+    assert [finding['id'] for finding in merge_findings(None, findings)] == [1, 2, 3]
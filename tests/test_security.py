@@ -0,0 +1,39 @@
+import re
+from pathlib import Path
+
+import pytest
+
+from leasecheck.security import CSP_POLICY, build_csp
+
+TEMPLATE_DIRS = [Path(__file__).parent.parent / 'leasecheck' / folder for folder in ('templates', 'components')]
+
+def script_src(policy):
+    return next(d for d in policy.split('; ') if d.startswith('script-src ')).split()[1:]
+
+def test_nonce_policy_drops_unsafe_inline():
+    assert "'unsafe-inline'" in script_src(build_csp(CSP_POLICY))
+
+    sources = script_src(build_csp(CSP_POLICY, nonce=True))
+    assert "'unsafe-inline'" not in sources
+    assert "'nonce-{nonce}'" in sources
+    # Inline styles are not covered by the nonce
+    assert "style-src 'self' 'unsafe-inline'" in build_csp(CSP_POLICY, nonce=True)
+
+@pytest.mark.parametrize('path', [
+    path for folder in TEMPLATE_DIRS for path in sorted(folder.rglob('*.html'))
+], ids=lambda path: str(path.relative_to(path.parents[2])))
+def test_templates_only_have_nonced_scripts(path):
+    html = path.read_text()
+    for tag in re.findall(r'<script\b[^>]*>', html):
+        assert 'nonce="{{ csp_nonce() }}"' in tag or 'src=' in tag, tag
+    assert not re.findall(r'\son[a-z]+\s*=', html)
+
+def test_page_nonce_matches_header(app, db, monkeypatch):
+    monkeypatch.setitem(app.extensions['security_headers'], 'nonce_enabled', True)
+    response = app.test_client().get('/preview/legal_stuff')
+    assert response.status_code == 200
+
+    policy = response.headers['Content-Security-Policy']
+    assert "'unsafe-inline'" not in script_src(policy)
+    nonce = re.search(r"'nonce-([^']+)'", policy).group(1)
+    assert f'<script nonce="{nonce}">' in response.get_data(as_text=True)
@@ -0,0 +1,155 @@
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask, session
+
+from leasecheck.models import ServerSessionRecord
+from leasecheck.sessions import DatabaseSessionStore, ServerSessionInterface, rotate_session
+
+class RecordingStore(DatabaseSessionStore):
+    """Database store that records which calls reached it"""
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.calls = []
+
+    def load(self, sid):
+        self.calls.append('load')
+        return super().load(sid)
+
+    def save(self, sid, data, expires_at):
+        self.calls.append('save')
+        super().save(sid, data, expires_at)
+
+    def touch(self, sid, expires_at):
+        self.calls.append('touch')
+        super().touch(sid, expires_at)
+
+    def delete(self, sid):
+        self.calls.append('delete')
+        super().delete(sid)
+
+@pytest.fixture
+def store(app, db):
+    return RecordingStore(app)
+
+@pytest.fixture
+def client(store):
+    site = Flask(__name__)
+    site.secret_key = 'test'
+    site.permanent_session_lifetime = timedelta(hours=1)
+    site.session_interface = ServerSessionInterface(store)
+
+    @site.route('/ping')
+    def ping():
+        return 'pong'
+
+    @site.route('/set/<value>')
+    def set_value(value):
+        session['value'] = value
+        return 'ok'
+
+    @site.route('/get')
+    def get_value():
+        return session.get('value', '')
+
+    @site.route('/login')
+    def login():
+        session['user_id'] = 1
+        rotate_session(session)
+        return 'ok'
+
+    @site.route('/logout')
+    def logout():
+        session.clear()
+        return 'ok'
+
+    return site.test_client()
+
+def session_id(client):
+    cookie = client.get_cookie('session')
+    return cookie.value if cookie else None
+
+def stored_ids(db):
+    db.session.expire_all()
+    return {record.id for record in ServerSessionRecord.query}
+
+def test_untouched_session_never_reaches_the_store(client, store):
+    client.get('/set/a')
+    store.calls.clear()
+
+    response = client.get('/ping')
+    assert store.calls == []
+    assert 'Set-Cookie' not in response.headers
+
+def test_data_is_loaded_on_first_read(client, store):
+    client.get('/set/a')
+    store.calls.clear()
+
+    response = client.get('/get')
+    assert response.text == 'a'
+    assert store.calls == ['load']
+    # A fresh session is read without being written back
+    assert 'Set-Cookie' not in response.headers
+    assert 'Cookie' in response.headers['Vary']
+
+def test_cookie_only_holds_the_session_id(client, db):
+    client.get('/set/secret')
+    sid = session_id(client)
+    assert 'secret' not in sid
+    assert stored_ids(db) == {sid}
+
+def test_login_moves_the_data_to_a_new_id(client, db):
+    client.get('/set/a')
+    old_sid = session_id(client)
+
+    client.get('/login')
+    new_sid = session_id(client)
+    assert new_sid != old_sid
+    assert stored_ids(db) == {new_sid}
+    assert client.get('/get').text == 'a'
+
+def test_unknown_id_is_not_adopted(client, db):
+    client.set_cookie('session', 'x' * 43)
+    client.get('/set/a')
+    assert session_id(client) != 'x' * 43
+    assert stored_ids(db) == {session_id(client)}
+
+def test_expired_session_starts_afresh(client, db):
+    client.get('/set/a')
+    sid = session_id(client)
+    db.session.get(ServerSessionRecord, sid).expires_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+
+    assert client.get('/get').text == ''
+
+def test_expiry_is_only_pushed_back_late_in_the_lifetime(client, store, db):
+    client.get('/set/a')
+    sid = session_id(client)
+    store.calls.clear()
+
+    client.get('/get')
+    assert store.calls == ['load']
+
+    db.session.get(ServerSessionRecord, sid).expires_at = datetime.utcnow() + timedelta(minutes=10)
+    db.session.commit()
+    store.calls.clear()
+    client.get('/get')
+    assert store.calls == ['load', 'touch']
+    db.session.expire_all()
+    assert db.session.get(ServerSessionRecord, sid).expires_at > datetime.utcnow() + timedelta(minutes=50)
+
+def test_clearing_the_session_deletes_it(client, db):
+    client.get('/set/a')
+    client.get('/logout')
+    assert session_id(client) is None
+    assert stored_ids(db) == set()
+
+def test_purge_removes_only_expired_sessions(client, store, db):
+    client.get('/set/a')
+    live = session_id(client)
+    db.session.add(ServerSessionRecord(id='y' * 43, data='{}', expires_at=datetime.utcnow() - timedelta(seconds=1)))
+    db.session.commit()
+
+    assert store.purge_expired(batch_size=1) == 1
+    assert stored_ids(db) == {live}
@@ -0,0 +1,176 @@
+import json
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from leasecheck import stripe_events
+from leasecheck.models import Payment, StripeEvent
+from leasecheck.stripe_events import (
+    sign_payload, record_event, claim_pending_events, process_batch, MAX_ATTEMPTS
+)
+
+SECRET = 'whsec_test'
+
+def intent_event(event_id, event_type, created, payment_id='pi_1', email='tenant@example.com'):
+    return json.dumps({
+        'id': event_id,
+        'type': event_type,
+        'created': created,
+        'data': {'object': {
+            'id': payment_id, 'amount': 2900, 'currency': 'usd', 'created': 1700000000,
+            'metadata': {'email': email, 'plan': 'standard'}
+        }}
+    }).encode()
+
+def refund_event(event_id, created, payment_id='pi_1'):
+    return json.dumps({
+        'id': event_id,
+        'type': 'charge.refunded',
+        'created': created,
+        'data': {'object': {'id': 'ch_1', 'payment_intent': payment_id, 'amount': 2900, 'refunded': True}}
+    }).encode()
+
+def process_all(app, db):
+    while True:
+        token, claimed = claim_pending_events(limit=100)
+        if not claimed:
+            break
+        process_batch(app, token, claimed)
+    db.session.expire_all()
+
+def payment(db, payment_id='pi_1'):
+    db.session.expire_all()
+    return Payment.query.filter_by(stripe_payment_id=payment_id).one()
+
+@pytest.fixture
+def client(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'STRIPE_WEBHOOK_SECRET', SECRET)
+    return app.test_client()
+
+def post_webhook(client, body, header=None):
+    return client.post('/webhooks/stripe', data=body, headers={
+        'Content-Type': 'application/json', 'Stripe-Signature': header or sign_payload(body, SECRET)
+    })
+
+def test_webhook_records_a_signed_event_once(client, db):
+    body = intent_event('evt_1', 'payment_intent.succeeded', 1700000100)
+
+    first = post_webhook(client, body)
+    assert first.status_code == 200
+    assert first.json == {'received': 'evt_1', 'duplicate': False}
+
+    redelivery = post_webhook(client, body)
+    assert redelivery.json == {'received': 'evt_1', 'duplicate': True}
+    assert StripeEvent.query.count() == 1
+
+def test_webhook_rejects_bad_and_stale_signatures(client, db):
+    body = intent_event('evt_1', 'payment_intent.succeeded', 1700000100)
+
+    assert post_webhook(client, body, sign_payload(body, 'whsec_other')).status_code == 400
+    assert post_webhook(client, body, sign_payload(body, SECRET, timestamp=time.time() - 3600)).status_code == 400
+    assert post_webhook(client, body, 'garbage').status_code == 400
+    assert StripeEvent.query.count() == 0
+
+def test_claim_takes_oldest_events_once(db):
+    for number in range(3):
+        record_event(intent_event(f"evt_{number}", 'payment_intent.processing', 1700000000 + number))
+
+    first_token, first = claim_pending_events(limit=2)
+    second_token, second = claim_pending_events(limit=2)
+    assert len(first) == 2 and len(second) == 1
+    assert first_token != second_token
+    assert first + second == sorted(first + second)
+    assert claim_pending_events(limit=2) == (None, [])
+
+def test_expired_claim_is_taken_again(db):
+    record_event(intent_event('evt_1', 'payment_intent.succeeded', 1700000100))
+    token, (event_id,) = claim_pending_events(limit=10)
+
+    # The processor that claimed it died before finishing
+    event = db.session.get(StripeEvent, event_id)
+    event.locked_until = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+
+    new_token, claimed = claim_pending_events(limit=10)
+    assert claimed == [event_id] and new_token != token
+    db.session.expire_all()
+    assert db.session.get(StripeEvent, event_id).attempts == 2
+
+def test_failed_batch_is_retried_then_given_up(app, db, monkeypatch):
+    record_event(intent_event('evt_1', 'payment_intent.succeeded', 1700000100))
+
+    def broken(rows):
+        raise RuntimeError('database unavailable')
+    monkeypatch.setattr(stripe_events, 'upsert_payments', broken)
+
+    assert process_batch(app, *claim_pending_events(limit=10)) == 0
+    db.session.expire_all()
+    event = StripeEvent.query.one()
+    assert event.status == 'pending'
+    assert event.claim_token is None and event.processed_at is None
+    assert event.next_attempt_at > datetime.utcnow()
+    assert 'database unavailable' in event.last_error
+
+    event.attempts = MAX_ATTEMPTS - 1
+    event.next_attempt_at = datetime.utcnow()
+    db.session.commit()
+    process_batch(app, *claim_pending_events(limit=10))
+    db.session.expire_all()
+    assert StripeEvent.query.one().status == 'failed'
+
+def test_duplicate_events_apply_once(app, db):
+    body = intent_event('evt_1', 'payment_intent.succeeded', 1700000100)
+    assert record_event(body) == ('evt_1', True)
+    assert record_event(body) == ('evt_1', False)
+
+    process_all(app, db)
+    assert payment(db).status == 'succeeded'
+    assert StripeEvent.query.one().status == 'processed'
+
+def test_older_event_never_overwrites_newer_status(app, db):
+    # Stripe sent processing, then succeeded, but they arrive the other way round
+    record_event(intent_event('evt_2', 'payment_intent.succeeded', 1700000200))
+    process_all(app, db)
+    record_event(intent_event('evt_1', 'payment_intent.processing', 1700000100))
+    process_all(app, db)
+
+    assert payment(db).status == 'succeeded'
+    assert payment(db).stripe_updated_at == datetime.utcfromtimestamp(1700000200)
+
+def test_out_of_order_events_in_one_batch_keep_the_newest(app, db):
+    record_event(refund_event('evt_3', 1700000300))
+    record_event(intent_event('evt_2', 'payment_intent.succeeded', 1700000200))
+    record_event(intent_event('evt_1', 'payment_intent.processing', 1700000100))
+    process_all(app, db)
+
+    row = payment(db)
+    assert row.status == 'refunded'
+    # The refund carries no metadata, the intent events fill in the buyer
+    assert row.user_email == 'tenant@example.com'
+    assert row.plan_name == 'standard'
+
+def test_events_whose_claim_was_lost_are_left_alone(app, db, monkeypatch):
+    record_event(intent_event('evt_1', 'payment_intent.succeeded', 1700000100, payment_id='pi_1'))
+    record_event(intent_event('evt_2', 'payment_intent.succeeded', 1700000200, payment_id='pi_2'))
+    token, claimed = claim_pending_events(limit=10)
+
+    read = stripe_events.payment_row
+    def steal(event):
+        # The lease ran out mid-batch and another processor claimed evt_2
+        if event['id'] == 'evt_2':
+            with db.engine.begin() as connection:
+                connection.execute(
+                    StripeEvent.__table__.update()
+                    .where(StripeEvent.event_id == 'evt_2')
+                    .values(claim_token='other-processor')
+                )
+        return read(event)
+    monkeypatch.setattr(stripe_events, 'payment_row', steal)
+
+    assert process_batch(app, token, claimed) == 1
+    db.session.expire_all()
+    assert StripeEvent.query.filter_by(event_id='evt_1').one().status == 'processed'
+    stolen = StripeEvent.query.filter_by(event_id='evt_2').one()
+    assert stolen.status == 'processing' and stolen.claim_token == 'other-processor'
+    assert [row.stripe_payment_id for row in Payment.query] == ['pi_1']
@@ -0,0 +1,97 @@
+import time
+
+import pytest
+
+from leasecheck import terms
+from leasecheck.cache import cache
+from leasecheck.models import AdminUser, TermsAcceptance, TermsVersion
+from leasecheck.terms import safe_next_url, record_acceptance
+
+@pytest.mark.parametrize('url', [
+    '/lease-analysis', '/checkout?plan=standard', '/a//b'
+])
+def test_safe_next_url_keeps_local_paths(url):
+    assert safe_next_url(url) == url
+
+@pytest.mark.parametrize('url', [
+    None, '', 'lease-analysis', 'https://evil.com/', '//evil.com', '/\\evil.com', '/\\/evil.com',
+    '\\\\evil.com', '/\t/evil.com', '/\n/evil.com'
+])
+def test_safe_next_url_rejects_other_sites(url):
+    assert safe_next_url(url) is None
+
+@pytest.fixture
+def client(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'TERMS_GATE_ENABLED', True)
+    return app.test_client()
+
+def sign_in(client, db, email='tenant@example.com'):
+    user = AdminUser(email=email, password_hash='unused')
+    db.session.add(user)
+    db.session.commit()
+    with client.session_transaction() as session:
+        session['user_id'] = user.id
+    return email
+
+def test_anonymous_visitor_is_sent_to_login(client, db):
+    response = client.get('/checkout?plan=standard')
+    assert response.status_code == 302
+    assert response.headers['Location'] == '/login'
+
+    response = client.post('/api/payment-intent', json={'plan': 'standard'})
+    assert response.status_code == 401
+
+def test_unaccepted_user_is_sent_to_the_legal_page(client, db):
+    sign_in(client, db)
+    response = client.get('/checkout?plan=standard')
+    assert response.status_code == 302
+    assert response.headers['Location'].startswith('/legal-stuff')
+
+    assert client.post('/api/payment-intent', json={'plan': 'standard'}).status_code == 403
+
+def test_accepting_returns_only_to_local_paths(client, db):
+    sign_in(client, db)
+    response = client.post('/terms?next=/\\evil.com', data={'email': 'tenant@example.com', 'accept_terms': 'y'})
+    assert response.headers['Location'] == '/'
+
+def test_accepting_returns_to_the_gated_page(client, db):
+    email = sign_in(client, db)
+    response = client.post('/terms?next=/checkout?plan=standard', data={'email': 'tenant@example.com', 'accept_terms': 'y'})
+    assert response.headers['Location'] == '/checkout?plan=standard'
+
+    record_acceptance(email)
+    assert client.get('/checkout?plan=standard').status_code == 200
+
+def test_acceptance_from_another_worker_is_seen_once_the_refusal_expires(db, monkeypatch):
+    cache.clear()
+    monkeypatch.setattr(terms, 'NOT_ACCEPTED_TIMEOUT', 1)
+    version = terms.current_terms_version()
+    assert not terms.has_accepted('other@example.com')
+
+    # Recorded by a worker whose cache writes never reach this one
+    db.session.add(TermsAcceptance(user_email='other@example.com', terms_version=version))
+    db.session.commit()
+    time.sleep(1.1)
+    assert terms.has_accepted('other@example.com')
+
+def test_carried_over_acceptances_exist_before_the_version_is_published(db, monkeypatch):
+    cache.clear()
+    record_acceptance('carried@example.com')
+    backfill = terms.backfill_acceptances
+    published_during_backfill = []
+
+    def watched_backfill(from_version, to_version, **kwargs):
+        copied = backfill(from_version, to_version, **kwargs)
+        # What another worker reading the database would see at this point
+        published_during_backfill.append(
+            TermsVersion.query.filter_by(version=to_version).first() is not None
+        )
+        return copied
+    monkeypatch.setattr(terms, 'backfill_acceptances', watched_backfill)
+
+    assert terms.publish_terms_version('2099-01-01', carry_over=True) == 1
+    assert published_during_backfill == [False]
+    assert terms.current_terms_version() == '2099-01-01'
+    assert terms.has_accepted('carried@example.com')
+    # The version row goes with the test's data, its cached name must go too
+    cache.clear()